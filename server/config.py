@@ -134,6 +134,50 @@ class Config:
     ADMINS_CAN_BUILD_RELEASES = bool(int(os.getenv("ADMINS_CAN_BUILD_RELEASES", 0)))
 
     FORCE_RQ_SYNCHRONOUS = bool(int(os.getenv("FORCE_RQ_SYNCHRONOUS", 0)))
+    # By default, each RQ worker forks a new process for each job, as standard
+    # RQ workers do, so that jobs are isolated from one another. Set this true
+    # to instead have each worker perform all its jobs in its own process,
+    # under one long-lived app context, saving the per-job cost of forming a
+    # new app and new connections (see `pfsc.rqworker`).
+    RQ_WORKER_NO_FORK = bool(int(os.getenv("RQ_WORKER_NO_FORK", 0)))
+    # If positive, each RQ worker exits after performing this many jobs, and
+    # relies on its supervisor (e.g. a container restart policy) to replace it.
+    # Mainly of interest with `RQ_WORKER_NO_FORK`.
+    RQ_WORKER_MAX_JOBS = int(os.getenv("RQ_WORKER_MAX_JOBS", 0))
+    # When a repo task (such as writing and building) is requested while a job
+    # of the same kind, for the same repos, is still waiting in the queue, we
+    # merge the new request into the waiting job, instead of queueing another
+    # job behind it. Set false to disable this.
+    COALESCE_REPO_JOBS = bool(int(os.getenv("COALESCE_REPO_JOBS", 1)))
+    # RQ jobs are routed to separate queues according to their class:
+    # interactive, build, bulk-clone, or maintenance (see
+    # `pfsc.constants.QueueClass`). Workers listen on all of these (unless
+    # given other queues on the command line), choosing which queue to serve
+    # next in proportion to the weights given here, as a comma-delimited list
+    # of `class:weight` pairs. A weight of zero means the class is served only
+    # when all others are empty.
+    RQ_WORKER_QUEUE_WEIGHTS = parse_cd_list(os.getenv(
+        "RQ_WORKER_QUEUE_WEIGHTS", "interactive:8,build:4,bulk-clone:2,maintenance:1"))
+    # Limits on how many jobs of each class any one user may have waiting or
+    # running at once, as a comma-delimited list of `class:limit` pairs.
+    # Classes not listed are unlimited. Anonymous users are counted per socket.
+    MAX_PENDING_JOBS_PER_USER = parse_cd_list(os.getenv(
+        "MAX_PENDING_JOBS_PER_USER", "build:4,bulk-clone:2"))
+
+    # Span tracing of builds, indexing, graph DB calls, and request handlers
+    # (see `pfsc.tracing`). Give a comma-delimited list of exporters: `ring`
+    # keeps the last `TRACING_RING_SIZE` spans in memory, where admins can
+    # view them at the `getTraces` endpoint; `file` appends them as JSON lines
+    # to `TRACING_FILE`. Leave empty to disable tracing.
+    TRACING_EXPORTERS = parse_cd_list(os.getenv("TRACING_EXPORTERS", ''))
+    TRACING_RING_SIZE = int(os.getenv("TRACING_RING_SIZE", 1000))
+    TRACING_FILE = os.getenv("TRACING_FILE")
+
+    # Set True to have the web server check that the build dir and graph DB
+    # are in sync, in a background task, after it starts serving. The check is
+    # incremental, and only reports discrepancies; see `pfsc.build.sync`, and
+    # the `flask pfsc sync_check` command.
+    BACKGROUND_SYNC_CHECK = bool(int(os.getenv("BACKGROUND_SYNC_CHECK", 0)))
     REQUIRE_CSRF_TOKEN = bool(int(os.getenv("REQUIRE_CSRF_TOKEN", 1)))
 
     ISE_DEV_MODE = bool(int(os.getenv("ISE_DEV_MODE", 0)))
@@ -303,19 +347,34 @@ class Config:
 
     REDIS_URI = os.getenv("REDIS_URI")
 
+    # The form of the GRAPHDB_URI determines the graph database system:
+    #   redis://... for RedisGraph; bolt://... or neo4j://... for Neo4j;
+    #   any URI ending with /gremlin for a Gremlin server; and
+    #   sqlite:///path/to/file.db (or embedded:///path/to/file.db) for an
+    #   embedded SQLite database, which needs no separate process.
     GRAPHDB_URI = os.getenv("GRAPHDB_URI")
     # Username and password for the GDB are optional.
     GDB_USERNAME = os.getenv("GDB_USERNAME") or ''
     GDB_PASSWORD = os.getenv("GDB_PASSWORD") or ''
 
+    # Optionally, give a comma-delimited list of URIs of read replicas of the
+    # GDB at GRAPHDB_URI. Reads are then spread over the replicas (one replica
+    # per app context), while all writes go to the primary. After a session
+    # records notes, or indexes a module, its reads go to the primary for
+    # GRAPHDB_REPLICA_MAX_LAG seconds, giving the replicas time to catch up.
+    # See `pfsc.gdb.replicas`.
+    GRAPHDB_REPLICA_URIS = parse_cd_list(os.getenv("GRAPHDB_REPLICA_URIS", ''))
+    GRAPHDB_REPLICA_MAX_LAG = float(os.getenv("GRAPHDB_REPLICA_MAX_LAG", 10))
+
     # Some GDB systems support transactions, some do not. If we can tell based
     # on the GRAPHDB_URI (such as RedisGraph versus Neo4j) then we ignore this
     # variable; if we cannot (such as with a Gremlin URI) then we follow this.
     USE_TRANSACTIONS = bool(int(os.getenv("USE_TRANSACTIONS", 0)))
 
     # NOTE: math job timeouts are only relevant if you are performing math jobs
-    # on the server. Generally speaking, this is now considered obsolete, since
-    # math calculations are performed in the user's browser via Pyodide.
+    # on the server, i.e. if `SERVER_SIDE_EXAMP_EVAL` is set (see below).
+    # By default, math calculations are performed in the user's browser via
+    # Pyodide.
     #
     # Number of seconds before math calculations for examp widgets are timed out.
     # Set to -1 for no timeout (_NOT_ recommended for a public server!!!).
@@ -325,6 +384,28 @@ class Config:
     # calculation time.
     MATH_JOB_QUEUE_TIMEOUT = os.getenv('MATH_JOB_QUEUE_TIMEOUT', 180)
 
+    # Set true to offer evaluation of examp widgets on the server, as an
+    # alternative to Pyodide in the browser. See `pfsc.exampeval`.
+    SERVER_SIDE_EXAMP_EVAL = bool(int(os.getenv("SERVER_SIDE_EXAMP_EVAL", 0)))
+    # Much has been done in the design of the param and disp widgets to try to
+    # gracefully handle "bad code"; however, it is the nature of such a system
+    # that we will never be able to call it more than "maybe safe". Use this
+    # setting to decide whether to evaluate examp widgets from untrusted repos.
+    EVAL_EXAMP_WIDGETS_IN_UNTRUSTED_REPOS = bool(int(os.getenv("EVAL_EXAMP_WIDGETS_IN_UNTRUSTED_REPOS", 0)))
+    # Number of worker processes in the examp evaluation pool.
+    EXAMP_EVAL_POOL_SIZE = int(os.getenv("EXAMP_EVAL_POOL_SIZE", 2))
+    # Memory (MB) each worker process may allocate, beyond what it uses at
+    # startup. Set to 0 for no limit.
+    EXAMP_EVAL_MEMORY_LIMIT_MB = int(os.getenv("EXAMP_EVAL_MEMORY_LIMIT_MB", 512))
+    # Number of evaluations after which a worker process is replaced. Set to
+    # 0 to keep workers for as long as the pool lives.
+    EXAMP_EVAL_MAX_TASKS_PER_PROCESS = int(os.getenv("EXAMP_EVAL_MAX_TASKS_PER_PROCESS", 200))
+    # Number of evaluation results memoized in each process.
+    EXAMP_EVAL_MEMO_SIZE = int(os.getenv("EXAMP_EVAL_MEMO_SIZE", 1024))
+    # If positive, evaluation results are also memoized in Redis, shared
+    # between processes, for this many seconds.
+    EXAMP_EVAL_MEMO_REDIS_TTL = int(os.getenv("EXAMP_EVAL_MEMO_REDIS_TTL", 0))
+
     # These vars are still relevant, even with math jobs being performed on the
     # client side, since these values are served to and configure the client.
     #
@@ -348,6 +429,11 @@ class Config:
     # to be defined.
     BUILD_IN_GDB = bool(int(os.getenv("BUILD_IN_GDB", 0)))
 
+    # Number of processes Sphinx may use to read and write the pages for rst
+    # modules, as with the `-j` switch to `sphinx-build`. Set 0 to use one per
+    # CPU. Sphinx falls back to serial operation on platforms without `fork()`.
+    SPHINX_PARALLEL_JOBS = int(os.getenv("SPHINX_PARALLEL_JOBS", 1))
+
     PFSC_LIB_ROOT = os.getenv("PFSC_LIB_ROOT")
     PFSC_BUILD_ROOT = os.getenv("PFSC_BUILD_ROOT")
     PFSC_DEMO_ROOT = os.getenv("PFSC_DEMO_ROOT")
@@ -461,6 +547,26 @@ class Config:
     PFSC_MD_IMGS_FOR_TRUSTED_REPOS = os.getenv("PFSC_MD_IMGS_FOR_TRUSTED_REPOS", 1)
     PFSC_MD_IMGS_FOR_UNTRUSTED_REPOS = os.getenv("PFSC_MD_IMGS_FOR_UNTRUSTED_REPOS", "upload.wikimedia.org,commons.wikimedia.org")
 
+    # Rendered markdown is cached under a hash of its inputs; see
+    # `pfsc.lang.render_cache`. Set the number of entries to be held in memory
+    # (0 to disable the in-memory cache), and whether annotation HTML should
+    # also be stored on disk, under the build cache dir. Since old entries are
+    # never invalidated, the number of files on disk is bounded; the least
+    # recently used are deleted when there are too many (0 for no bound).
+    PFSC_RENDER_CACHE_SIZE = int(os.getenv("PFSC_RENDER_CACHE_SIZE", 4096))
+    PFSC_RENDER_CACHE_ON_DISK = bool(int(os.getenv("PFSC_RENDER_CACHE_ON_DISK", 1)))
+    PFSC_RENDER_CACHE_DISK_MAX_FILES = int(os.getenv("PFSC_RENDER_CACHE_DISK_MAX_FILES", 100000))
+
+    # Parse trees of pfsc modules are cached item by item, under a hash of the
+    # text of each item; see `pfsc.lang.parse_cache`. Set the number of trees
+    # to be held in memory (0 to disable the in-memory cache), and whether they
+    # should also be pickled on disk, under the build cache dir. As with the
+    # render cache, the least recently used files on disk are deleted when
+    # there are too many (0 for no bound).
+    PFSC_PARSE_CACHE_SIZE = int(os.getenv("PFSC_PARSE_CACHE_SIZE", 4096))
+    PFSC_PARSE_CACHE_ON_DISK = bool(int(os.getenv("PFSC_PARSE_CACHE_ON_DISK", 1)))
+    PFSC_PARSE_CACHE_DISK_MAX_FILES = int(os.getenv("PFSC_PARSE_CACHE_DISK_MAX_FILES", 100000))
+
     # The server can send emails for various reasons, such as 500s (internal
     # errors), and hosting requests. Configure the SMTP connection here.
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
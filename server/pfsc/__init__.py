@@ -16,7 +16,6 @@
 
 import os
 import pathlib
-from collections import defaultdict
 from contextlib import nullcontext
 
 from flask import (
@@ -29,7 +28,6 @@ from flask_login import LoginManager, current_user
 from flask_mail import Mail
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-import pfsc.constants
 from pfsc.constants import REDIS_CHANNEL, ISE_PREFIX
 from pfsc.excep import PfscExcep, PECode
 from config import (
@@ -197,77 +195,25 @@ def check_build_dir_and_graph_db_sync(app, clean_up=False, skip_cache=False, ski
     we will run into weird, hard-to-diagnose issues. For example, requests to the
     `ForestUpdateHelper` will silently fail to resolve nodes to their parent deductions.
 
+    This runs a full check. See `pfsc.build.sync` for incremental checking.
+
     :param clean_up: set True to clean up any issues, instead of raising an exception.
     :param skip_cache: set True to ignore the cache part of the build dir. I.e. this means
         it's okay for there to be files in the cache dirs, even while that version is not indexed.
     :param skip_test_fam: set True to ignore repos under the `test.` family
     :param skip_wip_builds: set True to ignore repos built @WIP
     """
-    from pfsc.gdb import get_graph_reader
-    from pfsc.build.repo import RepoFamily, RepoInfo
+    from pfsc.build.sync import BuildSyncChecker
 
-    problems = defaultdict(set)
+    checker = BuildSyncChecker(
+        skip_cache=skip_cache, skip_test_fam=skip_test_fam,
+        skip_wip_builds=skip_wip_builds
+    )
     with app.app_context():
-        cache_options = [False] if skip_cache else [False, True]
-        for cache_dir in cache_options:
-            for sphinx_dir in [False, True]:
-                build_dir = get_build_dir(cache_dir=cache_dir, sphinx_dir=sphinx_dir)
-                gr = get_graph_reader()
-                for host_segment in RepoFamily.all_families:
-                    # Skip `test` family?
-                    if skip_test_fam and host_segment == RepoFamily.TEST:
-                        continue
-                    host_dir = build_dir / host_segment
-                    if host_dir.exists():
-                        for owner_dir in host_dir.iterdir():
-                            if not owner_dir.is_dir():
-                                continue
-                            for repo_dir in owner_dir.iterdir():
-                                if not repo_dir.is_dir():
-                                    continue
-
-                                relative_repo_path = repo_dir.relative_to(build_dir)
-                                relative_repo_path_str = str(relative_repo_path)
-                                repo_libpath = relative_repo_path_str.replace('/', '.')
-
-                                indexed_version_prop_dicts = gr.get_versions_indexed(repo_libpath, include_wip=True)
-                                versions_indexed = {d['version'] for d in indexed_version_prop_dicts}
-
-                                for version_dir in repo_dir.iterdir():
-                                    if not version_dir.is_dir():
-                                        continue
-                                    version_name = version_dir.name
-                                    # Skip WIP builds?
-                                    if skip_wip_builds and version_name == pfsc.constants.WIP_TAG:
-                                        continue
-                                    if version_name not in versions_indexed:
-                                        problems[repo_libpath].add(version_name)
-
+        problems = checker.run(clean_up=clean_up, use_checkpoint=False)
         if problems:
-            msg = 'Build dir and graph db are out of sync.'
-
-            if clean_up:
-                print(msg)
-                print('Cleaning up...')
-            else:
-                msg += '\nThe following builds are present in the build dir but not in the graph db.'
-
-            for repopath, versions in problems.items():
-                for version in sorted(versions):
-                    task = f'\n    {repopath}@{version}'
-                    if clean_up:
-                        print(task + '...')
-                        ri = RepoInfo(repopath)
-                        ri.delete_all_build_output(version=version, clear_cache=not skip_cache)
-                    else:
-                        msg += task
-
-            if not clean_up:
-                msg += (
-                    '\nSuggested fix is to manually delete built directories for numbered versions,'
-                    ' and then rebuild.'
-                )
-                raise PfscExcep(msg, PECode.BUILD_DIR_AND_GRAPH_DB_OUT_OF_SYNC)
+            print('Build dir and graph db are out of sync.')
+            print('Cleaned up:' + checker.write_problems(problems))
 
 
 def log_make_app():
@@ -440,6 +386,9 @@ def make_app(config_name=None, sync_check=None):
     from . import rq
     rq.init_app(app)
 
+    from . import tracing
+    tracing.init_app(app)
+
     from pfsc.blueprints import vstat
     app.register_blueprint(vstat.bp, url_prefix=PREFIX)
 
@@ -361,6 +361,83 @@ def set_hosting(status, version, hash, libpath):
 
 ###############################################################################
 
+@pfsc_cli.command('sync_check')
+@click.option('--full', is_flag=True, default=False,
+              help='Count all builds as newly verified, instead of only those changed since an earlier check.')
+@click.option('--clean-up', is_flag=True, default=False,
+              help='Delete builds that are present in the build dir but not in the graph DB.')
+@click.option('--report', is_flag=True, default=False,
+              help='Do not check; just show the report from the last check (which may have run in the background),'
+                   ' and the progress of any check still running.')
+@click.option('--background', is_flag=True, default=False,
+              help='Enqueue the check as an RQ job, and print the job ID, under which its progress can be polled.')
+@with_appcontext
+def sync_check(full, clean_up, report, background):
+    """
+    Check that the build dir and the graph DB are in sync.
+    """
+    from pfsc.build.sync import BuildSyncChecker, load_checkpoint, enqueue_sync_check
+    if background:
+        job = enqueue_sync_check(clean_up=clean_up, full=full)
+        print(f'Sync check job: {job.id}')
+        return
+    if report:
+        progress = load_checkpoint()['progress']
+        if progress is not None and progress['finished'] is None:
+            print(f'A check started at {progress["started"]} is still running (or was interrupted):')
+            print(json.dumps(progress, indent=4))
+    else:
+        checker = BuildSyncChecker()
+        try:
+            checker.run(
+                clean_up=clean_up, use_checkpoint=not full,
+                on_progress=lambda p: print(f'Examined {p["examined"]} builds...')
+            )
+        except PfscExcep as e:
+            print(e.public_msg())
+    last = load_checkpoint()['report']
+    if last is None:
+        print('No sync check has been recorded.')
+        return
+    print(json.dumps(last, indent=4))
+
+
+@pfsc_cli.command('reindex')
+@click.argument('repopaths', nargs=-1)
+@click.option('-w', '--workers', default=4, type=int,
+              help='Max number of repos to index at once.')
+@with_appcontext
+def reindex(repopaths, workers):
+    """
+    Rebuild the graph DB from the build dir, without rebuilding any repos.
+
+    Index all built versions of the given repos, or of all repos in the build
+    dir if none are given. Versions that are already indexed are skipped, so
+    an interrupted run can simply be started again.
+    """
+    from pfsc.build.reindex import Reindexer
+    reindexer = Reindexer(repopaths=repopaths or None, workers=workers, on_progress=print)
+    try:
+        report = reindexer.run()
+    except PfscExcep as e:
+        print(e.public_msg())
+        sys.exit(1)
+    print(json.dumps(report, indent=4))
+    if report['failed'] or report['blocked']:
+        sys.exit(1)
+
+
+@pfsc_cli.command('queue_stats')
+@with_appcontext
+def queue_stats():
+    """
+    Report queue lengths and queue wait times, for each class of RQ job.
+    """
+    from pfsc.rq import get_redis_connection, get_queue_wait_metrics
+    print(json.dumps(get_queue_wait_metrics(get_redis_connection()), indent=4))
+
+###############################################################################
+
 # TODO: Make "setup index" commands for other GDB systems
 
 @pfsc_cli.command('setup_indexes_neo4j')
@@ -48,9 +48,8 @@ from pfsc.handlers.forest    import (
 )
 from pfsc.handlers.process   import MarkdownHandler
 from pfsc.handlers.proxy     import ProxyPdfHandler
-
-# Disabled for now.
-# from pfsc.handlers.examp     import ExampReevaluator
+from pfsc.handlers.examp     import ExampReevaluator
+from pfsc.handlers.trace     import TraceLoader
 
 from pfsc.handlers.user      import (
     UserInfoLoader,
@@ -189,6 +188,10 @@ def export_user_info():
 def purge_user_acct():
     return handle_and_jsonify(UserAcctPurgeHandler, request.form)
 
+@bp.route('/getTraces', methods=["GET"])
+def get_traces():
+    return handle_and_jsonify(TraceLoader, request.args)
+
 # ----------------------------------------------------------------------------
 # Sometimes useful in development:
 
@@ -219,12 +222,12 @@ def oops():
 def render_markdown(message):
     enqueue_handler_job(MarkdownHandler, message, request.sid)
 
-# For now we've moved exclusively to client-side examp eval, with Pyodide.
-# May want to reinstate server-side eval as a configurable option at some
-# point, so we're keeping this here, commented out.
-#@socketio.on('examp_eval', namespace=WEBSOCKET_NAMESPACE)
-#def examp_eval(message):
-#    enqueue_handler_job(ExampReevaluator, message, request.sid)
+# Examp widgets are normally evaluated client-side, with Pyodide. Server-side
+# eval is an option, controlled by the `SERVER_SIDE_EXAMP_EVAL` config var,
+# which the handler checks.
+@socketio.on('examp_eval', namespace=WEBSOCKET_NAMESPACE)
+def examp_eval(message):
+    enqueue_handler_job(ExampReevaluator, message, request.sid)
 
 @socketio.on('proxy_get_pdf', namespace=WEBSOCKET_NAMESPACE)
 def proxy_get_pdf(message):
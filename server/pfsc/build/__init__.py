@@ -55,17 +55,12 @@ import logging
 import pathlib
 import traceback
 
-from sphinx.cmd import make_mode
-from sphinx.application import Sphinx
-from sphinx.errors import SphinxError
-from sphinx.util.console import strip_colors
-from sphinx.util.docutils import patch_docutils, docutils_namespace
-
 from pfsc.build.mii import ModuleIndexInfo
 from pfsc.build.manifest import (
     has_manifest,
     load_manifest,
     Manifest,
+    ManifestIndex,
     ManifestTreeNode
 )
 from pfsc.excep import PfscExcep, PECode
@@ -75,8 +70,10 @@ from pfsc.build.repo import RepoInfo, checkout, get_repo_info, parse_module_file
 from pfsc.build.versions import version_string_is_valid
 from pfsc.checkinput import check_repo_dependencies_format
 from pfsc.gdb import get_graph_writer, get_graph_reader, building_in_gdb
+from pfsc.gdb.origins import batched_origin_lookups
 from pfsc.constants import IndexType, PFSC_EXT, RST_EXT
-from pfsc import get_js_url
+from pfsc import get_js_url, check_config
+from config import PISE_VERSION
 from pfsc.lang.modules import (
     CachePolicy, load_module, PfscDefn, PfscAssignment,
     pickle_module, unpickle_module, remove_all_pickles_for_repo
@@ -87,6 +84,7 @@ from pfsc.lang.widgets import GoalWidget
 from pfsc.sphinx.pages import (
     build_libpath_for_rst, SphinxPage, get_pfsc_env
 )
+from pfsc.tracing import span, traced, current_span
 
 import pfsc.util
 import pfsc.constants
@@ -285,6 +283,7 @@ class SphinxBuildLogStream:
         self.basic_fake_denom = 10
 
     def write(self, record):
+        from sphinx.util.console import strip_colors
         message = strip_colors(record.strip())
         if message == 'done':
             # Sphinx ends each of its steps with a 'done' message.
@@ -321,12 +320,13 @@ class SphinxBuildLogStream:
 
 class OriginInjectionVisitor:
 
-    def __init__(self, lp2origin):
+    def __init__(self, lp2origin, resolver):
         """
         :param lp2origin: dict mapping libpaths to origins
+        :param resolver: OriginResolver, to look up any other origins we need
         """
         self.lp2origin = lp2origin
-        self.graph_reader = get_graph_reader()
+        self.resolver = resolver
 
     @staticmethod
     def takes_origin(item):
@@ -360,14 +360,14 @@ class OriginInjectionVisitor:
                     # opening a theorem, whether they have already studied it and
                     # put a checkmark on it.
                     #
-                    # TODO: Could we make this more efficient by noting all ghost
-                    #  nodes to external repos during the build process, and then
-                    #  making a single query to the GDB for all the origin info at once?
+                    # The resolver looks these up together, after the visit.
                     vers = real_obj.getVersion()
                     label = real_obj.get_index_type()
-                    origins = self.graph_reader.get_origins({label: [realpath]}, vers)
-                    if realpath in origins:
-                        real_obj.setOrigin(origins[realpath])
+                    def accept(origin, real_obj=real_obj):
+                        if origin is not None:
+                            real_obj.setOrigin(origin)
+
+                    self.resolver.request(label, vers, realpath, accept)
 
 
 class Builder:
@@ -432,6 +432,8 @@ class Builder:
         self.annotations = {}
         self.sphinx_pages = {}
         self.modules = {}
+        # Number of queries made to look up origins, during the resolving phase:
+        self.origin_queries = 0
 
         self.repo_node = ManifestTreeNode(self.repopath, type="MODULE", name=self.repopath)
         self.manifest = Manifest(self.repo_node)
@@ -442,13 +444,21 @@ class Builder:
             self.preexisting_manifest_lookup = m.lookup
 
         self.modpaths_having_files = []
-        self.modpaths_reread_by_sphinx = []
+        self.modpaths_reread_by_sphinx = set()
         # Modules that were updated (i.e. not loaded from a pickle file), by libpath:
         self.updated_modules = {}
         # Modules are said to be "affected" if they were updated, or if there is
         # an updated module among their import ancestors.
         self.affected_modules = {}
         self.modules_to_scan = {}
+        # Fingerprints of the deductions and annotations in each scanned
+        # module, by modpath, and the libpaths of those items whose fingerprints
+        # are unchanged since the last build. See `determine_unchanged_items()`.
+        self.item_fingerprints = {}
+        self.unchanged_items = set()
+        # Index records (see `ModuleIndexInfo.get_index_records()`) for each
+        # scanned module, by modpath:
+        self.index_records = {}
 
         # A place to store a copy of the dependencies declared by the repo being built:
         self.repo_dependencies = {}
@@ -501,9 +511,20 @@ class Builder:
         :return: nothing
         """
         try:
-            self.build()
-            self.update_index()
-            self.write_all()
+            with span(
+                'build.build_write_index', repopath=self.repopath,
+                version=self.version, clean=self.make_clean
+            ) as s:
+                self.build()
+                s.set(
+                    modules=len(self.modules),
+                    updated_modules=len(self.updated_modules),
+                    scanned_modules=len(self.modules_to_scan),
+                    deductions=len(self.deductions),
+                    annotations=len(self.annotations),
+                )
+                self.update_index()
+                self.write_all()
             self.monitor.declare_complete()
         except PfscExcep:
             # We try to offer an ACID-type guarantee that, if anything goes wrong during the
@@ -516,6 +537,7 @@ class Builder:
             self.graph_writer.delete_full_build_at_version(self.repopath, version=self.version)
             raise
 
+    @traced('build.build')
     def build(self, force_reread_rst_paths=None, no_sphinx_write=False):
         """
         Here is where we do the actual building operations.
@@ -539,26 +561,27 @@ class Builder:
             # own build process (so `load_module()` can find them), and so that
             # non-owning users can browse the source.
             # They are also needed for imports during other builds.
-            self.monitor.begin_phase(len(self.modpaths_having_files), 'Copying...')
-            for modpath in self.modpaths_having_files:
-                self.monitor.inc_count()
-                pi = PathInfo(modpath)
-                if pi.is_rst_file():
-                    has_rst_files = True
-                path = pi.get_build_dir_src_code_path(version=self.version)
-
-                # If not cleaning, and if we already have an up to date copy, don't copy again.
-                if (not self.make_clean) and path.exists():
-                    mod_time = pi.get_src_file_modification_time(version=pfsc.constants.WIP_TAG)
-                    copy_time = path.stat().st_mtime
-                    if copy_time > mod_time:
-                        continue
-
-                if not path.parent.exists():
-                    path.parent.mkdir(parents=True)
-                # Read @WIP, since we want the currently checked-out version.
-                src = pi.read_module(version=pfsc.constants.WIP_TAG)
-                path.write_text(src)
+            with span('build.copy_src', files=len(self.modpaths_having_files)):
+                self.monitor.begin_phase(len(self.modpaths_having_files), 'Copying...')
+                for modpath in self.modpaths_having_files:
+                    self.monitor.inc_count()
+                    pi = PathInfo(modpath)
+                    if pi.is_rst_file():
+                        has_rst_files = True
+                    path = pi.get_build_dir_src_code_path(version=self.version)
+
+                    # If not cleaning, and if we already have an up to date copy, don't copy again.
+                    if (not self.make_clean) and path.exists():
+                        mod_time = pi.get_src_file_modification_time(version=pfsc.constants.WIP_TAG)
+                        copy_time = path.stat().st_mtime
+                        if copy_time > mod_time:
+                            continue
+
+                    if not path.parent.exists():
+                        path.parent.mkdir(parents=True)
+                    # Read @WIP, since we want the currently checked-out version.
+                    src = pi.read_module(version=pfsc.constants.WIP_TAG)
+                    path.write_text(src)
 
             self.monitor.set_message('Checking root declarations...')
             self.check_root_declarations()
@@ -620,6 +643,7 @@ class Builder:
     def was_updated(self, modpath):
         return self.loading_results[f'{modpath}@{self.version}'].rebuilt
 
+    @traced('build.reading_phase')
     def reading_phase(self):
         """
         Form modules by READING pfsc files, but do not yet RESOLVE them.
@@ -698,6 +722,7 @@ class Builder:
         deleted_modpaths = old_modpaths - current_modpaths
         self.mii.add_deleted_modpaths(deleted_modpaths)
 
+    @traced('build.resolving_phase')
     def resolving_phase(self):
         """
         RESOLVE the pfsc modules formed in the READING phase.
@@ -709,9 +734,14 @@ class Builder:
         n = len(self.modules_to_scan)
 
         self.monitor.begin_phase(n, 'Resolving...')
-        for module in self.modules_to_scan.values():
-            module.resolve(cache=self.module_cache, prog_mon=self.monitor)
-            self.monitor.inc_count()
+        # Origins wanted during resolution (e.g. by goal widgets with an
+        # `altpath` in another repo) are looked up together at the end.
+        with batched_origin_lookups(self.graph_writer.reader) as resolver:
+            for module in self.modules_to_scan.values():
+                module.resolve(cache=self.module_cache, prog_mon=self.monitor)
+                self.monitor.inc_count()
+        self.origin_queries += resolver.num_queries
+        self.determine_unchanged_items()
 
         self.monitor.begin_phase(n * self.prog_count_per_module_when_scanning, 'Scanning...')
         for modpath, module in self.modules.items():
@@ -722,11 +752,50 @@ class Builder:
                 preexisting_node = self.preexisting_manifest_lookup[modpath]
                 manifest_node.add_children(preexisting_node.get_contents())
 
+        if not self.build_in_gdb:
+            self.index_records = self.mii.get_index_records()
         self.mii.do_post_scanning_steps(self.graph_writer.reader)
         self.inject_origins()
+        current_span().set(
+            origin_queries=self.origin_queries,
+            unchanged_items=len(self.unchanged_items),
+        )
         self.timestamp = datetime.now()
         self.manifest.set_build_info(self.repopath, self.version, self.repo_info.git_hash, self.timestamp)
 
+    def determine_unchanged_items(self):
+        """
+        Compute the fingerprints of the deductions and annotations in each
+        module to be scanned, and compare them to those recorded in the last
+        build. Items whose fingerprints are unchanged keep their built
+        products, and their indexing (see `ModuleIndexInfo.omit_unchanged_items()`).
+
+        We do this only when building to the filesystem, and not when making
+        a clean build.
+        """
+        if self.build_in_gdb:
+            return
+        for modpath, module in self.modules_to_scan.items():
+            fingerprints = module.get_item_fingerprints()
+            self.item_fingerprints[modpath] = fingerprints
+            if self.make_clean:
+                continue
+            path = PathInfo(modpath).get_item_fingerprints_path(version=self.version)
+            try:
+                with open(path) as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # Products made by another version of this software are not reused.
+            if previous.get('pise_version') != PISE_VERSION:
+                continue
+            previous = previous.get('fingerprints', {})
+            for name, fp in fingerprints.items():
+                if previous.get(name) == fp:
+                    self.unchanged_items.add(f'{modpath}.{name}')
+        self.mii.set_unchanged_items(self.unchanged_items)
+
+    @traced('build.build_sphinx_doc')
     def build_sphinx_doc(self, force_all=False, filenames=None,
                          force_reread_rst_paths=None,
                          just_read_no_write=False):
@@ -745,6 +814,13 @@ class Builder:
             https://www.sphinx-doc.org/en/master/man/sphinx-build.html#cmdoption-sphinx-build-a
             https://www.sphinx-doc.org/en/master/man/sphinx-build.html#synopsis
         """
+        # Sphinx is slow to import, and is needed only by repos that have rst
+        # modules, so we import it only when we are going to use it.
+        from sphinx.cmd import make_mode
+        from sphinx.application import Sphinx
+        from sphinx.errors import SphinxError
+        from sphinx.util.docutils import patch_docutils, docutils_namespace
+
         sourcedir = self.repo_info.abs_fs_path_to_dir
         confdir = sourcedir
         outputdir = self.repo_info.get_build_dir(
@@ -824,10 +900,10 @@ class Builder:
 
             # Record the modpath for every doc that Sphinx will re-read, so
             # that we can note updated modules later.
-            self.modpaths_reread_by_sphinx.extend([
+            self.modpaths_reread_by_sphinx.update(
                 build_libpath_for_rst(app.config, docname, within_page=False)
                 for docname in docnames
-            ])
+            )
 
         def env_updated_handler(app, env):
             """
@@ -861,6 +937,23 @@ class Builder:
 
             self.read_and_resolve()
 
+            # Sphinx will rewrite the pages it re-read. But there may be other
+            # pages, whose rst did not change, but which import from modules
+            # that did (or from modules that import from these, etc.). These
+            # are among our affected modules, and their pages need to be rewritten
+            # too, so that their widgets reflect the current state of their targets.
+            # Sphinx rewrites any docnames we return here (without re-reading them,
+            # which is not needed, since widget HTML is generated at writing time).
+            return [
+                docname for docname in env.found_docs
+                if (modpath := build_libpath_for_rst(app.config, docname, within_page=False))
+                in self.affected_modules and modpath not in self.modpaths_reread_by_sphinx
+            ]
+
+        parallel = check_config("SPHINX_PARALLEL_JOBS")
+        if parallel == 0:
+            parallel = os.cpu_count() or 1
+
         buildername = 'dummy' if just_read_no_write else 'html'
         try:
             with patch_docutils(confdir), docutils_namespace():
@@ -871,10 +964,15 @@ class Builder:
                 # as exceptions.
                 app = Sphinx(sourcedir, confdir, outputdir, doctreedir,
                              buildername, confoverrides=confoverrides,
-                             warningiserror=False)
+                             warningiserror=False, parallel=parallel)
                 app.connect('env-before-read-docs', set_builder_in_environment)
                 app.connect('env-before-read-docs', add_and_record_rereads)
                 app.connect('env-updated', env_updated_handler)
+                # The sphinx_math_dollar extension is stateless, and means to declare
+                # itself parallel read safe, but (as of v1.2.1) does so by mistakenly
+                # adding a config value, instead of returning it as metadata.
+                # Without this, Sphinx would fall back to a serial read.
+                app.extensions['sphinx_math_dollar'].parallel_read_safe = True
                 # Set html assets policy 'always', to ensure that MathJax is
                 # always loaded in every Sphinx page, even if that page contains
                 # no rST math elements. This is important for a couple of reasons:
@@ -894,10 +992,13 @@ class Builder:
                 raise PfscExcep(msg, PECode.SPHINX_ERROR)
 
     def inject_origins(self):
-        visitor = OriginInjectionVisitor(self.mii.origins)
-        for module in self.modules.values():
-            module.recursiveItemVisit(visitor)
+        with batched_origin_lookups(self.graph_writer.reader) as resolver:
+            visitor = OriginInjectionVisitor(self.mii.origins, resolver)
+            for module in self.modules.values():
+                module.recursiveItemVisit(visitor)
+        self.origin_queries += resolver.num_queries
 
+    @traced('build.check_root_declarations')
     def check_root_declarations(self):
         """
         This is where we load and perform checks on any of the things that are
@@ -991,6 +1092,7 @@ class Builder:
             pe.extra_data(missing_deps)
             raise pe
 
+    @traced('build.walk')
     def walk(self, root_fs_path):
         """
         Walk the filesystem hierarchy and discover module files.
@@ -1241,6 +1343,7 @@ class Builder:
             if mtn:
                 manifest_node.add_child(mtn)
 
+    @traced('build.write_all')
     def write_all(self):
         n = len(self.affected_modules) + len(self.deductions) + len(self.annotations)
         if self.build_in_gdb:
@@ -1252,7 +1355,10 @@ class Builder:
         self.write_manifest()
         self.write_dashgraphs()
         self.write_notespages()
+        self.write_item_fingerprints()
+        self.write_index_records()
 
+    @traced('build.write_manifest')
     def write_manifest(self):
         d = self.manifest.build_dict()
         j = json.dumps(d, indent=4)
@@ -1264,7 +1370,14 @@ class Builder:
             build_dir.mkdir(exist_ok=True)
             with open(manifest_json_path, 'w') as f:
                 f.write(j)
+            # Write the index after the JSON, since an index older than its
+            # JSON is considered out of date.
+            ManifestIndex.write(
+                self.repo_info.get_manifest_index_path(version=self.version),
+                self.manifest
+            )
 
+    @traced('build.copy_src_into_gdb')
     def copy_src_into_gdb(self):
         """
         If storing builds in GDB, we copy of module source code in there too.
@@ -1276,6 +1389,7 @@ class Builder:
                 self.graph_writer.record_module_source(modpath, self.version, text)
                 self.monitor.inc_count()
 
+    @traced('build.clear_build_dirs')
     def clear_build_dirs(self):
         """
         Clean out the build directory for each built module. This eliminates old built
@@ -1287,17 +1401,25 @@ class Builder:
                 modpath = module.getLibpath()
                 self.graph_writer.delete_builds_under_module(modpath, self.version)
             else:
+                modpath = module.getLibpath()
                 paths = module.list_existing_built_product_paths(version=self.version)
                 for path in paths:
-                    path.unlink()
+                    # The products of unchanged items are kept.
+                    name = path.name.split('.')[0]
+                    if f'{modpath}.{name}' not in self.unchanged_items:
+                        path.unlink()
             self.monitor.inc_count()
 
+    @traced('build.write_dashgraphs')
     def write_dashgraphs(self):
         """
         Write the dashgraphs to disk.
         """
         for deducpath, deduc in self.deductions.items():
             self.monitor.set_message(f'Writing {deducpath}...')
+            if self.reuse_products(deducpath, get_dashgraph_dir_and_filename):
+                self.monitor.inc_count()
+                continue
             dashgraph = deduc.buildDashgraph()
             dg_json = json.dumps(dashgraph, indent=4)
             if self.build_in_gdb:
@@ -1310,12 +1432,16 @@ class Builder:
                     f.write(dg_json)
             self.monitor.inc_count()
 
+    @traced('build.write_notespages')
     def write_notespages(self):
         """
         Write the annotations to disk.
         """
         for annopath, annotation in self.annotations.items():
             self.monitor.set_message(f'Writing {annopath}...')
+            if self.reuse_products(annopath, get_annotation_dir_and_filenames):
+                self.monitor.inc_count()
+                continue
             anno_html = annotation.get_escaped_html()
             anno_json = json.dumps(annotation.get_page_data(), indent=4)
             if self.build_in_gdb:
@@ -1331,6 +1457,65 @@ class Builder:
                     f.write(anno_json)
             self.monitor.inc_count()
 
+    def reuse_products(self, itempath, path_getter):
+        """
+        If an item is unchanged since the last build, and all of its built
+        products are present, keep them, instead of writing them again.
+
+        We touch the files we keep, since the modification times of a
+        module's products say when it was last built.
+
+        :param itempath: the libpath of a deduction or annotation
+        :param path_getter: function, like `get_dashgraph_dir_and_filename()`,
+            that, given the itempath and version, returns a directory and filenames
+        :return: boolean, True iff the products were kept
+        """
+        if itempath not in self.unchanged_items:
+            return False
+        dest_dir, *filenames = path_getter(itempath, version=self.version)
+        paths = [os.path.join(dest_dir, filename) for filename in filenames]
+        if not all(os.path.exists(path) for path in paths):
+            return False
+        for path in paths:
+            os.utime(path)
+        return True
+
+    @traced('build.write_item_fingerprints')
+    def write_item_fingerprints(self):
+        """
+        Record the fingerprints of the items in each scanned module, in the
+        module's build dir, for comparison in the next build.
+        """
+        for modpath, fingerprints in self.item_fingerprints.items():
+            path = PathInfo(modpath).get_item_fingerprints_path(version=self.version)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump({
+                    'pise_version': PISE_VERSION,
+                    'fingerprints': fingerprints,
+                }, f, indent=4)
+
+    @traced('build.write_index_records')
+    def write_index_records(self):
+        """
+        Record the index records of each scanned module in the module's build
+        dir, so that the graph database can be rebuilt from the build dir,
+        without rebuilding the repo. See `pfsc.build.reindex`.
+
+        The records for the repo's root module also carry the change log and
+        dependencies declared there.
+        """
+        for modpath, records in self.index_records.items():
+            data = dict(records)
+            if modpath == self.repopath:
+                data['change_log'] = self.mii.change_log
+                data['dependencies'] = self.repo_dependencies
+            path = PathInfo(modpath).get_index_records_path(version=self.version)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+
+    @traced('build.update_index')
     def update_index(self):
         """
         Update the graph database.
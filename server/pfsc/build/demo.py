@@ -19,12 +19,14 @@ import re
 from datetime import datetime, timedelta, timezone
 
 from pygit2 import init_repository
+from rq.job import Job
 from rq.registry import ScheduledJobRegistry
 from rq.exceptions import NoSuchJobError
 
 import pfsc.constants
+from pfsc.constants import QueueClass
 from pfsc import check_config, get_app, get_build_dir
-from pfsc.rq import get_rqueue
+from pfsc.rq import get_task_queue
 from pfsc.util import (
     casual_time_delta,
     recycle,
@@ -90,17 +92,51 @@ def make_demo_repo_lead_comment(libpath=None):
 def demo_repo_deletion_job_id(repopath):
     return f'{pfsc.constants.DELETE_DEMO_REPO_JOB_PREFIX}:{repopath}'
 
+def get_demo_repo_deletion_registries():
+    """
+    Get the registries in which demo repo deletion jobs may be scheduled.
+
+    Deletions are scheduled on the maintenance queue, but used to be scheduled
+    on the main task queue, where jobs scheduled before an upgrade may still
+    be waiting.
+
+    :return: list of ScheduledJobRegistry, current one first
+    """
+    return [
+        ScheduledJobRegistry(queue=get_task_queue(queue_class))
+        for queue_class in [QueueClass.MAINTENANCE, QueueClass.INTERACTIVE]
+    ]
+
 def schedule_demo_repo_for_deletion(repopath, delta=None):
     if delta is None:
         delta = timedelta(hours=check_config("DEMO_REPO_HOURS_TO_LIVE"))
     job_id = demo_repo_deletion_job_id(repopath)
-    get_rqueue(pfsc.constants.MAIN_TASK_QUEUE_NAME).enqueue_in(
+    # Any deletion still scheduled on the main task queue is superseded, and
+    # must not go on naming the job we are about to replace.
+    legacy_registry = get_demo_repo_deletion_registries()[1]
+    legacy_registry.remove(job_id)
+    get_task_queue(QueueClass.MAINTENANCE).enqueue_in(
         delta, delete_demo_repo_with_app, args=[repopath], job_id=job_id)
 
 def cancel_scheduled_demo_repo_deletion(repopath):
+    """
+    :param repopath: the libpath of a demo repo
+    :return: boolean, True iff a scheduled deletion was found and cancelled
+    """
     job_id = demo_repo_deletion_job_id(repopath)
-    registry = ScheduledJobRegistry(queue=get_rqueue(pfsc.constants.MAIN_TASK_QUEUE_NAME))
-    return registry.remove(job_id, delete_job=True)
+    removed = False
+    for registry in get_demo_repo_deletion_registries():
+        if registry.remove(job_id):
+            removed = True
+    if removed:
+        queue = get_task_queue(QueueClass.MAINTENANCE)
+        try:
+            job = Job.fetch(job_id, connection=queue.connection, serializer=queue.serializer)
+        except NoSuchJobError:
+            pass
+        else:
+            job.delete()
+    return removed
 
 def check_demo_repo_deletion_time(repopath):
     """
@@ -109,12 +145,12 @@ def check_demo_repo_deletion_time(repopath):
       to be deleted, or None if we find no such deletion job.
     """
     job_id = demo_repo_deletion_job_id(repopath)
-    registry = ScheduledJobRegistry(queue=get_rqueue(pfsc.constants.MAIN_TASK_QUEUE_NAME))
-    try:
-        deletion_time = registry.get_scheduled_time(job_id)
-    except NoSuchJobError:
-        return None
-    return deletion_time
+    for registry in get_demo_repo_deletion_registries():
+        try:
+            return registry.get_scheduled_time(job_id)
+        except NoSuchJobError:
+            pass
+    return None
 
 def make_demo_repo(repo_info, progress=None, dry_run=False):
     """
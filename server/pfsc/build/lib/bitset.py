@@ -0,0 +1,95 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Support for doing set algebra on large collections of uids (libpaths, or
+reln uids), by interning them as integers, and representing sets of them as
+bitsets, i.e. as plain Python ints.
+
+Union, intersection, and difference then become the bitwise operations
+`|`, `&`, and `& ~`, which CPython carries out a machine word at a time, without
+hashing or comparing any strings. Bitsets built over the same universe can be
+freely combined, even if the universe grew in between.
+"""
+
+from collections import deque
+from itertools import repeat
+
+ONE = ord('1')
+
+
+class UidUniverse:
+    """
+    Assigns consecutive integer ids to uids, and converts between collections
+    of uids and the bitsets representing them.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.uids = []
+
+    def __len__(self):
+        return len(self.uids)
+
+    def bits(self, uids):
+        """
+        Represent a collection of uids as a bitset. Any uids not yet in the
+        universe are added to it.
+
+        :param uids: iterable of distinct (hashable) uids, e.g. a set, or
+            the keys of a dict.
+        :return: int
+        """
+        index = self.index
+        members = self.uids
+        if not members:
+            # Fast path for the first collection: ids are consecutive.
+            members.extend(uids)
+            index.update(zip(members, range(len(members))))
+            return (1 << len(members)) - 1
+        uids = list(uids)
+        new = [uid for uid in uids if uid not in index]
+        if new:
+            n0 = len(members)
+            members.extend(new)
+            index.update(zip(new, range(n0, len(members))))
+        # We write the bitset as a string of binary digits, with the lowest
+        # bit first, using only C-level loops.
+        digits = bytearray(b'0') * len(members)
+        deque(map(digits.__setitem__, map(index.__getitem__, uids), repeat(ONE)), maxlen=0)
+        digits.reverse()
+        return int(digits, 2) if digits else 0
+
+    def uids_of(self, bits):
+        """
+        Convert a bitset back into the set of uids it represents.
+
+        :param bits: a non-negative int, as returned by `bits()`, or formed
+            from such ints via bitwise operations.
+        :return: set of uids
+        """
+        members = self.uids
+        result = set()
+        buf = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+        for j, byte in enumerate(buf):
+            if byte:
+                base = j << 3
+                while byte:
+                    low = byte & -byte
+                    result.add(members[base + low.bit_length() - 1])
+                    byte ^= low
+        return result
+
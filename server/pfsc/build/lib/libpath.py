@@ -252,6 +252,28 @@ class PathInfo:
         )
         return build_root.joinpath(*fs_parts)
 
+    def get_item_fingerprints_path(self, version=pfsc.constants.WIP_TAG):
+        """
+        Get the path where the fingerprints of the items in this module
+        should be saved when building. See `Builder.write_item_fingerprints()`.
+
+        :param version: which version we are building.
+        :return: pathlib.Path
+        """
+        src_path = self.get_build_dir_src_code_path(version=version)
+        return src_path.with_name('module.fingerprints.json')
+
+    def get_index_records_path(self, version=pfsc.constants.WIP_TAG):
+        """
+        Get the path where the index records for this module should be saved
+        when building. See `Builder.write_index_records()`.
+
+        :param version: which version we are building.
+        :return: pathlib.Path
+        """
+        src_path = self.get_build_dir_src_code_path(version=version)
+        return src_path.with_name('module.index.json')
+
     def list_existing_built_product_paths(
             self, version=pfsc.constants.WIP_TAG, include_sphinx_html=False):
         """
@@ -22,6 +22,8 @@ timestamps and commit hashes of the most recent build.
 """
 
 import json
+import os
+import sqlite3
 from functools import lru_cache
 
 import pfsc.constants
@@ -112,6 +114,292 @@ def load_manifest(libpath, cache_control_code=None, version=pfsc.constants.WIP_T
     else:
         return load_manifest_with_cache(libpath, cache_control_code, version=version)
 
+
+def get_manifest_index(libpath, version=pfsc.constants.WIP_TAG):
+    """
+    Get the index of a repo manifest, if there is an up-to-date one.
+
+    Indexes are written only when builds are stored on disk (not in the GDB).
+    An index is considered out of date if its manifest JSON file has been
+    written since it was.
+
+    :param libpath: the libpath of the repo, or of anything inside it
+    :param version: the desired build version
+    :return: a ManifestIndex, or None
+    """
+    if building_in_gdb():
+        return None
+    ri = get_repo_info(libpath)
+    index_path = ri.get_manifest_index_path(version=version)
+    json_path = ri.get_manifest_json_path(version=version)
+    try:
+        if os.stat(index_path).st_mtime < os.stat(json_path).st_mtime:
+            return None
+    except FileNotFoundError:
+        return None
+    return ManifestIndex(index_path)
+
+
+def load_manifest_node(libpath, version=pfsc.constants.WIP_TAG, max_depth=1):
+    """
+    Load a single node of a repo manifest, together with its descendants
+    down to a given depth.
+
+    If the manifest has an index, we load just the nodes we need from that.
+    Otherwise we have to load the whole manifest.
+
+    :param libpath: the libpath of the desired node
+    :param version: the desired build version
+    :param max_depth: how many generations of descendants to load (None for
+        all of them). Note that if we have to load the whole manifest, then
+        all descendants will be present, regardless of this setting.
+    :return: ManifestTreeNode, or None if the manifest has no such node
+    """
+    index = get_manifest_index(libpath, version=version)
+    if index is not None:
+        with index:
+            return index.load_subtree(libpath, max_depth=max_depth)
+    return load_manifest(libpath, version=version).get(libpath)
+
+
+class ManifestIndex:
+    """
+    An index of a repo manifest, stored in an SQLite file alongside the
+    manifest JSON, in which nodes are keyed by libpath.
+
+    This lets us look up a single node, or a subtree, or the ancestors of a
+    node, without loading and parsing the entire manifest, which for a large
+    repo can be several megabytes.
+
+    The nodes table stores, for each node, the libpath of its parent, its
+    position among its siblings, and its data (i.e. what
+    `ManifestTreeNode.build_dict()` would give, minus the children), as JSON.
+    The meta table stores the build info and doc infos, as JSON.
+    """
+
+    SCHEMA = """
+    CREATE TABLE nodes (
+        libpath TEXT PRIMARY KEY,
+        parent TEXT,
+        sibling INTEGER NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX nodes_by_parent ON nodes (parent, sibling);
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    # Sibling indices are zero-padded to this width when forming the keys by
+    # which we sort subtrees into pre-order.
+    SIBLING_KEY_WIDTH = 6
+
+    def __init__(self, path):
+        """
+        :param path: filesystem path of the SQLite file
+        """
+        self.path = str(path)
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @classmethod
+    def write(cls, path, manifest):
+        """
+        Write a complete index for a manifest, replacing any existing index
+        at the given path.
+
+        The new index is written to a temporary file, and then moved into
+        place, so that concurrent readers see either the old index or the
+        new one, never a partial one.
+
+        :param path: filesystem path for the SQLite file
+        :param manifest: the Manifest to be indexed
+        :return: the new ManifestIndex
+        """
+        path = str(path)
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        index = cls(tmp_path)
+        try:
+            with index.conn as conn:
+                conn.executescript(cls.SCHEMA)
+                index._insert_subtree(manifest.root_node, None, 0)
+                index._set_meta('build', manifest.build_info)
+                index._set_meta('doc_info', manifest.doc_infos)
+        finally:
+            index.close()
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def _set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value))
+        )
+
+    def _get_meta(self, key):
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _insert_subtree(self, node, parent_libpath, sibling):
+        rows = []
+
+        def add_rows(n, p, i):
+            d = {"id": n.id}
+            d.update(n.data)
+            rows.append((n.id, p, i, json.dumps(d)))
+            for j, child in enumerate(n.children):
+                add_rows(child, n.id, j)
+
+        add_rows(node, parent_libpath, sibling)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO nodes (libpath, parent, sibling, data) VALUES (?, ?, ?, ?)",
+            rows
+        )
+
+    @staticmethod
+    def _make_node(data):
+        d = json.loads(data)
+        return ManifestTreeNode(d.pop("id"), **d)
+
+    def _get_row(self, libpath):
+        return self.conn.execute(
+            "SELECT parent, sibling, data FROM nodes WHERE libpath = ?", (libpath,)
+        ).fetchone()
+
+    def get_build_info(self):
+        return self._get_meta('build')
+
+    def get_doc_infos(self):
+        return self._get_meta('doc_info')
+
+    def get_root_libpath(self):
+        row = self.conn.execute(
+            "SELECT libpath FROM nodes WHERE parent IS NULL"
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, libpath):
+        """
+        :return: the ManifestTreeNode for the given libpath (without its
+            children), or None if there is no such node.
+        """
+        row = self._get_row(libpath)
+        return self._make_node(row[2]) if row else None
+
+    def get_parent_libpath(self, libpath):
+        row = self._get_row(libpath)
+        return row[0] if row else None
+
+    def get_children(self, libpath):
+        """
+        :return: list of the ManifestTreeNodes (without their own children)
+            for the children of the node with the given libpath, in order.
+        """
+        rows = self.conn.execute(
+            "SELECT data FROM nodes WHERE parent = ? ORDER BY sibling", (libpath,)
+        ).fetchall()
+        return [self._make_node(row[0]) for row in rows]
+
+    def get_ancestors(self, libpath):
+        """
+        :return: list of the ManifestTreeNodes (without their children) for
+            the ancestors of the node with the given libpath, from its parent
+            up to the root.
+        """
+        rows = self.conn.execute("""
+        WITH RECURSIVE anc(libpath, parent, data, depth) AS (
+            SELECT n.libpath, n.parent, n.data, 0 FROM nodes n
+            WHERE n.libpath = (SELECT parent FROM nodes WHERE libpath = ?)
+            UNION ALL
+            SELECT n.libpath, n.parent, n.data, anc.depth + 1
+            FROM nodes n JOIN anc ON n.libpath = anc.parent
+        )
+        SELECT data FROM anc ORDER BY depth
+        """, (libpath,)).fetchall()
+        return [self._make_node(row[0]) for row in rows]
+
+    def iter_subtree(self, libpath, max_depth=None):
+        """
+        Iterate over the subtree rooted at a given node, in pre-order.
+
+        :param libpath: the libpath of the root of the subtree
+        :param max_depth: optional int, to stop at this many generations
+            below the root
+        :return: iterator of triples (ManifestTreeNode, parent libpath, depth).
+            The nodes are returned without children.
+        """
+        w = self.SIBLING_KEY_WIDTH
+        depth_limit = -1 if max_depth is None else max_depth
+        rows = self.conn.execute(f"""
+        WITH RECURSIVE sub(libpath, parent, data, depth, sort_key) AS (
+            SELECT libpath, parent, data, 0, '' FROM nodes WHERE libpath = ?
+            UNION ALL
+            SELECT n.libpath, n.parent, n.data, sub.depth + 1,
+                   sub.sort_key || printf('%0{w}d', n.sibling)
+            FROM nodes n JOIN sub ON n.parent = sub.libpath
+            WHERE ? < 0 OR sub.depth < ?
+        )
+        SELECT data, parent, depth FROM sub ORDER BY sort_key
+        """, (libpath, depth_limit, depth_limit))
+        for data, parent, depth in rows:
+            yield self._make_node(data), parent, depth
+
+    def load_subtree(self, libpath, max_depth=None):
+        """
+        Load the subtree rooted at a given node, as a tree of ManifestTreeNodes.
+
+        The nodes belong to a new Manifest, of which the given node is the
+        root, and which has no build info.
+
+        :param libpath: the libpath of the root of the subtree
+        :param max_depth: optional int, to stop at this many generations
+            below the root
+        :return: the root ManifestTreeNode, or None if there is no node with
+            the given libpath
+        """
+        root = None
+        nodes = {}
+        for node, parent, depth in self.iter_subtree(libpath, max_depth=max_depth):
+            if depth == 0:
+                root = node
+                Manifest(root)
+            else:
+                nodes[parent].add_child(node)
+            nodes[node.id] = node
+        return root
+
+    def load_manifest(self):
+        """
+        Load the entire manifest from the index.
+        """
+        root = self.load_subtree(self.get_root_libpath())
+        manifest = root.manifest
+        manifest.set_build_info_dict(self.get_build_info())
+        manifest.set_doc_infos_dict(self.get_doc_infos())
+        return manifest
+
+
 class Manifest:
     """
     Represents all the stuff in a container. Useful for recording and manipulating the data required
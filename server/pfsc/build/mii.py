@@ -15,11 +15,13 @@
 # --------------------------------------------------------------------------- #
 
 from collections import defaultdict
+import json
 import re
 from time import time as unixtime
 
 import pfsc.constants
-from pfsc.build.repo import get_repo_info
+from pfsc.build.repo import get_repo_part
+from pfsc.build.lib.bitset import UidUniverse
 from pfsc.build.lib.prefix import LibpathPrefixMapping
 from pfsc.build.versions import (
     VersionTag, collapse_major_string, get_padded_components,
@@ -28,6 +30,7 @@ from pfsc.checkinput import check_libpath
 from pfsc.constants import IndexType
 from pfsc.gdb.k import kNode, kReln
 from pfsc.excep import PfscExcep, PECode
+from pfsc.util import intern_str
 
 
 class IndexingMode:
@@ -65,8 +68,9 @@ class ModuleIndexInfo:
         """
         self.monitor = monitor
         self.modpath = modpath
-        self.repo_info = get_repo_info(modpath)
-        self.repopath = self.repo_info.libpath
+        # Note: The repo need not be present, since we may be indexing from
+        # saved records (see `pfsc.build.reindex`).
+        self.repopath = get_repo_part(modpath)
         self.version = version
         self.commit_hash = commit_hash
         self.major, self.minor, self.patch = get_padded_components(version)
@@ -77,6 +81,10 @@ class ModuleIndexInfo:
         self.reln_lookup = {}
         self.added_modpaths = []
         self.deleted_modpaths = []
+        # Libpaths of items whose indexing is unchanged since the last build,
+        # and of all the j-nodes that are therefore kept:
+        self.unchanged_items = set()
+        self.kept_libpaths = set()
 
         # For now, the indexing mode is entirely a function of the version being
         # indexed. Also, there is not yet any support for STANDALONE mode. All
@@ -321,6 +329,68 @@ class ModuleIndexInfo:
         self.cut_add_validate()
         self.here_elsewhere_nowhere()
         self.compute_origins(graph_reader)
+        self.compute_closures(graph_reader)
+        self.omit_unchanged_items(graph_reader)
+
+    def set_unchanged_items(self, itempaths):
+        """
+        Note the libpaths of those deductions and annotations whose fingerprints
+        are the same as in the last build. See `PfscModule.get_item_fingerprints()`.
+        """
+        self.unchanged_items = set(itempaths)
+
+    def omit_unchanged_items(self, graph_reader):
+        """
+        In a WIP build, rather than dropping and re-adding the j-nodes for
+        items that are unchanged since the last build (and for everything
+        under those items), we keep them. So here we remove them from the set
+        of j-nodes to be added, along with any j-relns both of whose endpoints
+        are kept, and which therefore are kept too.
+
+        Every other j-reln has an endpoint that will be dropped (taking the
+        j-reln with it), and so must still be added. For example, the UNDER
+        relation from a kept deduction to its module, which is always dropped
+        and re-added.
+
+        Whether an item is unchanged is judged from the fingerprints recorded
+        in the build dir, which say nothing about the state of the graph
+        database. It may since have been wiped, or switched, or its WIP index
+        rebuilt some other way. So we keep j-nodes under a module only if the
+        graph database still has every one of them. Otherwise, all j-nodes
+        under that module are added afresh.
+
+        :param graph_reader: GraphReader we can use to run queries.
+        """
+        if not (self.is_WIP() and self.unchanged_items):
+            return
+
+        def is_kept(libpath):
+            parts = libpath.split('.')
+            return any(
+                '.'.join(parts[:i]) in self.unchanged_items
+                for i in range(len(parts), 3, -1)
+            )
+
+        candidates_by_modpath = defaultdict(set)
+        for uid in self.V_add:
+            k = self.get_kNode(uid)
+            if is_kept(k.libpath):
+                candidates_by_modpath[k.modpath].add(uid)
+
+        self.kept_libpaths = set()
+        for modpath, candidates in candidates_by_modpath.items():
+            if candidates <= graph_reader.get_wip_libpaths_under_module(modpath):
+                self.kept_libpaths |= candidates
+        self.V_add -= self.kept_libpaths
+
+        def survives(libpath):
+            return libpath not in self.node_lookup or libpath in self.kept_libpaths
+
+        self.E_add = {
+            uid for uid in self.E_add
+            if not (survives((k := self.get_kReln(uid)).tail_libpath)
+                    and survives(k.head_libpath))
+        }
 
     def cut_add_validate(self):
         """
@@ -347,167 +417,16 @@ class ModuleIndexInfo:
         V_add       uids of vertices that are to be added
         E_cut       uids of edges that are to be cut
         E_add       uids of edges that are to be added
-        """
-
-        L = set(self.existing_k_nodes.keys())
-        M = set(self.get_kNode_uids())
-        existing_k_reln_uids = set(self.existing_k_relns.keys())
-        desired_k_reln_uids = set(self.get_kReln_uids())
-
-        # V-: Vertex UIDs (which equal libpaths) that are going away:
-        V_minus = L - M
-        # V0: Vertex UIDs that are staying:
-        V0 = L & M
-        # V+: New Vertex UIDs:
-        V_plus = M - L
-
-        # E-: Edge UIDs (taillibpath:relntype:headlibpath) that are going away:
-        E_minus = existing_k_reln_uids - desired_k_reln_uids
-        # E0: Edge UIDs that are staying:
-        E0 = existing_k_reln_uids & desired_k_reln_uids
-        # E+: New Edge UIDs:
-        E_plus = desired_k_reln_uids - existing_k_reln_uids
-
-        Dbar = set(self.mm_closure.keys())
-        Rbar = set(self.mm_closure.values()) - { None }
-        # We also want the domain before closure:
-        D = set(self.move_mapping.keys())
-
-        # Correctness checks:
-        # We want to check that certain sets are subsets of others.
-        # The set class has a nice method for that (`issubset`), but we can't
-        # use it because in the event of failure we want to be able to report
-        # the witnesses. So we compute set differences instead.
-
-        # Authors are allowed to omit names on most widget types, and these
-        # widgets get system-generated names. Authors are also allowed to ignore such
-        # widgets when they prepare move-mappings. As a consequence, we have to be careful
-        # to ignore such "unnamed" widgets here in these checks.
-        unnamed_widget_pattern = re.compile(r'_w\d+$')
-
-        def discard_unnamed_widgets(X):
-            """
-            Return that subset of a given set X of libpaths, which is obtained by discarding
-            all those libpaths whose final segment looks like a system-generated widget name.
-            """
-            return set(
-                x for x in X if not unnamed_widget_pattern.match(x.split('.')[-1])
-            )
 
-        # (Rbar - {unnamed widgets}) \subseteq M
-        X = Rbar - M
-        X = discard_unnamed_widgets(X)
-        if X:
-            msg = f'Change log for repo `{self.repopath}` implies the following libpaths should'
-            msg += ' occur in the new version, but they cannot be found: '
-            msg += str(list(X))
-            raise PfscExcep(msg, PECode.INVALID_MOVE_MAPPING)
-
-        # D \subseteq L
-        X = D - L
-        if X:
-            msg = f'Change log for repo `{self.repopath}` says the entities at the following'
-            msg += ' libpaths move, but these libpaths cannot be found in the existing version: '
-            msg += str(list(X))
-            raise PfscExcep(msg, PECode.INVALID_MOVE_MAPPING)
-
-        # (V_minus - {unnamed widgets}) \subseteq Dbar
-        X = V_minus - Dbar
-        X = discard_unnamed_widgets(X)
-        if X:
-            msg = f'The following libpaths go away in the new build of repo `{self.repopath}`,'
-            msg += ' but the change log is silent on them.'
-            msg += f' Did you define a `{pfsc.constants.MOVE_MAPPING_NAME}` property? '
-            msg += str(list(X))
-            raise PfscExcep(msg, PECode.INVALID_MOVE_MAPPING)
-
-        # We will compute the set of Immediately Reused Libpaths.
-        # This is a subset of V0, and consists of all those libpaths for which
-        # we are able to determine that they now point to something different
-        # from what they pointed to before.
-        I = set()
-        I.update(Dbar & M)
-        # Note: intersecting with M in the next step to ensure we only get that part of
-        # Rbar that is free of system-named widgets that went away.
-        I.update(Rbar & M & L)
-        # Examine the set V0 for any detectible changes, which will also indicate reused libpaths.
-        for uid in V0:
-            e = self.existing_k_nodes[uid]
-            d = self.get_kNode(uid)
-            if d.node_type != e.node_type or d.modpath != e.modpath:
-                I.add(e.libpath)
-
-        """
-        Thm: I subset Dbar.
-
-        Pf: If a libpath is in I, that means it's being reused.
-        That means it's no longer going to point to the entity it used to point to.
-        That means that entity has to have either moved or died.
-        That means that entity's old libpath (the one that's being reused) should be in Dbar. [ ]
-        """
-        # Check:
-        # if not I.issubset(Dbar):
-        X = I - Dbar
-        if X:
-            msg = 'The following libpaths appear to be recycled (point to new entities) in the'
-            msg += f' new build of repo `{self.repopath}`, but the change log is silent on them.'
-            msg += f' Did you put mappings under the `{pfsc.constants.MOVE_MAPPING_NAME}` key? '
-            msg += str(list(X))
-            raise PfscExcep(msg, PECode.INVALID_MOVE_MAPPING)
-
-        r"""
-        Thm: V_cut = Dbar.
-
-        Pf: Let a \in V_cut. This means a \in L and the existing j-node u_a for a is one on which
-        we intend to set u_a.cut = M. But we have the rule that any j-node with finite cut property
-        must have a move, i.e. a MOVE edge leaving it or one of its ancestors. But the latter can
-        only happen if we know which is the _right_ move, i.e. if the change log said sth about this.
-        But that's the case iff a is in Dbar.
-
-        Conversely, let b \in Dbar. Then the entity living at libpath b in major version L is either
-        moving or dying. That means the j-node representing libpath b for major version L must receive
-        cut = M. That means b \in V_cut. [ ]
+        The set algebra itself is carried out by `compute_cut_add_sets()`.
+        Here we add only the check for disallowed breaking changes.
         """
-        V_cut = Dbar
-
-        r"""
-        Thm: V_add = V+ U I.
-
-        Pf: Let a \in V_add. This means we need to add a j-node to represent the entity that lives
-        at libpath a in version M. There are two cases: either a \in L or not. If a \in L, then a
-        is an immediately reused libpath, so a \in I. Otherwise a is not in L. But we said that in
-        version M there is an entity that lives at a, which means a \in M. So a \in M - L = V+.
-
-        Conversely, suppose b \in V+ U I. If b \in V+, then by definition b is not in L. That means
-        there is currently no j-node for this libpath, so b \in V_add. Otherwise b \in I. In that case,
-        in verion M the libpath b is to represent a different entity from the one it represented in
-        version L; so the existing j-node must get cut = M, and we must add a new j-node to cover the
-        libpath, i.e. we must have b \in V_add.
-        """
-        V_add = V_plus | I
-
-        # A relation UID must be considered "immediately reused" if either or both of
-        # its endpoint libpaths are immediately reused.
-        I_reln = set()
-        for uid in E0:
-            tlp, kind, hlp = uid.split(":")
-            if tlp in I or hlp in I:
-                I_reln.add(uid)
-        # Where a relation UID has been immediately reused, the old edge under that UID
-        # must be marked as cut, and we must add a new edge to represent this reln in the new version.
-        E_cut = E_minus | I_reln
-        E_add = E_plus | I_reln
-
-        # Check: No j-node should have more than one EXPANDS relation leaving it.
-        # This means that if we're going to add an EXPANDS edge where the tail libpath
-        # already exists in the index, then this libpath should be among the immediately reused.
-        for uid in E_add:
-            tlp, kind, hlp = uid.split(":")
-            if kind == IndexType.EXPANDS and tlp in L and not tlp in I:
-                msg = f'Attempting to add relation `{uid}`, but tailpath `{tlp}` already exists'
-                msg += ', and does not appear to be recycled.'
-                msg += f' No node can have multiple `{IndexType.EXPANDS}` relations leaving it.'
-                raise PfscExcep(msg, PECode.MULTIPLE_EXPANSION_DEFINITION)
+        M, Rbar, I, V_cut, V_add, E_cut, E_add = compute_cut_add_sets(
+            self.repopath,
+            self.existing_k_nodes, self.node_lookup,
+            self.existing_k_relns, self.reln_lookup,
+            self.move_mapping, self.mm_closure
+        )
 
         # Note: It's always possible there be breaking changes that we _can't_ detect automatically,
         # but we do the best we can.
@@ -665,8 +584,129 @@ class ModuleIndexInfo:
         # properties in certain PfscObjs before writing their products to disk.
         self.origins = new_origins
 
+    def compute_closures(self, graph_reader):
+        """
+        Materialize closure properties on the new j-nodes, so that readers can
+        answer deduction-closure and ancestor-chain queries with indexed lookups,
+        instead of variable-length path expansion:
+
+        (1) Every new Deduc, Node, Ghost, or Special j-node gets a `deduc`
+          property, giving the libpath of the deduc to which it belongs. (For
+          a Deduc, this is its own libpath.)
+        (2) Every new Deduc j-node gets an `ancestors` property, recording the
+          chain of deducs it expands (see `IndexType.EP_ANCESTORS`).
+
+        We record the major version of each ancestor's j-node, but not its cut,
+        since the latter can change when later versions are indexed. Readers
+        look up cuts at query time.
+
+        Since j-nodes can have at most one EXPANDS edge leaving them, and can
+        only acquire one when they are first added, these properties never need
+        to be updated on existing j-nodes.
+        """
+        under = {}
+        expands = {}
+        for k in self.reln_lookup.values():
+            if k.reln_type == IndexType.UNDER:
+                under[k.tail_libpath] = k
+            elif k.reln_type == IndexType.EXPANDS:
+                expands[k.tail_libpath] = k
+
+        node_types = {IndexType.NODE, IndexType.GHOST, IndexType.SPECIAL}
+        enclosing_deducs = {}
+
+        def get_enclosing_deduc(libpath):
+            if libpath not in enclosing_deducs:
+                deducpath = None
+                r = under.get(libpath)
+                if r is not None:
+                    if r.head_type == IndexType.DEDUC:
+                        deducpath = r.head_libpath
+                    elif r.head_type in node_types:
+                        deducpath = get_enclosing_deduc(r.head_libpath)
+                enclosing_deducs[libpath] = deducpath
+            return enclosing_deducs[libpath]
+
+        ancestries = {}
+
+        def get_ancestry(deducpath):
+            if deducpath not in ancestries:
+                ancestry = []
+                r = expands.get(deducpath)
+                if r is not None:
+                    parentpath = r.head_libpath
+                    if parentpath in self.V_add:
+                        parent_major = self.major
+                        parent_ancestry = get_ancestry(parentpath)
+                    else:
+                        parent_major, parent_ancestry = (
+                            graph_reader.get_ancestry(parentpath, r.head_major)
+                            or (None, None)
+                        )
+                    if parent_ancestry is None:
+                        # Should not happen, but if it does we simply decline
+                        # to materialize, and let readers fall back on traversal.
+                        ancestry = None
+                    else:
+                        taken_at = r.extra_props.get(IndexType.EP_TAKEN_AT)
+                        ancestry = parent_ancestry + [
+                            [parentpath, parent_major, taken_at]
+                        ]
+                ancestries[deducpath] = ancestry
+            return ancestries[deducpath]
+
+        for uid in self.V_add:
+            k = self.get_kNode(uid)
+            if k.node_type == IndexType.DEDUC:
+                k.set_extra_prop(IndexType.EP_DEDUC, uid)
+                ancestry = get_ancestry(uid)
+                if ancestry is not None:
+                    k.set_extra_prop(IndexType.EP_ANCESTORS, json.dumps(ancestry))
+            elif k.node_type in node_types:
+                deducpath = get_enclosing_deduc(uid)
+                if deducpath is not None:
+                    k.set_extra_prop(IndexType.EP_DEDUC, deducpath)
+
     # ------------------------------------------------------------------------
 
+    def get_index_records(self):
+        """
+        Write the kNodes and kRelns recorded so far, in a compact form, and
+        grouped by the module that defines them. Call this after scanning, and
+        before the post-scanning steps (which add properties that depend on
+        the state of the graph database).
+
+        These records are saved at build time, so that the indexing can later
+        be redone from them, without rebuilding. See `pfsc.build.reindex`.
+
+        :return: dict mapping modpaths to dicts of the form
+            {'nodes': [...], 'relns': [...]}, suitable for `add_index_records()`.
+        """
+        records = defaultdict(lambda: {'nodes': [], 'relns': []})
+        for k in self.node_lookup.values():
+            records[k.modpath]['nodes'].append([
+                k.node_type, k.libpath, dict(k.extra_props)
+            ])
+        for k in self.reln_lookup.values():
+            records[k.modpath]['relns'].append([
+                k.tail_type, k.tail_libpath, k.tail_major,
+                k.reln_type,
+                k.head_type, k.head_libpath, k.head_major,
+                dict(k.extra_props)
+            ])
+        return dict(records)
+
+    def add_index_records(self, modpath, records):
+        """
+        Add the kNodes and kRelns for a module, as recorded by
+        `get_index_records()`, as if the module had just been scanned.
+        """
+        self.added_modpaths.append(modpath)
+        for node_type, libpath, extra_props in records.get('nodes', []):
+            self.add_kNode(node_type, libpath, modpath, extra_props=extra_props)
+        for *args, extra_props in records.get('relns', []):
+            self.add_kReln(*args, modpath, extra_props=extra_props)
+
     def get_kNode_uids(self):
         return self.node_lookup.keys()
 
@@ -735,7 +775,7 @@ class ModuleIndexInfo:
 
     def add_under_reln(self, child_type, childpath, parent_type, parentpath, modpath):
         i = childpath.rfind('.')
-        segment = childpath[i+1:]
+        segment = intern_str(childpath[i+1:])
         self.add_kReln(child_type, childpath, self.major, IndexType.UNDER, parent_type, parentpath, self.major, modpath,
                        extra_props={"segment": segment})
 
@@ -887,6 +927,196 @@ class ModuleIndexInfo:
                 IndexType.DEDUC, p_libpath, p_major, modpath, extra_props={IndexType.EP_TAKEN_AT: p_vers})
 
 
+def compute_cut_add_sets(repopath,
+                         existing_k_nodes, desired_k_nodes,
+                         existing_k_relns, desired_k_relns,
+                         move_mapping, mm_closure):
+    """
+    Carry out the set algebra, and the validation checks, for
+    `ModuleIndexInfo.cut_add_validate()`, which see for the definitions of the
+    sets involved.
+
+    Since a release of a large repo can involve very large numbers of libpaths
+    and reln uids, we intern these as integers, and represent all sets as
+    bitsets (see `pfsc.build.lib.bitset`). We convert back to sets of uids
+    only for witnesses (in the event of errors), and for the results.
+
+    :param repopath: the libpath of the repo being indexed (for error messages).
+    :param existing_k_nodes: dict mapping uids to kNodes at the current major version.
+    :param desired_k_nodes: dict mapping uids to kNodes for the version being indexed.
+    :param existing_k_relns: dict mapping uids to kRelns at the current major version.
+    :param desired_k_relns: dict mapping uids to kRelns for the version being indexed.
+    :param move_mapping: the move mapping, with absolute libpaths.
+    :param mm_closure: the closure of the move mapping, as computed by
+        `compute_movemapping_closure()`.
+    :return: tuple (M, Rbar, I, V_cut, V_add, E_cut, E_add) of sets of uids.
+    :raises: PfscExcep if validation fails.
+    """
+    nodes = UidUniverse()
+    L = nodes.bits(existing_k_nodes)
+    M = nodes.bits(desired_k_nodes)
+    Dbar = nodes.bits(mm_closure)
+    Rbar_set = set(mm_closure.values()) - { None }
+    Rbar = nodes.bits(Rbar_set)
+    # We also want the domain before closure:
+    D = nodes.bits(move_mapping)
+
+    relns = UidUniverse()
+    existing_k_reln_uids = relns.bits(existing_k_relns)
+    desired_k_reln_uids = relns.bits(desired_k_relns)
+
+    # V-: Vertex UIDs (which equal libpaths) that are going away:
+    V_minus = L & ~M
+    # V+: New Vertex UIDs:
+    V_plus = M & ~L
+
+    # E-: Edge UIDs (taillibpath:relntype:headlibpath) that are going away:
+    E_minus = existing_k_reln_uids & ~desired_k_reln_uids
+    # E+: New Edge UIDs:
+    E_plus = desired_k_reln_uids & ~existing_k_reln_uids
+
+    # Correctness checks:
+    # We want to check that certain sets are subsets of others, and in the
+    # event of failure we want to be able to report the witnesses.
+
+    # Authors are allowed to omit names on most widget types, and these
+    # widgets get system-generated names. Authors are also allowed to ignore such
+    # widgets when they prepare move-mappings. As a consequence, we have to be careful
+    # to ignore such "unnamed" widgets here in these checks.
+    unnamed_widget_pattern = re.compile(r'_w\d+$')
+
+    def discard_unnamed_widgets(X):
+        """
+        Return that subset of a given set X of libpaths, which is obtained by discarding
+        all those libpaths whose final segment looks like a system-generated widget name.
+        """
+        return set(
+            x for x in X if not unnamed_widget_pattern.match(x.split('.')[-1])
+        )
+
+    # (Rbar - {unnamed widgets}) \subseteq M
+    X = Rbar & ~M
+    if X:
+        X = discard_unnamed_widgets(nodes.uids_of(X))
+        if X:
+            msg = f'Change log for repo `{repopath}` implies the following libpaths should'
+            msg += ' occur in the new version, but they cannot be found: '
+            msg += str(list(X))
+            raise PfscExcep(msg, PECode.INVALID_MOVE_MAPPING)
+
+    # D \subseteq L
+    X = D & ~L
+    if X:
+        msg = f'Change log for repo `{repopath}` says the entities at the following'
+        msg += ' libpaths move, but these libpaths cannot be found in the existing version: '
+        msg += str(list(nodes.uids_of(X)))
+        raise PfscExcep(msg, PECode.INVALID_MOVE_MAPPING)
+
+    # (V_minus - {unnamed widgets}) \subseteq Dbar
+    X = V_minus & ~Dbar
+    if X:
+        X = discard_unnamed_widgets(nodes.uids_of(X))
+        if X:
+            msg = f'The following libpaths go away in the new build of repo `{repopath}`,'
+            msg += ' but the change log is silent on them.'
+            msg += f' Did you define a `{pfsc.constants.MOVE_MAPPING_NAME}` property? '
+            msg += str(list(X))
+            raise PfscExcep(msg, PECode.INVALID_MOVE_MAPPING)
+
+    # We will compute the set of Immediately Reused Libpaths.
+    # This is a subset of V0, and consists of all those libpaths for which
+    # we are able to determine that they now point to something different
+    # from what they pointed to before.
+    # Note: intersecting with M in the second term to ensure we only get that part of
+    # Rbar that is free of system-named widgets that went away.
+    I = (Dbar & M) | (Rbar & M & L)
+    # Examine V0 for any detectible changes, which will also indicate reused libpaths.
+    changed = []
+    for uid, e in existing_k_nodes.items():
+        d = desired_k_nodes.get(uid)
+        if d is not None and (d.node_type != e.node_type or d.modpath != e.modpath):
+            changed.append(uid)
+    I |= nodes.bits(changed)
+
+    r"""
+    Thm: I subset Dbar.
+
+    Pf: If a libpath is in I, that means it's being reused.
+    That means it's no longer going to point to the entity it used to point to.
+    That means that entity has to have either moved or died.
+    That means that entity's old libpath (the one that's being reused) should be in Dbar. [ ]
+    """
+    X = I & ~Dbar
+    if X:
+        msg = 'The following libpaths appear to be recycled (point to new entities) in the'
+        msg += f' new build of repo `{repopath}`, but the change log is silent on them.'
+        msg += f' Did you put mappings under the `{pfsc.constants.MOVE_MAPPING_NAME}` key? '
+        msg += str(list(nodes.uids_of(X)))
+        raise PfscExcep(msg, PECode.INVALID_MOVE_MAPPING)
+
+    r"""
+    Thm: V_cut = Dbar.
+
+    Pf: Let a \in V_cut. This means a \in L and the existing j-node u_a for a is one on which
+    we intend to set u_a.cut = M. But we have the rule that any j-node with finite cut property
+    must have a move, i.e. a MOVE edge leaving it or one of its ancestors. But the latter can
+    only happen if we know which is the _right_ move, i.e. if the change log said sth about this.
+    But that's the case iff a is in Dbar.
+
+    Conversely, let b \in Dbar. Then the entity living at libpath b in major version L is either
+    moving or dying. That means the j-node representing libpath b for major version L must receive
+    cut = M. That means b \in V_cut. [ ]
+    """
+    V_cut = set(mm_closure.keys())
+
+    r"""
+    Thm: V_add = V+ U I.
+
+    Pf: Let a \in V_add. This means we need to add a j-node to represent the entity that lives
+    at libpath a in version M. There are two cases: either a \in L or not. If a \in L, then a
+    is an immediately reused libpath, so a \in I. Otherwise a is not in L. But we said that in
+    version M there is an entity that lives at a, which means a \in M. So a \in M - L = V+.
+
+    Conversely, suppose b \in V+ U I. If b \in V+, then by definition b is not in L. That means
+    there is currently no j-node for this libpath, so b \in V_add. Otherwise b \in I. In that case,
+    in verion M the libpath b is to represent a different entity from the one it represented in
+    version L; so the existing j-node must get cut = M, and we must add a new j-node to cover the
+    libpath, i.e. we must have b \in V_add.
+    """
+    V_add = V_plus | I
+
+    # A relation UID must be considered "immediately reused" if either or both of
+    # its endpoint libpaths are immediately reused.
+    I = nodes.uids_of(I)
+    I_reln = 0
+    if I:
+        I_reln = relns.bits(
+            uid for uid, k in existing_k_relns.items()
+            if uid in desired_k_relns and (k.tail_libpath in I or k.head_libpath in I)
+        )
+    # Where a relation UID has been immediately reused, the old edge under that UID
+    # must be marked as cut, and we must add a new edge to represent this reln in the new version.
+    E_cut = relns.uids_of(E_minus | I_reln)
+    E_add = relns.uids_of(E_plus | I_reln)
+
+    # Check: No j-node should have more than one EXPANDS relation leaving it.
+    # This means that if we're going to add an EXPANDS edge where the tail libpath
+    # already exists in the index, then this libpath should be among the immediately reused.
+    for uid in E_add:
+        k = desired_k_relns[uid]
+        tlp = k.tail_libpath
+        if k.reln_type == IndexType.EXPANDS and tlp in existing_k_nodes and not tlp in I:
+            msg = f'Attempting to add relation `{uid}`, but tailpath `{tlp}` already exists'
+            msg += ', and does not appear to be recycled.'
+            msg += f' No node can have multiple `{IndexType.EXPANDS}` relations leaving it.'
+            raise PfscExcep(msg, PECode.MULTIPLE_EXPANSION_DEFINITION)
+
+    return (
+        set(desired_k_nodes.keys()), Rbar_set, I,
+        V_cut, nodes.uids_of(V_add), E_cut, E_add
+    )
+
+
 def compute_movemapping_closure(mm, L):
     """
     The move mapping in a repo change log is largely implicit: when it states
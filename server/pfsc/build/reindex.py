@@ -0,0 +1,325 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Rebuilding the graph database from the build dir.
+
+When the graph database has to be recovered (on a new host, or after a
+corrupt dump, or when switching GDB systems), we would rather not rebuild
+every repo at every version, since that means reading and parsing all the
+sources again.
+
+Instead, we can rely on the index records that the builder saves alongside
+each module in the build dir (see `Builder.write_index_records()`). These
+are the kNodes and kRelns recorded while scanning the module, before any of
+the post-scanning steps, which depend on the state of the graph database.
+So, for each built repo version, we can reconstruct the `ModuleIndexInfo`
+from the index records of all the modules in its manifest, redo the
+post-scanning steps (computing move mappings, origins, and so on), and pass
+it to `GraphWriter.index_module()`, exactly as the builder would have done.
+
+Since indexing a numbered version relies on the indexing of the versions
+before it, the versions of each repo are indexed in order, ending with WIP.
+Repos are indexed in parallel, except that a repo waits for any repos it
+declares as dependencies, so that relations into those repos can be formed.
+
+A run is resumable: numbered versions that are already indexed are skipped,
+so an interrupted run can simply be started again. (WIP builds are always
+indexed again, which replaces any existing WIP indexing.)
+"""
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import json
+
+from flask import current_app
+
+import pfsc.constants
+from pfsc import get_build_dir
+from pfsc.build import BuildMonitor
+from pfsc.build.lib.libpath import PathInfo
+from pfsc.build.manifest import build_manifest_from_dict
+from pfsc.build.mii import ModuleIndexInfo
+from pfsc.build.repo import RepoFamily
+from pfsc.build.versions import VersionTag
+from pfsc.excep import PfscExcep, PECode
+from pfsc.gdb import building_in_gdb, get_graph_writer
+from pfsc.tracing import span
+
+
+def find_built_versions(repopaths=None):
+    """
+    Find the repo versions that have been built, according to the build dir.
+
+    :param repopaths: optional iterable of repopaths. If given, look only for
+        versions of these repos.
+    :return: dict mapping repopaths to lists of versions, in the order in
+        which they should be indexed, i.e. numbered versions in increasing
+        order, followed by WIP, if present.
+    """
+    build_dir = get_build_dir()
+    wanted = None if repopaths is None else set(repopaths)
+    found = {}
+    for host_segment in RepoFamily.all_families:
+        host_dir = build_dir / host_segment
+        if not host_dir.exists():
+            continue
+        for owner_dir in host_dir.iterdir():
+            if not owner_dir.is_dir():
+                continue
+            for repo_dir in owner_dir.iterdir():
+                if not repo_dir.is_dir():
+                    continue
+                repopath = str(repo_dir.relative_to(build_dir)).replace('/', '.')
+                if wanted is not None and repopath not in wanted:
+                    continue
+                versions = [
+                    d.name for d in repo_dir.iterdir()
+                    if (d / 'manifest.json').exists()
+                ]
+                if versions:
+                    found[repopath] = sort_versions(versions)
+    return found
+
+
+def sort_versions(versions):
+    """
+    Sort version names into indexing order.
+    """
+    numbered = sorted(
+        (VersionTag(v) for v in versions if v != pfsc.constants.WIP_TAG)
+    )
+    ordered = [t.get_name() for t in numbered]
+    if pfsc.constants.WIP_TAG in versions:
+        ordered.append(pfsc.constants.WIP_TAG)
+    return ordered
+
+
+def load_built_manifest(repopath, version):
+    """
+    Load a manifest from the build dir.
+
+    Unlike `pfsc.build.manifest.load_manifest()`, this does not require the
+    repo to be present in the lib dir.
+    """
+    path = get_build_dir().joinpath(*repopath.split('.'), version, 'manifest.json')
+    try:
+        with open(path) as f:
+            d = json.load(f)
+    except FileNotFoundError:
+        msg = f'Manifest not found for {repopath} at version {version}.'
+        raise PfscExcep(msg, PECode.MISSING_MANIFEST)
+    return build_manifest_from_dict(d)
+
+
+def iter_manifest_modpaths(manifest):
+    """
+    Iterate over the libpaths of all modules in a manifest, in preorder.
+    """
+    stack = [manifest.get_root_node()]
+    while stack:
+        node = stack.pop()
+        yield node.id
+        stack.extend(reversed(list(node.get_submodules())))
+
+
+def load_index_records(modpath, version):
+    """
+    Load the index records saved for a module when it was built.
+
+    :return: the records dict, or None if the module was not scanned, i.e. it
+        is represented only by a directory.
+    :raises: PfscExcep if the module was built, but its index records are
+        missing. This happens for builds made before index records were saved.
+    """
+    path = PathInfo(modpath).get_index_records_path(version=version)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    if any(path.parent.glob('module.*')):
+        msg = (
+            f'Index records are missing for module `{modpath}` at version'
+            f' `{version}`. The repo must be rebuilt at this version.'
+        )
+        raise PfscExcep(msg, PECode.MISSING_INDEX_RECORDS)
+    return None
+
+
+def load_index_info(repopath, version):
+    """
+    Reconstruct the `ModuleIndexInfo` for a built repo version, as it stood
+    at the end of the scanning phase of the build.
+
+    :return: pair (mii, dependencies), where dependencies is the dict of
+        dependencies declared by the repo at this version.
+    """
+    manifest = load_built_manifest(repopath, version)
+    build_info = manifest.get_build_info().get(repopath, {})
+    mii = ModuleIndexInfo(
+        BuildMonitor(None), repopath, version, build_info.get('commit'),
+        recursive=True
+    )
+    dependencies = {}
+    for modpath in iter_manifest_modpaths(manifest):
+        records = load_index_records(modpath, version)
+        if records is None:
+            continue
+        if modpath == repopath:
+            mii.set_change_log(records.get('change_log') or {})
+            dependencies = records.get('dependencies') or {}
+        mii.add_index_records(modpath, records)
+    return mii, dependencies
+
+
+def load_repo_dependencies(repopath, versions):
+    """
+    Get the set of all repos on which any of the given versions of a repo
+    depend.
+    """
+    deps = set()
+    for version in versions:
+        records = load_index_records(repopath, version)
+        if records:
+            deps.update(records.get('dependencies') or {})
+    deps.discard(repopath)
+    return deps
+
+
+def reindex_version(repopath, version):
+    """
+    Index one built version of a repo, from its index records.
+
+    :return: boolean, True if we indexed, False if we skipped the version
+        since it was already indexed.
+    """
+    with span('build.reindex_version', repopath=repopath, version=version):
+        writer = get_graph_writer()
+        reader = writer.reader
+        if (version != pfsc.constants.WIP_TAG
+                and reader.version_is_already_indexed(repopath, version)):
+            return False
+        mii, _ = load_index_info(repopath, version)
+        mii.compute_mm_closure(reader)
+        mii.do_post_scanning_steps(reader)
+        mii.setup_monitor()
+        writer.index_module(mii)
+        return True
+
+
+class Reindexer:
+    """
+    Rebuilds the graph database from the build dir.
+    """
+
+    def __init__(self, repopaths=None, workers=4, on_progress=None):
+        """
+        :param repopaths: optional list of repopaths. If given, index only
+            these repos; else all repos in the build dir.
+        :param workers: the max number of repos to index at once.
+        :param on_progress: optional function, to be called with a message
+            each time a repo version is indexed or skipped, or a repo fails.
+        """
+        self.repopaths = repopaths
+        self.workers = max(1, workers)
+        self.on_progress = on_progress
+        self.report = {
+            'indexed': [],
+            'skipped': [],
+            'failed': {},
+            'blocked': [],
+        }
+
+    def note(self, message):
+        if self.on_progress:
+            self.on_progress(message)
+
+    def reindex_repo(self, repopath, versions):
+        """
+        Index all the given versions of a repo, in order.
+        """
+        for version in versions:
+            if reindex_version(repopath, version):
+                self.report['indexed'].append(f'{repopath}@{version}')
+                self.note(f'Indexed {repopath}@{version}')
+            else:
+                self.report['skipped'].append(f'{repopath}@{version}')
+                self.note(f'Skipped {repopath}@{version} (already indexed)')
+
+    def run_repo(self, app, repopath, versions):
+        with app.app_context():
+            self.reindex_repo(repopath, versions)
+
+    def run(self):
+        """
+        Run the reindexing.
+
+        :return: report dict, listing the repo versions that were `indexed`,
+            and those `skipped` since they were already indexed, as well as
+            the repos that `failed` (mapped to error messages), and those
+            `blocked` since a repo on which they depend failed.
+        """
+        if building_in_gdb():
+            msg = 'Cannot reindex from the build dir, when building in the GDB.'
+            raise PfscExcep(msg, PECode.OPTION_NOT_SUPPORTED_WITH_BUILD_IN_GDB)
+
+        built = find_built_versions(self.repopaths)
+        # Dependencies are only a constraint on scheduling, among the repos
+        # we are indexing.
+        waiting_on = {
+            r: load_repo_dependencies(r, vv) & built.keys()
+            for r, vv in built.items()
+        }
+        app = current_app._get_current_object()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+            while waiting_on or running:
+                ready = sorted(r for r, deps in waiting_on.items() if not deps)
+                if not ready and not running:
+                    # A dependency cycle. Give up on ordering these repos.
+                    ready = sorted(waiting_on)
+                for r in ready:
+                    del waiting_on[r]
+                    running[executor.submit(self.run_repo, app, r, built[r])] = r
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    r = running.pop(future)
+                    e = future.exception()
+                    if e is None:
+                        for deps in waiting_on.values():
+                            deps.discard(r)
+                    else:
+                        msg = e.public_msg() if isinstance(e, PfscExcep) else repr(e)
+                        self.report['failed'][r] = msg
+                        self.note(f'Failed {r}: {msg}')
+                        self.block_dependants(r, waiting_on)
+
+        return self.report
+
+    def block_dependants(self, repopath, waiting_on):
+        """
+        Remove from the waiting set all repos that depend, directly or
+        indirectly, on a given one.
+        """
+        stack = [repopath]
+        while stack:
+            r = stack.pop()
+            for s in [s for s, deps in waiting_on.items() if r in deps]:
+                del waiting_on[s]
+                self.report['blocked'].append(s)
+                self.note(f'Blocked {s}, since it depends on {r}')
+                stack.append(s)
@@ -329,6 +329,10 @@ class RepoInfo:
         build_dir = self.get_build_dir(version=version)
         return build_dir.joinpath('manifest.json')
 
+    def get_manifest_index_path(self, version=pfsc.constants.WIP_TAG):
+        build_dir = self.get_build_dir(version=version)
+        return build_dir.joinpath('manifest.sqlite')
+
     def has_manifest_json_file(self, version=pfsc.constants.WIP_TAG):
         path = self.get_manifest_json_path(version=version)
         return os.path.exists(path)
@@ -0,0 +1,385 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Checking that the build dir and the graph DB are in sync.
+
+Ideally this should mean that they show all the same repos and versions as
+having been built & indexed so far. For now, we check in one direction only,
+namely that if the build dir shows repo@vers as built, then the graph db also
+shows it as having been indexed.
+
+On hosts with many built repo versions, walking the whole build dir can take
+a while. So the check is streaming (we walk the build dir lazily, one version
+dir at a time), and makes a single query, asking the graph DB for all indexed
+versions at once, instead of one per repo. Every version dir is still
+checked against the result of that query, and its manifest is stat'd.
+
+We also keep a checkpoint file, for change detection: it records each version
+dir that has been verified, together with the modification time of that
+version's manifest, and the time at which the graph DB says that version was
+indexed. A version dir whose record is unchanged since the last check is
+counted as `unchanged`, and the others as `verified`, so that a report shows
+what has changed since the last check.
+
+A check can also run in the background (see `run_background_sync_check()`, and
+`enqueue_sync_check()`), so it reports its progress as it goes: every so often
+it writes the progress to a small status file, where
+`get_sync_check_progress()` can find it, and, if running as an RQ job, it also
+puts the progress in the job's meta. The checkpoint file is rewritten only
+when there are new verifications to save, so a check that finds nothing new
+does not rewrite it at all.
+"""
+
+from collections import defaultdict
+import json
+import os
+import pathlib
+import time
+
+import pfsc.constants
+from rq import get_current_job
+
+from pfsc import check_config, get_build_dir, socketio
+from pfsc.build.repo import RepoFamily, RepoInfo
+from pfsc.excep import PfscExcep, PECode
+from pfsc.gdb import get_graph_reader
+
+
+CHECKPOINT_FILENAME = 'sync_checkpoint.json'
+STATUS_FILENAME = 'sync_status.json'
+# ID under which a sync check job is enqueued, so there is at most one at a time.
+SYNC_CHECK_JOB_ID = 'pfsc-sync-check'
+# Key in an RQ job's meta, under which a sync check job reports its progress.
+PROGRESS_META_KEY = 'sync_check_progress'
+
+
+def get_checkpoint_path():
+    return pathlib.Path(check_config("PFSC_BUILD_ROOT")) / CHECKPOINT_FILENAME
+
+
+def get_status_path():
+    return pathlib.Path(check_config("PFSC_BUILD_ROOT")) / STATUS_FILENAME
+
+
+def read_json_file(path):
+    """
+    :return: the contents of a JSON file, or an empty dict if the file is
+        missing or corrupt.
+    """
+    if path.exists():
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+    return {}
+
+
+def write_json_file(path, obj):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint():
+    """
+    Load the checkpoint and status files, if any.
+
+    :return: dict with keys `verified` (mapping relative paths of version
+        dirs to dicts giving the `mtime` of the version's manifest, and the
+        `time` at which the graph DB said the version was indexed, when they
+        were verified), `report` (the report from the last completed
+        run, or None), and `progress` (the progress of the latest run, which
+        may still be going, or None).
+    """
+    # A corrupt checkpoint just means we have to verify everything.
+    checkpoint = {'verified': read_json_file(get_checkpoint_path()).get('verified', {})}
+    status = read_json_file(get_status_path())
+    checkpoint['report'] = status.get('report')
+    checkpoint['progress'] = status.get('progress')
+    return checkpoint
+
+
+def get_sync_check_progress():
+    """
+    Get the progress of the latest sync check, which may still be running, in
+    this or another process.
+
+    :return: the progress dict (see `BuildSyncChecker.progress`), or None if
+        no check has been recorded. A check is still running (or was
+        interrupted) if its `finished` time is None.
+    """
+    return load_checkpoint()['progress']
+
+
+class BuildSyncChecker:
+    """
+    Checks that the build dir and the graph DB are in sync.
+
+    The `progress` attribute can be consulted at any time, including while a
+    check is running in a background task.
+    """
+
+    def __init__(self, skip_cache=False, skip_test_fam=False, skip_wip_builds=False):
+        """
+        :param skip_cache: set True to ignore the cache part of the build dir. I.e. this means
+            it's okay for there to be files in the cache dirs, even while that version is not indexed.
+        :param skip_test_fam: set True to ignore repos under the `test.` family
+        :param skip_wip_builds: set True to ignore repos built @WIP
+        """
+        self.skip_cache = skip_cache
+        self.skip_test_fam = skip_test_fam
+        self.skip_wip_builds = skip_wip_builds
+        self.progress = {
+            'started': None,
+            'finished': None,
+            'examined': 0,
+            'verified': 0,
+            'unchanged': 0,
+            'discrepancies': 0,
+        }
+
+    def iter_version_dirs(self):
+        """
+        Lazily walk the build dirs.
+
+        :return: generator of triples (repopath, version, version_dir), where
+            version_dir is a pathlib.Path.
+        """
+        cache_options = [False] if self.skip_cache else [False, True]
+        for cache_dir in cache_options:
+            for sphinx_dir in [False, True]:
+                build_dir = get_build_dir(cache_dir=cache_dir, sphinx_dir=sphinx_dir)
+                for host_segment in RepoFamily.all_families:
+                    # Skip `test` family?
+                    if self.skip_test_fam and host_segment == RepoFamily.TEST:
+                        continue
+                    host_dir = build_dir / host_segment
+                    if not host_dir.exists():
+                        continue
+                    for owner_dir in host_dir.iterdir():
+                        if not owner_dir.is_dir():
+                            continue
+                        for repo_dir in owner_dir.iterdir():
+                            if not repo_dir.is_dir():
+                                continue
+                            repopath = str(repo_dir.relative_to(build_dir)).replace('/', '.')
+                            for version_dir in repo_dir.iterdir():
+                                if not version_dir.is_dir():
+                                    continue
+                                version = version_dir.name
+                                # Skip WIP builds?
+                                if self.skip_wip_builds and version == pfsc.constants.WIP_TAG:
+                                    continue
+                                yield repopath, version, version_dir
+
+    def run(self, clean_up=False, use_checkpoint=True, on_progress=None, progress_every=100):
+        """
+        Run the check.
+
+        :param clean_up: set True to clean up any issues, instead of raising an exception.
+        :param use_checkpoint: set False to count all version dirs as newly
+            verified, ignoring (but still updating) the checkpoint.
+        :param on_progress: optional function, to be called with the
+            `progress` dict once at the start, and then after every
+            `progress_every` version dirs examined. When running in a
+            background task, this is an opportunity to yield.
+        :param progress_every: how often (in version dirs examined) to report
+            progress, to the status file, to the current RQ job's meta, if
+            any, and to `on_progress`.
+        :return: dict mapping repopaths to sets of versions that are present
+            in the build dir but not indexed in the graph db. If `clean_up` is
+            True, these are the builds that were deleted.
+        :raises: PfscExcep if out of sync and `clean_up` is False.
+        """
+        self.progress['started'] = time.time()
+        self.progress['finished'] = None
+        checkpoint = load_checkpoint()
+        prev_report = checkpoint['report']
+        prev_verified = checkpoint['verified'] if use_checkpoint else {}
+        verified = {}
+        # Whether we have verifications not yet saved in the checkpoint.
+        unsaved = False
+
+        def report_progress():
+            nonlocal unsaved
+            if unsaved:
+                # Keep the old verifications, as long as we have not
+                # re-examined them.
+                self.save_checkpoint(dict(checkpoint['verified'], **verified))
+                unsaved = False
+            self.save_status(prev_report, self.progress)
+            self.publish_progress()
+            if on_progress:
+                on_progress(self.progress)
+
+        report_progress()
+
+        # For each repo, a dict mapping the versions the graph DB says are
+        # indexed to their property dicts.
+        indexed_by_repo = defaultdict(dict)
+        for info in get_graph_reader().get_all_versions_indexed(include_wip=True):
+            indexed_by_repo[info['repopath']][info['version']] = info
+        manifest_mtimes = {}
+
+        build_root = pathlib.Path(check_config("PFSC_BUILD_ROOT"))
+        problems = defaultdict(set)
+        for repopath, version, version_dir in self.iter_version_dirs():
+            self.progress['examined'] += 1
+            key = str(version_dir.relative_to(build_root))
+            index_info = indexed_by_repo[repopath].get(version)
+            if index_info is None:
+                problems[repopath].add(version)
+                self.progress['discrepancies'] += 1
+            else:
+                if (repopath, version) not in manifest_mtimes:
+                    manifest_mtimes[(repopath, version)] = self.get_manifest_mtime(repopath, version)
+                record = {
+                    'mtime': manifest_mtimes[(repopath, version)],
+                    'time': index_info.get('time'),
+                }
+                verified[key] = record
+                if prev_verified.get(key) == record:
+                    self.progress['unchanged'] += 1
+                else:
+                    unsaved = True
+                    self.progress['verified'] += 1
+            if self.progress['examined'] % progress_every == 0:
+                report_progress()
+
+        if problems and clean_up:
+            for repopath, versions in problems.items():
+                for version in sorted(versions):
+                    ri = RepoInfo(repopath)
+                    ri.delete_all_build_output(version=version, clear_cache=not self.skip_cache)
+
+        self.progress['finished'] = time.time()
+        report = dict(self.progress)
+        report['problems'] = {r: sorted(v) for r, v in problems.items()}
+        report['cleaned_up'] = bool(problems and clean_up)
+        if verified != checkpoint['verified']:
+            self.save_checkpoint(verified)
+        self.save_status(report, self.progress)
+        self.publish_progress()
+
+        if problems and not clean_up:
+            msg = 'Build dir and graph db are out of sync.'
+            msg += '\nThe following builds are present in the build dir but not in the graph db.'
+            msg += self.write_problems(problems)
+            msg += (
+                '\nSuggested fix is to manually delete built directories for numbered versions,'
+                ' and then rebuild.'
+            )
+            raise PfscExcep(msg, PECode.BUILD_DIR_AND_GRAPH_DB_OUT_OF_SYNC)
+
+        return problems
+
+    def publish_progress(self):
+        """
+        If running as an RQ job, put our progress in the job's meta.
+        """
+        job = get_current_job()
+        if job is not None:
+            job.meta[PROGRESS_META_KEY] = dict(self.progress)
+            job.save_meta()
+
+    @staticmethod
+    def get_manifest_mtime(repopath, version):
+        """
+        :return: the modification time (in ns) of the manifest for a given
+            repo version, or None if there is no manifest.
+        """
+        path = get_build_dir().joinpath(*repopath.split('.'), version, 'manifest.json')
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def write_problems(problems):
+        text = ''
+        for repopath, versions in problems.items():
+            for version in sorted(versions):
+                text += f'\n    {repopath}@{version}'
+        return text
+
+    @staticmethod
+    def save_checkpoint(verified):
+        write_json_file(get_checkpoint_path(), {'verified': verified})
+
+    @staticmethod
+    def save_status(report, progress):
+        write_json_file(get_status_path(), {'report': report, 'progress': progress})
+
+
+def run_background_sync_check(app):
+    """
+    Run an incremental sync check, for use as a background task, started
+    after the app begins serving. We only report discrepancies (in the log,
+    and in the checkpoint file, where the `flask pfsc sync_check --report`
+    command can show them); we do not clean up, since in a running system
+    that could race with builds in progress.
+    """
+    checker = BuildSyncChecker(skip_cache=True)
+    with app.app_context():
+        try:
+            checker.run(on_progress=lambda p: socketio.sleep(0))
+        except PfscExcep as e:
+            app.logger.warning(e.public_msg())
+    return checker
+
+
+def sync_check_job(clean_up=False, full=False):
+    """
+    Run a sync check, as an RQ job. The job's meta reports the progress, under
+    `PROGRESS_META_KEY`.
+
+    :return: the report of the check
+    """
+    checker = BuildSyncChecker()
+    try:
+        checker.run(clean_up=clean_up, use_checkpoint=not full)
+    except PfscExcep as e:
+        if e.code() != PECode.BUILD_DIR_AND_GRAPH_DB_OUT_OF_SYNC:
+            raise
+    return load_checkpoint()['report']
+
+
+def enqueue_sync_check(clean_up=False, full=False):
+    """
+    Enqueue a sync check on the maintenance queue, unless one is already
+    waiting or running.
+
+    :return: the RQ job, whose meta can be polled for progress
+    """
+    from rq.job import Job, JobStatus
+    from rq.exceptions import NoSuchJobError
+    from pfsc.constants import QueueClass
+    from pfsc.rq import get_task_queue
+    q = get_task_queue(QueueClass.MAINTENANCE)
+    try:
+        job = Job.fetch(SYNC_CHECK_JOB_ID, connection=q.connection, serializer=q.serializer)
+    except NoSuchJobError:
+        pass
+    else:
+        if job.get_status() in [JobStatus.QUEUED, JobStatus.STARTED]:
+            return job
+    return q.enqueue(
+        sync_check_job, clean_up=clean_up, full=full, job_id=SYNC_CHECK_JOB_ID,
+    )
@@ -102,6 +102,41 @@ def check_dlist(key, raw, typedef):
     return check_list(key, inputs, typedef)
 
 
+def load_list(key, raw):
+    """
+    :param raw: an actual list or a string rep thereof
+    :return: the list
+    """
+    if isinstance(raw, str):
+        try:
+            L = json.loads(raw)
+        except Exception:
+            raise PfscExcep('Bad list', PECode.INPUT_WRONG_TYPE, bad_field=key)
+    else:
+        L = raw
+
+    if not isinstance(L, list):
+        raise PfscExcep('Bad list', PECode.INPUT_WRONG_TYPE, bad_field=key)
+    return L
+
+
+def load_dict(key, raw):
+    """
+    :param raw: an actual dictionary or a string rep thereof
+    :return: the dictionary
+    """
+    if isinstance(raw, str):
+        try:
+            raw_dict = json.loads(raw)
+        except Exception:
+            raise PfscExcep('Bad dictionary', PECode.INPUT_WRONG_TYPE, bad_field=key)
+    else:
+        raw_dict = raw
+    if not isinstance(raw_dict, dict):
+        raise PfscExcep('Bad dictionary', PECode.INPUT_WRONG_TYPE, bad_field=key)
+    return raw_dict
+
+
 def check_list(key, raw, typedef):
     """
     :param raw: an actual list or a string rep thereof
@@ -122,16 +157,7 @@ def check_list(key, raw, typedef):
                         of typedef dictionaries, one for each expected entry.
     :return: list of values
     """
-    if isinstance(raw, str):
-        try:
-            L = json.loads(raw)
-        except Exception:
-            raise PfscExcep('Bad list', PECode.INPUT_WRONG_TYPE, bad_field=key)
-    else:
-        L = raw
-
-    if not isinstance(L, list):
-        raise PfscExcep('Bad list', PECode.INPUT_WRONG_TYPE, bad_field=key)
+    L = load_list(key, raw)
 
     values = []
     if 'spec' in typedef:
@@ -191,15 +217,7 @@ def check_dict(key, raw, typedef):
                     reify_undefined: boolean, to be passed to `check_input()`. Default True.
     :return: dict
     """
-    if isinstance(raw, str):
-        try:
-            raw_dict = json.loads(raw)
-        except Exception:
-            raise PfscExcep('Bad dictionary', PECode.INPUT_WRONG_TYPE, bad_field=key)
-    else:
-        raw_dict = raw
-    if not isinstance(raw_dict, dict):
-        raise PfscExcep('Bad dictionary', PECode.INPUT_WRONG_TYPE, bad_field=key)
+    raw_dict = load_dict(key, raw)
 
     checked_dict = {}
     if 'spec' in typedef:
@@ -579,3 +597,283 @@ def check_input(raw_dict, stash, types, reify_undefined=True, err_on_unexpected=
             raise PfscExcep(msg, PECode.UNEXPECTED_INPUT)
 
     return expected_keys
+
+
+# ----------------------------------------------------------------------------
+# Compiled validators
+#
+# `check_input()` interprets its `types` dict from scratch on every call. Where
+# the same types are checked over and over (e.g. the fields of every widget of
+# a given type), we can instead compile them once into a validator function,
+# which does the same checks, and raises the same errors, but does not have to
+# look anything up in the typedefs again.
+
+def compile_types(types, reify_undefined=True, err_on_unexpected=False):
+    """
+    Compile a `types` dict into a validator.
+
+    :param types: as for the `check_input()` function
+    :param reify_undefined: as for the `check_input()` function
+    :param err_on_unexpected: as for the `check_input()` function
+    :return: a function `validate(raw_dict, stash)`, which does exactly what
+        `check_input(raw_dict, stash, types, reify_undefined=reify_undefined,
+        err_on_unexpected=err_on_unexpected)` would do, and returns the same
+        set of expected keys.
+    """
+    expected_keys = set()
+
+    req_fields = []
+    req = types.get("REQ")
+    if req is not None:
+        req_order = types.get("REQ_ORDER")
+        varnames = req_order if req_order is not None else req.keys()
+        for varname in varnames:
+            typedef = req[varname]
+            expected_keys.add(varname)
+            req_fields.append((
+                varname, typedef.get('rename', varname),
+                typedef.get('keep_raw', False), compile_typedef(typedef),
+            ))
+
+    opt_fields = []
+    opt = types.get("OPT")
+    if opt is not None:
+        for varname, typedef in opt.items():
+            expected_keys.add(varname)
+            opt_fields.append((
+                varname, typedef.get('rename', varname),
+                typedef.get('keep_raw', False), compile_typedef(typedef),
+                typedef,
+            ))
+
+    alt_sets = []
+    for alt_set in types.get("ALT_SETS") or []:
+        expected_keys.update(alt_set.keys())
+        alt_sets.append((alt_set, {
+            varname: (
+                typedef.get('rename', varname),
+                typedef.get('keep_raw', False), compile_typedef(typedef),
+            )
+            for varname, typedef in alt_set.items()
+        }))
+
+    conf_fields = []
+    conf = types.get("CONF")
+    if conf is not None:
+        for varname, typedef in conf.items():
+            expected_keys.add(varname)
+            conf_fields.append((varname, typedef['primary']))
+
+    def validate(raw_dict, stash):
+        get = raw_dict.get
+
+        for varname, stashname, keep_raw, checker in req_fields:
+            raw = get(varname)
+            if raw is None:
+                raise PfscExcep('var "%s" not supplied' % varname, PECode.MISSING_INPUT, bad_field=varname)
+            checked_value = checker(varname, raw)
+            stash[stashname] = raw if keep_raw else checked_value
+
+        for varname, stashname, keep_raw, checker, typedef in opt_fields:
+            raw = get(varname)
+            if raw is None:
+                if 'default_cooked' in typedef:
+                    stash[stashname] = typedef['default_cooked']
+                elif 'default_raw' in typedef:
+                    default_raw = typedef['default_raw']
+                    checked_value = checker(varname, default_raw)
+                    stash[stashname] = default_raw if keep_raw else checked_value
+                elif reify_undefined:
+                    stash[stashname] = UndefinedInput()
+            else:
+                checked_value = checker(varname, raw)
+                stash[stashname] = raw if keep_raw else checked_value
+
+        if alt_sets:
+            raw_key_set = set(raw_dict.keys())
+            for alt_set, alt_fields in alt_sets:
+                alt_key_set = set(alt_set.keys())
+                inter = alt_key_set & raw_key_set
+                if len(inter) != 1:
+                    msg = 'Bad alternative args. For alternatives\n    %s' % alt_key_set
+                    msg += '\ngot\n    %s' % raw_key_set
+                    raise PfscExcep(msg, PECode.BAD_ALTERNATIVE_ARGS)
+                varname = inter.pop()
+                stashname, keep_raw, checker = alt_fields[varname]
+                raw = raw_dict[varname]
+                checked_value = checker(varname, raw)
+                stash[stashname] = raw if keep_raw else checked_value
+                for u in alt_key_set - {varname}:
+                    stash[alt_fields[u][0]] = UndefinedInput()
+
+        for varname, primary_key in conf_fields:
+            conf_raw = get(varname)
+            if conf_raw is None:
+                raise PfscExcep('var "%s" not supplied' % varname, PECode.MISSING_INPUT, bad_field=varname)
+            primary_raw = get(primary_key)
+            if primary_raw is None:
+                raise PfscExcep('var "%s" not supplied' % primary_key, PECode.MISSING_INPUT, bad_field=primary_key)
+            if conf_raw != primary_raw:
+                raise PfscExcep(
+                    'var "%s" does not match var "%s"' % (varname, primary_key),
+                    PECode.CONF_ARG_DOES_NOT_MATCH,
+                    bad_field=varname
+                )
+
+        if err_on_unexpected:
+            unexpected = raw_dict.keys() - expected_keys
+            if unexpected:
+                noun = 'key' if len(unexpected) == 1 else 'keys'
+                msg = f'Received unexpected {noun}: ' + ', '.join(sorted(list(unexpected)))
+                raise PfscExcep(msg, PECode.UNEXPECTED_INPUT)
+
+        return set(expected_keys)
+
+    return validate
+
+
+def compile_typedef(typedef):
+    """
+    Compile a typedef into a checker.
+
+    :param typedef: a typedef, as for the `check_type()` function
+    :return: a function `checker(key, raw)` that does exactly what
+        `check_type(key, raw, typedef)` would do.
+    """
+    typename = typedef['type']
+    compiler = TYPE_COMPILERS.get(typename)
+    if compiler is not None:
+        return compiler(typedef)
+    handler = TYPE_HANDLERS[typename]
+
+    def checker(key, raw):
+        return handler(key, raw, typedef)
+
+    return checker
+
+
+def compile_list(typedef):
+    """
+    Compile a typedef for `check_list()`.
+    """
+    if 'spec' in typedef:
+        item_checkers = [compile_typedef(item_typedef) for item_typedef in typedef['spec']]
+        n = len(item_checkers)
+
+        def check_items(key, L):
+            if len(L) != n:
+                msg = f'Wrong number of items passed. Expected {n}.'
+                raise PfscExcep(msg, PECode.INPUT_WRONG_TYPE, bad_field=key)
+            values = []
+            for i, (item, item_checker) in enumerate(zip(L, item_checkers)):
+                try:
+                    value = item_checker(f'{key}[{i}]', item)
+                except PfscExcep as pe:
+                    pe.extendMsg(f'Error was on list item of index {i}: "{item}"')
+                    raise pe
+                values.append(value)
+            return values
+    else:
+        M = typedef.get('max_num_items')
+        nonempty = typedef.get('nonempty', False)
+        flatten = typedef.get('flatten', False)
+        item_checker = compile_typedef(typedef['itemtype'])
+
+        def check_items(key, L):
+            if M is not None and len(L) > M:
+                raise PfscExcep("List too long.", PECode.INPUT_TOO_LONG, bad_field=key)
+            if nonempty and len(L) == 0:
+                raise PfscExcep("Empty list.", PECode.INPUT_EMPTY, bad_field=key)
+            values = [item_checker(key, raw_i) for raw_i in L]
+            if flatten and len(values) > 0 and isinstance(values[0], list):
+                values = sum(values, [])
+            return values
+
+    def checker(key, raw):
+        return check_items(key, load_list(key, raw))
+
+    return checker
+
+
+def compile_dlist(typedef):
+    """
+    Compile a typedef for `check_dlist()`, or (with no delimiter) `check_cdlist()`.
+    """
+    d = typedef.get('delimiter', ',') if typedef['type'] == IType.DLIST else ','
+    list_checker = compile_list(typedef)
+
+    def checker(key, raw):
+        inputs = raw.split(d)
+        if len(inputs) == 1 and inputs[0] == '': inputs = []
+        return list_checker(key, inputs)
+
+    return checker
+
+
+def compile_dict(typedef):
+    """
+    Compile a typedef for `check_dict()`.
+    """
+    if 'spec' in typedef:
+        validate = compile_types(
+            typedef['spec'], reify_undefined=typedef.get('reify_undefined', True)
+        )
+
+        def check_items(key, raw_dict):
+            checked_dict = {}
+            try:
+                validate(raw_dict, checked_dict)
+            except PfscExcep as pe:
+                pe.extendMsg(f'Error occurred in dictionary passed under key: "{key}"')
+                raise pe
+            return checked_dict
+    else:
+        key_checker = compile_typedef(typedef['keytype'])
+        val_checker = compile_typedef(typedef['valtype'])
+
+        def check_items(key, raw_dict):
+            checked_dict = {}
+            for raw_k, raw_v in raw_dict.items():
+                k = key_checker(f'{key} key {raw_k}', raw_k)
+                v = val_checker(f'{key}[{raw_k}]', raw_v)
+                checked_dict[k] = v
+            return checked_dict
+
+    def checker(key, raw):
+        return check_items(key, load_dict(key, raw))
+
+    return checker
+
+
+def compile_disjunctive_type(typedef):
+    """
+    Compile a typedef for `check_disjunctive_type()`.
+    """
+    alts = [(alt_def["type"], compile_typedef(alt_def)) for alt_def in typedef['alts']]
+
+    def checker(key, raw):
+        err_msgs = []
+        for alt_type, alt_checker in alts:
+            try:
+                value = alt_checker(key, raw)
+            except PfscExcep as pe:
+                msg = f'Failed as {alt_type} due to:\n  ' + pe.public_msg()
+                err_msgs.append(msg)
+            else:
+                return value
+        msg = 'Input did not match any of the allowed types.\n'
+        msg += '\n'.join(err_msgs)
+        raise PfscExcep(msg, PECode.INPUT_WRONG_TYPE, bad_field=key)
+
+    return checker
+
+
+# Compilers for those types whose typedefs contain further typedefs.
+# All other types are checked by their handler in `TYPE_HANDLERS`.
+TYPE_COMPILERS = {
+    IType.DISJ: compile_disjunctive_type,
+    IType.DICT: compile_dict,
+    IType.LIST: compile_list,
+    IType.CDLIST: compile_dlist,
+    IType.DLIST: compile_dlist,
+}
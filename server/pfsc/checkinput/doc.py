@@ -16,10 +16,10 @@
 
 import re
 
-from lark import Lark
 import lark.exceptions
 
 from pfsc.excep import PfscExcep, PECode
+from pfsc.util import LazyLark
 
 NONEMPTY_HEXADECIMAL_PATTERN = re.compile(r'^[a-fA-F0-9]+$')
 
@@ -98,7 +98,7 @@ combiner_code_grammar = r"""
     %ignore WS
 """
 
-combiner_code_parser = Lark(combiner_code_grammar, start='program', parser='lalr', lexer='standard')
+combiner_code_parser = LazyLark(combiner_code_grammar, start='program', parser='lalr', lexer='standard')
 
 
 def check_combiner_code(key, raw, typedef):
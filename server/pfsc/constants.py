@@ -30,8 +30,31 @@ WEBSOCKET_NAMESPACE = '/pfsc-ise'
 REDIS_CHANNEL = 'pfsc-io'
 MAIN_TASK_QUEUE_NAME = 'pfsc-tasks'
 MATH_CALC_QUEUE_NAME = 'pfsc-math-calc'
+
+
+class QueueClass:
+    """
+    Classes of RQ jobs. Each class has its own task queue, so that workers can
+    give interactive work priority over long-running bulk work. Handlers
+    declare the class of their jobs. See `pfsc.rq`.
+    """
+    INTERACTIVE = 'interactive'
+    BUILD = 'build'
+    BULK_CLONE = 'bulk-clone'
+    MAINTENANCE = 'maintenance'
+
+    all_classes = [INTERACTIVE, BUILD, BULK_CLONE, MAINTENANCE]
+
+
+TASK_QUEUE_NAME_BY_CLASS = {
+    QueueClass.INTERACTIVE: MAIN_TASK_QUEUE_NAME,
+    QueueClass.BUILD: 'pfsc-tasks-build',
+    QueueClass.BULK_CLONE: 'pfsc-tasks-bulk-clone',
+    QueueClass.MAINTENANCE: 'pfsc-tasks-maintenance',
+}
+
 RQ_QUEUE_NAMES = [
-    MAIN_TASK_QUEUE_NAME,
+    *TASK_QUEUE_NAME_BY_CLASS.values(),
     MATH_CALC_QUEUE_NAME,
 ]
 ISE_EVENT_NAME = 'iseEvent'
@@ -217,6 +240,14 @@ class IndexType:
     # time deduc D is _taken at_ a particular version.
     EP_TAKEN_AT = 'taken_at'
 
+    # Materialized closures:
+    #  The libpath of the deduc to which a node belongs (for a deduc, its own
+    #  libpath), and, for a deduc, the JSONified chain of deducs it expands,
+    #  root first, as triples `[libpath, major, taken_at]`, where `major` is
+    #  the major version of the ancestor's j-node.
+    EP_DEDUC = 'deduc'
+    EP_ANCESTORS = 'ancestors'
+
     # -----------------------------------------------------
     # Other property names
     #   These are any other properties we want to use in the GDB, but which
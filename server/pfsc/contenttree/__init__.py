@@ -91,7 +91,7 @@ compact -- and even human-readable -- as possible.
 
 import re
 
-from lark import Lark, Transformer
+from lark import Transformer
 
 import pfsc.constants
 from pfsc.build.versions import VersionTag
@@ -99,6 +99,7 @@ from pfsc.build.lib.libpath import get_modpath
 from pfsc.build.repo import parse_repo_versioned_libpath, make_repo_versioned_libpath
 from pfsc.excep import PfscExcep, PECode
 from pfsc.session import make_demo_user_path
+from pfsc.util import LazyLark
 
 forest_grammar = r'''
     forest : tree | children
@@ -223,7 +224,7 @@ class ForestBuilder(Transformer):
         return self.code(items)
 
 
-forest_parser = Lark(forest_grammar, start='forest')
+forest_parser = LazyLark(forest_grammar, start='forest')
 
 
 class TypeRequest:
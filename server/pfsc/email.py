@@ -21,8 +21,8 @@ import jinja2
 from rq.job import get_current_job
 
 from pfsc import get_app, mail, check_config
-from pfsc.rq import get_rqueue
-from pfsc.constants import MAIN_TASK_QUEUE_NAME
+from pfsc.rq import get_task_queue
+from pfsc.constants import QueueClass
 
 
 templates_dir = check_config("EMAIL_TEMPLATE_DIR")
@@ -145,7 +145,7 @@ def send_mail(subject, body, recips, html=None, sender=None, asyncr=None):
     if asyncr is None:
         asyncr = get_current_job() is None
     if asyncr and not testing:
-        q = get_rqueue(MAIN_TASK_QUEUE_NAME)
+        q = get_task_queue(QueueClass.MAINTENANCE)
         return q.enqueue(
             send_mail_core,
             args=[subject, body, recips, sender],
@@ -0,0 +1,540 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Server-side evaluation of examp widgets (param and disp widgets).
+
+Normally examp widgets are evaluated in the browser, under Pyodide. As an
+opt-in alternative (`SERVER_SIDE_EXAMP_EVAL`), we can evaluate them here.
+
+Evaluations are carried out in a pool of worker processes, in which
+`pfsc_examp` and SymPy have already been imported. Each evaluation is subject
+to a CPU time limit of `MATH_CALCULATION_TIMEOUT` seconds, and each worker
+process to a memory limit of `EXAMP_EVAL_MEMORY_LIMIT_MB` (beyond what it was
+using when it started). A wall-clock timeout in the requesting process backs
+these up: if a worker fails to answer in time, the whole pool is terminated,
+and replaced on the next request.
+
+Evaluation requests are handled in RQ jobs. An RQ worker that performs its
+jobs in its own process starts the pool when it starts work. A worker that
+forks a work horse for each job cannot share a pool with its horses, so there
+the horses instead evaluate in their own process, having inherited the
+preloaded libraries (see `prepare_rq_worker()`).
+
+Results are memoized, keyed by widget libpath, version, the (canonical)
+parameter choices, and the built data of the widgets involved, in an in-process LRU of size `EXAMP_EVAL_MEMO_SIZE`, and,
+if `EXAMP_EVAL_MEMO_REDIS_TTL` is positive, in Redis, where they are shared
+between processes.
+
+The worker processes never need an app context. The requesting process loads
+the built data for the widgets, and passes it to the workers as plain dicts.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import resource
+import signal
+
+from pfsc import check_config
+from pfsc.excep import PfscExcep, PECode
+
+
+EXAMP_MEMO_REDIS_PREFIX = 'pfsc:exampmemo:'
+
+# Modules to be imported by each worker process, when it starts.
+PREWARM_MODULES = [
+    'sympy',
+    'pfsc_examp',
+    'pfsc_examp.parameters.types',
+    'pfsc_examp.display',
+]
+
+# Config vars that `pfsc_examp` reads from its own config.
+EXAMP_CONFIG_VARS = [
+    "MAX_SYMPY_EXPR_LEN",
+    "MAX_SYMPY_EXPR_DEPTH",
+    "MAX_DISPLAY_BUILD_LEN",
+    "MAX_DISPLAY_BUILD_DEPTH",
+]
+
+# Seconds of wall-clock time we allow beyond the CPU time limit, before
+# giving up on a worker.
+WALL_CLOCK_GRACE = 2
+
+
+class LimitExceeded:
+    CPU = 'cpu'
+    MEMORY = 'memory'
+
+
+# ----------------------------------------------------------------------------
+# Worker side
+
+
+class EvaluationTimeout(Exception):
+    pass
+
+
+def raise_evaluation_timeout(signum, frame):
+    raise EvaluationTimeout
+
+
+def get_address_space_size():
+    """
+    :return: the current size (bytes) of this process's virtual address
+        space, or None if we cannot determine it.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def init_eval_process(memory_limit_mb, examp_config):
+    """
+    Initializer for worker processes in the pool.
+
+    :param memory_limit_mb: how many MB the process may allocate beyond what
+        it is using now. Zero or negative means no limit.
+    :param examp_config: dict of config vars for `pfsc_examp`.
+    """
+    # Workers should leave SIGINT to the parent.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_eval_environment(memory_limit_mb, examp_config)
+
+
+def preload_examp_modules():
+    for name in PREWARM_MODULES:
+        importlib.import_module(name)
+
+
+def init_eval_environment(memory_limit_mb, examp_config):
+    """
+    Prepare the current process to evaluate examp widgets.
+
+    :param memory_limit_mb: as for `init_eval_process()`.
+    :param examp_config: as for `init_eval_process()`.
+    """
+    preload_examp_modules()
+    # If `pfsc_examp` was imported outside of an app context, it is using a
+    # plain dict of defaults. Either way, we update it in place.
+    from pfsc_examp.config import config
+    config.update(examp_config)
+    if memory_limit_mb > 0 and (current := get_address_space_size()) is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        soft = current + memory_limit_mb * 1024 * 1024
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+@contextmanager
+def cpu_time_limit(seconds):
+    """
+    Raise `EvaluationTimeout` if the enclosed code uses more than the given
+    number of seconds of CPU time. (The kernel counts CPU time in whole
+    seconds, so the limit is effectively rounded up.)
+
+    We raise only the soft limit, leaving the hard limit alone, since an
+    unprivileged process can never raise its hard limit again.
+
+    :param seconds: the limit. Negative means no limit.
+    """
+    if seconds < 0:
+        yield
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = math.ceil(used + seconds)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    prev_handler = signal.signal(signal.SIGXCPU, raise_evaluation_timeout)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+        signal.signal(signal.SIGXCPU, prev_handler)
+
+
+class WidgetStandIn:
+    """
+    Plays the role of a Widget, in its capacity as the parent object of a
+    Parameter or ExampDisplay. Like `pfsc_examp.PyodideWidgetStandIn`, but
+    looks up other generators in a dict, instead of in the browser.
+    """
+
+    def __init__(self, info, generators):
+        self.info = info
+        self.generators = generators
+        self.uid = info['uid']
+        self.libpath = info['widget_libpath']
+        self.context = info.get('context', 'Basic')
+
+    def get_generator(self, libpath):
+        return self.generators[libpath]
+
+    def getLibpath(self):
+        return self.libpath
+
+    def getUid(self):
+        return self.uid
+
+
+def evaluate_examp_widget(target_info, dep_infos, params, cpu_seconds):
+    """
+    Evaluate an examp widget. This is the function run in the worker
+    processes.
+
+    :param target_info: the built data for the widget to be evaluated.
+    :param dep_infos: list of the built data for each of the examp widgets on
+        which the target depends, in topological order.
+    :param params: dict mapping libpaths of param widgets to the raw values
+        chosen for them.
+    :param cpu_seconds: the CPU time limit.
+    :return: dict with `err_lvl` (int), `err_msg` (str), and, on success,
+        `html`, or on failure, possibly `blame_widget_uid`. These have the
+        same meaning as in `pfsc_examp.rebuild_examp_generator_from_js()`.
+        If a resource limit was exceeded, the dict instead has a
+        `limit_exceeded` field, whose value is a `LimitExceeded`.
+    """
+    from pfsc_examp import (
+        make_param, make_disp, ErrCode,
+        ExampError, MalformedParamRawValue, ControlledEvaluationException,
+    )
+    from markupsafe import escape
+
+    result = {'err_lvl': ErrCode.OK, 'err_msg': ''}
+    generators = {}
+    generator = None
+    try:
+        with cpu_time_limit(cpu_seconds):
+            for info in dep_infos + [target_info]:
+                make = make_param if info['type'] == 'PARAM' else make_disp
+                generator = make(WidgetStandIn(info, generators), info)
+                generator.build(raw=params.get(info['widget_libpath']))
+                generators[info['widget_libpath']] = generator
+            result['html'] = generator.write_html()
+    except EvaluationTimeout:
+        return {'limit_exceeded': LimitExceeded.CPU}
+    except MemoryError:
+        return {'limit_exceeded': LimitExceeded.MEMORY}
+    except MalformedParamRawValue as e:
+        result['err_lvl'] = ErrCode.MALFORMED_PARAM_RAW_VALUE
+        result['err_msg'] = str(e)
+        result['blame_widget_uid'] = e.param.getUid()
+    except ControlledEvaluationException as e:
+        result['err_lvl'] = ErrCode.CONTROLLED_EVALUATION_EXCEPTION
+        result['err_msg'] = str(e)
+        if generator is not None:
+            result['blame_widget_uid'] = generator.getUid()
+    except ExampError as e:
+        result['err_lvl'] = ErrCode.EXAMP_ERROR
+        result['err_msg'] = str(e)
+    except Exception as e:
+        result['err_lvl'] = ErrCode.UNEXPECTED
+        result['err_msg'] = str(e)
+    result['err_msg'] = str(escape(result['err_msg']))
+    return result
+
+
+# ----------------------------------------------------------------------------
+# Requester side
+
+
+class ExampEvalPool:
+    """
+    A pool of worker processes, for evaluating examp widgets.
+
+    The pool belongs to the process that started it. If we find ourselves in
+    a forked child, we start a new one. (RQ work horses should not get this
+    far; see `InProcessEvaluator`.)
+    """
+
+    def __init__(self, size, memory_limit_mb, max_tasks_per_process, examp_config):
+        self.size = size
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_process = max_tasks_per_process
+        self.examp_config = examp_config
+        self.pool = None
+        self.pid = None
+
+    def start(self):
+        # Use a fork server if we can, so that workers are not forked from a
+        # process that may have other threads running.
+        # The fork server preloads the libraries too, so that replacing a
+        # worker is cheap.
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context('forkserver')
+            ctx.set_forkserver_preload(PREWARM_MODULES)
+        else:
+            ctx = multiprocessing.get_context('spawn')
+        self.pool = ctx.Pool(
+            self.size,
+            initializer=init_eval_process,
+            initargs=(self.memory_limit_mb, self.examp_config),
+            maxtasksperchild=self.max_tasks_per_process or None,
+        )
+        self.pid = os.getpid()
+
+    def terminate(self):
+        if self.pool is not None and self.pid == os.getpid():
+            self.pool.terminate()
+        self.pool = None
+
+    def evaluate(self, target_info, dep_infos, params, cpu_seconds):
+        """
+        Evaluate an examp widget in a worker process.
+
+        See `evaluate_examp_widget()` for params and return value.
+
+        :raises: PfscExcep if no result comes back in time.
+        """
+        if self.pool is None or self.pid != os.getpid():
+            self.start()
+        async_result = self.pool.apply_async(
+            evaluate_examp_widget, (target_info, dep_infos, params, cpu_seconds)
+        )
+        wall_seconds = None if cpu_seconds < 0 else cpu_seconds + WALL_CLOCK_GRACE
+        try:
+            return async_result.get(wall_seconds)
+        except multiprocessing.TimeoutError:
+            # The worker may be stuck in a system call, or in C code where the
+            # CPU limit signal cannot be handled. Terminating the pool is the
+            # only way to get rid of it.
+            self.terminate()
+            msg = f'Timed out while evaluating `{target_info["widget_libpath"]}`.'
+            raise PfscExcep(msg, PECode.MATH_TIMEOUT_EXPIRED)
+
+
+class InProcessEvaluator:
+    """
+    Evaluates examp widgets in the current process, instead of in a pool.
+
+    This is for RQ work horses, i.e. processes forked to perform a single job,
+    and then discarded. Such a process cannot use a pool started by its
+    parent (the pool's own threads do not survive the fork), and starting and
+    tearing down a pool of its own for each job would cost far more than the
+    evaluation itself. Since the horse is already a disposable process, it can
+    instead take the resource limits upon itself. The memory limit stays in
+    place until the horse exits, and RQ's job timeout backs up the CPU limit.
+    """
+
+    def __init__(self, memory_limit_mb, examp_config):
+        self.memory_limit_mb = memory_limit_mb
+        self.examp_config = examp_config
+        self.pid = None
+
+    def start(self):
+        init_eval_environment(self.memory_limit_mb, self.examp_config)
+        self.pid = os.getpid()
+
+    def terminate(self):
+        pass
+
+    def evaluate(self, target_info, dep_infos, params, cpu_seconds):
+        """
+        See `evaluate_examp_widget()` for params and return value.
+        """
+        if self.pid != os.getpid():
+            self.start()
+        return evaluate_examp_widget(target_info, dep_infos, params, cpu_seconds)
+
+
+class ExampMemo:
+    """
+    Memo for the results of examp widget evaluations.
+    """
+
+    def __init__(self, max_size, redis_ttl):
+        self.max_size = max_size
+        self.redis_ttl = redis_ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+        elif self.redis_ttl > 0:
+            from pfsc.rq import get_redis_connection
+            j = get_redis_connection().get(EXAMP_MEMO_REDIS_PREFIX + key)
+            if j is not None:
+                result = json.loads(j)
+                self.remember(key, result)
+        return result
+
+    def put(self, key, result):
+        self.remember(key, result)
+        if self.redis_ttl > 0:
+            from pfsc.rq import get_redis_connection
+            get_redis_connection().set(
+                EXAMP_MEMO_REDIS_PREFIX + key, json.dumps(result), ex=self.redis_ttl
+            )
+
+    def remember(self, key, result):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def make_memo_key(widgetpath, version, params, infos):
+    """
+    Make the memo key for an evaluation.
+
+    :param widgetpath: the libpath of the widget being evaluated.
+    :param version: the full version at which it is being evaluated.
+    :param params: the canonical parameter choices, as returned by
+        `canonicalize_param_choices()`.
+    :param infos: list of the built data of all widgets involved. This can
+        change without a change of version, not only at WIP, but also when a
+        numbered version is rebuilt, so we include it in the key.
+    :return: hex digest (str)
+    """
+    parts = [widgetpath, version, params, infos]
+    j = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(j.encode()).hexdigest()
+
+
+def canonicalize_param_choices(target_info, dep_infos, params):
+    """
+    Reduce a given set of parameter choices to those that matter for the
+    evaluation of a given widget, in a canonical order.
+
+    :param target_info: the built data for the widget to be evaluated.
+    :param dep_infos: list of the built data for the widgets on which it depends.
+    :param params: dict mapping libpaths of param widgets to raw values.
+    :return: list of pairs (libpath, raw value), sorted by libpath.
+    :raises: PfscExcep if a choice is missing for a param on which the
+        target depends.
+    """
+    choices = {}
+    for info in dep_infos:
+        if info['type'] == 'PARAM':
+            lp = info['widget_libpath']
+            if lp not in params:
+                msg = f'Missing required parameter choice for `{lp}`'
+                raise PfscExcep(msg, PECode.MISSING_EXAMPLORE_PARAM)
+            choices[lp] = params[lp].strip()
+    lp = target_info['widget_libpath']
+    if target_info['type'] == 'PARAM' and lp in params:
+        choices[lp] = params[lp].strip()
+    return sorted(choices.items())
+
+
+_pool = None
+_memo = None
+_evaluate_in_process = False
+
+
+def get_examp_eval_pool():
+    """
+    :return: the evaluator (an `ExampEvalPool`, or, if we are set to evaluate
+        in process, an `InProcessEvaluator`) for this process.
+    """
+    global _pool
+    if _pool is None:
+        memory_limit_mb = check_config("EXAMP_EVAL_MEMORY_LIMIT_MB") or 0
+        examp_config = {var: int(check_config(var)) for var in EXAMP_CONFIG_VARS}
+        if _evaluate_in_process:
+            _pool = InProcessEvaluator(memory_limit_mb, examp_config)
+        else:
+            _pool = ExampEvalPool(
+                check_config("EXAMP_EVAL_POOL_SIZE") or 1,
+                memory_limit_mb,
+                check_config("EXAMP_EVAL_MAX_TASKS_PER_PROCESS") or 0,
+                examp_config,
+            )
+    return _pool
+
+
+def prepare_rq_worker(forks_per_job):
+    """
+    Prepare an RQ worker process for examp evaluation, before it starts work.
+    Must be called under an app context.
+
+    A worker that performs all jobs in its own process starts its pool now,
+    and keeps it for as long as it lives.
+
+    A worker that forks a work horse for each job instead imports the examp
+    libraries now, so that each horse inherits them, and sets its horses to
+    evaluate in process (see `InProcessEvaluator`).
+
+    :param forks_per_job: whether the worker forks a work horse for each job.
+    """
+    global _evaluate_in_process
+    if forks_per_job:
+        preload_examp_modules()
+        _evaluate_in_process = True
+    else:
+        get_examp_eval_pool().start()
+
+
+def get_examp_memo():
+    global _memo
+    if _memo is None:
+        _memo = ExampMemo(
+            check_config("EXAMP_EVAL_MEMO_SIZE") or 0,
+            check_config("EXAMP_EVAL_MEMO_REDIS_TTL") or 0,
+        )
+    return _memo
+
+
+def evaluate_examp(widgetpath, version, target_info, dep_infos, params):
+    """
+    Evaluate an examp widget, using the memo if possible.
+
+    :param widgetpath: the libpath of the widget to be evaluated.
+    :param version: the full version at which it is being evaluated.
+    :param target_info: the built data for the widget.
+    :param dep_infos: list of the built data for the widgets on which it
+        depends, in topological order.
+    :param params: dict mapping libpaths of param widgets to raw values.
+    :return: dict, as returned by `evaluate_examp_widget()`, without the
+        `limit_exceeded` field.
+    :raises: PfscExcep if evaluation exceeded a resource limit.
+    """
+    choices = canonicalize_param_choices(target_info, dep_infos, params)
+    key = make_memo_key(widgetpath, version, choices, [target_info] + dep_infos)
+    memo = get_examp_memo()
+    result = memo.get(key)
+    if result is None:
+        cpu_seconds = float(check_config("MATH_CALCULATION_TIMEOUT"))
+        result = get_examp_eval_pool().evaluate(
+            target_info, dep_infos, dict(choices), cpu_seconds
+        )
+        if (limit := result.get('limit_exceeded')) is not None:
+            if limit == LimitExceeded.CPU:
+                msg = f'Timed out while evaluating `{widgetpath}`.'
+                raise PfscExcep(msg, PECode.MATH_TIMEOUT_EXPIRED)
+            msg = f'Exceeded memory limit while evaluating `{widgetpath}`.'
+            raise PfscExcep(msg, PECode.MATH_CALCULATION_FAILED)
+        memo.put(key, result)
+    return result
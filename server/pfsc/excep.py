@@ -78,6 +78,7 @@ class PECode:
     BAD_MODULE_FILENAME = 59
     BUILD_DIR_AND_GRAPH_DB_OUT_OF_SYNC = 60
     SERVICE_DISABLED = 61
+    BAD_JOB_DESCRIPTOR = 62
 
     # input checking
     MISSING_INPUT = 100
@@ -265,6 +266,7 @@ class PECode:
     PARENT_DOES_NOT_EXIST = 283
     MALFORMED_COLOR_CODE = 284
     REPO_DEPENDENCIES_NOT_BUILT = 285
+    MISSING_INDEX_RECORDS = 286
 
     # meson/arclang parsing
     MESON_ERROR = 300
@@ -16,84 +16,147 @@
 
 from flask import current_app
 from flask import g as flask_g
-from gremlin_python.process.anonymous_traversal import traversal
-from gremlin_python.process.graph_traversal import GraphTraversalSource
-from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
-from wsc_grempy_transport.transport import websocket_client_transport_factory
-import neo4j
 
 from pfsc import check_config
 from pfsc.gdb.reader import GraphReader
+from pfsc.gdb.replicas import choose_replica_uri, get_replica_uris, must_read_primary
 from pfsc.gdb.writer import GraphWriter
+from pfsc.gdb.util import isinstance_if_loaded
 
-from pfsc.gdb.cypher.reader import CypherGraphReader, RedisGraphReader
-from pfsc.gdb.cypher.writer import CypherGraphWriter
-from pfsc.gdb.cypher.rg import RedisGraphWrapper
-
-from pfsc.gdb.gremlin.reader import GremlinGraphReader
-from pfsc.gdb.gremlin.writer import GremlinGraphWriter
-from pfsc.gdb.gremlin.util import GtxTx_Gts
+# The driver libraries for the various graph database systems, and our
+# readers and writers built on them, are slow to import. So we import each
+# only when it is actually chosen, by `get_gdb()`.
 
 
 GDB_OBJECT_NAME = "gdb"
 GRAPH_READER_NAME = "graph_reader"
 GRAPH_WRITER_NAME = "graph_writer"
 GREMLIN_REMOTE_NAME = "gremlin_remote"
+# Names for the objects for the read replica (if any) chosen for an app context.
+REPLICA_GDB_OBJECT_NAME = "replica_gdb"
+REPLICA_GRAPH_READER_NAME = "replica_graph_reader"
+REPLICA_GREMLIN_REMOTE_NAME = "replica_gremlin_remote"
+
+
+def make_gdb(uri):
+    """
+    Make a driver object for a graph database.
+
+    :param uri: the URI of the graph database. We decide by its form which
+        graph database system we are using.
+    :return: pair (gdb, remote), where remote is the remote connection (to be
+        closed later) if using Gremlin, else None.
+    """
+    if uri.endswith('/gremlin'):
+        from gremlin_python.process.anonymous_traversal import traversal
+        from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
+        from wsc_grempy_transport.transport import websocket_client_transport_factory
+        from pfsc.gdb.gremlin.util import GtxTx_Gts
+        remote = DriverRemoteConnection(
+            uri, transport_factory=websocket_client_transport_factory)
+        return traversal(GtxTx_Gts).with_remote(remote), remote
+    protocol = uri.split(":")[0]
+    if protocol in ['redis', 'rediss']:
+        from pfsc.gdb.cypher.rg import RedisGraphWrapper
+        return RedisGraphWrapper(uri), None
+    elif protocol in ['bolt', 'neo4j']:
+        username = current_app.config.get('GDB_USERNAME', '')
+        password = current_app.config.get('GDB_PASSWORD', '')
+        import neo4j
+        return neo4j.GraphDatabase.driver(uri, auth=(username, password)), None
+    elif protocol in ['sqlite', 'embedded']:
+        from pfsc.gdb.sqlite.util import SQLiteGraph
+        return SQLiteGraph(uri), None
+    raise Exception(f"Unknown GDB URI format: {uri}")
+
+
+def make_graph_reader(gdb) -> GraphReader:
+    """
+    Make a GraphReader of the right kind for a driver object.
+    """
+    if using_gremlin(gdb):
+        from pfsc.gdb.gremlin.reader import GremlinGraphReader
+        return GremlinGraphReader(gdb)
+    elif using_sqlite(gdb):
+        from pfsc.gdb.sqlite.reader import SQLiteGraphReader
+        return SQLiteGraphReader(gdb)
+    elif using_RedisGraph(gdb):
+        from pfsc.gdb.cypher.reader import RedisGraphReader
+        return RedisGraphReader(gdb)
+    else:
+        from pfsc.gdb.cypher.reader import CypherGraphReader
+        return CypherGraphReader(gdb)
 
 
 def get_gdb():
     """
-    Get a driver object for interacting with the graph database.
+    Get a driver object for interacting with the (primary) graph database.
     """
     if GDB_OBJECT_NAME not in flask_g:
-        uri = current_app.config["GRAPHDB_URI"]
-        # Decide by the form of the URI which graph database system we are using.
-        if uri.endswith('/gremlin'):
-            remote = DriverRemoteConnection(
-                uri, transport_factory=websocket_client_transport_factory)
+        gdb, remote = make_gdb(current_app.config["GRAPHDB_URI"])
+        if remote is not None:
             # Store the remote so it can be closed later.
             setattr(flask_g, GREMLIN_REMOTE_NAME, remote)
-            gdb = traversal(GtxTx_Gts).with_remote(remote)
-        else:
-            protocol = uri.split(":")[0]
-            if protocol in ['redis', 'rediss']:
-                gdb = RedisGraphWrapper(uri)
-            elif protocol in ['bolt', 'neo4j']:
-                username = current_app.config.get('GDB_USERNAME', '')
-                password = current_app.config.get('GDB_PASSWORD', '')
-                gdb = neo4j.GraphDatabase.driver(uri, auth=(username, password))
-            else:
-                raise Exception(f"Unknown GDB URI format: {uri}")
         setattr(flask_g, GDB_OBJECT_NAME, gdb)
     return getattr(flask_g, GDB_OBJECT_NAME)
 
 
-def get_graph_reader() -> GraphReader:
+def get_replica_gdb():
     """
-    Get the GraphReader.
+    Get a driver object for the read replica chosen for this app context.
+
+    :return: the driver object, or None if there are no replicas.
+    """
+    if REPLICA_GDB_OBJECT_NAME not in flask_g:
+        uri = choose_replica_uri()
+        gdb = None
+        if uri is not None:
+            gdb, remote = make_gdb(uri)
+            if remote is not None:
+                setattr(flask_g, REPLICA_GREMLIN_REMOTE_NAME, remote)
+        setattr(flask_g, REPLICA_GDB_OBJECT_NAME, gdb)
+    return getattr(flask_g, REPLICA_GDB_OBJECT_NAME)
+
+
+def get_primary_graph_reader() -> GraphReader:
+    """
+    Get the GraphReader for the primary graph database.
     """
     if GRAPH_READER_NAME not in flask_g:
-        gdb = get_gdb()
-        if using_gremlin(gdb):
-            reader = GremlinGraphReader(gdb)
-        elif using_RedisGraph(gdb):
-            reader = RedisGraphReader(gdb)
-        else:
-            reader = CypherGraphReader(gdb)
-        setattr(flask_g, GRAPH_READER_NAME, reader)
+        setattr(flask_g, GRAPH_READER_NAME, make_graph_reader(get_gdb()))
     return getattr(flask_g, GRAPH_READER_NAME)
 
 
+def get_graph_reader() -> GraphReader:
+    """
+    Get the GraphReader.
+
+    If read replicas are configured, this reads from a replica, unless this
+    app context must read from the primary, in order to see a recent write.
+    See `pfsc.gdb.replicas`.
+    """
+    if get_replica_uris() and not must_read_primary():
+        if REPLICA_GRAPH_READER_NAME not in flask_g:
+            setattr(flask_g, REPLICA_GRAPH_READER_NAME, make_graph_reader(get_replica_gdb()))
+        return getattr(flask_g, REPLICA_GRAPH_READER_NAME)
+    return get_primary_graph_reader()
+
+
 def get_graph_writer() -> GraphWriter:
     """
-    Get the GraphWriter.
+    Get the GraphWriter. This always uses the primary graph database.
     """
     if GRAPH_WRITER_NAME not in flask_g:
-        reader = get_graph_reader()
-        if isinstance(reader, GremlinGraphReader):
+        reader = get_primary_graph_reader()
+        if using_gremlin(reader.gdb):
+            from pfsc.gdb.gremlin.writer import GremlinGraphWriter
             use_transactions = current_app.config["USE_TRANSACTIONS"]
             writer = GremlinGraphWriter(reader, use_transactions)
+        elif using_sqlite(reader.gdb):
+            from pfsc.gdb.sqlite.writer import SQLiteGraphWriter
+            writer = SQLiteGraphWriter(reader)
         else:
+            from pfsc.gdb.cypher.writer import CypherGraphWriter
             writer = CypherGraphWriter(reader)
         setattr(flask_g, GRAPH_WRITER_NAME, writer)
     return getattr(flask_g, GRAPH_WRITER_NAME)
@@ -104,7 +167,15 @@ def using_RedisGraph(gdb=None):
     Check whether we are using RedisGraph
     """
     gdb = gdb or get_gdb()
-    return isinstance(gdb, RedisGraphWrapper)
+    return isinstance_if_loaded(gdb, 'pfsc.gdb.cypher.rg', 'RedisGraphWrapper')
+
+
+def using_sqlite(gdb=None):
+    """
+    Check whether we are using the embedded SQLite graph database.
+    """
+    gdb = gdb or get_gdb()
+    return isinstance_if_loaded(gdb, 'pfsc.gdb.sqlite.util', 'SQLiteGraph')
 
 
 def using_gremlin(gdb=None):
@@ -112,7 +183,8 @@ def using_gremlin(gdb=None):
     Check whether we are using Gremlin.
     """
     gdb = gdb or get_gdb()
-    return isinstance(gdb, GraphTraversalSource)
+    return isinstance_if_loaded(
+        gdb, 'gremlin_python.process.graph_traversal', 'GraphTraversalSource')
 
 
 def building_in_gdb():
@@ -120,19 +192,23 @@ def building_in_gdb():
 
 
 def close_gdb(e=None):
-    gdb = flask_g.pop(GDB_OBJECT_NAME, None)
-    if gdb is not None:
-        if using_gremlin(gdb):
-            if remote := getattr(flask_g, GREMLIN_REMOTE_NAME):
-                remote.close()
-            # Alternatively:
-            '''
-            for strat in gdb.traversal_strategies.traversal_strategies:
-                if rc := getattr(strat, 'remote_connection'):
-                    rc.close()
-            '''
-        else:
-            gdb.close()
+    for gdb_name, remote_name in [
+        (GDB_OBJECT_NAME, GREMLIN_REMOTE_NAME),
+        (REPLICA_GDB_OBJECT_NAME, REPLICA_GREMLIN_REMOTE_NAME),
+    ]:
+        gdb = flask_g.pop(gdb_name, None)
+        if gdb is not None:
+            if using_gremlin(gdb):
+                if remote := flask_g.pop(remote_name, None):
+                    remote.close()
+                # Alternatively:
+                '''
+                for strat in gdb.traversal_strategies.traversal_strategies:
+                    if rc := getattr(strat, 'remote_connection'):
+                        rc.close()
+                '''
+            else:
+                gdb.close()
 
 
 def init_app(app):
@@ -25,6 +25,7 @@ from collections import defaultdict
 
 from pfsc.constants import IndexType
 from pfsc.gdb.k import make_kNode_from_jNode
+from pfsc.tracing import trace_module_functions
 
 
 def ix00220(mii, tx, verbose=False):
@@ -320,3 +321,6 @@ def ix00282c03f(tx, props, tail_type, reln_type, head_type):
     """
     #print(query)
     tx.run(query, props=props)
+
+
+trace_module_functions(globals(), 'ix', lambda name: name.startswith('ix'))
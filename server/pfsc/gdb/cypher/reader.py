@@ -77,6 +77,21 @@ class CypherGraphReader(GraphReader):
             infos = infos[:-1]
         return infos
 
+    def get_all_versions_indexed(self, include_wip=False):
+        rg = self.using_rg()
+        res = self.session.run(
+            f"""
+            MATCH (v:{IndexType.VERSION})
+            RETURN {'v' if rg else 'properties(v)'}
+            """
+        )
+        infos = [record[0] for record in res]
+        if rg:
+            infos = [node.properties for node in infos]
+        if not include_wip:
+            infos = [info for info in infos if info['major'] != WIP_TAG]
+        return infos
+
     def version_is_already_indexed(self, repopath, version):
         res = self.session.run(
             f"""
@@ -185,17 +200,44 @@ class CypherGraphReader(GraphReader):
         record = res.single()
         return None if record is None else record.value()
 
-    def get_ancestor_chain(self, deducpath, major):
-        major = self.adaptall(major)
+    def get_wip_libpaths_under_module(self, modpath):
+        res = self.session.run(
+            f"""
+            MATCH (v {{modpath: $modpath, major: $WIP}}) RETURN v.libpath
+            """, modpath=modpath, WIP=WIP_TAG
+        )
+        return {rec.value() for rec in res}
+
+    def _get_ancestry_internal(self, deducpath, major0):
+        res = self.session.run(f"""
+        MATCH (d:{IndexType.DEDUC} {{libpath: $deducpath}})
+        WHERE d.major <= $major < d.cut
+        RETURN d.major, d.{IndexType.EP_ANCESTORS}
+        """, deducpath=deducpath, major=major0)
+        record = res.single()
+        return None if record is None else (record[0], record[1])
+
+    def _get_cuts_internal(self, libpaths_and_majors):
+        # Requiring `major < cut` means we skip any j-node having an empty
+        # interval, as can arise under major version zero.
+        res = self.session.run(f"""
+        UNWIND $pairs AS pair
+        MATCH (e:{IndexType.DEDUC} {{libpath: pair[0]}})
+        WHERE e.major = pair[1] AND e.major < e.cut
+        RETURN e.libpath, e.major, e.cut
+        """, pairs=libpaths_and_majors)
+        return {(v[0], v[1]): v[2] for v in res}
+
+    def _get_ancestor_chain_by_traversal(self, deducpath, major0):
         # Note that we do not need to check the major intervals of the EXPANDS
         # relations. This is because any given j-node can have at most one
         # EXPANDS relation leaving it.
         res = self.session.run(f"""
         MATCH p = (d:{IndexType.DEDUC} {{libpath: $deducpath}})-[:{IndexType.EXPANDS}*1..]->(e:{IndexType.DEDUC})
         WHERE d.major <= $major < d.cut
-        RETURN e.libpath, relationships(p)[-1].{IndexType.EP_TAKEN_AT}, e.cut, length(p) AS n
+        RETURN e.libpath, relationships(p)[-1].{IndexType.EP_TAKEN_AT}, e.cut, e.major, length(p) AS n
         ORDER BY n DESC
-        """, deducpath=deducpath, major=major)
+        """, deducpath=deducpath, major=major0)
         # Unlike NJ, RG seems to need values to be RETURNED in order to be able
         # to work properly with them in a subsequent ORDER BY clause. If you do not
         # include `p` or `length(p)` in the RETURN, then RG can't do the ORDER BY
@@ -214,6 +256,15 @@ class CypherGraphReader(GraphReader):
         """, libpaths=libpaths, major=major0)
         return {v[0] for v in res}
 
+    def _get_materialized_deducs_internal(self, libpaths, major0):
+        res = self.session.run(f"""
+        MATCH (u)
+        WHERE u.libpath in $libpaths AND u.major <= $major < u.cut
+            AND u.{IndexType.EP_DEDUC} IS NOT NULL
+        RETURN u.libpath, u.{IndexType.EP_DEDUC}
+        """, libpaths=libpaths, major=major0)
+        return {v[0]: v[1] for v in res}
+
     def _get_deduction_closure_internal(self, libpaths, major0):
         # Note: we match no label on node (u) in the query below, since we want
         # to catch anything under a deduc, including j-nodes of label `Ghost` and
@@ -30,8 +30,8 @@ from tenacity import (
 )
 
 from pfsc import check_config
-from pfsc.constants import MAIN_TASK_QUEUE_NAME
-from pfsc.rq import get_rqueue
+from pfsc.constants import QueueClass
+from pfsc.rq import get_task_queue
 
 
 class RedisGraphWrapper:
@@ -63,7 +63,7 @@ class RedisGraphWrapper:
         self.uri = uri
         r = Redis.from_url(uri)
         self.graph = redisgraph.graph.Graph(RedisGraphWrapper.GRAPH_NAME, r)
-        self.rqueue = get_rqueue(MAIN_TASK_QUEUE_NAME)
+        self.rqueue = get_task_queue(QueueClass.MAINTENANCE)
         #self.has_open_transaction = False
 
     def execute_command(self, *args, **kwargs):
@@ -39,12 +39,20 @@ class CypherGraphWriter(GraphWriter):
     def rollback_transaction(self, tx):
         tx.rollback()
 
-    def _drop_wip_nodes_under_module(self, modpath, tx):
-        tx.run(f"""
-        MATCH (u {{modpath: $modpath, major: $WIP}})
-        OPTIONAL MATCH (u)-[:{IndexType.BUILD}]->(b)
-        DETACH DELETE u, b
-        """, modpath=modpath, WIP=pfsc.constants.WIP_TAG)
+    def _drop_wip_nodes_under_module(self, modpath, tx, keep=None):
+        if keep:
+            tx.run(f"""
+            MATCH (u {{modpath: $modpath, major: $WIP}})
+            WHERE NOT u.libpath IN $keep
+            OPTIONAL MATCH (u)-[:{IndexType.BUILD}]->(b)
+            DETACH DELETE u, b
+            """, modpath=modpath, WIP=pfsc.constants.WIP_TAG, keep=keep)
+        else:
+            tx.run(f"""
+            MATCH (u {{modpath: $modpath, major: $WIP}})
+            OPTIONAL MATCH (u)-[:{IndexType.BUILD}]->(b)
+            DETACH DELETE u, b
+            """, modpath=modpath, WIP=pfsc.constants.WIP_TAG)
 
     def ix0200(self, mii, tx):
         indexing.ix00220(mii, tx)
@@ -207,7 +215,7 @@ class CypherGraphWriter(GraphWriter):
         SET u.properties = $j_props
         """, username=username, j_props=j_props)
 
-    def record_user_notes(self, username, user_notes):
+    def _record_user_notes(self, username, user_notes):
         major0 = self.reader.adaptall(user_notes.goal_major)
         # It's important that we structure this as a transaction, for the case
         # of the user of the one-container app on their own machine. There we
@@ -21,6 +21,7 @@ from gremlin_python.process.graph_traversal import __
 
 from pfsc.constants import IndexType
 from pfsc.gdb.gremlin.util import lp_covers, set_kReln_reln_props
+from pfsc.tracing import trace_module_functions
 
 
 def ix002682(mii, gtx, N=12):
@@ -198,3 +199,6 @@ def ix002680(mii, gtx):
     if tr:
         tr.iterate()
     return new_targeting_relns
+
+
+trace_module_functions(globals(), 'ix', lambda name: name.startswith('ix'))
@@ -55,6 +55,12 @@ class GremlinGraphReader(GraphReader):
             infos = infos[:-1]
         return infos
 
+    def get_all_versions_indexed(self, include_wip=False):
+        infos = self.g.V().has_label(IndexType.VERSION).element_map().to_list()
+        if not include_wip:
+            infos = [info for info in infos if info['major'] != WIP_TAG]
+        return infos
+
     def version_is_already_indexed(self, repopath, version):
         n = self.g.V().has_label(IndexType.VERSION). \
             has('repopath', repopath).has('version', version).count().next()
@@ -173,16 +179,44 @@ class GremlinGraphReader(GraphReader):
         tr = lp_covers(libpath, major0, self.g.V()).values('modpath')
         return None if not tr.has_next() else tr.next()
 
-    def get_ancestor_chain(self, deducpath, major):
-        major0 = self.adaptall(major)
+    def get_wip_libpaths_under_module(self, modpath):
+        return set(
+            self.g.V().has('modpath', modpath).has('major', WIP_TAG)
+                .values('libpath').to_list()
+        )
+
+    def _get_ancestry_internal(self, deducpath, major0):
+        tr = lp_covers(deducpath, major0, self.g.V().has_label(IndexType.DEDUC)) \
+            .value_map('major', IndexType.EP_ANCESTORS)
+        if not tr.has_next():
+            return None
+        m = tr.next()
+        ancestors = m.get(IndexType.EP_ANCESTORS)
+        return m['major'][0], (None if ancestors is None else ancestors[0])
+
+    def _get_cuts_internal(self, libpaths_and_majors):
+        libpaths = list({lp for lp, _ in libpaths_and_majors})
+        res = among_lps(libpaths, self.g.V().has_label(IndexType.DEDUC)) \
+            .value_map('libpath', 'major', 'cut').to_list()
+        wanted = {tuple(pair) for pair in libpaths_and_majors}
+        cuts = {}
+        for m in res:
+            libpath, major, cut = m['libpath'][0], m['major'][0], m['cut'][0]
+            # Skip any j-node having an empty interval, as can arise under
+            # major version zero.
+            if (libpath, major) in wanted and major < cut:
+                cuts[(libpath, major)] = cut
+        return cuts
+
+    def _get_ancestor_chain_by_traversal(self, deducpath, major0):
         tr = lp_covers(deducpath, major0, self.g.V())
         tr = tr.repeat(__.out_e(IndexType.EXPANDS).as_('e').in_v().as_('d')).emit()
         tr = tr.select('e', 'd'). \
             by(IndexType.EP_TAKEN_AT). \
-            by(__.value_map('libpath', 'cut'))
+            by(__.value_map('libpath', 'cut', 'major'))
         res = tr.to_list()
         return [
-            [r['d']['libpath'][0], r['e'], r['d']['cut'][0]]
+            [r['d']['libpath'][0], r['e'], r['d']['cut'][0], r['d']['major'][0]]
             for r in reversed(res)
         ]
 
@@ -192,6 +226,12 @@ class GremlinGraphReader(GraphReader):
             covers(major0, __.in_e(IndexType.IMPLIES)).out_v(),
         ).values('libpath').to_set()
 
+    def _get_materialized_deducs_internal(self, libpaths, major0):
+        res = lps_covers(libpaths, major0, self.g.V()) \
+            .has(IndexType.EP_DEDUC) \
+            .value_map('libpath', IndexType.EP_DEDUC).to_list()
+        return {m['libpath'][0]: m[IndexType.EP_DEDUC][0] for m in res}
+
     def _get_deduction_closure_internal(self, libpaths, major0):
         res = among_lps(libpaths, self.g.V()).as_('u') \
             .repeat(
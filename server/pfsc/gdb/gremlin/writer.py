@@ -15,7 +15,7 @@
 # --------------------------------------------------------------------------- #
 
 from gremlin_python.process.graph_traversal import __
-from gremlin_python.process.traversal import TextP
+from gremlin_python.process.traversal import P, TextP
 
 from pfsc.constants import WIP_TAG, IndexType
 from pfsc.gdb.writer import GraphWriter
@@ -55,8 +55,11 @@ class GremlinGraphWriter(GraphWriter):
         if self.use_transactions:
             gtx.rollback()
 
-    def _drop_wip_nodes_under_module(self, modpath, gtx):
-        gtx.V().has('modpath', modpath).has('major', WIP_TAG).union(
+    def _drop_wip_nodes_under_module(self, modpath, gtx, keep=None):
+        t = gtx.V().has('modpath', modpath).has('major', WIP_TAG)
+        if keep:
+            t = t.has('libpath', P.without(keep))
+        t.union(
             __.identity(),
             __.out(IndexType.BUILD),
         ).barrier().drop().iterate()
@@ -212,7 +215,7 @@ class GremlinGraphWriter(GraphWriter):
             __.property('properties', j_props)
         ).iterate()
 
-    def record_user_notes(self, username, user_notes):
+    def _record_user_notes(self, username, user_notes):
         major0 = self.reader.adaptall(user_notes.goal_major)
 
         is_goal = lambda tr: lp_maj(user_notes.goalpath, major0, tr)
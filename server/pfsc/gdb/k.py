@@ -14,16 +14,19 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
-"""k-Nodes and k-Relns. """
+"""
+k-Nodes and k-Relns.
 
-from gremlin_python.process.traversal import (
-    T as gremlin_T,
-    Direction as gremlin_Direction
-)
-import neo4j.graph
-import redisgraph
+Indexing a large repo can make hundreds of thousands of these, so they are
+kept lean: they use `__slots__` instead of instance dicts, their strings are
+interned (so that e.g. the libpath of a kNode, and the tail and head libpaths
+of the kRelns that refer to it, are all one object), and all those that have
+no extra properties share one, read-only, empty dict.
+"""
 
 import pfsc.constants
+from pfsc.gdb.util import isinstance_if_loaded
+from pfsc.util import EMPTY_DICT, intern_str
 
 
 class Versioned:
@@ -31,12 +34,13 @@ class Versioned:
     Currently just a superclass for kObj; potentially for anything that
     is versioned.
     """
+    __slots__ = ('major', 'minor', 'patch', 'cut')
 
     def __init__(self, major, minor, patch, cut):
-        self.major = major
-        self.minor = minor
-        self.patch = patch
-        self.cut = cut
+        self.major = intern_str(major)
+        self.minor = intern_str(minor)
+        self.patch = intern_str(patch)
+        self.cut = intern_str(cut)
 
     def __str__(self):
         if self.major == pfsc.constants.WIP_TAG:
@@ -54,21 +58,42 @@ class kObj(Versioned):
     """
     Superclass for kNodes and kRelns.
     """
+    __slots__ = ('modpath', 'repopath', 'db_uid', 'extra_props')
 
     def __init__(self, modpath, repopath,
                  major, minor, patch, cut,
                  db_uid=None, extra_props=None):
         super().__init__(major, minor, patch, cut)
-        self.modpath = modpath
-        self.repopath = repopath
+        self.modpath = intern_str(modpath)
+        self.repopath = intern_str(repopath)
         self.db_uid = db_uid
-        self.extra_props = extra_props or {}
+        self.extra_props = extra_props or EMPTY_DICT
+
+    def own_extra_props(self):
+        """
+        Make sure we have an extra props dict of our own, and not the shared,
+        read-only `EMPTY_DICT`.
+        """
+        if self.extra_props is EMPTY_DICT:
+            self.extra_props = {}
+        return self.extra_props
+
+    def get_attributes(self):
+        """
+        :return: dict of all our attributes. (Since we use `__slots__`, this
+            is what `vars()` would give, if it worked.)
+        """
+        return {
+            name: getattr(self, name)
+            for cls in type(self).__mro__
+            for name in getattr(cls, '__slots__', ())
+        }
 
     def update_extra_props(self, d):
-        self.extra_props.update(d)
+        self.own_extra_props().update(d)
 
     def set_extra_prop(self, k, v):
-        self.extra_props[k] = v
+        self.own_extra_props()[k] = v
 
     def write_extra_props_internal_pairs(self, initialComma=False, finalComma=False):
         s = ', '.join([f'{k}: ${k}' for k in self.extra_props])
@@ -81,6 +106,7 @@ class kNode(kObj):
     """
     This class provides an alternative representation of graph database nodes.
     """
+    __slots__ = ('node_type', 'libpath', 'uid')
 
     def __init__(self, node_type, libpath, modpath, repopath,
                  major, minor, patch, cut=pfsc.constants.INF_TAG,
@@ -104,9 +130,9 @@ class kNode(kObj):
         """
         super().__init__(modpath, repopath, major, minor, patch, cut,
                          db_uid=db_uid, extra_props=extra_props)
-        self.node_type = node_type
-        self.libpath = libpath
-        self.uid = libpath
+        self.node_type = intern_str(node_type)
+        self.libpath = intern_str(libpath)
+        self.uid = self.libpath
 
     def __eq__(self, other):
         return (
@@ -151,6 +177,10 @@ class kReln(kObj):
     This class provides an alternative representation of edges/relationships
     from our graph database.
     """
+    __slots__ = (
+        'tail_type', 'tail_libpath', 'tail_major', 'reln_type',
+        'head_type', 'head_libpath', 'head_major', 'uid',
+    )
 
     def __init__(self, tail_type, tail_libpath, tail_major, reln_type, head_type, head_libpath, head_major,
                  modpath, repopath,
@@ -185,13 +215,13 @@ class kReln(kObj):
         """
         super().__init__(modpath, repopath, major, minor, patch, cut,
                          db_uid=db_uid, extra_props=extra_props)
-        self.tail_type = tail_type
-        self.tail_libpath = tail_libpath
-        self.tail_major = tail_major
-        self.reln_type = reln_type
-        self.head_type = head_type
-        self.head_libpath = head_libpath
-        self.head_major = head_major
+        self.tail_type = intern_str(tail_type)
+        self.tail_libpath = intern_str(tail_libpath)
+        self.tail_major = intern_str(tail_major)
+        self.reln_type = intern_str(reln_type)
+        self.head_type = intern_str(head_type)
+        self.head_libpath = intern_str(head_libpath)
+        self.head_major = intern_str(head_major)
         self.uid = f'{self.tail_libpath}:{self.reln_type}:{self.head_libpath}'
 
     def __str__(self):
@@ -270,11 +300,11 @@ def make_kNode_from_jNode(j):
     # _necessity_ now that we also work with RedisGraph, where only a single
     # node label is supported.
     # See <https://oss.redis.com/redisgraph/cypher_support/#structural-types>
-    if isinstance(j, redisgraph.node.Node):
+    if isinstance_if_loaded(j, 'redisgraph.node', 'Node'):
         node_type = j.label
         p = j.properties
         db_uid = j.id
-    elif isinstance(j, neo4j.graph.Node):
+    elif isinstance_if_loaded(j, 'neo4j.graph', 'Node'):
         assert len(j.labels) == 1
         node_type = list(j.labels)[0]
         p = j
@@ -283,6 +313,7 @@ def make_kNode_from_jNode(j):
         # Otherwise we should be using Gremlin, in which case `j` should just
         # be a plain dictionary, representing an `elementMap()`.
         assert isinstance(j, dict)
+        from gremlin_python.process.traversal import T as gremlin_T
         node_type = j[gremlin_T.label]
         p = j
         db_uid = j[gremlin_T.id]
@@ -307,7 +338,7 @@ def make_kReln_from_jReln(j):
         u, e, v = j['u'], j['e'], j['v']
     else:
         u, e, v = j
-    if isinstance(e, redisgraph.edge.Edge):
+    if isinstance_if_loaded(e, 'redisgraph.edge', 'Edge'):
         # We don't know which of u and v is src node and dst node
         # (aka tail and head) of the relation. We have to find out
         # by consulting the `e.src_node` and `e.dest_node` properties.
@@ -319,7 +350,7 @@ def make_kReln_from_jReln(j):
         reln_type = e.relation
         p = e.properties
         db_uid = e.id
-    elif isinstance(e, neo4j.graph.Relationship):
+    elif isinstance_if_loaded(e, 'neo4j.graph', 'Relationship'):
         tail_type = list(e.start_node.labels)[0]
         head_type = list(e.end_node.labels)[0]
         tail_props = e.start_node
@@ -331,6 +362,10 @@ def make_kReln_from_jReln(j):
         # Otherwise we should be using Gremlin, in which case `u`, `e`, and `v`
         # should just be plain dictionaries, representing `elementMap()`s.
         assert all(isinstance(x, dict) for x in [u, e, v])
+        from gremlin_python.process.traversal import (
+            T as gremlin_T,
+            Direction as gremlin_Direction
+        )
         nodes = {u[gremlin_T.id]: u, v[gremlin_T.id]: v}
         out_info = e[gremlin_Direction.OUT]
         in_info = e[gremlin_Direction.IN]
@@ -0,0 +1,105 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Batched lookup of origins.
+
+`GraphReader.get_origins()` accepts many libpaths at once, but origins are
+often wanted one at a time, e.g. by each goal widget that names an `altpath`
+in another repo. Within a `batched_origin_lookups()` context, such requests
+are instead collected by an `OriginResolver`, and looked up together when
+the context exits.
+"""
+
+from contextlib import contextmanager
+
+from flask import g as flask_g
+
+from pfsc.gdb import get_graph_reader
+
+ORIGIN_RESOLVER_NAME = "origin_resolver"
+
+
+class OriginResolver:
+    """
+    Collects requests for origins, and then looks them up with one call to
+    `GraphReader.get_origins()` per (label, major) pair.
+    """
+
+    def __init__(self, graph_reader=None):
+        """
+        :param graph_reader: optional GraphReader. If not given, we use the
+            one returned by `get_graph_reader()`.
+        """
+        self.graph_reader = graph_reader
+        # Lists of pairs (libpath, callback), under (label, major) pairs:
+        self.requests = {}
+        self.num_queries = 0
+
+    def request(self, label, major, libpath, callback):
+        """
+        Request the origin of a libpath.
+
+        :param label: the index type of the entity, as for `get_origins()`
+        :param major: the major version, as for `get_origins()`
+        :param libpath: the libpath of the entity
+        :param callback: function to be called with the origin, or with None
+            if no origin is found
+        """
+        self.requests.setdefault((label, major), []).append((libpath, callback))
+
+    def resolve(self):
+        """
+        Look up all the requested origins, and pass them to their callbacks.
+        """
+        reader = self.graph_reader or get_graph_reader()
+        requests, self.requests = self.requests, {}
+        for (label, major), pairs in requests.items():
+            libpaths = list(dict.fromkeys(libpath for libpath, _ in pairs))
+            origins = reader.get_origins({label: libpaths}, major)
+            self.num_queries += 1
+            for libpath, callback in pairs:
+                callback(origins.get(libpath))
+
+
+def get_origin_resolver():
+    """
+    :return: the `OriginResolver` of the active `batched_origin_lookups()`
+        context, or None if there is none.
+    """
+    return flask_g.get(ORIGIN_RESOLVER_NAME)
+
+
+@contextmanager
+def batched_origin_lookups(graph_reader=None):
+    """
+    Collect requests for origins made within this context, and look them all
+    up when it exits.
+
+    Code that wants an origin should check for a resolver with
+    `get_origin_resolver()`, and, if there is one, make a request of it
+    instead of calling `get_origins()` directly.
+
+    :param graph_reader: optional GraphReader, passed to the `OriginResolver`
+    """
+    outer = get_origin_resolver()
+    resolver = OriginResolver(graph_reader=graph_reader)
+    setattr(flask_g, ORIGIN_RESOLVER_NAME, resolver)
+    try:
+        yield resolver
+        resolver.resolve()
+    finally:
+        setattr(flask_g, ORIGIN_RESOLVER_NAME, outer)
@@ -29,6 +29,7 @@ from pfsc.gdb.user import User
 from pfsc.gdb.util import SimpleGraph
 from pfsc.lang.theorygraph import TheoryNode, TheoryEdge, TheoryGraph
 from pfsc.permissions import have_repo_permission, ActionType
+from pfsc.tracing import trace_methods
 
 
 class EnrichmentRecord:
@@ -75,12 +76,22 @@ class EnrichmentRecord:
         return self.max_pfv < other.max_pfv
 
 
+def is_traced_reader_method(name):
+    return not name.startswith('_')
+
+
 class GraphReader:
     """Abstract base class for graph database readers. """
 
     def __init__(self, gdb):
         self.gdb = gdb
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Every public method makes a span (see `pfsc.tracing`), so that the
+        # spans of builds and requests count the GDB calls made within them.
+        trace_methods(cls, 'gdb', is_traced_reader_method)
+
     @staticmethod
     def adaptall(version):
         return adapt_gen_version_to_major_index_prop(version)
@@ -129,6 +140,17 @@ class GraphReader:
         """
         raise NotImplementedError
 
+    def get_all_versions_indexed(self, include_wip=False):
+        """
+        Say which versions of all repos have so far been indexed.
+
+        :param include_wip: if True, include WIP versions.
+        :return: list of property dicts, as in `get_versions_indexed()`, for
+            all versions of all repos that have so far been indexed, in no
+            particular order.
+        """
+        raise NotImplementedError
+
     def get_versions_for_k_objects(self, objects, include_wip=False):
         """
         Given an iterable of kObj instances (kNodes and/or kRelns), determine
@@ -421,6 +443,15 @@ class GraphReader:
         """
         raise NotImplementedError
 
+    def get_wip_libpaths_under_module(self, modpath):
+        """
+        Get the libpaths of all the WIP j-nodes having a given modpath.
+
+        :param modpath: the libpath of the module in question
+        :return: set of libpaths
+        """
+        raise NotImplementedError
+
     def get_ancestor_chain(self, deducpath, major):
         """
         Suppose, for a given major version of a deduction d, the chain of ancestors
@@ -440,6 +471,83 @@ class GraphReader:
         that is both >= `taken_at`, and strictly < `cut`; in other words, any version
         of the parent deduc's repo from the time the expansion was written, to the
         time (if any) at which a breaking change was made that affected the parent deduc.
+
+        If the deduc's ancestry was materialized at indexing time, we need only
+        look up the cuts of the ancestors' j-nodes; otherwise we fall back on
+        traversing EXPANDS edges.
+        """
+        major0 = self.adaptall(major)
+        info = self._get_ancestry_internal(deducpath, major0)
+        if info is None:
+            return []
+        _, ancestors_json = info
+        if ancestors_json is None:
+            return [
+                [libpath, taken_at, cut]
+                for libpath, taken_at, cut, _ in
+                self._get_ancestor_chain_by_traversal(deducpath, major0)
+            ]
+        ancestry = json.loads(ancestors_json)
+        if not ancestry:
+            return []
+        cuts = self._get_cuts_internal([[lp, M] for lp, M, _ in ancestry])
+        return [
+            [libpath, taken_at, cuts.get((libpath, M))]
+            for libpath, M, taken_at in ancestry
+        ]
+
+    def get_ancestry(self, deducpath, major):
+        """
+        Get the ancestry of a deduc, in the form that is materialized on Deduc
+        j-nodes at indexing time under the `IndexType.EP_ANCESTORS` property.
+
+        :param deducpath: the libpath of the deduc.
+        :param major: the major version at which the deduc is to be taken.
+        :return: None if no such deduc can be found; otherwise a pair
+            `(major, ancestry)`, where `major` is the major version of the
+            deduc's j-node, and `ancestry` is the list
+            `[[libpath, major, taken_at], ...]` of its ancestors, root first,
+            in which each `major` is that of the ancestor's j-node.
+        """
+        major0 = self.adaptall(major)
+        info = self._get_ancestry_internal(deducpath, major0)
+        if info is None:
+            return None
+        jmajor, ancestors_json = info
+        if ancestors_json is None:
+            ancestry = [
+                [libpath, M, taken_at]
+                for libpath, taken_at, _, M in
+                self._get_ancestor_chain_by_traversal(deducpath, major0)
+            ]
+        else:
+            ancestry = json.loads(ancestors_json)
+        return jmajor, ancestry
+
+    def _get_ancestry_internal(self, deducpath, major0):
+        """
+        :return: None if there is no Deduc j-node for this libpath at this
+            major version; otherwise the pair `(major, ancestors)` of that
+            j-node's `major` and `ancestors` properties, the latter being None
+            if the j-node has none (i.e. was indexed before these were
+            materialized).
+        """
+        raise NotImplementedError
+
+    def _get_cuts_internal(self, libpaths_and_majors):
+        """
+        :param libpaths_and_majors: list of pairs `[libpath, major]`, each
+            identifying a Deduc j-node.
+        :return: dict mapping tuples `(libpath, major)` to the `cut` property
+            of the j-node so identified.
+        """
+        raise NotImplementedError
+
+    def _get_ancestor_chain_by_traversal(self, deducpath, major0):
+        """
+        :return: list `[[libpath, taken_at, cut, major], ...]`, root first,
+            as in `get_ancestor_chain()`, but with each ancestor's j-node
+            major added.
         """
         raise NotImplementedError
 
@@ -479,14 +587,30 @@ class GraphReader:
         those libpaths that do point to nodes by the libpaths of the deducs to which
         those nodes belong. Therefore it is very much a "garbage in, garbage out" situation.
         Buyer beware.
+
+        For j-nodes on which the enclosing deduc was materialized at indexing
+        time, this is a simple lookup. We fall back on traversing UNDER edges
+        for any others.
         """
         closure = set()
         for major, libpaths in libpaths_by_major.items():
             major0 = self.adaptall(major)
-            node2deduc = self._get_deduction_closure_internal(libpaths, major0)
+            libpaths = list(libpaths)
+            node2deduc = self._get_materialized_deducs_internal(libpaths, major0)
+            remaining = [lp for lp in libpaths if lp not in node2deduc]
+            if remaining:
+                node2deduc.update(
+                    self._get_deduction_closure_internal(remaining, major0))
             closure.update({node2deduc.get(lp, lp) for lp in libpaths})
         return closure
 
+    def _get_materialized_deducs_internal(self, libpaths, major0):
+        """
+        :return: dict mapping those of the given libpaths whose j-nodes carry
+            a `deduc` property, to the value of that property.
+        """
+        raise NotImplementedError
+
     def _get_deduction_closure_internal(self, libpaths, major0):
         raise NotImplementedError
 
@@ -819,3 +943,6 @@ class GraphReader:
             else the current JSON string value.
         """
         raise NotImplementedError
+
+
+trace_methods(GraphReader, 'gdb', is_traced_reader_method)
@@ -0,0 +1,174 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Routing of reads to replicas of the graph database.
+
+When `GRAPHDB_REPLICA_URIS` is configured, each app context that reads from
+the GDB is given one of the replicas, in turn. Writers always use the
+primary (at `GRAPHDB_URI`).
+
+Since replicas lag behind the primary, we guard against stale reads with
+"read-your-writes" tokens. Whenever a user's notes are recorded, or a module
+is indexed, we note the time of the write:
+
+    * in the Flask session, if there is a request, so that this session
+      reads from the primary until the replicas have had time to catch up,
+      namely `GRAPHDB_REPLICA_MAX_LAG` seconds;
+
+    * in Redis, under a key named for the requester, and expiring after the
+      same time, if there is no request, or if we are in an RQ job (where
+      builds usually run). A job may have a request context, but its session
+      is a throwaway, made up only to carry the session vars the job needs,
+      so a token stored there would never reach the user. Instead, the job
+      is told for whom it works (see `set_job_requesters()`), and the
+      requester's later sessions find the token in Redis. Writes made for no
+      identifiable requester leave no token.
+
+Requesters are identified by `pfsc.session.get_requester_identity()`, just as
+for per-requester job limits. Other users' reads are unaffected by the token,
+and keep going to the replicas.
+
+The decision is made once per app context, and the rest of the app context
+then reads from the primary, once it has written.
+"""
+
+import itertools
+import math
+import time
+
+from flask import g as flask_g, has_request_context, session
+from rq import get_current_job
+
+from pfsc import check_config
+from pfsc.session import get_requester_identity
+
+
+# Name in `g` where we store whether this app context must read from the
+# primary. Note: this should _not_ persist across jobs in RQ workers.
+READ_PRIMARY_NAME = "gdb_read_primary"
+# Name in the Flask session, where we store the time of this session's last write.
+SESSION_WRITE_TIME_NAME = "gdb_write_time"
+# Prefix of keys in Redis, where we store the time of each requester's last
+# write made outside of a request, or in an RQ job.
+SHARED_WRITE_TIME_KEY_PREFIX = "pfsc:gdb:write_time:"
+# Name in `g` where an RQ job stores the identities of the requesters for whom
+# it works.
+JOB_REQUESTERS_NAME = "gdb_job_requesters"
+
+_replica_counter = itertools.count()
+
+
+def get_replica_uris():
+    return check_config("GRAPHDB_REPLICA_URIS") or []
+
+
+def choose_replica_uri():
+    """
+    Choose the next replica, in round-robin order.
+
+    :return: a replica URI, or None if there are no replicas.
+    """
+    uris = get_replica_uris()
+    if not uris:
+        return None
+    return uris[next(_replica_counter) % len(uris)]
+
+
+def get_max_lag():
+    return check_config("GRAPHDB_REPLICA_MAX_LAG") or 0
+
+
+def set_job_requesters(identities):
+    """
+    Say for whom the current RQ job works, so that its writes are seen by
+    those requesters' reads.
+
+    :param identities: iterable of identities, as returned by
+        `pfsc.session.get_requester_identity()` at enqueueing time. Nones
+        are ignored.
+    """
+    setattr(flask_g, JOB_REQUESTERS_NAME, {i for i in identities if i is not None})
+
+
+def get_requester_identities():
+    """
+    :return: set of identities of the requesters for whom this app context
+        works.
+    """
+    if JOB_REQUESTERS_NAME in flask_g:
+        return getattr(flask_g, JOB_REQUESTERS_NAME)
+    identity = get_requester_identity()
+    return set() if identity is None else {identity}
+
+
+def shared_write_time_key(identity):
+    return SHARED_WRITE_TIME_KEY_PREFIX + identity
+
+
+def note_primary_write():
+    """
+    Record that the primary GDB has just been written to, so that reads that
+    should see the write go to the primary.
+    """
+    if not get_replica_uris():
+        return
+    setattr(flask_g, READ_PRIMARY_NAME, True)
+    now = time.time()
+    in_request = has_request_context()
+    if in_request:
+        session[SESSION_WRITE_TIME_NAME] = now
+    if get_current_job() is not None or not in_request:
+        identities = get_requester_identities()
+        if identities:
+            from pfsc.rq import get_redis_connection
+            redis = get_redis_connection()
+            ex = max(1, math.ceil(get_max_lag()))
+            for identity in identities:
+                redis.set(shared_write_time_key(identity), now, ex=ex)
+
+
+def recent_write_time():
+    """
+    :return: the time of the most recent write that this app context should
+        see, if the replicas may not yet have caught up with it, else None.
+    """
+    max_lag = get_max_lag()
+    if has_request_context():
+        t = session.get(SESSION_WRITE_TIME_NAME)
+        if t is not None and time.time() - t < max_lag:
+            return t
+    identities = get_requester_identities()
+    if not identities:
+        return None
+    from pfsc.rq import get_redis_connection
+    try:
+        redis = get_redis_connection()
+        times = [redis.get(shared_write_time_key(i)) for i in identities]
+    except Exception:
+        # If we can't tell, play it safe.
+        return time.time()
+    times = [float(t) for t in times if t is not None]
+    return max(times) if times else None
+
+
+def must_read_primary():
+    """
+    Say whether this app context must read from the primary GDB.
+    """
+    if READ_PRIMARY_NAME not in flask_g:
+        setattr(flask_g, READ_PRIMARY_NAME, recent_write_time() is not None)
+    return getattr(flask_g, READ_PRIMARY_NAME)
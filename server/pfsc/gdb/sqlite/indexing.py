@@ -0,0 +1,107 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Indexing functions for the embedded SQLite graph database.
+"""
+
+import json
+
+from pfsc.constants import IndexType
+from pfsc.gdb.sqlite.util import (
+    NODE_COLUMNS, RELN_COLUMNS, covers, in_list, split_props,
+)
+from pfsc.tracing import trace_module_functions
+
+
+def ix00220(mii, tx, verbose=False):
+    if mii.V_cut:
+        mii.note_begin_indexing_phase(220)
+        ids = [mii.existing_k_nodes[uid].db_uid for uid in mii.V_cut]
+        if verbose:
+            print(f'Marking {len(ids)} j-nodes as cut.')
+        tx.execute(f"""
+        UPDATE nodes AS u SET cut = :cut
+        WHERE u.repopath = :repopath AND {in_list('u.id', 'ids')}
+        """, {'repopath': mii.repopath, 'ids': json.dumps(ids), 'cut': mii.major})
+        mii.note_task_element_completed(220, len(ids))
+
+
+def ix00240(mii, tx, verbose=False):
+    if mii.E_cut:
+        mii.note_begin_indexing_phase(240)
+        ids = [mii.existing_k_relns[uid].db_uid for uid in mii.E_cut]
+        if verbose:
+            print(f'Marking {len(ids)} j-relns as cut.')
+        tx.execute(f"""
+        UPDATE edges AS r SET cut = :cut
+        WHERE r.repopath = :repopath AND {in_list('r.id', 'ids')}
+        """, {'repopath': mii.repopath, 'ids': json.dumps(ids), 'cut': mii.major})
+        mii.note_task_element_completed(240, len(ids))
+
+
+def ix00261(mii, tx, verbose=False):
+    """
+    We add all nodes with one statement, executed over the list of rows.
+    """
+    if mii.V_add:
+        mii.note_begin_indexing_phase(260)
+        kNodes = [mii.get_kNode(uid) for uid in mii.V_add]
+        if verbose:
+            print(f'Adding {len(kNodes)} new j-nodes.')
+        rows = []
+        for k in kNodes:
+            values, rest = split_props(k.get_property_dict(), NODE_COLUMNS)
+            rows.append([k.node_type, *values, rest])
+        tx.executemany(f"""
+        INSERT INTO nodes (label, {', '.join(NODE_COLUMNS)}, props)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        mii.note_task_element_completed(260, len(kNodes))
+
+
+def ix00282s(mii, tx, diagnostics=False):
+    """
+    As in the Cypher version, we use structured property dicts. Each relation
+    is added between every pair of j-nodes that match its endpoints.
+    """
+    new_targeting_relns = []
+    if mii.E_add:
+        mii.note_begin_indexing_phase(280)
+        kRelns = [mii.get_kReln(uid) for uid in mii.E_add]
+        if diagnostics:
+            print(f'Adding {len(kRelns)} new j-relns.')
+        rows = []
+        for k in kRelns:
+            prop = k.get_structured_property_dict()
+            values, rest = split_props(prop['reln'], RELN_COLUMNS)
+            rows.append([
+                k.reln_type, *values, rest,
+                k.tail_type, prop['tail']['libpath'], prop['tail']['major'],
+                k.head_type, prop['head']['libpath'], prop['head']['major'],
+            ])
+        tx.executemany(f"""
+        INSERT INTO edges (label, {', '.join(RELN_COLUMNS)}, props, tail, head)
+        SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, t.id, h.id FROM nodes t, nodes h
+        WHERE t.label = ?9 AND t.libpath = ?10 AND {covers('t', '?11')}
+        AND h.label = ?12 AND h.libpath = ?13 AND {covers('h', '?14')}
+        """, rows)
+        new_targeting_relns = [k for k in kRelns if k.reln_type == IndexType.TARGETS]
+        mii.note_task_element_completed(280, len(kRelns))
+    return new_targeting_relns
+
+
+trace_module_functions(globals(), 'ix', lambda name: name.startswith('ix'))
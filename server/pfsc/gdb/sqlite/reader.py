@@ -0,0 +1,564 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import json
+
+from pfsc.constants import IndexType, WIP_TAG
+from pfsc.gdb.reader import GraphReader
+from pfsc.gdb.sqlite.util import (
+    NODE_COLUMNS, RELN_JOIN,
+    covers, in_list, is_user, prefix_range, prefix_params, knode_columns, kreln_columns,
+    make_kNode_from_row, make_kReln_from_row, node_props_from_row,
+)
+from pfsc.gdb.user import UserNotes
+
+
+# Separates the segments of a path of UNDER edges, when we write them in a
+# single string. (This is the ASCII "unit separator".)
+SEGMENT_SEP = '\x1f'
+
+UNDER_SEGMENT = "coalesce(json_extract(e.props, '$.segment'), '')"
+
+
+class SQLiteGraphReader(GraphReader):
+    """
+    GraphReader for the embedded SQLite graph database.
+
+    Where the Cypher reader matches variable-length paths, we use recursive
+    common table expressions (CTEs). Since paths of `UNDER` edges form trees,
+    and `EXPANDS` edges form forests, these find the same nodes, each just
+    once.
+    """
+
+    def __init__(self, gdb):
+        super().__init__(gdb)
+        self.session = self.gdb.session()
+
+    def query(self, sql, **params):
+        return self.session.execute(sql, params).fetchall()
+
+    def query_one(self, sql, **params):
+        return self.session.execute(sql, params).fetchone()
+
+    def count(self, sql, **params):
+        return self.query_one(sql, **params)[0]
+
+    def num_nodes_in_db(self):
+        return self.count("SELECT count(*) FROM nodes")
+
+    def num_edges_in_db(self):
+        return self.count("SELECT count(*) FROM edges")
+
+    def all_nodes_under_repo(self, repopath):
+        rows = self.query(f"""
+        SELECT {knode_columns('n')} FROM nodes n WHERE n.repopath = :repopath
+        """, repopath=repopath)
+        return [make_kNode_from_row(row) for row in rows]
+
+    def all_relns_under_repo(self, repopath):
+        rows = self.query(f"""
+        SELECT {kreln_columns('t', 'e', 'h')} FROM {RELN_JOIN}
+        WHERE e.repopath = :repopath
+        """, repopath=repopath)
+        return [make_kReln_from_row(row) for row in rows]
+
+    def get_versions_indexed(self, repopath, include_wip=False):
+        rows = self.query(f"""
+        SELECT {', '.join(NODE_COLUMNS)}, props FROM nodes v
+        WHERE v.label = '{IndexType.VERSION}' AND v.repopath = :repopath
+        ORDER BY json_extract(v.props, '$.full')
+        """, repopath=repopath)
+        infos = [node_props_from_row(row) for row in rows]
+        if infos and (not include_wip) and infos[-1]['major'] == WIP_TAG:
+            infos = infos[:-1]
+        return infos
+
+    def get_all_versions_indexed(self, include_wip=False):
+        rows = self.query(f"""
+        SELECT {', '.join(NODE_COLUMNS)}, props FROM nodes v
+        WHERE v.label = '{IndexType.VERSION}'
+        """)
+        infos = [node_props_from_row(row) for row in rows]
+        if not include_wip:
+            infos = [info for info in infos if info['major'] != WIP_TAG]
+        return infos
+
+    def version_is_already_indexed(self, repopath, version):
+        n = self.count(f"""
+        SELECT count(*) FROM nodes v
+        WHERE v.label = '{IndexType.VERSION}' AND v.repopath = :repopath
+        AND json_extract(v.props, '$.version') = :version
+        """, repopath=repopath, version=version)
+        assert n < 2
+        return n == 1
+
+    def find_move_conjugate(self, libpath, major):
+        major = self.adaptall(major)
+        # Find the nearest MOVE edge, leaving t or any node that t is under,
+        # and the segments of the UNDER edges leading there.
+        rec = self.query_one(f"""
+        WITH RECURSIVE up(id, n, segments) AS (
+            SELECT t.id, 0, '' FROM nodes t
+            WHERE t.libpath = :libpath AND {covers('t')}
+            UNION ALL
+            SELECT e.head, up.n + 1, up.segments || {UNDER_SEGMENT} || :sep
+            FROM up JOIN edges e ON e.tail = up.id AND e.label = '{IndexType.UNDER}'
+        )
+        SELECT up.segments, r.id, r.label
+        FROM up JOIN edges m ON m.tail = up.id AND m.label = '{IndexType.MOVE}'
+        JOIN nodes r ON r.id = m.head
+        ORDER BY up.n LIMIT 1
+        """, libpath=libpath, major=major, sep=SEGMENT_SEP)
+        if rec is None:
+            return None
+        segments, r_id, r_label = rec
+        if r_label == IndexType.VOID:
+            return IndexType.VOID
+        # Find the node under r by the same segments. We build each path
+        # from the top down, so we can stop following it as soon as it is
+        # not a suffix of the one we want.
+        new_segments = f"{UNDER_SEGMENT} || :sep || down.segments"
+        rec = self.query_one(f"""
+        WITH RECURSIVE down(id, segments) AS (
+            SELECT :r_id, ''
+            UNION ALL
+            SELECT e.tail, {new_segments}
+            FROM down JOIN edges e ON e.head = down.id AND e.label = '{IndexType.UNDER}'
+            WHERE length({new_segments}) <= length(:segments)
+            AND substr(:segments, length(:segments) - length({new_segments}) + 1) = {new_segments}
+        )
+        SELECT {knode_columns('q')} FROM down JOIN nodes q ON q.id = down.id
+        WHERE down.segments = :segments
+        """, r_id=r_id, segments=segments, sep=SEGMENT_SEP)
+        return None if rec is None else make_kNode_from_row(rec)
+
+    def get_existing_objects(self, modpath, major, recursive):
+        params = {'modpath': modpath, 'major': major}
+        node_cond = "n.modpath = :modpath"
+        reln_cond = "e.modpath = :modpath"
+        # For a recursive build we also need objects defined _under_ this module.
+        if recursive:
+            params.update(prefix_params('base', modpath + '.'))
+            node_cond = f"({node_cond} OR {prefix_range('n.modpath', 'base')})"
+            reln_cond = f"({reln_cond} OR {prefix_range('e.modpath', 'base')})"
+        rows = self.query(f"""
+        SELECT {knode_columns('n')} FROM nodes n
+        WHERE {node_cond} AND {covers('n')}
+        """, **params)
+        existing_k_nodes = {}
+        for row in rows:
+            k = make_kNode_from_row(row)
+            existing_k_nodes[k.uid] = k
+        rows = self.query(f"""
+        SELECT {kreln_columns('t', 'e', 'h')} FROM {RELN_JOIN}
+        WHERE {reln_cond} AND {covers('e')}
+        """, **params)
+        existing_k_relns = {}
+        for row in rows:
+            k = make_kReln_from_row(row)
+            # Reject inferred relations.
+            if k.reln_type in IndexType.INFERRED_RELNS:
+                continue
+            existing_k_relns[k.uid] = k
+        return existing_k_nodes, existing_k_relns
+
+    def _get_origins_internal(self, label, libpaths, major0):
+        return self.query(f"""
+        SELECT u.libpath, u.major, json_extract(u.props, '$.origin') FROM nodes u
+        WHERE u.label = :label AND {in_list('u.libpath', 'libpaths')} AND {covers('u')}
+        """, label=label, libpaths=json.dumps(libpaths), major=major0)
+
+    def _find_enrichments_internal(self, deducpath, major0):
+        rows = self.query(f"""
+        WITH RECURSIVE below(id) AS (
+            SELECT d.id FROM nodes d
+            WHERE d.label = '{IndexType.DEDUC}' AND d.libpath = :deducpath AND {covers('d')}
+            UNION
+            SELECT e.tail FROM below JOIN edges e ON e.head = below.id
+            WHERE e.label = '{IndexType.UNDER}' AND {covers('e')}
+        )
+        SELECT {kreln_columns('t', 'e', 'h')} FROM below
+        JOIN edges e ON e.head = below.id
+        JOIN nodes t ON t.id = e.tail JOIN nodes h ON h.id = e.head
+        WHERE e.label IN ('{IndexType.TARGETS}', '{IndexType.RETARGETS}', '{IndexType.CF}')
+        """, deducpath=deducpath, major=major0)
+        return [make_kReln_from_row(row) for row in rows]
+
+    def get_modpath(self, libpath, major):
+        major = self.adaptall(major)
+        rec = self.query_one(f"""
+        SELECT v.modpath FROM nodes v WHERE v.libpath = :libpath AND {covers('v')}
+        """, libpath=libpath, major=major)
+        return None if rec is None else rec[0]
+
+    def get_wip_libpaths_under_module(self, modpath):
+        rows = self.query("""
+        SELECT v.libpath FROM nodes v WHERE v.modpath = :modpath AND v.major = :WIP
+        """, modpath=modpath, WIP=WIP_TAG)
+        return {row[0] for row in rows}
+
+    def _get_ancestry_internal(self, deducpath, major0):
+        rec = self.query_one(f"""
+        SELECT d.major, json_extract(d.props, '$.{IndexType.EP_ANCESTORS}') FROM nodes d
+        WHERE d.label = '{IndexType.DEDUC}' AND d.libpath = :deducpath AND {covers('d')}
+        """, deducpath=deducpath, major=major0)
+        return None if rec is None else (rec[0], rec[1])
+
+    def _get_cuts_internal(self, libpaths_and_majors):
+        # Requiring `major < cut` means we skip any j-node having an empty
+        # interval, as can arise under major version zero.
+        rows = self.query(f"""
+        SELECT e.libpath, e.major, e.cut FROM json_each(:pairs) p
+        JOIN nodes e ON e.libpath = json_extract(p.value, '$[0]')
+            AND e.major = json_extract(p.value, '$[1]')
+        WHERE e.label = '{IndexType.DEDUC}' AND e.major < e.cut
+        """, pairs=json.dumps(libpaths_and_majors))
+        return {(v[0], v[1]): v[2] for v in rows}
+
+    def _get_ancestor_chain_by_traversal(self, deducpath, major0):
+        # Note that we do not need to check the major intervals of the EXPANDS
+        # relations. This is because any given j-node can have at most one
+        # EXPANDS relation leaving it.
+        rows = self.query(f"""
+        WITH RECURSIVE chain(id, taken_at, n) AS (
+            SELECT d.id, NULL, 0 FROM nodes d
+            WHERE d.label = '{IndexType.DEDUC}' AND d.libpath = :deducpath AND {covers('d')}
+            UNION ALL
+            SELECT x.head, json_extract(x.props, '$.{IndexType.EP_TAKEN_AT}'), chain.n + 1
+            FROM chain JOIN edges x ON x.tail = chain.id AND x.label = '{IndexType.EXPANDS}'
+        )
+        SELECT e.libpath, chain.taken_at, e.cut, e.major FROM chain JOIN nodes e ON e.id = chain.id
+        WHERE chain.n > 0 AND e.label = '{IndexType.DEDUC}'
+        ORDER BY chain.n DESC
+        """, deducpath=deducpath, major=major0)
+        return [list(v) for v in rows]
+
+    def _get_deductive_nbrs_internal(self, libpaths, major0):
+        params = {'libpaths': json.dumps(libpaths), 'major': major0}
+        rows = self.query(f"""
+        SELECT u.libpath FROM edges r
+        JOIN nodes c ON c.id = r.tail JOIN nodes u ON u.id = r.head
+        WHERE r.label = '{IndexType.IMPLIES}' AND {in_list('c.libpath', 'libpaths')} AND {covers('r')}
+        UNION
+        SELECT u.libpath FROM edges r
+        JOIN nodes c ON c.id = r.head JOIN nodes u ON u.id = r.tail
+        WHERE r.label = '{IndexType.IMPLIES}' AND {in_list('c.libpath', 'libpaths')} AND {covers('r')}
+        """, **params)
+        return {v[0] for v in rows}
+
+    def _get_materialized_deducs_internal(self, libpaths, major0):
+        rows = self.query(f"""
+        SELECT u.libpath, json_extract(u.props, '$.{IndexType.EP_DEDUC}') FROM nodes u
+        WHERE {in_list('u.libpath', 'libpaths')} AND {covers('u')}
+        AND json_extract(u.props, '$.{IndexType.EP_DEDUC}') IS NOT NULL
+        """, libpaths=json.dumps(libpaths), major=major0)
+        return {v[0]: v[1] for v in rows}
+
+    def _get_deduction_closure_internal(self, libpaths, major0):
+        # Note: we match no label on the starting nodes in the query below,
+        # since we want to catch anything under a deduc, including j-nodes of
+        # label `Ghost` and even `Special`, along with (of course) `Node`.
+        rows = self.query(f"""
+        WITH RECURSIVE up(libpath, id, n) AS (
+            SELECT u.libpath, u.id, 0 FROM nodes u
+            WHERE {in_list('u.libpath', 'libpaths')}
+            UNION
+            SELECT up.libpath, e.head, up.n + 1
+            FROM up JOIN edges e ON e.tail = up.id AND e.label = '{IndexType.UNDER}'
+            WHERE {covers('e')}
+        )
+        SELECT up.libpath, D.libpath FROM up JOIN nodes D ON D.id = up.id
+        WHERE up.n > 0 AND D.label = '{IndexType.DEDUC}'
+        ORDER BY up.n DESC
+        """, libpaths=json.dumps(list(libpaths)), major=major0)
+        # Ordered so that the nearest deduc wins.
+        return {v[0]: v[1] for v in rows}
+
+    def is_deduc(self, libpath, major):
+        return self._has_node(IndexType.DEDUC, libpath, major)
+
+    def is_anno(self, libpath, major):
+        return self._has_node(IndexType.ANNO, libpath, major)
+
+    def _has_node(self, label, libpath, major):
+        major = self.adaptall(major)
+        c = self.count(f"""
+        SELECT count(*) FROM nodes d
+        WHERE d.label = :label AND d.libpath = :libpath AND {covers('d')}
+        """, label=label, libpath=libpath, major=major)
+        return c > 0
+
+    def get_results_relied_upon_by(self, deducpath, major, realm=None):
+        major = self.adaptall(major)
+        if realm is None:
+            realm = '.'.join(deducpath.split('.')[:3])
+        # As in the Cypher reader, all paths have length at least 1, so we
+        # need only check major intervals on edges.
+        rows = self.query(f"""
+        WITH RECURSIVE
+        expanders(id) AS (
+            SELECT x.tail FROM nodes d JOIN edges x ON x.head = d.id
+            WHERE d.label = '{IndexType.DEDUC}' AND d.libpath = :deducpath
+            AND x.label = '{IndexType.EXPANDS}' AND {covers('x')}
+            UNION
+            SELECT x.tail FROM expanders JOIN edges x ON x.head = expanders.id
+            WHERE x.label = '{IndexType.EXPANDS}' AND {covers('x')}
+        ),
+        below(id) AS (
+            SELECT E.id FROM expanders JOIN nodes E ON E.id = expanders.id
+            WHERE E.label = '{IndexType.DEDUC}' AND {prefix_range('E.modpath', 'realm')}
+            UNION
+            SELECT e.tail FROM below JOIN edges e ON e.head = below.id
+            WHERE e.label = '{IndexType.UNDER}' AND {covers('e')}
+        )
+        SELECT D.libpath FROM below
+        JOIN nodes g ON g.id = below.id
+        JOIN edges o ON o.tail = g.id AND o.label = '{IndexType.GHOSTOF}'
+        JOIN nodes D ON D.id = o.head
+        WHERE g.label = '{IndexType.GHOST}' AND D.label = '{IndexType.DEDUC}' AND {covers('o')}
+        """, deducpath=deducpath, major=major, **prefix_params('realm', realm + '.'))
+        return [v[0] for v in rows]
+
+    def get_results_relying_upon(self, deducpath, major, realm=None):
+        major = self.adaptall(major)
+        if realm is None:
+            realm = '.'.join(deducpath.split('.')[:3])
+        # As in the Cypher reader, all paths have length at least 1, so we
+        # need only check major intervals on edges.
+        rows = self.query(f"""
+        WITH RECURSIVE
+        above(id) AS (
+            SELECT o.tail FROM nodes d JOIN edges o ON o.head = d.id
+            JOIN nodes g ON g.id = o.tail
+            WHERE d.label = '{IndexType.DEDUC}' AND d.libpath = :deducpath
+            AND o.label = '{IndexType.GHOSTOF}' AND {covers('o')}
+            AND g.label = '{IndexType.GHOST}' AND {prefix_range('g.modpath', 'realm')}
+            UNION
+            SELECT e.head FROM above JOIN edges e ON e.tail = above.id
+            WHERE e.label = '{IndexType.UNDER}' AND {covers('e')}
+        ),
+        expanded(id) AS (
+            SELECT x.head FROM above JOIN nodes E ON E.id = above.id
+            JOIN edges x ON x.tail = E.id
+            WHERE E.label = '{IndexType.DEDUC}' AND x.label = '{IndexType.EXPANDS}' AND {covers('x')}
+            UNION
+            SELECT x.head FROM expanded JOIN edges x ON x.tail = expanded.id
+            WHERE x.label = '{IndexType.EXPANDS}' AND {covers('x')}
+        )
+        SELECT D.libpath FROM expanded JOIN nodes D ON D.id = expanded.id
+        WHERE D.label = '{IndexType.DEDUC}'
+        """, deducpath=deducpath, major=major, **prefix_params('realm', realm + '.'))
+        return [v[0] for v in rows]
+
+    def _load_user(self, username):
+        rec = self.query_one(f"""
+        SELECT json_extract(u.props, '$.properties') FROM nodes u WHERE {is_user('u')}
+        """, username=username)
+        return None if rec is None else rec[0]
+
+    def load_user_notes(self, username, goal_infos):
+        if goal_infos is None:
+            rows = self.query(f"""
+            SELECT g.libpath, g.major,
+                json_extract(e.props, '$.state'), json_extract(e.props, '$.notes')
+            FROM nodes u JOIN edges e ON e.tail = u.id AND e.label = '{IndexType.NOTES}'
+            JOIN nodes g ON g.id = e.head
+            WHERE {is_user('u')}
+            """, username=username)
+        else:
+            goal_infos = [[g[0], self.adaptall(g[1])] for g in goal_infos]
+            rows = self.query(f"""
+            SELECT g.libpath, g.major,
+                json_extract(e.props, '$.state'), json_extract(e.props, '$.notes')
+            FROM json_each(:goal_infos) goal
+            JOIN nodes g ON g.libpath = json_extract(goal.value, '$[0]')
+                AND g.major = json_extract(goal.value, '$[1]')
+            JOIN edges e ON e.head = g.id AND e.label = '{IndexType.NOTES}'
+            JOIN nodes u ON u.id = e.tail
+            WHERE {is_user('u')}
+            """, goal_infos=json.dumps(goal_infos), username=username)
+        return [UserNotes(r[0], r[1], r[2], r[3]) for r in rows]
+
+    def _load_user_notes_on_goals(self, username, goals_cte, goal_cond, **params):
+        """
+        Load a user's notes on the goals selected by a CTE `goals(id)`,
+        together with the notes on any goals that these have as their
+        origin.
+        """
+        rows = self.query(f"""
+        WITH RECURSIVE {goals_cte}
+        SELECT g.libpath, g.major,
+            json_extract(e.props, '$.state'), json_extract(e.props, '$.notes')
+        FROM goals JOIN nodes g ON g.id = goals.id
+        JOIN edges e ON e.head = g.id AND e.label = '{IndexType.NOTES}'
+        JOIN nodes u ON u.id = e.tail
+        WHERE {goal_cond} AND {is_user('u')}
+        AND json_extract(g.props, '$.origin') IS NULL
+        """, username=username, **params)
+        notes = [UserNotes(r[0], r[1], r[2], r[3]) for r in rows]
+        rows = self.query(f"""
+        WITH RECURSIVE {goals_cte}
+        SELECT json_extract(g.props, '$.origin') FROM goals JOIN nodes g ON g.id = goals.id
+        WHERE {goal_cond} AND json_extract(g.props, '$.origin') IS NOT NULL
+        """, **params)
+        goal_infos = [r[0].split("@") for r in rows]
+        notes.extend(self.load_user_notes(username, goal_infos))
+        return notes
+
+    def load_user_notes_on_deduc(self, username, deducpath, major):
+        major0 = self.adaptall(major)
+        return self._load_user_notes_on_goals(username, f"""
+        goals(id) AS (
+            SELECT d.id FROM nodes d
+            WHERE d.label = '{IndexType.DEDUC}' AND d.libpath = :deducpath AND {covers('d')}
+            UNION
+            SELECT e.tail FROM goals JOIN edges e ON e.head = goals.id
+            WHERE e.label = '{IndexType.UNDER}' AND {covers('e')}
+        )
+        """, "1", deducpath=deducpath, major=major0)
+
+    def load_user_notes_on_anno(self, username, annopath, major):
+        major0 = self.adaptall(major)
+        return self._load_user_notes_on_goals(username, f"""
+        goals(id) AS (
+            SELECT a.id FROM nodes a
+            WHERE a.label = '{IndexType.ANNO}' AND a.libpath = :annopath AND {covers('a')}
+            UNION
+            SELECT e.tail FROM goals JOIN edges e ON e.head = goals.id
+            WHERE e.label = '{IndexType.UNDER}' AND {covers('e')}
+        )
+        """, f"""
+        g.label = '{IndexType.WIDGET}' AND json_extract(g.props, '$.{IndexType.EP_WTYPE}') = 'GOAL'
+        """, annopath=annopath, major=major0)
+
+    def load_user_notes_on_module(self, username, modpath, major):
+        major0 = self.adaptall(major)
+        return self._load_user_notes_on_goals(username, f"""
+        goals(id) AS (
+            SELECT m.id FROM nodes m WHERE m.modpath = :modpath AND {covers('m')}
+        )
+        """, f"""
+        (g.label IN ('{IndexType.DEDUC}', '{IndexType.NODE}')
+            OR json_extract(g.props, '$.{IndexType.EP_WTYPE}') = 'GOAL')
+        """, modpath=modpath, major=major0)
+
+    # ----------------------------------------------------------------------
+
+    def _version_prop(self, repopath, version, name):
+        """
+        :return: None if there is no Version node for this repo and version,
+            else a 1-tuple holding the value of the named property.
+        """
+        return self.query_one(f"""
+        SELECT json_extract(v.props, '$.{name}') FROM nodes v
+        WHERE v.label = '{IndexType.VERSION}' AND v.repopath = :repopath
+        AND json_extract(v.props, '$.version') = :version
+        """, repopath=repopath, version=version)
+
+    def has_manifest(self, libpath, version):
+        rec = self._version_prop(libpath, version, 'manifest')
+        return rec is not None and rec[0] is not None
+
+    def load_manifest(self, libpath, version):
+        rec = self._version_prop(libpath, version, 'manifest')
+        # Unlike the build nodes for modules, annos, and deducs, a Version node
+        # can exist but not yet have a `manifest` property.
+        if rec is None or rec[0] is None:
+            raise FileNotFoundError
+        return rec[0]
+
+    def _load_build_props(self, node_type, libpath, version, fields):
+        """
+        :return: None if the object is not built at this version, else a tuple
+            of the values of the named properties of its build node.
+        """
+        major0 = self.adaptall(version)
+        columns = ', '.join(f"json_extract(b.props, '$.{f}')" for f in fields)
+        return self.query_one(f"""
+        SELECT {columns} FROM nodes u
+        JOIN edges x ON x.tail = u.id AND x.label = '{IndexType.BUILD}'
+        JOIN nodes b ON b.id = x.head
+        WHERE u.label = :label AND u.libpath = :libpath AND {covers('u')}
+        AND json_extract(x.props, '$.{IndexType.P_BUILD_VERS}') = :version
+        """, label=node_type, libpath=libpath, version=version, major=major0)
+
+    def dashgraph_is_built(self, libpath, version):
+        return self._object_is_built(libpath, version, IndexType.DEDUC)
+
+    def load_dashgraph(self, libpath, version):
+        rec = self._load_build_props(IndexType.DEDUC, libpath, version, ['json'])
+        if rec is None:
+            raise FileNotFoundError
+        return rec[0]
+
+    def annotation_is_built(self, libpath, version):
+        return self._object_is_built(libpath, version, IndexType.ANNO)
+
+    def _load_annotation(self, libpath, version, fields):
+        rec = self._load_build_props(IndexType.ANNO, libpath, version, fields)
+        if rec is None:
+            raise FileNotFoundError
+        if len(fields) == 2:
+            return list(rec)
+        elif fields[0] == 'html':
+            return rec[0], None
+        else:
+            return None, rec[0]
+
+    def module_is_built(self, libpath, version):
+        return self._object_is_built(libpath, version, IndexType.MODULE)
+
+    def load_module_src(self, libpath, version):
+        rec = self._load_build_props(IndexType.MODULE, libpath, version, ['pfsc'])
+        if rec is None:
+            raise FileNotFoundError
+        return rec[0]
+
+    def _object_is_built(self, libpath, version, node_type):
+        major0 = self.adaptall(version)
+        n = self.count(f"""
+        SELECT count(*) FROM nodes u
+        JOIN edges x ON x.tail = u.id AND x.label = '{IndexType.BUILD}'
+        WHERE u.label = :label AND u.libpath = :libpath AND {covers('u')}
+        AND json_extract(x.props, '$.{IndexType.P_BUILD_VERS}') = :version
+        """, label=node_type, libpath=libpath, version=version, major=major0)
+        assert n < 2
+        return n == 1
+
+    # ----------------------------------------------------------------------
+
+    def check_approvals_under_anno(self, annopath, version):
+        major0 = self.adaptall(version)
+        rows = self.query(f"""
+        SELECT w.libpath, json_extract(w.props, '$.{IndexType.P_APPROVALS}') FROM nodes w
+        WHERE w.label = '{IndexType.WIDGET}' AND {covers('w')}
+        AND {prefix_range('w.libpath', 'base')}
+        """, major=major0, **prefix_params('base', annopath + '.'))
+        approved = []
+        for libpath, j in rows:
+            if j is not None:
+                approvals = json.loads(j)
+                if approvals.get(version, False):
+                    approved.append(libpath)
+        return approved
+
+    def _load_approvals_dict_json(self, widgetpath, version):
+        major0 = self.adaptall(version)
+        rec = self.query_one(f"""
+        SELECT json_extract(w.props, '$.{IndexType.P_APPROVALS}') FROM nodes w
+        WHERE w.label = '{IndexType.WIDGET}' AND w.libpath = :widgetpath AND {covers('w')}
+        """, widgetpath=widgetpath, major=major0)
+        return None if rec is None else rec[0]
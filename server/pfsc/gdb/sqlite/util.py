@@ -0,0 +1,345 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+An embedded graph database, kept in SQLite.
+
+This lets the server run without any separate graph database process, as
+in a single-container deployment, or for development and testing. Select it
+with a `GRAPHDB_URI` of the form
+
+    sqlite:///path/to/file.db    (or embedded:///path/to/file.db)
+
+giving the path of the database file (relative paths are relative to the
+working directory), or just `sqlite://` for an in-memory database. The
+in-memory database lasts as long as the process, and is meant for tests and
+benchmarks, in a single thread.
+
+We keep a property graph in two tables, `nodes` and `edges`. Each row has a
+`label`, its standard properties (those of a kNode or kReln) in columns of
+their own, and any other properties in a JSON object under `props`. An edge
+names its endpoints by their node ids, in `tail` and `head`, and is deleted
+when either endpoint is, so that deleting a node is like a Cypher
+`DETACH DELETE`.
+"""
+
+import json
+import sqlite3
+import threading
+
+from pfsc.constants import IndexType
+from pfsc.gdb.k import kNode, kReln
+
+
+NODE_COLUMNS = ('libpath', 'modpath', 'repopath', 'major', 'minor', 'patch', 'cut')
+RELN_COLUMNS = ('modpath', 'repopath', 'major', 'minor', 'patch', 'cut')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL,
+    libpath TEXT, modpath TEXT, repopath TEXT,
+    major TEXT, minor TEXT, patch TEXT, cut TEXT,
+    props TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS nodes_libpath ON nodes (libpath, major);
+CREATE INDEX IF NOT EXISTS nodes_modpath ON nodes (modpath);
+CREATE INDEX IF NOT EXISTS nodes_repopath ON nodes (repopath);
+CREATE INDEX IF NOT EXISTS nodes_label ON nodes (label);
+CREATE INDEX IF NOT EXISTS nodes_username
+    ON nodes (json_extract(props, '$.username')) WHERE label = 'User';
+CREATE TABLE IF NOT EXISTS edges (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL,
+    tail INTEGER NOT NULL REFERENCES nodes (id) ON DELETE CASCADE,
+    head INTEGER NOT NULL REFERENCES nodes (id) ON DELETE CASCADE,
+    modpath TEXT, repopath TEXT,
+    major TEXT, minor TEXT, patch TEXT, cut TEXT,
+    props TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS edges_tail ON edges (tail, label);
+CREATE INDEX IF NOT EXISTS edges_head ON edges (head, label);
+CREATE INDEX IF NOT EXISTS edges_modpath ON edges (modpath);
+CREATE INDEX IF NOT EXISTS edges_repopath ON edges (repopath);
+"""
+
+# Seconds to wait for another connection's write lock.
+BUSY_TIMEOUT = 30
+
+MEMORY_DB_URI = 'file:pfsc_gdb?mode=memory&cache=shared'
+
+_lock = threading.Lock()
+# A connection that we never close, so that the in-memory database persists
+# across app contexts.
+_memory_keeper = None
+
+
+def get_db_path(uri):
+    """
+    Get the path of the database file named by a URI, or None if the URI
+    names the in-memory database.
+    """
+    path = uri.split('://', 1)[1]
+    return None if path in ['', ':memory:'] else path
+
+
+class SQLiteGraph:
+    """
+    Like the `RedisGraphWrapper`, this class stands in where any of a Neo4j
+    database, session, or transaction would have been used. It wraps one
+    connection to the SQLite database.
+
+    Outside of a transaction, each statement is committed as soon as it is
+    executed. Transactions take the database's write lock at the outset, so
+    that concurrent writers wait for each other (up to `BUSY_TIMEOUT`),
+    instead of failing when they try to upgrade a read lock.
+    """
+
+    def __init__(self, uri):
+        global _memory_keeper
+        self.uri = uri
+        path = get_db_path(uri)
+        if path is None:
+            with _lock:
+                if _memory_keeper is None:
+                    _memory_keeper = self._connect(MEMORY_DB_URI, uri=True)
+            self.conn = self._connect(MEMORY_DB_URI, uri=True)
+        else:
+            self.conn = self._connect(path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _connect(database, uri=False):
+        conn = sqlite3.connect(
+            database, uri=uri, timeout=BUSY_TIMEOUT,
+            isolation_level=None, check_same_thread=False,
+        )
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    # ------------------------------------------------
+    # Act as database
+
+    def session(self):
+        # Return self to act as a session.
+        return self
+
+    def close(self):
+        self.conn.close()
+
+    # ------------------------------------------------
+    # Act as session
+
+    def begin_transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self
+
+    # ------------------------------------------------
+    # Act as transaction
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.conn.executemany(sql, seq_of_params)
+
+    def commit(self):
+        if self.conn.in_transaction:
+            self.conn.execute("COMMIT")
+
+    def rollback(self):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+
+
+# ----------------------------------------------------------------------------
+# Building SQL
+
+def covers(alias, major=':major'):
+    """
+    SQL condition that the object named by `alias` covers a major version.
+    Like the Cypher `u.major <= $major < u.cut`, this is false when either
+    property is null.
+    """
+    return f"{alias}.major <= {major} AND {major} < {alias}.cut"
+
+
+def node_prop(alias, name):
+    """
+    SQL expression for a property of a node.
+    """
+    if name in NODE_COLUMNS:
+        return f"{alias}.{name}"
+    return f"json_extract({alias}.props, '$.{name}')"
+
+
+def reln_prop(alias, name):
+    """
+    SQL expression for a property of an edge.
+    """
+    if name in RELN_COLUMNS:
+        return f"{alias}.{name}"
+    return f"json_extract({alias}.props, '$.{name}')"
+
+
+def in_list(expr, param):
+    """
+    SQL condition that an expression is in a list, passed as a JSON array
+    under the named parameter.
+    """
+    return f"{expr} IN (SELECT value FROM json_each(:{param}))"
+
+
+def prefix_range(expr, param):
+    """
+    SQL condition that a string starts with a prefix. Unlike `LIKE`, this
+    can use an index. Pass the parameters made by `prefix_params()`.
+    """
+    return f"{expr} >= :{param}_lo AND {expr} < :{param}_hi"
+
+
+def prefix_params(param, prefix):
+    return {
+        f'{param}_lo': prefix,
+        f'{param}_hi': prefix[:-1] + chr(ord(prefix[-1]) + 1),
+    }
+
+
+def knode_columns(n):
+    """
+    The columns from which `make_kNode_from_row()` makes a kNode, for a
+    node under alias `n`.
+    """
+    return (f"{n}.label, {n}.libpath, {n}.modpath, {n}.repopath, "
+            f"{n}.major, {n}.minor, {n}.patch, {n}.cut, {n}.id")
+
+
+def kreln_columns(t, e, h):
+    """
+    The columns from which `make_kReln_from_row()` makes a kReln, for an
+    edge under alias `e`, from tail `t` to head `h`.
+    """
+    return (f"{t}.label, {t}.libpath, {t}.major, {e}.label, "
+            f"{h}.label, {h}.libpath, {h}.major, "
+            f"{e}.modpath, {e}.repopath, {e}.major, {e}.minor, {e}.patch, {e}.cut, {e}.id")
+
+
+# Join an edge `e` with its tail `t` and head `h`.
+RELN_JOIN = "edges e JOIN nodes t ON t.id = e.tail JOIN nodes h ON h.id = e.head"
+
+
+def is_user(alias):
+    """
+    SQL condition that the node under `alias` is the User node for the
+    parameter `:username`.
+    """
+    return (f"{alias}.label = '{IndexType.USER}' "
+            f"AND json_extract({alias}.props, '$.username') = :username")
+
+
+def make_kNode_from_row(row):
+    return kNode(*row)
+
+
+def make_kReln_from_row(row):
+    return kReln(*row)
+
+
+# ----------------------------------------------------------------------------
+# Reading and writing properties
+
+def split_props(props, columns):
+    """
+    Split a dictionary of properties into the values for the given columns,
+    and the JSON for the rest. As when setting properties in Cypher, null
+    values are dropped.
+    """
+    values = [props.get(name) for name in columns]
+    rest = {k: v for k, v in props.items() if k not in columns and v is not None}
+    return values, json.dumps(rest)
+
+
+def insert_node(tx, label, props):
+    """
+    Add a node.
+
+    :return: the id of the new node.
+    """
+    values, rest = split_props(props, NODE_COLUMNS)
+    cur = tx.execute(f"""
+    INSERT INTO nodes (label, {', '.join(NODE_COLUMNS)}, props)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [label, *values, rest])
+    return cur.lastrowid
+
+
+def insert_edge(tx, label, tail, head, props):
+    """
+    Add an edge between two nodes, given by id.
+    """
+    values, rest = split_props(props, RELN_COLUMNS)
+    tx.execute(f"""
+    INSERT INTO edges (label, tail, head, {', '.join(RELN_COLUMNS)}, props)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [label, tail, head, *values, rest])
+
+
+def node_props_from_row(row):
+    """
+    Get the dictionary of all properties of a node, from a row giving the
+    `NODE_COLUMNS` followed by `props`.
+    """
+    props = {k: v for k, v in zip(NODE_COLUMNS, row) if v is not None}
+    props.update(json.loads(row[len(NODE_COLUMNS)]))
+    return props
+
+
+def find_node(tx, label, ident):
+    """
+    Find a node by label and identifying properties.
+
+    :return: the id of the first matching node, or None if there is none.
+    """
+    conds = ''.join(f" AND {node_prop('n', k)} = :{k}" for k in ident)
+    row = tx.execute(f"""
+    SELECT n.id FROM nodes n WHERE n.label = :label{conds} LIMIT 1
+    """, {'label': label, **ident}).fetchone()
+    return None if row is None else row[0]
+
+
+def merge_node(tx, label, ident, props=None):
+    """
+    Like the Cypher `MERGE (n:label {ident}) SET n += props`.
+
+    :return: the id of the node.
+    """
+    props = props or {}
+    node_id = find_node(tx, label, ident)
+    if node_id is None:
+        return insert_node(tx, label, {**ident, **props})
+    if props:
+        row = tx.execute(f"""
+        SELECT {', '.join(NODE_COLUMNS)}, props FROM nodes WHERE id = ?
+        """, [node_id]).fetchone()
+        merged = node_props_from_row(row)
+        merged.update(props)
+        values, rest = split_props(merged, NODE_COLUMNS)
+        tx.execute(f"""
+        UPDATE nodes SET {', '.join(f'{c} = ?' for c in NODE_COLUMNS)}, props = ?
+        WHERE id = ?
+        """, [*values, rest, node_id])
+    return node_id
@@ -0,0 +1,324 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import json
+
+import pfsc.constants
+from pfsc.constants import IndexType
+from pfsc.gdb.writer import GraphWriter
+import pfsc.gdb.sqlite.indexing as indexing
+from pfsc.gdb.sqlite.util import (
+    RELN_COLUMNS,
+    covers, in_list, is_user, prefix_range, prefix_params, kreln_columns,
+    make_kReln_from_row, split_props, insert_node, insert_edge, merge_node,
+)
+from pfsc.build.versions import get_padded_components
+from pfsc.excep import PfscExcep
+
+
+class SQLiteGraphWriter(GraphWriter):
+
+    def __init__(self, reader):
+        super().__init__(reader)
+        self.session = self.gdb.session()
+
+    def new_transaction(self):
+        return self.session.begin_transaction()
+
+    def commit_transaction(self, tx):
+        tx.commit()
+
+    def rollback_transaction(self, tx):
+        tx.rollback()
+
+    def _delete_nodes_and_builds(self, tx, cond, **params):
+        """
+        Delete the nodes `u` satisfying a condition, along with their build
+        nodes. Like the Cypher
+
+            MATCH (u) WHERE cond
+            OPTIONAL MATCH (u)-[:BUILD]->(b)
+            DETACH DELETE u, b
+
+        :return: the number of nodes `u` deleted.
+        """
+        tx.execute(f"""
+        DELETE FROM nodes WHERE id IN (
+            SELECT x.head FROM nodes u JOIN edges x ON x.tail = u.id
+            WHERE x.label = '{IndexType.BUILD}' AND {cond}
+        )
+        """, params)
+        return tx.execute(f"""
+        DELETE FROM nodes AS u WHERE {cond}
+        """, params).rowcount
+
+    def _drop_wip_nodes_under_module(self, modpath, tx, keep=None):
+        cond = "u.modpath = :modpath AND u.major = :WIP"
+        if keep:
+            cond += f" AND NOT {in_list('u.libpath', 'keep')}"
+        self._delete_nodes_and_builds(
+            tx, cond, modpath=modpath, WIP=pfsc.constants.WIP_TAG,
+            keep=json.dumps(keep or []))
+
+    def ix0200(self, mii, tx):
+        indexing.ix00220(mii, tx)
+        indexing.ix00240(mii, tx)
+        indexing.ix00261(mii, tx)
+        new_targeting_relns = indexing.ix00282s(mii, tx)
+        return new_targeting_relns
+
+    def ix0330(self, mii, tx, verbose=False):
+        items = mii.move_mapping.items()
+        if verbose:
+            print(f'Adding {len(items)} new moves.')
+        move_counter, void_counter = 0, 0
+        mii.note_begin_indexing_phase(330)
+        for src, dst in items:
+            if dst is None:
+                void_counter += 1
+                void_id = merge_node(tx, IndexType.VOID, {})
+                tx.execute(f"""
+                INSERT INTO edges (label, tail, head)
+                SELECT '{IndexType.MOVE}', s.id, :void_id FROM nodes s
+                WHERE s.libpath = :src AND {covers('s', ':cmv')}
+                """, {'src': src, 'cmv': mii.current_maj_vers, 'void_id': void_id})
+            else:
+                move_counter += 1
+                tx.execute(f"""
+                INSERT INTO edges (label, tail, head)
+                SELECT '{IndexType.MOVE}', s.id, d.id FROM nodes s, nodes d
+                WHERE s.libpath = :src AND {covers('s', ':cmv')}
+                AND d.libpath = :dst AND d.major = :major
+                """, {'src': src, 'dst': dst, 'major': mii.major,
+                      'cmv': mii.current_maj_vers})
+            mii.note_task_element_completed(330)
+        if verbose:
+            print(f'  ({move_counter}) ?:{IndexType.MOVE}:?')
+            print(f'  ({void_counter}) ?:{IndexType.MOVE}:{IndexType.VOID}')
+
+    def ix0360(self, mii, tx, new_targeting_relns, verbose=False):
+        if verbose:
+            print('Searching for retargeting relations...')
+        mii.note_begin_indexing_phase(360)
+        retarget_counter = 0
+        # (1) Enrichments we have added:
+        for k in new_targeting_relns:
+            mcs = self.reader.find_move_conjugate_chain(k.head_libpath, k.head_major)
+            if mcs:
+                retarget_counter += len(mcs)
+                self._add_retargets(
+                    tx, k.get_structured_property_dict()['reln'],
+                    f"e.libpath = :libpath AND {covers('e')} AND {in_list('t.id', 'mc_ids')}",
+                    libpath=k.tail_libpath, major=k.tail_major,
+                    mc_ids=json.dumps([mc.db_uid for mc in mcs]),
+                )
+            mii.note_task_element_completed(361)
+
+        # (2) Existing enrichments on anything we moved:
+        ids = [mii.existing_k_nodes[a].db_uid for a, b in
+               mii.mm_closure.items() if b is not None]
+        rows = tx.execute(f"""
+        SELECT e.tail, {kreln_columns('t', 'e', 'h')} FROM edges e
+        JOIN nodes t ON t.id = e.tail JOIN nodes h ON h.id = e.head
+        WHERE e.label IN ('{IndexType.TARGETS}', '{IndexType.RETARGETS}')
+        AND {in_list('h.id', 'ids')}
+        """, {'ids': json.dumps(ids)}).fetchall()
+        for row in rows:
+            e_id, k = row[0], make_kReln_from_row(row[1:])
+            retarget_counter += 1
+            self._add_retargets(
+                tx, k.get_structured_property_dict()['reln'],
+                f"e.id = :e_id AND t.libpath = :libpath AND {covers('t')}",
+                e_id=e_id, libpath=mii.mm_closure[k.head_libpath], major=mii.major,
+            )
+        mii.note_task_element_completed(362, len(ids))
+        if verbose:
+            print(f'  ({retarget_counter}) ?:{IndexType.RETARGETS}:?')
+
+    @staticmethod
+    def _add_retargets(tx, reln_props, cond, **params):
+        """
+        Add RETARGETS edges with given properties, from nodes `e` to nodes
+        `t` satisfying a condition.
+
+        The edge's own column values are passed under `reln_`-prefixed
+        parameter names, so that they cannot clash with parameters of the
+        condition, such as the `major` read by `covers()`.
+        """
+        values, rest = split_props(reln_props, RELN_COLUMNS)
+        params.update((f'reln_{c}', v) for c, v in zip(RELN_COLUMNS, values))
+        params['reln_props'] = rest
+        tx.execute(f"""
+        INSERT INTO edges (label, tail, head, {', '.join(RELN_COLUMNS)}, props)
+        SELECT '{IndexType.RETARGETS}', e.id, t.id,
+            {', '.join(f':reln_{c}' for c in RELN_COLUMNS)}, :reln_props
+        FROM nodes e, nodes t WHERE {cond}
+        """, params)
+
+    def ix0400(self, mii, tx):
+        merge_node(tx, IndexType.VERSION, {
+            'repopath': mii.repopath, 'version': mii.version,
+        }, mii.write_version_node_props())
+
+    def clear_test_indexing(self):
+        self._delete_nodes_and_builds(
+            self.session, prefix_range('u.repopath', 'test'),
+            **prefix_params('test', 'test.'))
+        self.session.execute(f"""
+        DELETE FROM nodes WHERE label = '{IndexType.USER}'
+        AND {prefix_range("json_extract(props, '$.username')", 'test')}
+        """, prefix_params('test', 'test.'))
+
+    def _do_delete_all_under_repo(self, repopath):
+        self._delete_nodes_and_builds(
+            self.session, "u.repopath = :repopath", repopath=repopath)
+
+    def delete_full_build_at_version(self, repopath, version=pfsc.constants.WIP_TAG):
+        M, m, p = get_padded_components(version)
+        self._delete_nodes_and_builds(self.session, """
+        u.repopath = :repopath AND (
+            json_extract(u.props, '$.version') = :version
+            OR (u.major = :M AND u.minor = :m AND u.patch = :p)
+        )
+        """, repopath=repopath, version=version, M=M, m=m, p=p)
+
+    # ----------------------------------------------------------------------
+
+    def _add_user(self, username, j_props):
+        merge_node(self.session, IndexType.USER, {'username': username}, {
+            'properties': j_props,
+        })
+
+    def delete_user(self, username, *,
+                    definitely_want_to_delete_this_user=False):
+        if not definitely_want_to_delete_this_user:
+            return 0
+        return self.session.execute(f"""
+        DELETE FROM nodes AS u WHERE {is_user('u')}
+        """, {'username': username}).rowcount
+
+    def delete_all_notes_of_one_user(self, username, *,
+                    definitely_want_to_delete_all_notes=False):
+        if not definitely_want_to_delete_all_notes:
+            return
+        self.session.execute(f"""
+        DELETE FROM edges WHERE label = '{IndexType.NOTES}'
+        AND tail IN (SELECT u.id FROM nodes u WHERE {is_user('u')})
+        """, {'username': username})
+
+    def _update_user(self, username, j_props):
+        self.session.execute(f"""
+        UPDATE nodes AS u SET props = json_set(props, '$.properties', :j_props)
+        WHERE {is_user('u')}
+        """, {'username': username, 'j_props': j_props})
+
+    def _record_user_notes(self, username, user_notes):
+        major0 = self.reader.adaptall(user_notes.goal_major)
+        # As with the other GDBs, we structure this as a transaction, so the
+        # user's notes are committed as soon as they're recorded.
+        tx = self.new_transaction()
+        try:
+            rec = tx.execute("""
+            SELECT id FROM nodes WHERE libpath = :goalpath AND major = :major
+            """, {'goalpath': user_notes.goalpath, 'major': major0}).fetchone()
+            if rec is None:
+                raise PfscExcep(f'Cannot record notes. Origin {user_notes.write_origin()} does not exist.')
+            goal_db_id = rec[0]
+            params = {'username': username, 'goal_db_id': goal_db_id}
+            note_ids = [r[0] for r in tx.execute(f"""
+            SELECT e.id FROM edges e JOIN nodes u ON u.id = e.tail
+            WHERE e.label = '{IndexType.NOTES}' AND e.head = :goal_db_id AND {is_user('u')}
+            """, params)]
+
+            if user_notes.is_blank():
+                tx.execute(f"""
+                DELETE FROM edges WHERE {in_list('id', 'ids')}
+                """, {'ids': json.dumps(note_ids)})
+            elif note_ids:
+                tx.execute(f"""
+                UPDATE edges SET props = json_set(props, '$.state', :state, '$.notes', :notes)
+                WHERE {in_list('id', 'ids')}
+                """, {'ids': json.dumps(note_ids), 'state': user_notes.state,
+                      'notes': user_notes.notes})
+            else:
+                for (user_id,) in tx.execute(f"""
+                SELECT u.id FROM nodes u WHERE {is_user('u')}
+                """, params).fetchall():
+                    insert_edge(tx, IndexType.NOTES, user_id, goal_db_id, {
+                        'state': user_notes.state, 'notes': user_notes.notes,
+                    })
+        except:
+            self.rollback_transaction(tx)
+            raise
+        else:
+            self.commit_transaction(tx)
+
+    # ----------------------------------------------------------------------
+
+    def _record_build(self, node_type, libpath, version, build_type, props):
+        """
+        Add a build node with given properties, and a BUILD edge to it from
+        each node of the given type and libpath that covers the version.
+        """
+        major0 = self.reader.adaptall(version)
+        for (u_id,) in self.session.execute(f"""
+        SELECT u.id FROM nodes u
+        WHERE u.label = :label AND u.libpath = :libpath AND {covers('u')}
+        """, {'label': node_type, 'libpath': libpath, 'major': major0}).fetchall():
+            b_id = insert_node(self.session, build_type, props)
+            insert_edge(self.session, IndexType.BUILD, u_id, b_id, {
+                IndexType.P_BUILD_VERS: version,
+            })
+
+    def record_module_source(self, modpath, version, modtext):
+        self._record_build(IndexType.MODULE, modpath, version, IndexType.MOD_SRC, {
+            'pfsc': modtext,
+        })
+
+    def record_repo_manifest(self, repopath, version, manifest_json):
+        self.session.execute(f"""
+        UPDATE nodes SET props = json_set(props, '$.manifest', :manifest_json)
+        WHERE label = '{IndexType.VERSION}' AND repopath = :repopath
+        AND json_extract(props, '$.version') = :version
+        """, {'repopath': repopath, 'version': version, 'manifest_json': manifest_json})
+
+    def record_dashgraph(self, deducpath, version, dg_json):
+        self._record_build(IndexType.DEDUC, deducpath, version, IndexType.DEDUC_BUILD, {
+            'json': dg_json,
+        })
+
+    def record_annobuild(self, annopath, version, anno_html, anno_json):
+        self._record_build(IndexType.ANNO, annopath, version, IndexType.ANNO_BUILD, {
+            'html': anno_html, 'json': anno_json,
+        })
+
+    def delete_builds_under_module(self, modpath, version):
+        self.session.execute(f"""
+        DELETE FROM nodes WHERE id IN (
+            SELECT x.head FROM nodes u JOIN edges x ON x.tail = u.id
+            WHERE u.modpath = :modpath AND x.label = '{IndexType.BUILD}'
+            AND json_extract(x.props, '$.{IndexType.P_BUILD_VERS}') = :version
+        )
+        """, {'modpath': modpath, 'version': version})
+
+    # ----------------------------------------------------------------------
+
+    def _set_approvals_dict_json(self, widgetpath, version, j):
+        major0 = self.reader.adaptall(version)
+        self.session.execute(f"""
+        UPDATE nodes AS w SET props = json_set(props, '$.{IndexType.P_APPROVALS}', :approvals)
+        WHERE w.label = '{IndexType.WIDGET}' AND w.libpath = :widgetpath AND {covers('w')}
+        """, {'widgetpath': widgetpath, 'major': major0, 'approvals': j})
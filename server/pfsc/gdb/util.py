@@ -14,6 +14,22 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
+import json
+import sys
+
+
+def isinstance_if_loaded(obj, module_name, class_name):
+    """
+    Like `isinstance()`, but names the class by its module and name, and does
+    not import that module. If the module has not been imported yet, then
+    `obj` cannot be an instance of the class. This lets us check which graph
+    database driver we are using, without importing all of them.
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        return False
+    return isinstance(obj, getattr(module, class_name))
+
 
 class SimpleGraph:
 
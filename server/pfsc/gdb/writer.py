@@ -14,22 +14,84 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
+import functools
+import inspect
 import json
+import re
 
 import pfsc.constants
 from pfsc.constants import UserProps
 from pfsc.excep import PfscExcep, PECode
 from pfsc.gdb.reader import GraphReader
+from pfsc.gdb.replicas import note_primary_write
 from pfsc.gdb.user import User, make_new_user_properties_dict
+from pfsc.tracing import current_span, trace_methods
+
+
+def is_indexing_step(name):
+    return name == 'index_module' or re.match(r'ix\d', name) is not None
+
+
+# Public writer methods that do not themselves write, or that are carried out
+# only as parts of `index_module()`.
+NON_WRITING_METHODS = {
+    'new_transaction', 'rollback_transaction', 'clear_wip_indexing',
+}
+
+
+def is_writing_method(name):
+    return not (
+        name.startswith('_') or name in NON_WRITING_METHODS
+        or (is_indexing_step(name) and name != 'index_module')
+    )
+
+
+def noting_primary_write(method):
+    """
+    Decorator for writer methods. Once the method returns (or fails, having
+    possibly written something), record that the primary GDB has been written
+    to, so that subsequent reads go to the primary. See `pfsc.gdb.replicas`.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        finally:
+            note_primary_write()
+    return wrapper
+
+
+def note_primary_writes(cls):
+    """
+    Make each of those writing methods defined in a writer class itself (not
+    inherited) record that the primary GDB has been written to.
+    """
+    for attr_name, value in list(vars(cls).items()):
+        if inspect.isfunction(value) and is_writing_method(attr_name):
+            setattr(cls, attr_name, noting_primary_write(value))
 
 
 class GraphWriter:
-    """Abstract base class for graph database writers. """
+    """
+    Abstract base class for graph database writers.
+
+    Every public method of a writer is taken to write to the GDB, except those
+    named in `NON_WRITING_METHODS`, and the indexing steps carried out under
+    `index_module()`. All of these record that the primary has been written
+    to (see `note_primary_writes()`), so that reads that should see the write
+    do not go to a replica that may not yet have it.
+    """
 
     def __init__(self, reader):
         self.gdb = reader.gdb
         self._reader = reader
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Each indexing step makes a span (see `pfsc.tracing`).
+        trace_methods(cls, 'ix', is_indexing_step)
+        note_primary_writes(cls)
+
     @property
     def reader(self) -> GraphReader:
         return self._reader
@@ -55,6 +117,7 @@ class GraphWriter:
         :param mii: a ModuleIndexInfo instance.
 
         """
+        current_span().set(repopath=mii.repopath, version=mii.version)
         if not mii.is_WIP():
             # Sanity check: When indexing a numbered release version (i.e.
             # anything other than a WIP build), the operation relies heavily
@@ -92,12 +155,18 @@ class GraphWriter:
         # Any j-relns added in a previous WIP build should have at least
         # one endpoint which is a j-node added in that build, so dropping
         # just the nodes should be enough.
+        # The j-nodes for unchanged items are kept (see
+        # `ModuleIndexInfo.omit_unchanged_items()`).
+        keep = sorted(mii.kept_libpaths)
         for modpath in mii.all_modpaths_with_changes():
-            self._drop_wip_nodes_under_module(modpath, tx)
+            self._drop_wip_nodes_under_module(modpath, tx, keep=keep)
             mii.note_task_element_completed(111)
 
-    def _drop_wip_nodes_under_module(self, modpath, tx):
-        """Drop all nodes having a given modpath and major=WIP. """
+    def _drop_wip_nodes_under_module(self, modpath, tx, keep=None):
+        """
+        Drop all nodes having a given modpath and major=WIP, except those
+        whose libpaths are in the list `keep`, if given.
+        """
         raise NotImplementedError
 
     def ix0100(self, mii, tx):
@@ -282,6 +351,9 @@ class GraphWriter:
         @param username: str, the user
         @param user_notes: UserNotes to be recorded
         """
+        self._record_user_notes(username, user_notes)
+
+    def _record_user_notes(self, username, user_notes):
         raise NotImplementedError
 
     # ----------------------------------------------------------------------
@@ -377,3 +449,7 @@ class GraphWriter:
         @param j: the JSON string to be recorded.
         """
         raise NotImplementedError
+
+
+trace_methods(GraphWriter, 'ix', is_indexing_step)
+note_primary_writes(GraphWriter)
@@ -14,7 +14,8 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
-from contextlib import nullcontext
+from contextlib import contextmanager, nullcontext
+import importlib
 import json
 from json.decoder import JSONDecodeError
 import inspect
@@ -24,6 +25,7 @@ from rq import get_current_job
 from flask import redirect, flash, has_request_context, session
 from flask_socketio import SocketIO
 from pottery import Redlock
+from redis.exceptions import WatchError
 
 import pfsc.constants
 from pfsc.constants import (
@@ -31,7 +33,7 @@ from pfsc.constants import (
     REDIS_CHANNEL,
     ISE_EVENT_NAME,
     WIP_TAG,
-    MAIN_TASK_QUEUE_NAME,
+    QueueClass,
 )
 from pfsc import check_config, get_app
 from pfsc.excep import *
@@ -40,8 +42,53 @@ from pfsc.checkinput.libpath import CheckedLibpath
 from pfsc.checkinput.version import CheckedVersion
 from pfsc.permissions import have_repo_permission, ActionType
 from pfsc.build.repo import get_repo_part
-from pfsc.rq import get_rqueue, get_redis_connection
-from pfsc.session import get_csrf_from_session
+from pfsc.gdb.replicas import set_job_requesters
+from pfsc.rq import (
+    get_task_queue, get_redis_connection, is_worker_app,
+    check_pending_jobs_limit, note_pending_job,
+)
+from pfsc.session import get_csrf_from_session, get_requester_identity
+from pfsc.tracing import span
+
+
+# Version of the format of the job descriptors made by
+# `RepoTaskHandler.make_job_descriptor()`. Increment this whenever that format
+# changes, so that workers reject descriptors they cannot understand.
+JOB_DESCRIPTOR_VERSION = 1
+
+# Lifetime in seconds of the Redis keys by which we coalesce repo jobs. (See
+# `RepoTaskHandler.coalesce_into_waiting_job()`.) Should exceed the time a job
+# may reasonably spend waiting in the queue; if it does not, the only cost is
+# that later requests are queued behind the job, instead of merged into it.
+COALESCING_TTL = 24 * 60 * 60
+
+
+def last_repo_job_key(repopath):
+    return f'pfsc:last_repo_job:{repopath}'
+
+
+def coalescing_signature_key(job_id):
+    return f'pfsc:repo_job_coalescing:{job_id}'
+
+
+def coalesced_descriptors_key(job_id):
+    return f'pfsc:repo_job_coalesced:{job_id}'
+
+
+def claim_coalesced_job_descriptors(job):
+    """
+    Close a repo job to further coalescing, and collect the descriptors of
+    all requests that were coalesced into it.
+
+    :param job: the RQ job, which must be the one that is now starting.
+    :return: list of job descriptors, in the order in which they were added.
+    """
+    with job.connection.pipeline() as pipe:
+        pipe.delete(coalescing_signature_key(job.id))
+        pipe.lrange(coalesced_descriptors_key(job.id), 0, -1)
+        pipe.delete(coalesced_descriptors_key(job.id))
+        _, dumps, _ = pipe.execute()
+    return [job.serializer.loads(d) for d in dumps]
 
 
 # By setting the right message queue and channel, we can emit events from
@@ -461,11 +508,14 @@ class Handler:
         if self.do_require_csrf:
             self.check_csrf()
         self.check_enabled()
-        self.check_input()
-        self.withfields(self.check_permissions)
-        self.withfields(self.confirm)
-        for hook in self.post_preparation_hooks:
-            self.withfields(hook)
+        with span('handler.check_input'):
+            self.check_input()
+        with span('handler.check_permissions'):
+            self.withfields(self.check_permissions)
+        with span('handler.confirm'):
+            self.withfields(self.confirm)
+            for hook in self.post_preparation_hooks:
+                self.withfields(hook)
         self.is_prepared = True
 
     @pfsc_anticipate_all()
@@ -485,7 +535,8 @@ class Handler:
         if self.anticipated_pfsc_excep is not None:
             # There was already an error, so do nothing more.
             return
-        self.withfields(self.go_ahead)
+        with span('handler.go_ahead'):
+            self.withfields(self.go_ahead)
         self.success = True
 
     def process(self, raise_anticipated=False):
@@ -500,9 +551,10 @@ class Handler:
           set to True. That way, any errors occurring during K's process are actually
           visible to H.
         """
-        self.prepare(raise_anticipated=raise_anticipated)
-        if self.is_prepared:
-            self.proceed(raise_anticipated=raise_anticipated)
+        with span('handler.process', handler=type(self).__name__):
+            self.prepare(raise_anticipated=raise_anticipated)
+            if self.is_prepared:
+                self.proceed(raise_anticipated=raise_anticipated)
 
     @pfsc_anticipate_all()
     def super_process(self, cls):
@@ -579,6 +631,9 @@ class SocketHandler(Handler):
     Handler for SocketIO events.
     """
 
+    # The class of RQ job in which this handler does its work, if enqueued.
+    QUEUE_CLASS = QueueClass.INTERACTIVE
+
     def __init__(self, request_info, room,
                  recipSID=None, namespace=WEBSOCKET_NAMESPACE, csrf_from_session=None):
         """
@@ -674,7 +729,16 @@ class SocketHandler(Handler):
         self.emit(event, message)
 
 
-def finish_socket_handler_process_with_app(handler):
+@contextmanager
+def job_app_context(phony_session=None):
+    """
+    Context manager under which to carry out a handler's delayed processing,
+    as an RQ job.
+
+    :param phony_session: optional dict of session variables the processing
+        will require. If given, and if there is no request context, we supply
+        a phony one, in which these session vars are set.
+    """
     # If we're operating in RQ synchronous mode, then we'll still have the
     # existing app context under which the handler process began. Forming
     # a new one doesn't just waste time; in early experiments with the one-
@@ -682,20 +746,77 @@ def finish_socket_handler_process_with_app(handler):
     # socket emits through Redis. Only the new app heard them, and it of
     # course did not have any of the sockets on which the user was connected,
     # so no emits were being sent to the client.
+    #
+    # A long-lived `PfscWorker` likewise already has its app context, which
+    # we want to reuse, so that connections stay warm.
     app, new = get_app()
+    worker_app = is_worker_app(app)
     if new:
         # RQ workers need to be able to do whatever we ask them to do.
         # By the time a job reaches them, we are past all questions of permissions.
         app.config["PERSONAL_SERVER_MODE"] = True
-    with app.app_context():
-        d = getattr(handler, 'required_phony_session_dict', {})
-        need_rc = d and not has_request_context()
-        ctx_mgr = app.test_request_context() if need_rc else nullcontext()
-        with ctx_mgr:
-            for k, v in d.items():
-                session[k] = v
-            handler.proceed()
+    elif worker_app:
+        # Same, but the app outlives the job, so we must restore the setting.
+        psm = app.config["PERSONAL_SERVER_MODE"]
+        app.config["PERSONAL_SERVER_MODE"] = True
+    try:
+        with (nullcontext() if worker_app else app.app_context()):
+            d = phony_session or {}
+            need_rc = d and not has_request_context()
+            ctx_mgr = app.test_request_context() if need_rc else nullcontext()
+            with ctx_mgr:
+                for k, v in d.items():
+                    session[k] = v
+                yield
+    finally:
+        if worker_app:
+            app.config["PERSONAL_SERVER_MODE"] = psm
+
+
+def finish_socket_handler_process_with_app(handler):
+    with job_app_context(getattr(handler, 'required_phony_session_dict', {})):
+        handler.proceed()
+        handler.emit_standard_response()
+
+
+def perform_repo_task_job(descriptor, return_response=False):
+    """
+    The job function for exclusive repo tasks. See `RepoTaskHandler`.
+
+    :param descriptor: a job descriptor, as made by
+        `RepoTaskHandler.make_job_descriptor()`.
+    :param return_response: set True to return the handler's response. We do
+        not want this in async mode, since RQ would store it in Redis.
+    :return: the handler's response, or None.
+    """
+    requests = [descriptor]
+    job = get_current_job()
+    if job is not None:
+        requests += claim_coalesced_job_descriptors(job)
+    if len(requests) > 1:
+        cls = RepoTaskHandler.get_handler_class(descriptor)
+        descriptor = cls.coalesce_job_descriptors(requests)
+    with job_app_context(descriptor.get('session')):
+        # Our GDB writes should be seen by the reads of everyone we work for.
+        set_job_requesters(req.get('requester') for req in requests)
+        handler = RepoTaskHandler.from_job_descriptor(descriptor)
+        with span(
+            'handler.perform_job', handler=type(handler).__name__,
+            repopaths=descriptor.get('repopaths'), coalesced=len(requests)
+        ):
+            handler.rehydrate(descriptor)
+            if handler.is_prepared:
+                handler.proceed()
+        # Every requester whose request was coalesced into this job gets the
+        # response, in their own room, and with their own request info and
+        # cookie.
+        for req in requests:
+            handler.room = req['room']
+            handler.recipSID = req['recipSID']
+            handler.request_info = req['request_info']
+            handler.cookie = req['request_info'].get('cookie', {})
             handler.emit_standard_response()
+        return handler.generate_response() if return_response else None
 
 
 class RepoTaskHandler(SocketHandler):
@@ -707,8 +828,19 @@ class RepoTaskHandler(SocketHandler):
     running simultaneously, for a given repo. It is fine however to run such
     tasks simultaneously for different repos. We refer to tasks of this kind
     as "exclusive repo tasks".
+
+    Such tasks are carried out as RQ jobs. For the job, we do not serialize
+    the handler itself, but only a compact "job descriptor" (see
+    `make_job_descriptor()`), from which the job function forms a new handler
+    instance, and "rehydrates" it (see `rehydrate()`).
     """
 
+    # Names of attributes, set during preparation, which `go_ahead()` needs,
+    # and which therefore must be carried in the job descriptor. Values should
+    # be plain data. Checked input fields need not be listed, since these are
+    # recomputed from the raw request info.
+    JOB_STATE_ATTRS = []
+
     def __init__(self, request_info, room, recipSID=None, namespace=WEBSOCKET_NAMESPACE):
         SocketHandler.__init__(self, request_info, room, recipSID=recipSID, namespace=namespace)
         self.implicated_repopaths = set()
@@ -736,6 +868,19 @@ class RepoTaskHandler(SocketHandler):
             raise ValueError('Must pass one or two args')
         self.required_phony_session_dict[k] = v
 
+    def get_requester_identity(self, room=True):
+        """
+        Identify the requester of this task (see
+        `pfsc.session.get_requester_identity()`).
+
+        :param room: set False not to fall back on our socket room, to
+            identify an anonymous requester.
+        """
+        return get_requester_identity(
+            session_dict=self.required_phony_session_dict,
+            room=self.room if room else None,
+        )
+
     def get_implicated_repopaths(self):
         return self.implicated_repopaths
 
@@ -751,19 +896,193 @@ class RepoTaskHandler(SocketHandler):
         """
         raise NotImplementedError
 
+    def make_job_descriptor(self):
+        """
+        Make the descriptor from which an RQ job can carry out our task.
+
+        This is everything a new handler instance needs in order to proceed
+        as we would: the raw request info (from which it can recompute the
+        checked fields), where to emit, and whatever state and response
+        fields we have built up during preparation.
+
+        :return: dict
+        """
+        cls = self.__class__
+        return {
+            'v': JOB_DESCRIPTOR_VERSION,
+            'handler': f'{cls.__module__}.{cls.__qualname__}',
+            'request_info': self.request_info,
+            'room': self.room,
+            'recipSID': self.recipSID,
+            'namespace': self.namespace,
+            'repopaths': sorted(self.get_implicated_repopaths()),
+            'session': self.required_phony_session_dict,
+            # A room does not outlast its socket, so is no use for
+            # read-your-writes tokens.
+            'requester': self.get_requester_identity(room=False),
+            'response': self.success_response,
+            'state': {name: getattr(self, name) for name in self.JOB_STATE_ATTRS},
+        }
+
+    @staticmethod
+    def get_handler_class(descriptor):
+        """
+        Get the handler class named by a job descriptor.
+
+        :param descriptor: a job descriptor, as made by `make_job_descriptor()`.
+        :return: a subclass of RepoTaskHandler
+        :raises: PfscExcep if the descriptor is of a version we cannot handle,
+            or does not name a `RepoTaskHandler` subclass.
+        """
+        v = descriptor.get('v')
+        if v != JOB_DESCRIPTOR_VERSION:
+            msg = f'Cannot handle job descriptor of version {v}.'
+            raise PfscExcep(msg, PECode.BAD_JOB_DESCRIPTOR)
+        modname, _, clsname = descriptor['handler'].rpartition('.')
+        cls = getattr(importlib.import_module(modname), clsname, None)
+        if not (isinstance(cls, type) and issubclass(cls, RepoTaskHandler)):
+            msg = f'Job descriptor names unknown handler class: {descriptor["handler"]}'
+            raise PfscExcep(msg, PECode.BAD_JOB_DESCRIPTOR)
+        return cls
+
+    @staticmethod
+    def from_job_descriptor(descriptor):
+        """
+        Form a new handler instance from a job descriptor. The instance still
+        has to be rehydrated (see `rehydrate()`) before it can proceed.
+
+        :param descriptor: a job descriptor, as made by `make_job_descriptor()`.
+        :return: RepoTaskHandler
+        :raises: PfscExcep if the descriptor is bad (see `get_handler_class()`).
+        """
+        cls = RepoTaskHandler.get_handler_class(descriptor)
+        handler = cls(descriptor['request_info'], descriptor['room'])
+        handler.recipSID = descriptor['recipSID']
+        handler.namespace = descriptor['namespace']
+        # The CSRF check was passed at enqueueing time.
+        handler.do_require_csrf = False
+        return handler
+
+    @pfsc_anticipate_all()
+    def rehydrate(self, descriptor):
+        """
+        Bring a new handler, formed by `from_job_descriptor()`, to the
+        prepared state that the original one had at enqueueing time.
+
+        We re-run `check_input()`, but not the permission checks, which were
+        passed at enqueueing time.
+
+        :param descriptor: a job descriptor, as made by `make_job_descriptor()`.
+        """
+        self.check_input()
+        for name, value in descriptor['state'].items():
+            setattr(self, name, value)
+        self.success_response.update(descriptor['response'])
+        self.implicated_repopaths = set(descriptor['repopaths'])
+        self.required_phony_session_dict = dict(descriptor['session'])
+        self.withfields(self.complete_rehydration)
+        self.is_prepared = True
+
+    def complete_rehydration(self):
+        """
+        Subclasses may override, if they have more to restore than their
+        `JOB_STATE_ATTRS`.
+
+        **WF** This method is invoked using "withfields".
+        """
+        pass
+
+    def get_queue_class(self):
+        """
+        Say the class of RQ job in which our work should be done. Subclasses
+        may override, if this depends on the particular request.
+
+        :return: a value of the `QueueClass` enum class.
+        """
+        return self.QUEUE_CLASS
+
+    def get_coalescing_signature(self):
+        """
+        Handlers whose requests can be coalesced (see
+        `coalesce_into_waiting_job()`) should override, returning a string.
+        Two requests can be coalesced iff they have the same signature, which
+        therefore must determine (at least) the handler class, and the set of
+        implicated repopaths.
+
+        :return: string, or None if this request cannot be coalesced.
+        """
+        return None
+
+    @classmethod
+    def coalesce_job_descriptors(cls, descriptors):
+        """
+        Handlers that can have a coalescing signature must override.
+
+        :param descriptors: list of job descriptors, all having been made by
+            instances of this class, with the same coalescing signature, and
+            given in the order in which the requests were made.
+        :return: a single job descriptor, for a job that does the work of all
+            of the given ones.
+        """
+        raise NotImplementedError
+
+    def coalesce_into_waiting_job(self, redis, repos, descriptor, serializer):
+        """
+        Exclusive repo tasks for the same repo are chained one behind another.
+        When a task is requested while a job for the same repos, of the same
+        kind, is still waiting at the end of the chain, we can merge the new
+        request into that job, instead of chaining another job behind it.
+
+        Must be called while holding the lock on the repo job chains.
+
+        :param redis: Redis connection.
+        :param repos: the set of implicated repopaths.
+        :param descriptor: our job descriptor.
+        :param serializer: the serializer of the task queue.
+        :return: the id of the job into which we merged, or None if we could
+            not merge.
+        """
+        signature = self.get_coalescing_signature()
+        if signature is None or not check_config("COALESCE_REPO_JOBS"):
+            return None
+        last_job_ids = {redis.get(last_repo_job_key(repopath)) for repopath in repos}
+        if len(last_job_ids) != 1:
+            return None
+        job_id = last_job_ids.pop()
+        if job_id is None:
+            return None
+        job_id = job_id.decode()
+        sig_key = coalescing_signature_key(job_id)
+        with redis.pipeline() as pipe:
+            try:
+                # Watch the signature key, since the job may be starting, and
+                # closing itself to coalescing, at this very moment.
+                pipe.watch(sig_key)
+                if pipe.get(sig_key) != signature.encode():
+                    return None
+                pipe.multi()
+                pipe.rpush(coalesced_descriptors_key(job_id), serializer.dumps(descriptor))
+                pipe.expire(coalesced_descriptors_key(job_id), COALESCING_TTL)
+                pipe.execute()
+            except WatchError:
+                return None
+        return job_id
+
     def process(self, raise_anticipated=False):
         self.prepare(raise_anticipated=raise_anticipated)
         if self.is_prepared:
             repos = self.get_implicated_repopaths()
             if repos:
-                pfsc_task_queue = get_rqueue(MAIN_TASK_QUEUE_NAME)
+                queue_class = self.get_queue_class()
+                pfsc_task_queue = get_task_queue(queue_class)
+                requester = self.get_requester_identity()
                 next_job_id = str(uuid4())
                 redis = get_redis_connection()
                 is_async = pfsc_task_queue.is_async
 
-                # Whether we are in async mode or not, we ensure that the
-                # Handler instance that carries out the job will not be the
-                # present one.
+                # Whether we are in async mode or not, the Handler instance
+                # that carries out the job will not be the present one, but a
+                # new one, formed from our job descriptor.
                 #
                 # This ensures uniformity of behavior across our various
                 # execution contexts:
@@ -773,17 +1092,17 @@ class RepoTaskHandler(SocketHandler):
                 # and, in sync mode, prevents the present handler from becoming
                 # cluttered with the results of the job handler's work.
                 #
-                # In async mode, RQ will serialize the handler, and an RQ worker
-                # process will deserialize it. In sync mode, RQ does not do any
-                # ser./deser. and executes the job with the exact same objects
-                # it was passed. So in this case we do the ser./deser. ourselves,
-                # in order to make a copy.
-                handler_to_enqueue = self
+                # In async mode, RQ will serialize the descriptor, and an RQ
+                # worker process will deserialize it. In sync mode, RQ does not
+                # do any ser./deser. and executes the job with the exact same
+                # objects it was passed. So in this case we do the ser./deser.
+                # ourselves, so that the job handler shares no objects with us.
+                descriptor = self.make_job_descriptor()
                 if not is_async:
                     # Watch this line. `self.serializer` is not explicitly a
                     # part of the `Queue` class's API, so this could change.
                     ser = pfsc_task_queue.serializer
-                    handler_to_enqueue = ser.loads(ser.dumps(handler_to_enqueue))
+                    descriptor = ser.loads(ser.dumps(descriptor))
 
                 # If we're operating with RQ in synchronous mode, as in the OCA,
                 # then we don't use Redlock. It shouldn't be necessary in such a
@@ -795,34 +1114,53 @@ class RepoTaskHandler(SocketHandler):
                 # expire, Redlock raises a `ReleaseUnlockedLock` exception on exit.
                 ctx_mgr = (Redlock(key=f'pfsc:repo_job_queue_lock', masters={redis})
                            if is_async else nullcontext())
+                job = None
                 with ctx_mgr:
-                    last_job_ids = [
-                        redis.getset(f'pfsc:last_repo_job:{repopath}', next_job_id)
-                        for repopath in repos
-                    ]
-                    # Some last job ids may be None, and we want to filter these out;
-                    # the others will be bytes (since retrieved from Redis), and we
-                    # must convert these to strings.
-                    dependencies = [str(job_id) for job_id in last_job_ids if job_id]
-                    pfsc_task_queue.enqueue_call(
-                        finish_socket_handler_process_with_app, args=[handler_to_enqueue],
-                        job_id=next_job_id, depends_on=dependencies
-                    )
+                    coalesced_job_id = self.coalesce_into_waiting_job(
+                        redis, repos, descriptor, pfsc_task_queue.serializer)
+                    if coalesced_job_id is None:
+                        try:
+                            check_pending_jobs_limit(pfsc_task_queue, queue_class, requester)
+                        except PfscExcep as pe:
+                            self.set_anticipated_pfsc_excep(pe)
+                            return
+                        last_job_ids = [
+                            redis.getset(last_repo_job_key(repopath), next_job_id)
+                            for repopath in repos
+                        ]
+                        # Some last job ids may be None, and we want to filter these out;
+                        # the others will be bytes (since retrieved from Redis), and we
+                        # must convert these to strings.
+                        dependencies = [str(job_id) for job_id in last_job_ids if job_id]
+                        # Open the new job to coalescing, until it starts.
+                        signature = self.get_coalescing_signature()
+                        if signature is not None and check_config("COALESCE_REPO_JOBS"):
+                            redis.set(coalescing_signature_key(next_job_id), signature,
+                                      ex=COALESCING_TTL)
+                        job = pfsc_task_queue.enqueue_call(
+                            perform_repo_task_job, args=[descriptor],
+                            kwargs={'return_response': not is_async},
+                            job_id=next_job_id, depends_on=dependencies
+                        )
+                        note_pending_job(pfsc_task_queue, queue_class, requester, next_job_id)
+                    else:
+                        next_job_id = coalesced_job_id
                 self.job_id = next_job_id
                 # At this point, the present handler instance has done all it wants to
                 # do, so we count this much as a success.
                 self.success = True
-                # Meanwhile, when operating asynchronously, an RQ worker will have
-                # its own handler instance, after unpickling, and that one will emit
-                # its standard response when it finishes.
+                # Meanwhile, an RQ worker will form its own handler instance
+                # from the descriptor (or, if our request was coalesced, from
+                # the combination of several), and that one will emit its
+                # standard response when it finishes.
 
-                if not is_async and check_config("TESTING"):
+                if job is not None and not is_async and check_config("TESTING"):
                     # In our unit tests, we operate synchronously, and have still
                     # not managed to get the Flask-SocketIO test client to receive
                     # emitted messages. (TO DO!) Therefore, in order to be able to
                     # see the emitted response of the job handler, we stash it here
                     # in our own response.
-                    resp = handler_to_enqueue.generate_response()
+                    resp = job.result
                     self.set_response_field(
                         pfsc.constants.SYNC_JOB_RESPONSE_KEY, resp)
 
@@ -21,6 +21,7 @@ from pfsc.handlers import SocketHandler
 from pfsc.excep import PfscExcep, PECode
 from pfsc.checkinput import IType
 from pfsc.build.products import load_annotation
+from pfsc.exampeval import evaluate_examp
 from pfsc.lang.widgets import make_widget_uid, WidgetTypes, WIDGET_TYPE_TO_CLASS
 
 
@@ -99,28 +100,20 @@ class WidgetReconstructor:
 
 class ExampHandler(SocketHandler):
     """
-    Server-side examp re-eval is disabled, at least for now (maybe for good?).
-    We have moved to using Pyodide in the browser for this.
-
-    Here was the old config var and explanatory text from config.py, which is checked here:
-
-    # Evaluating examp widgets (i.e. param and disp widgets) means passing jobs
-    # to the math queue workers based on "moderately freeform" input.
-    # Much has been done in the design of the param and disp widgets to try to
-    # gracefully handle "bad code"; however, it is the nature of such a system
-    # that we will never be able to call it more than "maybe safe". For this
-    # reason, the math queue workers are containerized, and there is a strict,
-    # short timeout before these jobs are terminated, completed or not. Use
-    # this setting to decide whether to evaluate examp widgets from untrusted
-    # repos.
-    EVAL_EXAMP_WIDGETS_IN_UNTRUSTED_REPOS = bool(int(os.getenv("EVAL_EXAMP_WIDGETS_IN_UNTRUSTED_REPOS", 0)))
+    Server-side examp evaluation is an opt-in alternative to evaluation in
+    the browser, under Pyodide. See `pfsc.exampeval`.
     """
 
+    def check_enabled(self):
+        if not check_config("SERVER_SIDE_EXAMP_EVAL"):
+            msg = 'Server-side evaluation of examplorer widgets is disabled.'
+            raise PfscExcep(msg, PECode.SERVICE_DISABLED)
+
     def check_libpath_trusted(self):
         if not check_config("EVAL_EXAMP_WIDGETS_IN_UNTRUSTED_REPOS"):
             checked_libpath = self.fields['libpath']
             lp = checked_libpath.value
-            is_trusted = libpath_is_trusted(lp)
+            is_trusted = libpath_is_trusted(lp, self.fields['vers'].full)
             if not is_trusted:
                 msg = 'Sorry, cannot evaluate examplorer widget %s from untrusted repo.' % lp
                 raise PfscExcep(msg, PECode.LIBPATH_NOT_ALLOWED)
@@ -173,25 +166,21 @@ class ExampReevaluator(ExampHandler):
         _, data_json = load_annotation(annopath, cache_code, version=vers.full)
 
         wr = WidgetReconstructor(data_json)
-        target_widget = wr.get_widget(widgetpath)
-        required_widgets = []
-        deps = target_widget.data["dependencies"]
-        for dep in deps:
-            lp = dep["libpath"]
-            if dep["type"] == WidgetTypes.PARAM:
-                if lp not in params:
-                    msg = f'Missing required parameter choice for `{lp}`'
-                    raise PfscExcep(msg, PECode.MISSING_EXAMPLORE_PARAM)
-                subs = {"default": params[lp]}
-            else:
-                subs = None
-            required_widgets.append(wr.get_widget(lp, subs=subs))
-
-        wr.link_all()
-
-        for w in required_widgets:
-            w.enrich_data()
-
-        target_widget.enrich_data()
-
-        self.set_response_field('innerHtml', target_widget.innerHtml)
+        target_info = wr.get_widget_data(widgetpath)
+        if target_info["type"] not in [WidgetTypes.PARAM, WidgetTypes.DISP]:
+            msg = f'`{widgetpath}` is not an examplorer widget.'
+            raise PfscExcep(msg, PECode.EXAMP_WIDGET_WRONG_DEPENDENCY_TYPE)
+        dep_infos = [
+            wr.get_widget_data(dep["libpath"])
+            for dep in target_info["dependencies"]
+        ]
+
+        result = evaluate_examp(widgetpath, vers.full, target_info, dep_infos, params)
+
+        # Same fields as in `pfsc_examp.rebuild_examp_generator_from_js()`.
+        self.set_response_field('err_lvl', result['err_lvl'])
+        self.set_response_field('err_msg', result['err_msg'])
+        if 'blame_widget_uid' in result:
+            self.set_response_field('blame_widget_uid', result['blame_widget_uid'])
+        if 'html' in result:
+            self.set_response_field('innerHtml', result['html'])
@@ -28,6 +28,7 @@ from pfsc.build.repo import get_repo_part
 from pfsc.gdb import get_graph_reader
 from pfsc.gdb.user import should_load_user_notes_from_gdb
 from pfsc.handlers.study import StudyPageBuilder
+from pfsc.tracing import span
 
 
 def inject_enrichment_and_notes_in_dashgraph(enrichment, user_notes, node):
@@ -138,9 +139,11 @@ class DashgraphLoader(Handler):
         assert libpath.valid_format
 
     def go_ahead(self, libpath, vers, cache_code):
-        h0 = products.load_dashgraph_with_cache.cache_info().hits
-        dgj = products.load_dashgraph(libpath.value, cache_code, version=vers.full)
-        h1 = products.load_dashgraph_with_cache.cache_info().hits
+        with span('load.dashgraph', libpath=libpath.value, version=vers.full) as s:
+            h0 = products.load_dashgraph_with_cache.cache_info().hits
+            dgj = products.load_dashgraph(libpath.value, cache_code, version=vers.full)
+            h1 = products.load_dashgraph_with_cache.cache_info().hits
+            s.set(cache_hit=h1 > h0)
         dg = json.loads(dgj)
 
         gr = get_graph_reader()
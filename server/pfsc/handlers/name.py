@@ -169,6 +169,10 @@ class RenameModuleHandler(RepoTaskHandler):
         assert segment.length_in_bounds
         assert segment.valid_format
 
+    def complete_rehydration(self):
+        # Our `confirm()` computes the `segment` field.
+        self.withfields(self.confirm)
+
     def check_permissions(self, libpath):
         self.check_repo_write_permission(libpath, action='edit')
 
@@ -21,6 +21,7 @@ from pygit2 import clone_repository, GitError, RemoteCallbacks
 
 from pfsc import check_config, libpath_is_trusted
 import pfsc.constants
+from pfsc.constants import QueueClass
 from pfsc.permissions import have_repo_permission, ActionType
 from pfsc.excep import PfscExcep, PECode
 from pfsc.handlers import RepoTaskHandler
@@ -53,6 +54,12 @@ class RepoLoader(RepoTaskHandler):
     Supports optionally building and even cloning the repo, as needed.
     """
 
+    JOB_STATE_ATTRS = [
+        'version', 'is_wip', 'required_hash',
+        'will_return_model_immediately', 'will_scan',
+        'will_build', 'will_clone', 'will_make_demo',
+    ]
+
     def __init__(self, request_info, room):
         RepoTaskHandler.__init__(self, request_info, room)
         self.repo_info = None
@@ -127,6 +134,11 @@ class RepoLoader(RepoTaskHandler):
         self.set_response_field('repopath', self.repo_info.libpath)
         self.set_response_field('version', vers.full)
 
+    def complete_rehydration(self):
+        # The true repopath (which can differ from the requested one, for demo
+        # repos) was recorded as a response field in `confirm()`.
+        self.repo_info = RepoInfo(self.get_response_field('repopath'))
+
     def compute_implicated_repopaths(self, doBuild, doClone):
         repopath = self.repo_info.libpath
 
@@ -205,6 +217,13 @@ class RepoLoader(RepoTaskHandler):
     def need_lock(self):
         return self.will_build or self.will_clone or self.will_make_demo
 
+    def get_queue_class(self):
+        if self.will_clone:
+            return QueueClass.BULK_CLONE
+        if self.will_build or self.will_make_demo:
+            return QueueClass.BUILD
+        return self.QUEUE_CLASS
+
     def load_model(self):
         # The manifest for a numbered release never changes, so we can use a
         # constant cache control code for that case.
@@ -14,27 +14,36 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
+from functools import lru_cache
 import json
 import os
+import re
 
 from flask_login import current_user
 import jinja2
 
+from pfsc import libpath_is_trusted
 from pfsc.constants import IndexType
 from pfsc.handlers import Handler
 from pfsc.excep import PfscExcep, PECode
 from pfsc.checkinput import IType
+from pfsc.checkinput.version import CheckedVersion
 from pfsc.build.lib.libpath import get_modpath, PathInfo
 from pfsc.build.products import load_dashgraph, load_annotation
-from pfsc.build.repo import get_repo_part
-from pfsc.lang.modules import load_module, build_module_from_text
+from pfsc.build.repo import get_repo_part, get_repo_info
+from pfsc.lang.freestrings import Libpath, RawWidgetData, vertex_and_escape
+from pfsc.lang.modules import load_module, PfscModule, PendingImport
 from pfsc.lang.annotations import Annotation
 from pfsc.lang.widgets import GoalWidget, WidgetTypes
 from pfsc.lang.deductions import Deduction
-from pfsc.build.versions import collapse_major_string, adapt_gen_version_to_major_index_prop as adapt_maj
+from pfsc.build.versions import (
+    collapse_major_string, get_major_version_part,
+    adapt_gen_version_to_major_index_prop as adapt_maj,
+)
 from pfsc.gdb import get_gdb, get_graph_reader, building_in_gdb
+from pfsc.gdb.origins import batched_origin_lookups
 from pfsc.gdb.user import should_load_user_notes_from_gdb
-from pfsc.build.manifest import load_manifest
+from pfsc.build.manifest import load_manifest_node
 import pfsc.constants
 
 class GoalInfo:
@@ -50,15 +59,23 @@ class GoalInfo:
         """
         return []
 
-    def write_pfsc(self, studyData):
+    def write_section(self, writer, studyData):
         """
         Subclasses should override.
+        :param writer: the `StudyPageWriter`, through which widgets are to be
+          written.
         :param studyData: lookup giving goal notes by origin.
-        :return: string representing a section of a study page,
-          in pfsc syntax.
+        :return: string representing a section of a study page, in pfsc
+          syntax, except that widgets are represented by the writer's markers.
         """
         return ''
 
+    @staticmethod
+    def get_notes(studyData, origin):
+        notes = studyData.get(origin, {}).get('notes')
+        # NUL chars would be mistaken for the boundaries of widget markers.
+        return notes.replace('\x00', '') if isinstance(notes, str) else notes
+
 class AnnoInfo(GoalInfo):
 
     def __init__(self, anno_name):
@@ -83,11 +100,13 @@ class AnnoInfo(GoalInfo):
     def get_origins(self):
         return [p[1] for p in self.goal_widgets]
 
-    def write_pfsc(self, studyData):
-        notes = {g[1]: studyData.get(g[1], {}).get('notes') for g in self.goal_widgets}
+    def write_section(self, writer, studyData):
+        notes = {g[1]: self.get_notes(studyData, g[1]) for g in self.goal_widgets}
         context = {
             'ai': self,
             'notes': notes,
+            'w': writer.widget,
+            'Libpath': Libpath,
         }
         return study_page_anno_section_template.render(context)
 
@@ -116,38 +135,108 @@ class DeducInfo(GoalInfo):
     def get_origins(self):
         return [self.deduc_origin] + [p[1] for p in self.nodes]
 
-    def write_pfsc(self, studyData):
-        notes = {u[1]: studyData.get(u[1], {}).get('notes') for u in self.nodes}
+    def write_section(self, writer, studyData):
+        notes = {u[1]: self.get_notes(studyData, u[1]) for u in self.nodes}
         context = {
             'di': self,
-            'deduc_notes': studyData.get(self.deduc_origin, {}).get('notes'),
+            'deduc_notes': self.get_notes(studyData, self.deduc_origin),
             'notes': notes,
+            'w': writer.widget,
         }
         return study_page_deduc_section_template.render(context)
 
 
+WIDGET_MARKER_PATTERN = re.compile('\x00(\\d+)\x00')
+
+
+class StudyPageWriter:
+    """
+    Writes the annotation for a study page, using the templates below. It
+    records the same parts `split_on_widgets()` would find in the text,
+    together with the data for each widget, as our JSON parser would produce
+    it from the widget's data text. This lets us build the study page
+    directly, instead of writing pfsc text, and parsing it.
+
+    The templates write widgets by calling our `widget()` method, which
+    records the widget, and returns a marker, to be replaced when we
+    `record()` the rendered text. We can then either write the text of the
+    annotation (which the `Annotation` wants, but does not parse), or use
+    the parts.
+    """
+
+    def __init__(self):
+        self.parts = ['']
+        self.widgets = []
+        self.widget_data = []
+
+    def widget(self, type_, label, **fields):
+        """
+        Add a widget, with automatically supplied name.
+
+        :param type_: the widget type, as it would be written in pfsc text.
+        :param label: the widget label.
+        :param fields: the widget's fields, in order. Each value is either a
+            `Libpath`, or a string, which would be written in quotes.
+        :return: a marker, to be written in the text in place of the widget.
+        """
+        k = len(self.widgets)
+        data_text = '{' + ', '.join(
+            f'{key}:{v}' if isinstance(v, Libpath) else f'{key}:"{v}"'
+            for key, v in fields.items()
+        ) + '}'
+        data = {
+            key: v if isinstance(v, Libpath) else vertex_and_escape(v)
+            for key, v in fields.items()
+        }
+        self.widgets.append((type_, f'_w{k}', label, data_text))
+        self.widget_data.append(data)
+        return f'\x00{k}\x00'
+
+    def record(self, text):
+        """
+        Record the rendered text of the annotation, splitting it into parts
+        at the widget markers.
+        """
+        pieces = WIDGET_MARKER_PATTERN.split(text)
+        self.parts = [pieces[0]]
+        lineno = 1 + pieces[0].count('\n')
+        for i in range(1, len(pieces), 2):
+            type_, name, label, data_text = self.widgets[int(pieces[i])]
+            self.parts.append(RawWidgetData(type_, name, label, data_text, lineno))
+            self.parts.append(pieces[i + 1])
+            lineno += data_text.count('\n') + pieces[i + 1].count('\n')
+
+    def write_text(self):
+        return ''.join(
+            p if isinstance(p, str) else f'<{p.type}:>[{p.label}]{p.data}'
+            for p in self.parts
+        )
+
+
 study_page_basic_template = jinja2.Template('''
 {% for name in names %}
 from {{modpath}} import {{name}}
 {% endfor %}
-anno {{pagename}} @@@
+anno {{pagename}} @@@{{notes}}@@@
+''')
+
+study_page_notes_template = jinja2.Template('''
 # Study Notes
 ----------------------------------------------------------------------
 {% for section in sections %}
 {{section}}
 ----------------------------------------------------------------------
 {% endfor %}
-@@@
-''')
+''', keep_trailing_newline=True)
 
 study_page_anno_section_template = jinja2.Template('''
 ## Page
 
-<link:>[`{{ai.anno_name}}`]{tab:"other", ref:{{ai.anno_name}}}
+{{w('link', '`' ~ ai.anno_name ~ '`', tab='other', ref=Libpath(ai.anno_name))}}
 
 ## Goals
 {% for goal_name, origin in ai.goal_widgets %}
-<goal:>[]{altpath:"{{ai.anno_name}}.{{goal_name}}", origin:"{{origin}}"} <link:>[`{{goal_name}}`]{tab:"other", ref:{{ai.anno_name}}.{{goal_name}}}
+{{w('goal', '', altpath=ai.anno_name ~ '.' ~ goal_name, origin=origin)}} {{w('link', '`' ~ goal_name ~ '`', tab='other', ref=Libpath(ai.anno_name ~ '.' ~ goal_name))}}
 {% if notes[origin] %}
 {{notes[origin]}}
 {% endif %}
@@ -157,12 +246,12 @@ study_page_anno_section_template = jinja2.Template('''
 study_page_deduc_section_template = jinja2.Template('''
 ## Deduction
 
-<goal:>[]{altpath:"{{di.deduc_name}}"} <chart:>[`{{di.deduc_name}}`]{view:"{{di.deduc_name}}"}
+{{w('goal', '', altpath=di.deduc_name)}} {{w('chart', '`' ~ di.deduc_name ~ '`', view=di.deduc_name)}}
 {% if deduc_notes %}{{deduc_notes}}{% endif %}
 
 ## Goals
 {% for idp, origin in di.nodes %}
-<goal:>[]{altpath:"{{di.deduc_name}}.{{idp}}"} <chart:>[`{{idp}}`]{view:"{{di.deduc_name}}.{{idp}}"}
+{{w('goal', '', altpath=di.deduc_name ~ '.' ~ idp)}} {{w('chart', '`' ~ idp ~ '`', view=di.deduc_name ~ '.' ~ idp)}}
 {% if notes[origin] %}
 {{notes[origin]}}
 {% endif %}
@@ -197,14 +286,79 @@ class GoalDataHandler(Handler):
         self.method = method
 
     def make_loader(self, libpath, version):
-        LoaderClass = {
-            GoalDataLoadMethod.BUILD_DIR: BuildDir_GoalDataLoader,
-            #GoalDataLoadMethod.GDB: Gdb_GoalDataLoader,
-            GoalDataLoadMethod.MOD_LOAD: ModuleLoad_GoalDataLoader,
-        }[self.method]
-        loader = LoaderClass(libpath, version)
-        loader.check()
-        return loader
+        return make_goal_data_loader(self.method, libpath, version)
+
+    def load_goal_data(self, libpath, version, generation=None):
+        """
+        Make a loader, and load goal data, using the cache if possible.
+
+        :param generation: the build generation, if already known, else we
+            look it up.
+        :return: pair (loader, list of `GoalInfo` instances)
+        """
+        if generation is None:
+            generation = get_build_generation(libpath, version.full)
+        if generation is None:
+            loader = self.make_loader(libpath, version)
+            return loader, loader.load_goal_data()
+        return load_goal_data_with_cache(self.method, libpath, version.full, generation)
+
+
+def make_goal_data_loader(method, libpath, version):
+    LoaderClass = {
+        GoalDataLoadMethod.BUILD_DIR: BuildDir_GoalDataLoader,
+        #GoalDataLoadMethod.GDB: Gdb_GoalDataLoader,
+        GoalDataLoadMethod.MOD_LOAD: ModuleLoad_GoalDataLoader,
+    }[method]
+    loader = LoaderClass(libpath, version)
+    loader.check()
+    return loader
+
+
+def get_build_generation(libpath, full_version):
+    """
+    Get a value that changes whenever the repo to which a libpath belongs
+    is rebuilt at a given version.
+
+    Not only WIP, but numbered versions too, can be rebuilt (after
+    `delete_full_build_at_version()`), so we need a value that comes from
+    the build itself. When building in the build dir, we use the modification
+    time of the manifest, which is rewritten by every build. When building in
+    the GDB, we use the time at which the version was indexed.
+
+    :return: the generation, or None if the repo is not built at this version.
+    """
+    if building_in_gdb():
+        repopath = get_repo_part(libpath)
+        for info in get_graph_reader().get_versions_indexed(repopath, include_wip=True):
+            if info['version'] == full_version:
+                return info.get('time')
+        return None
+    path = get_repo_info(libpath).get_manifest_json_path(version=full_version)
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@lru_cache(maxsize=32)
+def load_goal_data_with_cache(method, libpath, full_version, generation):
+    """
+    Make a goal data loader, and load the goal data.
+
+    :param method: value of the `GoalDataLoadMethod` enum class.
+    :param libpath: the libpath under which to load goal data.
+    :param full_version: the full version at which to load.
+    :param generation: the build generation, as returned by
+        `get_build_generation()`. Just here for cache control.
+    :return: pair (loader, list of `GoalInfo` instances)
+    """
+    version = CheckedVersion(
+        full_version, get_major_version_part(full_version),
+        full_version == pfsc.constants.WIP_TAG
+    )
+    loader = make_goal_data_loader(method, libpath, version)
+    return loader, loader.load_goal_data()
 
 
 class StudyPageBuilder(GoalDataHandler):
@@ -279,28 +433,70 @@ class StudyPageBuilder(GoalDataHandler):
         if vers.isWIP:
             self.check_repo_read_permission(studypath, vers, action='load work in progress from')
 
-    def write_pfsc(self, pagename, modpath, infos, studyData):
+    @staticmethod
+    def write_parts(infos, studyData):
+        """
+        Write the annotation for a study page.
+
+        :return: the `StudyPageWriter`
+        """
+        writer = StudyPageWriter()
+        sections = [info.write_section(writer, studyData) for info in infos]
+        writer.record(study_page_notes_template.render(sections=sections))
+        return writer
+
+    @staticmethod
+    def write_pfsc(pagename, modpath, infos, studyData):
+        """
+        Write the whole module for a study page, as pfsc text.
+        """
         context = {
             'pagename': pagename,
             'modpath': modpath,
             'names': [info.name() for info in infos],
-            'sections': [info.write_pfsc(studyData) for info in infos]
+            'notes': StudyPageBuilder.write_parts(infos, studyData).write_text(),
         }
         return study_page_basic_template.render(context)
 
-    def go_ahead(self, modpath, vers, studypath, studyData):
-        loader = self.make_loader(studypath.value, vers)
-        infos = loader.load_goal_data()
-        if should_load_user_notes_from_gdb():
-            studyData = loader.load_user_notes()
+    @staticmethod
+    def build_page_module(pagename, modpath, src_modpath, infos, studyData, dependencies):
+        """
+        Build the module for a study page directly, i.e. without writing it
+        as pfsc text and parsing. The result is the same as we would get by
+        passing the text from `write_pfsc()` to `build_module_from_text()`.
+
+        :return: the (unresolved) `PfscModule`
+        """
+        writer = StudyPageBuilder.write_parts(infos, studyData)
+        module = PfscModule(modpath, given_dependencies=dependencies)
+        for info in infos:
+            module.add_pending_import(PendingImport(
+                module, PendingImport.FROM_IMPORT_FORMAT,
+                src_modpath, object_names=[info.name()]
+            ))
+        anno = Annotation(pagename, [], writer.write_text(), module)
+        module[pagename] = anno
+        # In the template, each import takes two lines, and there are three more
+        # before the anno.
+        anno.setTextRange(3 + 2 * len(infos), None, None, None)
+        anno.build(raw_parts=writer.parts, widget_data=writer.widget_data)
+        anno.cascadeLibpaths()
+        return module
+
+    @staticmethod
+    def build_page(modpath, vers, loader, infos, studyData):
+        """
+        Build a study page module on the fly, and return the built annotation
+        assets.
+
+        :return: pair (html, data_json)
+        """
         pagename = pfsc.constants.STUDYPAGE_ANNO_NAME
-        pfsc_text = self.write_pfsc(pagename, loader.modpath, infos, studyData)
-        # Now build a module on the fly, and return the built annotation assets.
-        repopath = get_repo_part(studypath.value)
-        modpath = modpath.value
-        module = build_module_from_text(pfsc_text, modpath, dependencies={
-            repopath: vers.full,
-        })
+        repopath = get_repo_part(loader.libpath)
+        module = StudyPageBuilder.build_page_module(
+            pagename, modpath, loader.modpath, infos, studyData,
+            dependencies={repopath: vers.full}
+        )
         module.resolve()
         # Hack: Before writing the data for the page, tell this PfscModule
         # that it represents the same version as that of the subject matter
@@ -313,11 +509,54 @@ class StudyPageBuilder(GoalDataHandler):
         page = module[pagename]
         html = page.get_escaped_html()
         data = page.get_page_data()
-        data_json = json.dumps(data)
+        return html, json.dumps(data)
+
+    def go_ahead(self, modpath, vers, studypath, studyData):
+        generation = get_build_generation(studypath.value, vers.full)
+        loader, infos = self.load_goal_data(studypath.value, vers, generation=generation)
+        if should_load_user_notes_from_gdb():
+            studyData = loader.load_user_notes()
+        if generation is None:
+            html, data_json = self.build_page(modpath.value, vers, loader, infos, studyData)
+        else:
+            # Besides the build, and the notes, the page depends only on
+            # whether it is trusted, which may depend on the user.
+            pagepath = f'{modpath.value}.{pfsc.constants.STUDYPAGE_ANNO_NAME}'
+            html, data_json = build_study_page_with_cache(
+                self.method, modpath.value, studypath.value, vers.full, generation,
+                json.dumps(studyData, sort_keys=True),
+                libpath_is_trusted(pagepath, vers.full),
+            )
         self.set_response_field('html', html)
         self.set_response_field('data_json', data_json)
 
 
+@lru_cache(maxsize=32)
+def build_study_page_with_cache(method, modpath, studypath, full_version, generation,
+                                study_data_json, trusted):
+    """
+    Build a study page, or reuse one already built, for the same build of the
+    subject matter, with the same notes.
+
+    Most study pages are loaded with no notes, or without changes to the
+    notes, so this saves building the module for the page, and looking up its
+    widgets' data, and not just rendering the markdown (which the render cache
+    already saves).
+
+    :param study_data_json: the study data, as JSON with sorted keys.
+    :param trusted: whether the page is trusted. Just here for cache control.
+    :return: pair (html, data_json)
+    """
+    version = CheckedVersion(
+        full_version, get_major_version_part(full_version),
+        full_version == pfsc.constants.WIP_TAG
+    )
+    loader, infos = load_goal_data_with_cache(method, studypath, full_version, generation)
+    return StudyPageBuilder.build_page(
+        modpath, version, loader, infos, json.loads(study_data_json)
+    )
+
+
 class GoalOriginFinder(GoalDataHandler):
     """
     Look up goal origins.
@@ -344,8 +583,7 @@ class GoalOriginFinder(GoalDataHandler):
             self.check_repo_read_permission(libpath, vers, action='load work in progress from')
 
     def go_ahead(self, libpath, vers):
-        loader = self.make_loader(libpath.value, vers)
-        infos = loader.load_goal_data()
+        loader, infos = self.load_goal_data(libpath.value, vers)
         all_origins = sum([info.get_origins() for info in infos], [])
         self.set_response_field('origins', all_origins)
 
@@ -510,8 +748,7 @@ class BuildDir_GoalDataLoader(GoalDataLoader):
 
     def load_module_data(self):
         # We use the manifest, so that we can load files in definition order.
-        manifest = load_manifest(self.modpath, version=self.version.full)
-        module_node = manifest.get(self.modpath)
+        module_node = load_manifest_node(self.modpath, version=self.version.full)
         contents = module_node.get_contents()
 
         infos = []
@@ -579,8 +816,10 @@ class ModuleLoad_GoalDataLoader(GoalDataLoader):
     def build_anno_info(anno):
         goal_widgets = list(filter(lambda w: isinstance(w, GoalWidget), anno.get_widget_lookup().values()))
         ai = AnnoInfo(anno.name)
+        with batched_origin_lookups():
+            for gw in goal_widgets:
+                gw.compute_origin()
         for gw in goal_widgets:
-            gw.compute_origin()
             ai.add_goal_widget(gw.name, gw.origin)
         return ai
 
@@ -0,0 +1,67 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+from flask_login import current_user
+
+from pfsc import check_config
+from pfsc.checkinput import IType
+from pfsc.excep import PfscExcep, PECode
+from pfsc.handlers import Handler
+from pfsc.tracing import get_tracer, RingBufferExporter
+
+
+class TraceLoader(Handler):
+    """
+    Load the most recent spans held by the in-memory tracing exporter of the
+    process serving the request. Admins only (or anyone, in personal server
+    mode).
+    """
+
+    def check_enabled(self):
+        tracer = get_tracer()
+        if tracer is None or tracer.get_exporter(RingBufferExporter) is None:
+            msg = 'The in-memory tracing exporter is not enabled.'
+            raise PfscExcep(msg, PECode.SERVICE_DISABLED)
+
+    def check_input(self):
+        """
+        name: optional prefix. If given, load only spans whose names begin
+          with this, e.g. `build.` or `gdb.`.
+        limit: optional maximum number of spans to load (the most recent).
+        """
+        self.check({
+            "OPT": {
+                'name': {
+                    'type': IType.STR,
+                    'default_cooked': None,
+                },
+                'limit': {
+                    'type': IType.INTEGER,
+                    'min': 0,
+                    'default_cooked': None,
+                },
+            }
+        })
+
+    def check_permissions(self):
+        if check_config("PERSONAL_SERVER_MODE"):
+            return
+        if not (current_user.is_authenticated and current_user.is_admin()):
+            raise PfscExcep('Only admins may load traces.', PECode.INADEQUATE_PERMISSIONS)
+
+    def go_ahead(self, name, limit):
+        exporter = get_tracer().get_exporter(RingBufferExporter)
+        self.set_response_field('spans', exporter.list_spans(name_prefix=name, limit=limit))
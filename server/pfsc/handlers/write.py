@@ -14,6 +14,7 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
+import json
 import time
 
 from flask import has_request_context
@@ -156,6 +157,8 @@ class WriteHandler(RepoTaskHandler):
                 AutowriteType enum class.
     """
 
+    JOB_STATE_ATTRS = ['writerepos', 'buildrepos', 'cacherepos']
+
     def __init__(self, request_info, room):
         RepoTaskHandler.__init__(self, request_info, room)
         self.post_preparation_hooks.insert(0, self.prepare_autowriters)
@@ -271,6 +274,12 @@ class WriteHandler(RepoTaskHandler):
             assert aw.is_prepared
             self.autowriters.append(aw)
 
+    def complete_rehydration(self):
+        # AutoWriters are handlers in their own right, and are cheap to prepare
+        # (just input checking), so we prepare them again, instead of trying to
+        # carry them in the descriptor.
+        self.withfields(self.prepare_autowriters)
+
     def compute_implicated_repopaths(self):
         ir = self.writerepos | self.buildrepos | self.cacherepos
         for aw in self.autowriters:
@@ -283,6 +292,59 @@ class WriteHandler(RepoTaskHandler):
             )
         self.implicated_repopaths = ir
 
+    def get_coalescing_signature(self):
+        # Autowrites are performed after all writes, so, if coalesced, an
+        # earlier request's autowrite could land on top of a later request's
+        # text. Requests with autowrites therefore get a job of their own.
+        if self.fields['autowrites']:
+            return None
+        repos = ','.join(sorted(self.get_implicated_repopaths()))
+        requester = self.get_requester_identity()
+        return f'WriteHandler:{requester}:{self.fields["shadowonly"]}:{repos}'
+
+    @classmethod
+    def coalesce_job_descriptors(cls, descriptors):
+        """
+        Combine several write requests, all from the same requester, into one.
+        For modules written by more than one request, the last write wins.
+        Builds are unioned, and a build is clean if any of the requests asked
+        for it to be clean. Requests with autowrites are never coalesced (see
+        `get_coalescing_signature()`), so none of the requests have any.
+        """
+        writes = {}
+        builds = {}
+        shadowonly = False
+        for d in descriptors:
+            info = json.loads(d['request_info']['info'])
+            assert not info.get('autowrites')
+            writes.update(zip(info.get('writepaths', []), info.get('writetexts', [])))
+            for buildpath, makeclean in zip(info.get('buildpaths', []), info.get('makecleans', [])):
+                builds[buildpath] = builds.get(buildpath, False) or makeclean
+            # All requests have the same signature, so the same `shadowonly`.
+            shadowonly = info.get('shadowonly', False)
+
+        last = descriptors[-1]
+        combined = dict(last)
+        combined['request_info'] = dict(last['request_info'])
+        combined['request_info']['info'] = json.dumps({
+            'writepaths': list(writes.keys()),
+            'writetexts': list(writes.values()),
+            'shadowonly': shadowonly,
+            'buildpaths': list(builds.keys()),
+            'makecleans': list(builds.values()),
+            'autowrites': [],
+        })
+        combined['state'] = {
+            name: set().union(*[d['state'][name] for d in descriptors])
+            for name in cls.JOB_STATE_ATTRS
+        }
+        # All requests come from the same requester, so have the same session.
+        combined['session'] = dict(last['session'])
+        combined['response'] = {}
+        for d in descriptors:
+            combined['response'].update(d['response'])
+        return combined
+
     def go_ahead(self, writepaths, writetexts, shadowonly, buildpaths, makecleans, autowrites):
         # Replace CheckedLibpaths with their values.
         writepaths = [p.value for p in writepaths]
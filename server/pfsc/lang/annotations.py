@@ -21,8 +21,10 @@ from pfsc import libpath_is_trusted
 from pfsc.excep import PfscExcep, PECode
 from pfsc.constants import IndexType
 from pfsc.lang.freestrings import (
-    PfscJsonTransformer, json_parser, split_on_widgets, render_anno_markdown
+    PfscJsonTransformer, json_parser, split_on_widgets, render_anno_markdown,
+    lookup_link_and_img_policy,
 )
+from pfsc.lang.render_cache import make_render_key, cached_render
 from pfsc.lang.widgets import (
     UnknownTypeWidget, MalformedWidget,
     WIDGET_TYPE_TO_CLASS,
@@ -104,16 +106,25 @@ class Annotation(EnrichmentPage):
     def get_index_type(self):
         return IndexType.ANNO
 
-    def build(self):
+    def build(self, raw_parts=None, widget_data=None):
         """
         Split the text into chunks, find and build widgets.
+
+        When building an annotation programmatically, instead of from a module,
+        the parsing can be skipped, by passing the results directly:
+
+        :param raw_parts: optional list of parts, as `split_on_widgets()` would
+            return for our text.
+        :param widget_data: list of dicts, giving the data for each widget
+            defn in `raw_parts`, as our JSON parser would return it. Required
+            if `raw_parts` is given.
         """
         # Start by "splitting on widgets". In other words, the full text of the annotation is split
         # into alternating chunks of non-widget text, and widget definitions. The list is always odd in
         # length, starting and ending with (possibly empty) non-widget text.
         # We store these original "chunks" before proceding to build Widget instances based on the
         # widget defn parts.
-        self.raw_parts = split_on_widgets(self.text)
+        self.raw_parts = split_on_widgets(self.text) if raw_parts is None else raw_parts
         parts = self.raw_parts
         # Number of parts:
         self.Np = len(parts)
@@ -134,8 +145,11 @@ class Annotation(EnrichmentPage):
                 raise PfscExcep(msg, PECode.DUPLICATE_DEFINITION_IN_PFSC_MODULE)
             # Try to build a dictionary from the user-supplied JSON.
             try:
-                tree = json_parser.parse(rwd.data)
-                data = transformer.transform(tree)
+                if widget_data is None:
+                    tree = json_parser.parse(rwd.data)
+                    data = transformer.transform(tree)
+                else:
+                    data = widget_data[k]
             except Exception as err:
                 # If any errors, make a MalformedWidget to display the error in HTML.
                 widget = MalformedWidget(name, rwd.label, rwd.data, err, rwd.lineno)
@@ -157,6 +171,15 @@ class Annotation(EnrichmentPage):
             # I'm keeping the sequence anyway, just to not rely on that. Debatable design choice I suppose...
             self.widget_seq.append(widget)
 
+    def list_references(self):
+        """
+        Besides our targets, we refer to every object named in a widget.
+        """
+        refs = super().list_references()
+        for widget in self.widget_seq:
+            refs.extend(getattr(widget, 'objects_by_abspath', {}).values())
+        return refs
+
     def get_widget_lookup(self):
         return self.widget_lookup
 
@@ -246,10 +269,33 @@ class Annotation(EnrichmentPage):
                 parts[2 * k + 1] = f'[{widget.label}]{{{widget.name}}}'
             # Join it all together and compile markdown --> HTML.
             doc = ''.join(parts)
-            escaped_html = render_anno_markdown(doc, self.widget_lookup, trusted=self.trusted)
+            # The rendering is memoized in the render cache, so we have to key it on
+            # everything it depends on: the doc, the link and image policies, and
+            # each widget's contribution to the HTML.
+            allow_links, allow_images = lookup_link_and_img_policy(self.trusted)
+            key = make_render_key(
+                'anno', doc, allow_links, allow_images,
+                [self.get_widget_render_signature(w) for w in self.widget_seq]
+            )
+            escaped_html = cached_render(
+                key,
+                lambda: render_anno_markdown(doc, self.widget_lookup, trusted=self.trusted),
+                persist=True
+            )
             if caching: self.escaped_html = escaped_html
         return escaped_html
 
+    @staticmethod
+    def get_widget_render_signature(widget):
+        """
+        Represent everything a widget's HTML depends on: its type, its UID
+        (which includes the version), its label, and its data, which, after
+        resolution and enrichment, includes the versions of any targets.
+        """
+        if isinstance(widget, MalformedWidget):
+            return ['MalformedWidget', widget.name, widget.label, widget.data_text, str(widget.err)]
+        return [type(widget).__name__, widget.writeUID(), widget.label, widget.data]
+
     def get_notespage_data(self, caching=True):
         """
         Get all the info for a notespage, bundled into one dict.
@@ -22,7 +22,6 @@ module, as defined in a .pfsc file.
 import re, traceback
 from collections import defaultdict, deque
 
-import mistletoe
 from markupsafe import Markup
 
 import pfsc.util
@@ -35,7 +34,7 @@ from pfsc import util, libpath_is_trusted
 from pfsc.constants import IndexType
 from pfsc.lang.comparisons import Comparison
 from pfsc.lang.doc import doc_ref_factory
-from pfsc.lang.nodelabels import NodeLabelRenderer, ll, writeNodelinkHTML
+from pfsc.lang.nodelabels import render_node_label, ll, writeNodelinkHTML
 
 
 class NodeLikeObj(PfscObj):
@@ -215,6 +214,24 @@ class Deduction(Enrichment, NodeLikeObj):
     def getCloneSubstitution(self, libpath):
         return self.cloneSubstitutions.get(libpath, None)
 
+    def list_references(self):
+        """
+        Besides our targets, we refer to our running defs, the real objects
+        behind our ghost nodes, the originals of our clones, and anything our
+        nodes resolved (nodelinks, alternate cases, contras) or compare to.
+        """
+        refs = super().list_references() + self.runningDefs
+        refs.extend(gn.realObj() for gn in self.ghostNodes)
+
+        def visit(item):
+            if isinstance(item, NodeLikeObj):
+                if item.cloneOf is not None:
+                    refs.append(item.cloneOf)
+                refs.extend(item.relpathResolutions.values())
+                refs.extend(cf.target for cf in item.comparisons)
+        self.recursiveItemVisit(visit)
+        return refs
+
     def getGhostNodes(self):
         return self.ghostNodes
 
@@ -1149,8 +1166,7 @@ class Node(NodeLikeObj):
             text = prefix + text
 
         # Markdown processing
-        renderer = NodeLabelRenderer(self)
-        text = mistletoe.markdown(text, renderer)
+        text = render_node_label(text, self)
 
         # Add a doc label if defined, and if no latex label.
         if self.docReference and not latex_label:
@@ -1354,14 +1370,16 @@ class Supp(WologNode):
 
     def buildDashgraph(self, lang='en', debug=False):
         dg = Node.buildDashgraph(self,lang=lang,debug=debug)
-        dg['alternates'] = [alt.getLibpath() for alt in self.alternates]
+        # Alternates are a set, so we sort them, for deterministic output.
+        dg['alternates'] = sorted(alt.getLibpath() for alt in self.alternates)
         dg['wolog'] = self.wolog
         return dg
 
     def writeLabelPrefix(self):
         if self.alternates:
             label = "Case"
-            all_cases = self.alternates | {self}
+            # Sort the cases, for deterministic output.
+            all_cases = sorted(self.alternates | {self}, key=lambda c: c.getLibpath())
             versions = {c.getLibpath():c.getVersion() for c in all_cases}
             libpaths = list(versions.keys())
             prefix = writeNodelinkHTML(label, libpaths, versions)
@@ -109,19 +109,25 @@ It follows that all free parts of annotations are escaped.
 
 import json, re
 from collections import namedtuple
+from contextlib import contextmanager
+import html
 from itertools import chain
+import threading
 
 from markupsafe import escape
-from lark import Lark, Transformer, v_args
+from lark import Transformer, v_args
 import vertex2tex
 import mistletoe
+from mistletoe import block_token, span_token
 from mistletoe.span_token import SpanToken
 from mistletoe.latex_token import Math as MathToken
 from mistletoe.html_renderer import HTMLRenderer
 
 from pfsc import check_config
+from pfsc.lang.render_cache import make_render_key, cached_render
 import pfsc.constants
 from pfsc.excep import PfscExcep, PECode
+from pfsc.util import LazyLark
 from pfsc_util.scan import PfscModuleStringAwareScanner
 
 
@@ -258,7 +264,7 @@ class PfscJsonTransformer(Transformer):
     json_false = lambda self, _: False
 
 
-json_parser = Lark(json_grammar + json_grammar_imports, start='json_value', parser='lalr', lexer='standard')
+json_parser = LazyLark(json_grammar + json_grammar_imports, start='json_value', parser='lalr', lexer='standard')
 
 
 def build_pfsc_json(text, scope=None):
@@ -409,11 +415,15 @@ def render_markdown(text, trusted=False):
     to contain any widget stubs. You do get to specify whether the "trusted" or
     "untrusted" policies should be applied while rendering.
 
+    Results are memoized in the render cache (see `pfsc.lang.render_cache`).
+
     :param text: the markdown to be rendered
     :param trusted: boolean specifying how this text should be treated
     :return: rendered HTML
     """
-    return render_anno_markdown(text, {}, trusted=trusted)
+    allow_links, allow_images = lookup_link_and_img_policy(trusted)
+    key = make_render_key('md', text, allow_links, allow_images)
+    return cached_render(key, lambda: render_anno_markdown(text, {}, trusted=trusted))
 
 DOMAIN_LIST_PATTERN = re.compile(r'\w+\.\w+(\.\w+)*(, *\w+\.\w+(\.\w+)*)*$')
 
@@ -452,9 +462,63 @@ def render_anno_markdown(annotext_with_widget_stubs, widget_lookup, trusted=Fals
     :return: the rendered HTML
     """
     allow_links, allow_images = lookup_link_and_img_policy(trusted)
-    renderer = PfscRenderer(widget_lookup, allow_links=allow_links, allow_images=allow_images)
     ve_text = vertex_and_escape(annotext_with_widget_stubs)
-    return mistletoe.markdown(ve_text, renderer)
+    with renderer_pool.take(
+        ('anno', allow_links, allow_images),
+        lambda: PfscRenderer({}, allow_links=allow_links, allow_images=allow_images)
+    ) as renderer:
+        renderer.bind(widget_lookup)
+        return mistletoe.markdown(ve_text, renderer)
+
+
+class RendererPool:
+    """
+    Keeps renderer instances for reuse.
+
+    Constructing a renderer is not free: mistletoe builds its render map, and
+    registers its token classes, every time. Since we render many small
+    pieces of markdown (e.g. a label for every node of every deduction), we
+    keep our renderers, per thread, in free lists keyed by their configuration.
+
+    Renderers are taken with a context manager, so that when rendering is
+    reentrant (as when rendering a widget calls for more rendering) the
+    inner rendering gets a different instance.
+
+    A renderer must be bound to the objects it is to work on (see e.g.
+    `PfscRenderer.bind()`) each time it is taken. It is unbound when it is
+    returned to the pool, so that the pool does not keep those objects alive.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def get_free_list(self, key):
+        try:
+            free_lists = self.local.free_lists
+        except AttributeError:
+            free_lists = self.local.free_lists = {}
+        return free_lists.setdefault(key, [])
+
+    @contextmanager
+    def take(self, key, factory):
+        """
+        :param key: a tuple naming the kind of renderer and its configuration.
+            Lists (as in link and image policies) are allowed.
+        :param factory: function of no arguments, to construct a renderer of
+            this kind, if none is free
+        """
+        key = tuple(tuple(k) if isinstance(k, list) else k for k in key)
+        free = self.get_free_list(key)
+        renderer = free.pop() if free else factory()
+        try:
+            yield renderer
+        finally:
+            renderer.unbind()
+            free.append(renderer)
+
+
+renderer_pool = RendererPool()
+
 
 MathToken.precedence = 100
 
@@ -482,6 +546,27 @@ class PfscWidgetStub(SpanToken):
         super().__init__(match_obj)
         self.widget_name = match_obj.group(2)
 
+# The char ref pattern used by mistletoe's `HTMLRenderer`, as in mistletoe 0.7.2.
+MISTLETOE_CHARREF = re.compile(r'&(#[0-9]+;'
+                               r'|#[xX][0-9a-fA-F]+;'
+                               r'|[^\t\n\f <&#;]{1,32};)')
+
+
+def reinstall_mistletoe_charref():
+    """
+    In mistletoe 0.7.2 (the version we pin), `HTMLRenderer.__init__()` puts
+    `MISTLETOE_CHARREF` in the private module global `html._charref`, and
+    `HTMLRenderer.__exit__()` puts the stdlib's pattern back. A pooled
+    renderer is constructed once but exited after every use, so it must put
+    mistletoe's pattern back each time it is reused.
+
+    This is the only place where we touch `html._charref`. If an upgrade of
+    mistletoe changes how it uses that global, `test_mistletoe_charref()`
+    should fail.
+    """
+    html._charref = MISTLETOE_CHARREF
+
+
 class SectionNumberRenderer(HTMLRenderer):
     """
     Automatically add section numbers to headings.
@@ -493,10 +578,31 @@ class SectionNumberRenderer(HTMLRenderer):
 
     def __init__(self, *extras):
         super().__init__(*extras)
+        self.reset_render_state()
+
+    def reset_render_state(self):
+        self.footnotes = {}
+        self._suppress_ptag_stack = [False]
         self.sn_counters = [0] * 6
         self.sn_do_number = False
         self.sn_top_level = 1
 
+    def __enter__(self):
+        """
+        Make the renderer ready to (re)use.
+
+        Mistletoe renderers register their extra token types when constructed,
+        and unregister them (by resetting all token types) on exit. So, to
+        reuse a renderer (see `RendererPool`), we have to register them again.
+        """
+        for token in self._extras:
+            module = span_token if issubclass(token, span_token.SpanToken) else block_token
+            if token not in module._token_types:
+                module.add_token(token)
+        reinstall_mistletoe_charref()
+        self.reset_render_state()
+        return self
+
     def render_heading(self, token):
         template = '<h{level}>{inner}</h{level}>'
         inner = self.render_inner(token)
@@ -578,6 +684,13 @@ class PfscRenderer(MathRenderer):
         self.widget_lookup = widget_lookup
         self.allow_links = allow_links
         self.allow_images = allow_images
+
+    def bind(self, widget_lookup):
+        self.widget_lookup = widget_lookup
+        return self
+
+    def unbind(self):
+        self.widget_lookup = {}
     
     def __call__(self, *args, **kwargs):
         """
@@ -19,11 +19,13 @@ Parse meson scripts, and build Graph objects to represent them.
 """
 import sys
 from collections import defaultdict
+from functools import lru_cache
 
-from lark import Lark, Transformer
+from lark import Transformer
 from lark.exceptions import VisitError, LarkError
 
 from pfsc.excep import PfscExcep, PECode
+from pfsc.util import LazyLark
 
 ######################################################################
 # At one time these were viewed as settings. But as libraries grow,
@@ -223,10 +225,12 @@ class Graph:
         """
 
         # (I) Check nodes.
-        # (N1 and N2) Check supp and intr nodes.
+        check_modal_words = (self.src_type == GraphSource.MESON)
         for node in self.nodes.values():
-            node_is_modal = node.actualNode.isModal()
-            if (self.src_type == GraphSource.MESON and node_is_modal
+            actual = node.actualNode
+            node_is_modal = actual.isModal()
+            # (N1 and N2) Check supp and intr nodes.
+            if (check_modal_words and node_is_modal
                     and node.declaredLocally and not node.firstOccursInSupposition):
                 msg = 'Modal nodes must first occur after a modal keyword'
                 msg += ', but node "%s" breaks this rule.' % node.name
@@ -235,10 +239,9 @@ class Graph:
                 msg = 'Only modal nodes may occur after modal keywords'
                 msg += ', but node "%s" breaks this rule.' % node.name
                 raise PfscExcep(msg, PECode.MESON_MODAL_MISMATCH)
-        # (N3) ghost node references
-        for node in self.nodes.values():
-            if node.actualNode.isGhostNode():
-                r = node.actualNode.realObj()
+            # (N3) ghost node references
+            if actual.isGhostNode():
+                r = actual.realObj()
                 if not r.canAppearAsGhostInMesonScript():
                     msg = (f'Node "{node.name}" of type {r.__class__} cannot'
                            ' occur in a meson script. Did you mean to reference'
@@ -246,35 +249,34 @@ class Graph:
                     raise PfscExcep(msg, PECode.MESON_BAD_GHOST_NODE)
 
         # (II) Check edges.
-        # Get the list of libpaths of the targets.
-        targetLibpaths = [t.getLibpath() for t in targets]
+        # Get the set of libpaths of the targets.
+        targetLibpaths = {t.getLibpath() for t in targets}
         # Prepare a set of libpaths of "undeduced targets," i.e. target
         # nodes which were not found to be at the head of any deduction arrow.
         # It starts off as the set of all target libpaths.
         # After we have iterated over all edges, it should be empty.
         undeducedTargetLibpaths = set(targetLibpaths)
-        # Prepare a set of ordered pairs of edge endpts.
-        # We will record these as strings, with the endpts
-        # sorted alphabetically.
-        endpairs = set([])
+        # Prepare a set of unordered pairs of edge endpts.
+        endpairs = set()
         # Prepare a set of nodes having an outgoing flow edge,
         # and a set of nodes having an incoming flow edge.
-        outflow = set([])
-        inflow = set([])
+        outflow = set()
+        inflow = set()
         # Now iterate over edges.
-        for desc in self.edges:
-            e = self.edges[desc]
-            sn = e.getSrcName()
-            tn = e.getTgtName()
+        nodes = self.nodes
+        for e in self.edges.values():
+            sn = e.srcName
+            tn = e.tgtName
+            s = nodes[sn].actualNode
+            t = nodes[tn].actualNode
+            is_deduc = e.isDeduc()
             # Check (1)
-            if e.isDeduc():
-                t = self.getNode(tn).getActualNode()
-                if t.isSubDeduc() or t.isModal():
-                    msg = 'Deduction arrows may not terminate '
-                    msg += 'at subdeductions or modal nodes.\n'
-                    msg += 'Deduction arrow terminates at %s.\n'%tn
-                    msg += self.listEdges()
-                    raise PfscExcep(msg, PECode.MESON_DEDUC_ARROW_BAD_TARGET)
+            if is_deduc and (t.isSubDeduc() or t.isModal()):
+                msg = 'Deduction arrows may not terminate '
+                msg += 'at subdeductions or modal nodes.\n'
+                msg += 'Deduction arrow terminates at %s.\n'%tn
+                msg += self.listEdges()
+                raise PfscExcep(msg, PECode.MESON_DEDUC_ARROW_BAD_TARGET)
             # Check (2)
             if e.isFlow():
                 if sn in outflow or tn in inflow:
@@ -285,11 +287,10 @@ class Graph:
                     msg += 'Node %s appears to violate this.\n'%prob
                     msg += self.listEdges()
                     raise PfscExcep(msg, PECode.MESON_EXCESS_FLOW)
-                else:
-                    outflow.add(sn)
-                    inflow.add(tn)
+                outflow.add(sn)
+                inflow.add(tn)
             # Check (3)
-            pair = ','.join(sorted([sn,tn]))
+            pair = (sn, tn) if sn < tn else (tn, sn)
             if pair in endpairs:
                 msg = 'There may be at most one arrow between'
                 msg += ' any two nodes.\n'
@@ -297,18 +298,16 @@ class Graph:
                 msg += ' the nodes %s and %s.\n'%(sn,tn)
                 msg += self.listEdges()
                 raise PfscExcep(msg, PECode.MESON_EXCESS_ARROW)
-            else:
-                endpairs.add(pair)
+            endpairs.add(pair)
             # Check (4)
-            s = self.getNode(sn).getActualNode()
-            t = self.getNode(tn).getActualNode()
             # There's a problem only if the source node lies outside
             # the present deduction, and is a target of this
             # deduction, AND the target node is IN the deduction, i.e.
             # is NOT a ghost node.
+            t_is_ghost = t.isGhostNode()
             if (
                 s.isGhostNode() and
-                (not t.isGhostNode()) and
+                (not t_is_ghost) and
                 (s.ghostOf() in targetLibpaths)
             ):
                 msg = 'A node which is a target of a '
@@ -318,13 +317,9 @@ class Graph:
                 msg += self.listEdges()
                 raise PfscExcep(msg, PECode.MESON_DOWNWARD_FLOW_ERROR)
             # Prepare for Check (5):
-            if e.isDeduc() or (e.isFlow and not TARGET_NODES_STRICTLY_DEDUCED):
-                if t.isGhostNode():
-                    tlp = t.ghostOf()
-                else:
-                    tlp = t.getLibpath()
-                if tlp in undeducedTargetLibpaths:
-                    undeducedTargetLibpaths.remove(tlp)
+            if undeducedTargetLibpaths and (is_deduc or not TARGET_NODES_STRICTLY_DEDUCED):
+                tlp = t.ghostOf() if t_is_ghost else t.getLibpath()
+                undeducedTargetLibpaths.discard(tlp)
         # Check (5)
         numUndeducedTargets = len(undeducedTargetLibpaths)
         if numUndeducedTargets > 0:
@@ -354,64 +349,130 @@ class Graph:
         :return: dict in which node name maps to set of names of that node's containment nbrs.
         """
         containment_nbrs = defaultdict(set)
-        all_names = set(self.nodes.keys())
-        for name, node in self.nodes.items():
-            parent = node.getActualNode().getParent()
-            parentName = parent.getName()
-            if parentName in all_names:
+        nodes = self.nodes
+        for name, node in nodes.items():
+            parentName = node.actualNode.getParent().getName()
+            if parentName in nodes:
                 containment_nbrs[name].add(parentName)
                 containment_nbrs[parentName].add(name)
         return containment_nbrs
 
+    def buildAdjacency(self):
+        """
+        Number the nodes, and build integer-indexed adjacency lists, covering
+        both the neighbors of each node, and the containment edges.
+
+        :return: pair (names, adj), where names is the list of node names, in
+            order of index, and adj[i] is the list of indices of the neighbors
+            of node i.
+        """
+        # Note: We go by the nodes' `nbrNames`, not by our `edges`. These
+        # differ when edges have been factored through a method node, since
+        # the nodes at either end of a factored edge remain neighbors. This
+        # keeps edges into and out of a method node from being marked as bridges.
+        nodes = self.nodes
+        names = list(nodes.keys())
+        index = {name: i for i, name in enumerate(names)}
+        nbrs = [{index[m] for m in nodes[name].nbrNames} for name in names]
+        for i, name in enumerate(names):
+            j = index.get(nodes[name].actualNode.getParent().getName())
+            if j is not None:
+                nbrs[i].add(j)
+                nbrs[j].add(i)
+        return names, [list(s) for s in nbrs]
+
+    def tarjanSearch(self):
+        """
+        Find the bridges and articulation points of the graph (containment
+        edges included), by Tarjan's algorithm.
+
+        We traverse each connected component of the graph via DFS, enumerating
+        the nodes in the order in which they are first encountered. As we go,
+        we also work out the minimum index that can be reached from each node,
+        _without traversing the edge along which we first came to that node_.
+        In this process, the bridges are precisely those edges that lead us to a
+        node from which it is "impossible to retreat", i.e. a node whose minimum
+        reachable index equals its index as first encountered.
+
+        The DFS is iterative, so works on graphs of any depth.
+
+        :return: pair (bridges, articulations), where bridges is a list of
+            pairs (a, b) of names of nodes joined by a bridge, with a the parent
+            of b in the DFS tree, and articulations is a set of node names.
+        """
+        names, adj = self.buildAdjacency()
+        n = len(names)
+        first_enc = [-1] * n
+        min_reach = [0] * n
+        parent = [-1] * n
+        # Position in adjacency list of next neighbor to be tried, for each node:
+        pos = [0] * n
+        bridges = []
+        articulations = set()
+        count = 0
+        for root in range(n):
+            if first_enc[root] >= 0:
+                continue
+            first_enc[root] = min_reach[root] = count
+            count += 1
+            root_children = 0
+            stack = [root]
+            while stack:
+                b = stack[-1]
+                nbrs = adj[b]
+                if pos[b] < len(nbrs):
+                    c = nbrs[pos[b]]
+                    pos[b] += 1
+                    if first_enc[c] < 0:
+                        parent[c] = b
+                        first_enc[c] = min_reach[c] = count
+                        count += 1
+                        if b == root:
+                            root_children += 1
+                        stack.append(c)
+                    elif c != parent[b] and first_enc[c] < min_reach[b]:
+                        min_reach[b] = first_enc[c]
+                else:
+                    stack.pop()
+                    a = parent[b]
+                    if a >= 0:
+                        if min_reach[b] < min_reach[a]:
+                            min_reach[a] = min_reach[b]
+                        if min_reach[b] == first_enc[b]:
+                            bridges.append((names[a], names[b]))
+                        if a != root and min_reach[b] >= first_enc[a]:
+                            articulations.add(names[a])
+            if root_children > 1:
+                articulations.add(names[root])
+        return bridges, articulations
+
     def findAndMarkBridges(self):
         """
         Locate all bridges in the graph -- i.e. edges whose deletion would increase
         the number of connected components -- and mark them as such, i.e. record the
         fact in each Edge instance.
 
-        The idea is: we traverse each connected component of the graph via DFS, enumerating
-        the nodes in the order in which they are first encountered. As we go,
-        we also work out the minimum index that can be reached from each node, _without traversing
-        the edge along which we first came to that node_. In this process, the bridges
-        are precisely those edges that lead us to a node from which it is "impossible to retreat",
-        i.e. a node whose minimum reachable index equals its index as first encountered.
+        Containment edges count toward connectivity, but, not being edges of
+        the graph, are never marked.
 
         :return: the set of bridges located.
         """
         bridges = set()
-        all_nodes = self.nodes
         edge_lookup = self.edgesByEndpts
-        unvisited_names = set(all_nodes.keys())
-        c_nbrs = self.computeContainmentNbrs()
-
-        count = 0
-        min_reach = {name:-1 for name in all_nodes}
-        first_enc = min_reach.copy()
-
-        def bridge_search(a, b, count):
-            count += 1
-            min_reach[b] = first_enc[b] = count
-
-            all_nbrs = all_nodes[b].nbrNames | c_nbrs[b]
-            for c in all_nbrs:
-                if first_enc[c] < 0:
-                    unvisited_names.remove(c)
-                    bridge_search(b, c, count)
-                    min_reach[b] = min(min_reach[b], min_reach[c])
-                    if min_reach[c] == first_enc[c]:
-                        e = edge_lookup[b].get(c)
-                        if e is not None:
-                            e.isBridge(True)
-                            bridges.add(e)
-                elif a != c:
-                    min_reach[b] = min(min_reach[b], first_enc[c])
-
-        while unvisited_names:
-            a = unvisited_names.pop()
-            bridge_search(a, a, count)
-
+        for a, b in self.tarjanSearch()[0]:
+            e = edge_lookup[a].get(b)
+            if e is not None:
+                e.isBridge(True)
+                bridges.add(e)
         return bridges
 
+    def findArticulationNodes(self):
+        """
+        :return: the set of names of nodes whose deletion would increase the
+            number of connected components.
+        """
+        return self.tarjanSearch()[1]
+
     def markFlowLinkOutsAsBridges(self):
         """
         A "link" is a degree-2 node; a "flow-link" is a link both of whose incident edges
@@ -558,7 +619,7 @@ class Edge:
 ######################################################################
 # Parsing
 
-arc_parser = Lark(r'''
+arc_parser = LazyLark(r'''
     arclisting : chain+
     chain : NAME (ARC NAME)+
     ARC  : "-->"|"<--"|"..>"
@@ -588,7 +649,7 @@ class ArcLangTransformer(Transformer):
 
 
 
-meson_parser = Lark(r'''
+meson_parser = LazyLark(r'''
     mesonscript : ROAM? initialphrase phrase*
     ?initialphrase : supposition | assertion
     phrase : conclusion | (ROAM|FLOW)? initialphrase
@@ -864,12 +925,25 @@ class MesonTransformer(Transformer):
 ######################################################################
 # API
 
+# Graphs are mutated by the deductions that own them, so it is the parse trees
+# (which the transformers only read) that we memoize. A deduction whose text is
+# unchanged, in a module that is being rebuilt, then costs us no parsing.
+@lru_cache(maxsize=1024)
+def parse_arcs(arc_listing):
+    return arc_parser.parse(arc_listing)
+
+
+@lru_cache(maxsize=1024)
+def parse_meson(meson_script):
+    return meson_parser.parse(meson_script)
+
+
 def build_graph_from_arcs(arc_listing):
     """
     Take a listing in the "arc lang", and return a Graph object for it.
     """
     try:
-        tree = arc_parser.parse(arc_listing)
+        tree = parse_arcs(arc_listing)
         alt = ArcLangTransformer()
         graph = alt.transform(tree)
     except VisitError as v:
@@ -886,7 +960,7 @@ def build_graph_from_meson(meson_script):
     Take a meson script, and return a Graph object for it.
     """
     try:
-        tree = meson_parser.parse(meson_script)
+        tree = parse_meson(meson_script)
         mt = MesonTransformer()
         graph = mt.transform(tree)
     except VisitError as v:
@@ -20,10 +20,11 @@ they declare, using the classes in the deductions and annotations (python) modul
 """
 
 import datetime
+import hashlib
 import pickle
 import re
 
-from lark import Lark, v_args
+from lark import Tree, v_args
 from lark.exceptions import VisitError, LarkError
 
 from pfsc.lang.annotations import Annotation
@@ -34,6 +35,7 @@ from pfsc.lang.deductions import (
     PfscObj, Deduction, SubDeduc, Node, Supp, Flse, node_factory,
 )
 from pfsc.lang.objects import PfscDefn
+from pfsc.lang.parse_cache import get_parse_cache
 from pfsc.lang.widgets import Widget
 from pfsc.excep import PfscExcep, PECode
 from pfsc.build.lib.libpath import PathInfo, get_modpath
@@ -67,6 +69,8 @@ class PfscModule(PfscObj):
         self.version = version
         self._modtext = None  # place to stash the original text of the module
         self._bc = None  # place to stash the BlockChunker that processed this module's text
+        self._item_fingerprints = None
+        self._computing_fingerprints = False
         self.dependencies = None
         if given_dependencies is not None:
             self.load_and_validate_dependency_info()
@@ -76,6 +80,14 @@ class PfscModule(PfscObj):
         self.resolving = False
         self.resolved = False
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Fingerprints depend on other modules, which may have changed by the
+        # time we are unpickled, so they must always be recomputed.
+        state['_item_fingerprints'] = None
+        state['_computing_fingerprints'] = False
+        return state
+
     def add_pending_import(self, pi):
         self.pending_imports.append(pi)
 
@@ -145,6 +157,83 @@ class PfscModule(PfscObj):
 
         return latest_read_time
 
+    def get_item_fingerprints(self):
+        """
+        Compute a fingerprint for each deduction and annotation defined in
+        this module. Should be called only after the module has been resolved.
+
+        An item's fingerprint is a hash of its own source (see
+        `BlockChunker.record_item_digests()`), the source of all the other
+        top-level items in the module (which it may use without naming them,
+        e.g. doc info), whether it is trusted, and the items it refers to (see
+        `list_references()`).
+        An item referred to in this module is represented by its fingerprint,
+        so that e.g. a deduction's fingerprint changes whenever that of the
+        deduction it expands does. An item in another module is likewise
+        represented by its libpath, version, and fingerprint, so that changes
+        propagate across chains of modules. (If that module is not resolved,
+        or is itself computing its fingerprints, as in a cycle of references
+        between modules, we fall back to the item's source digest.)
+
+        So, when the fingerprint of an item is unchanged since a previous
+        build, its built products and indexing are too.
+
+        :return: dict mapping item names to fingerprints (hex digests). Empty
+            if we do not have digests of our source, as e.g. for rst modules.
+        """
+        # (Modules pickled by earlier versions of this code lack the attribute.)
+        if getattr(self, '_item_fingerprints', None) is None:
+            digests = getattr(self._bc, 'item_digests', None) or {}
+            fingerprints = {}
+            computing = set()
+
+            def get_top_level_item(obj):
+                while obj.parent is not None and not obj.parent.isModule():
+                    obj = obj.parent
+                return obj
+
+            def make_ref_key(obj):
+                top = get_top_level_item(obj)
+                module = top.parent
+                if module is self:
+                    # Other items in this module are covered by the context digest.
+                    return fingerprint(top.name) if top.name in digests else None
+                fp = None
+                if module is not None:
+                    if module.resolved and not getattr(module, '_computing_fingerprints', False):
+                        fp = module.get_item_fingerprints().get(top.name)
+                    if fp is None:
+                        bc = module.getBlockChunker()
+                        fp = getattr(bc, 'item_digests', {}).get(top.name)
+                return f'{top.getLibpath()}@{top.getVersion()}:{fp or ""}'
+
+            def fingerprint(name):
+                if name in fingerprints:
+                    return fingerprints[name]
+                if name in computing:
+                    # Break cycles by falling back to the source digest.
+                    return digests[name]
+                computing.add(name)
+                item = self.items[name]
+                keys = {make_ref_key(obj) for obj in item.list_references()} - {None}
+                h = hashlib.sha256(
+                    f'{digests[name]}\n{self._bc.context_digest}\n{item.trusted}\n'.encode()
+                )
+                for key in sorted(keys):
+                    h.update(f'{key}\n'.encode())
+                computing.remove(name)
+                fingerprints[name] = h.hexdigest()
+                return fingerprints[name]
+
+            self._computing_fingerprints = True
+            try:
+                for name in digests:
+                    fingerprint(name)
+            finally:
+                self._computing_fingerprints = False
+            self._item_fingerprints = fingerprints
+        return self._item_fingerprints
+
     def isRepo(self):
         return self.libpath == self.repopath
 
@@ -555,7 +644,7 @@ pfsc_grammar_imports = '''
 
 # Pass `propagate_positions=True` so that non-terminal handlers in the `ModuleLoader`
 # can use `@v_args` to get a `meta` arg containing line and column numbers.
-pfsc_parser = Lark(
+pfsc_parser = util.LazyLark(
     pfsc_grammar + json_grammar + pfsc_grammar_imports + json_grammar_imports,
     start='module',
     propagate_positions=True
@@ -646,6 +735,41 @@ class BlockChunker:
         # annotations_by_name will map the names of Annotation instances to those instances;
         # these names are the same as the identifiers of the original anno blocks.
         self.annotations_by_name = {}
+        # See `record_item_digests()`:
+        self.item_digests = {}
+        self.context_digest = None
+
+    def record_item_digests(self, tree, parsed_text):
+        """
+        Record a digest of the source of each deduction and annotation in the
+        module, and one digest covering the source of all other top-level
+        items (imports, definitions, and assignments) together.
+
+        A deduction or annotation's digest covers the line on which it begins,
+        as well as its text, since line numbers are recorded in its built
+        products.
+
+        :param tree: the parse tree of the module
+        :param parsed_text: the text that was parsed to make the tree
+        """
+        context = hashlib.sha256()
+        for item in tree.children:
+            if not isinstance(item, Tree) or getattr(item.meta, 'empty', True):
+                continue
+            source = parsed_text[item.meta.start_pos:item.meta.end_pos]
+            if item.data == 'deduc':
+                name = item.children[0].children[0]
+            elif item.data == 'anno':
+                name = item.children[0]
+                source += self.anno_lookup[name]
+            else:
+                context.update(source.encode() + b'\0')
+                continue
+            line = self.map_line_num_to_orig(item.meta.line)
+            self.item_digests[str(name)] = hashlib.sha256(
+                f'{line}\n{source}'.encode()
+            ).hexdigest()
+        self.context_digest = context.hexdigest()
 
     def map_line_num_to_orig(self, n):
         for lb, a in self.line_mapping:
@@ -757,12 +881,13 @@ def parse_module_text(text, base_line_num=0):
     mmtext = strip_comments(mtext)
     # Now parse, and return.
     try:
-        tree = pfsc_parser.parse(mmtext)
+        tree = get_parse_cache(pfsc_parser).parse(mmtext)
     except LarkError as e:
         # Parsing error.
         # Restore original line numbers in error message.
         parse_msg = re.sub(r'at line (\d+)', lambda m: ('at line %s' % bc.map_line_num_to_orig(int(m.group(1)))), str(e))
         raise PfscExcep(parse_msg, PECode.PARSING_ERROR)
+    bc.record_item_digests(tree, mmtext)
     return tree, bc
 
 
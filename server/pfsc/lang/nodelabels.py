@@ -17,9 +17,14 @@
 import re, json
 
 from markupsafe import Markup
+import mistletoe
 
 from pfsc.lang.widgets import LinkWidget
-from pfsc.lang.freestrings import MathRenderer, PfscRenderer, lookup_link_and_img_policy, Libpath
+from pfsc.lang.freestrings import (
+    MathRenderer, PfscRenderer, lookup_link_and_img_policy, Libpath,
+    renderer_pool,
+)
+from pfsc.lang.render_cache import make_render_key, cached_render
 from pfsc.build.lib.libpath import expand_multipath
 from pfsc.excep import PfscExcep, PECode
 from pfsc.util import unindent
@@ -42,12 +47,18 @@ class NodeLabelRenderer(PfscRenderer):
     In the future we will likely support other custom protocols.
     """
 
-    def __init__(self, node):
-        trusted = getattr(node.getDeduction(), 'trusted', False)
-        allow_links, allow_images = lookup_link_and_img_policy(trusted)
+    def __init__(self, allow_links=False, allow_images=False):
         super().__init__({}, allow_links=allow_links, allow_images=allow_images)
+        self.node = None
+        self.nextLinkNum = 0
+
+    def bind(self, node):
         self.node = node
         self.nextLinkNum = 0
+        return self
+
+    def unbind(self):
+        self.node = None
 
     def take_next_link_num(self):
         """
@@ -91,6 +102,36 @@ class NodeLabelRenderer(PfscRenderer):
     # --------------------------------------------------------------------
 
 
+def render_node_label(text, node):
+    """
+    Do markdown processing for a node label.
+
+    Many labels recur (think of "Suppose" or "Then"), so we memoize the HTML
+    in the render cache. Links however are resolved relative to the node
+    (see `NodeLabelRenderer`), so labels that may contain links are always
+    rendered afresh.
+
+    :param text: the label text, after multiline formatting and the addition
+        of any prefix
+    :param node: the Node whose label this is
+    :return: the HTML
+    """
+    trusted = getattr(node.getDeduction(), 'trusted', False)
+    allow_links, allow_images = lookup_link_and_img_policy(trusted)
+
+    def render():
+        with renderer_pool.take(
+            ('node_label', allow_links, allow_images),
+            lambda: NodeLabelRenderer(allow_links=allow_links, allow_images=allow_images)
+        ) as renderer:
+            return mistletoe.markdown(text, renderer.bind(node))
+
+    if '[' in text:
+        return render()
+    key = make_render_key('node_label', str(text), allow_links, allow_images)
+    return cached_render(key, render)
+
+
 def processAsLibpaths(url, label, node):
     from pfsc.lang.deductions import Deduction, Node
     # URL should be a semicolon-delimited list of multipaths.
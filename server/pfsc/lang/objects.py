@@ -14,13 +14,12 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
-from collections import defaultdict
-
 from pfsc.build.versions import get_major_version_part
 from pfsc.excep import PfscExcep, PECode
 from pfsc.lang.doc import DocReference
 from pfsc.checkinput.libpath import check_libseg
 from pfsc.constants import ContentDescriptorType
+from pfsc.util import EMPTY_DICT, intern_str
 
 
 class PfscObj:
@@ -48,10 +47,13 @@ class PfscObj:
     deduction had a node named 'E70' in it, then that Node object
     could be retrieved by M['Pf.E70']. If that node had a subnode
     called 'C1', that could be retrieved by M['Pf.E70.C1'].
+
+    Since most objects (e.g. most nodes) have no items, they all share the
+    read-only `EMPTY_DICT` as their self.items, until their first item is set.
     """
 
     def __init__(self):
-        self.items = defaultdict(PfscObj)
+        self.items = EMPTY_DICT
         # A libpath is something like 'lib.H.ilbert.ZB.Thm168.Pf'
         self.libpath = None
         # A name is something like 'Pf' -- the final segment of a dotted libpath.
@@ -159,7 +161,7 @@ class PfscObj:
         if self.parent:
             parentLibpath = self.parent.getLibpath()
 
-        self.libpath = '%s.%s' % (parentLibpath, self.name)
+        self.libpath = intern_str('%s.%s' % (parentLibpath, self.name))
 
         # We take this opportunity to check whether the name of the object is acceptable.
         try:
@@ -405,12 +407,16 @@ class PfscObj:
         if isinstance(path, str):
             path = path.split('.')
         assert isinstance(path, list)
+        if self.items is EMPTY_DICT:
+            self.items = {}
         lead = path[0]
         if len(path) == 1:
             self.items[lead] = value
         else:
-            # This works because self.items is a defaultdict(PfscObj)
-            self.items[lead][path[1:]] = value
+            sub = self.items.get(lead)
+            if sub is None:
+                sub = self.items[lead] = PfscObj()
+            sub[path[1:]] = value
 
     def lazyLoadSubmodule(self, name):
         """
@@ -454,8 +460,14 @@ class PfscObj:
         :param lazy_load: if True, and the object is not found, then we will attempt to
             lazy load it as a submodule.
         """
-        # Make sure the path is in the form of a list, if not already.
         if isinstance(path, str):
+            # Fast path for the most common case: a single segment.
+            if '.' not in path:
+                if path in self.items:
+                    item = self.items[path]
+                else:
+                    item = self.lazyLoadSubmodule(path) if lazy_load else None
+                return default if item is None else item
             path = path.split('.')
         assert isinstance(path, list)
         # Check length. A list of zero length is an error.
@@ -463,30 +475,25 @@ class PfscObj:
         if n == 0:
             msg = 'Attempt to access item with empty path.'
             raise PfscExcep(msg, PECode.MALFORMED_LIBPATH)
-        # So path is at least one segment long.
-        # Grab the lead segment.
-        lead = path[0]
-        # See if we can get an item named by the lead segment.
-        item = None
-        if lead in self.items:
-            # We do have an item.
-            item = self.items[lead]
-        elif lazy_load:
-            # We do not currently have an item named by the lead segment.
-            # Last-ditch: see if we can lazy load a submodule by that name.
-            item = self.lazyLoadSubmodule(lead)
-        # Did we manage to get an item?
-        if item is not None:
-            # Yes, we got one.
-            if n == 1:
-                # If that's the whole path, then just return the item.
-                return item
+        # Walk down the path iteratively. Lazy loading of submodules may be
+        # declined for the lead segment, but is always attempted beyond that.
+        obj = self
+        for i, seg in enumerate(path):
+            if seg in obj.items:
+                item = obj.items[seg]
+            elif lazy_load or i > 0:
+                item = obj.lazyLoadSubmodule(seg)
             else:
-                # If there's more to the path, then recurse.
-                return item.get(path[1:], default)
-        else:
-            # Nope. Time to give up.
-            return default
+                item = None
+            if item is None:
+                return default
+            if i == n - 1:
+                return item
+            if not isinstance(item, PfscObj):
+                # Let non-PfscObj items answer for the rest of the path
+                # (or fail) in their own way.
+                return item.get(path[i + 1:], default)
+            obj = item
 
     def getFromAncestor(self, path, proper=False, missing_obj_descrip=None):
         """
@@ -507,18 +514,27 @@ class PfscObj:
         If you did not provide a missing object description, then we assume you want to fail gracefully, so
         we just return an ordered pair, in which both components are None.
         """
-        item = None if proper else self.get(path)
-        if item is None:
-            if self.parent:
-                return self.parent.getFromAncestor(path, missing_obj_descrip=missing_obj_descrip)
-            elif missing_obj_descrip is not None:
-                msg = 'Object "%s" %s could not be found.\n' % (path, missing_obj_descrip)
-                msg += 'Did you forget to import it or declare it?'
-                raise PfscExcep(msg, PECode.MODULE_DOES_NOT_CONTAIN_OBJECT)
-            else:
-                return (None, None)
-        else:
-            return (item, self.libpath)
+        # Split the path once, instead of at each ancestor.
+        segs = path.split('.') if isinstance(path, str) else path
+        obj = self
+        skip = proper
+        while True:
+            if not isinstance(obj, PfscObj):
+                # Non-PfscObj parents (see e.g. `pfsc.handlers.examp`) may
+                # do their own search.
+                return obj.getFromAncestor(path, missing_obj_descrip=missing_obj_descrip)
+            item = None if skip else obj.get(segs)
+            if item is not None:
+                return (item, obj.libpath)
+            skip = False
+            if not obj.parent:
+                break
+            obj = obj.parent
+        if missing_obj_descrip is not None:
+            msg = 'Object "%s" %s could not be found.\n' % (path, missing_obj_descrip)
+            msg += 'Did you forget to import it or declare it?'
+            raise PfscExcep(msg, PECode.MODULE_DOES_NOT_CONTAIN_OBJECT)
+        return (None, None)
 
     def resolve_object(self, obj_path, obj_home, self_typename='', obj_descrip='object', allowed_types=None):
         """
@@ -601,6 +617,13 @@ class Enrichment(PfscObj):
     def getTargets(self):
         return self.targets
 
+    def list_references(self):
+        """
+        List the objects this enrichment refers to, and on which its built
+        products may therefore depend. Subclasses extend this.
+        """
+        return list(self.targets)
+
     def getTargetDeduc(self):
         return self.targetDeduc
 
@@ -0,0 +1,244 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Item-level caching of pfsc module parse trees.
+
+Parsing a module with the Earley parser is the most expensive part of reading
+it, and its cost grows with the length of the module. When one deduction in a
+long module is edited, it is wasteful to parse all the others again.
+
+Since the pfsc grammar makes a module a mere sequence of top-level items, we
+can split the (simplified, comment-stripped) text of a module into chunks, at
+the start of each line that begins a deduction or annotation, parse the chunks
+separately, and concatenate the results. Each chunk's tree is stored under a
+hash of the chunk's text, so that a chunk that recurs (in the next build of the
+module, say) need not be parsed again. Since trees are parsed as if each chunk
+began at the top of a file, we return copies of them with line numbers and
+positions shifted to where the chunks actually lie.
+
+The split is made by a regex that does not know about strings or brackets. A
+bad split (e.g. inside a multiline string) leaves a chunk that fails to parse,
+and in that case we fall back on parsing the whole text at once, so that any
+error messages are as they would have been.
+
+Trees are held in an in-process LRU, of size `PFSC_PARSE_CACHE_SIZE`. If
+`PFSC_PARSE_CACHE_ON_DISK` is set, they are also pickled under the build cache
+dir, where they are shared between processes, and survive restarts.
+
+Since keys are content addresses, old entries are never invalidated; they just
+stop being used, as items are edited. So the files on disk are bounded, at
+`PFSC_PARSE_CACHE_DISK_MAX_FILES`. Reading a file touches it, and every
+`PRUNE_INTERVAL` writes, a process prunes the least recently used files.
+"""
+
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import re
+
+import lark
+from lark import Tree, Token
+from lark.exceptions import LarkError
+from lark.tree import Meta
+
+from pfsc import check_config, get_build_dir
+from pfsc.util import prune_lru_files, touch_file
+
+
+PARSE_CACHE_SUBDIR = '_parse'
+
+# Number of writes to disk, by one process, between prunings.
+PRUNE_INTERVAL = 256
+
+ITEM_START_RE = re.compile(r'^(?=(?:deduc|anno)\s)', flags=re.M)
+
+
+def split_item_chunks(text):
+    """
+    Split module text into chunks, each of which should be a sequence of
+    whole top-level items, and which begin at the start of a line.
+
+    :return: list of pairs (offset, chunk), where offset is the position of
+        the chunk in the given text
+    """
+    starts = [m.start() for m in ITEM_START_RE.finditer(text)]
+    if not starts or starts[0] > 0:
+        starts.insert(0, 0)
+    ends = starts[1:] + [len(text)]
+    return [(a, text[a:b]) for a, b in zip(starts, ends)]
+
+
+def shifted_copy(tree, d_line, d_pos):
+    """
+    Copy a parse tree, adding to all line numbers and stream positions.
+    """
+    children = []
+    for c in tree.children:
+        if isinstance(c, Tree):
+            c = shifted_copy(c, d_line, d_pos)
+        elif isinstance(c, Token):
+            t = Token(c.type, c.value, c.pos_in_stream + d_pos, c.line + d_line, c.column)
+            t.end_line = None if c.end_line is None else c.end_line + d_line
+            t.end_column = c.end_column
+            c = t
+        children.append(c)
+    meta = None
+    if tree._meta is not None:
+        meta = Meta()
+        meta.__dict__.update(tree._meta.__dict__)
+        for attr, d in [('line', d_line), ('end_line', d_line),
+                        ('start_pos', d_pos), ('end_pos', d_pos)]:
+            if getattr(meta, attr, None) is not None:
+                setattr(meta, attr, getattr(meta, attr) + d)
+    return Tree(tree.data, children, meta)
+
+
+class ParseCache:
+
+    def __init__(self, parser, max_size):
+        """
+        :param parser: the (Lazy)Lark parser whose trees we cache
+        :param max_size: max number of trees to hold in memory
+        """
+        self.parser = parser
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_writes = 0
+        # Trees depend on the grammar, and are pickled by lark.
+        self.salt = hashlib.sha256(
+            f'{lark.__version__}\n{parser.grammar}'.encode()
+        ).hexdigest()
+
+    def make_key(self, chunk):
+        return hashlib.sha256(f'{self.salt}\n{chunk}'.encode()).hexdigest()
+
+    @staticmethod
+    def disk_dir():
+        if not (check_config("PFSC_PARSE_CACHE_ON_DISK") and check_config("PFSC_BUILD_ROOT")):
+            return None
+        return get_build_dir(cache_dir=True) / PARSE_CACHE_SUBDIR
+
+    def disk_path(self, key):
+        d = self.disk_dir()
+        return None if d is None else d / key[:2] / f'{key}.pickle'
+
+    def get_tree(self, chunk):
+        """
+        Get the (unshifted) parse tree for a chunk, parsing only on a miss.
+
+        :raises: LarkError if the chunk does not parse
+        """
+        key = self.make_key(chunk)
+        tree = self.entries.get(key)
+        if tree is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return tree
+        path = self.disk_path(key)
+        if path is not None and path.exists():
+            try:
+                with open(path, 'rb') as f:
+                    tree = pickle.load(f)
+            except Exception:
+                tree = None
+            else:
+                touch_file(path)
+        if tree is None:
+            self.misses += 1
+            tree = self.parser.parse(chunk)
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(tree, f, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+                self.disk_writes += 1
+                if self.disk_writes % PRUNE_INTERVAL == 0:
+                    self.prune_disk()
+        else:
+            self.hits += 1
+        self.remember(key, tree)
+        return tree
+
+    def prune_disk(self):
+        """
+        Delete the least recently used files on disk, if there are too many.
+
+        :return: the number of files deleted
+        """
+        d = self.disk_dir()
+        max_files = int(check_config("PFSC_PARSE_CACHE_DISK_MAX_FILES") or 0)
+        if d is None or max_files <= 0:
+            return 0
+        return prune_lru_files(d, max_files)
+
+    def remember(self, key, tree):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = tree
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def parse(self, text):
+        """
+        Parse a whole text, chunk by chunk.
+
+        :return: Lark Tree, as would be returned by `self.parser.parse(text)`
+        :raises: LarkError
+        """
+        children = []
+        d_line = 0
+        try:
+            for offset, chunk in split_item_chunks(text):
+                tree = self.get_tree(chunk)
+                children.extend(shifted_copy(tree, d_line, offset).children)
+                d_line += chunk.count('\n')
+        except LarkError:
+            return self.parser.parse(text)
+        # Let the top-level tree have the meta the whole parse would have given it.
+        meta = Meta()
+        meta.empty = True
+        for c in children:
+            if isinstance(c, Tree) and not getattr(c.meta, 'empty', True):
+                if meta.empty:
+                    meta.line, meta.column, meta.start_pos = c.meta.line, c.meta.column, c.meta.start_pos
+                    meta.empty = False
+                meta.end_line, meta.end_column, meta.end_pos = c.meta.end_line, c.meta.end_column, c.meta.end_pos
+        return Tree('module', children, meta)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+_parse_caches = {}
+
+
+def get_parse_cache(parser):
+    """
+    Get the parse cache for a given parser.
+    """
+    cache = _parse_caches.get(parser)
+    if cache is None:
+        cache = ParseCache(parser, int(check_config("PFSC_PARSE_CACHE_SIZE") or 0))
+        _parse_caches[parser] = cache
+    return cache
@@ -0,0 +1,182 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Content-addressed cache for rendered markdown.
+
+Rendering annotation markdown (VerTeX translation, escaping, and the mistletoe
+pass, including the HTML for all widgets) is the most expensive part of
+writing a notespage. Since the output is a pure function of a few inputs, we
+can store it under a hash of those inputs, and reuse it whenever they recur:
+across annotations, across builds of a module, and between builds and
+markdown previews.
+
+Keys are formed by `make_render_key()`, from everything the HTML depends on.
+Callers are responsible for passing all of it; see e.g.
+`Annotation.get_escaped_html()`. The `RENDERER_VERSION` is always included,
+and must be incremented whenever a change to the rendering code could change
+the HTML for a given input.
+
+Only the final HTML is cached. Splitting annotation text into widgets, and
+parsing widget data, still happen on every build, since the widgets are needed
+for the page data, and are built from the parse results.
+
+Entries are held in an in-process LRU, of size `PFSC_RENDER_CACHE_SIZE`.
+If `PFSC_RENDER_CACHE_ON_DISK` is set, entries stored with `persist=True`
+are also written under the build cache dir, where they are shared between
+processes (RQ runs each job in a fresh work horse process) and survive
+restarts. We persist only the output of builds, not that of previews, which
+come straight from user input.
+
+Since keys are content addresses, old entries are never invalidated; they just
+stop being used. So the files on disk are bounded, at
+`PFSC_RENDER_CACHE_DISK_MAX_FILES`. Reading a file touches it, and every
+`PRUNE_INTERVAL` writes, a process prunes the least recently used files.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+
+from pfsc import check_config, get_build_dir
+from pfsc.util import prune_lru_files, touch_file
+
+
+RENDERER_VERSION = 1
+
+RENDER_CACHE_SUBDIR = '_render'
+
+# Number of writes to disk, by one process, between prunings.
+PRUNE_INTERVAL = 256
+
+
+def make_render_key(*parts):
+    """
+    Make a cache key from any number of JSON-serializable parts.
+
+    We deliberately have no fallback for other objects (such as their
+    `repr()`), since that might omit the very state on which the HTML depends.
+
+    :return: hex digest (str)
+    :raises: TypeError if any part is not JSON-serializable.
+    """
+    j = json.dumps(
+        [RENDERER_VERSION, parts], sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(j.encode()).hexdigest()
+
+
+class RenderCache:
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_writes = 0
+
+    @staticmethod
+    def disk_dir():
+        if not (check_config("PFSC_RENDER_CACHE_ON_DISK") and check_config("PFSC_BUILD_ROOT")):
+            return None
+        return get_build_dir(cache_dir=True) / RENDER_CACHE_SUBDIR
+
+    def disk_path(self, key):
+        d = self.disk_dir()
+        return None if d is None else d / key[:2] / f'{key}.html'
+
+    def get(self, key):
+        """
+        :return: the cached HTML, or None.
+        """
+        html = self.entries.get(key)
+        if html is not None:
+            self.entries.move_to_end(key)
+        elif (path := self.disk_path(key)) is not None and path.exists():
+            html = path.read_text()
+            touch_file(path)
+            self.remember(key, html)
+        if html is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return html
+
+    def put(self, key, html, persist=False):
+        self.remember(key, html)
+        path = self.disk_path(key) if persist else None
+        if path is not None and not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp_path.write_text(html)
+            os.replace(tmp_path, path)
+            self.disk_writes += 1
+            if self.disk_writes % PRUNE_INTERVAL == 0:
+                self.prune_disk()
+
+    def prune_disk(self):
+        """
+        Delete the least recently used files on disk, if there are too many.
+
+        :return: the number of files deleted
+        """
+        d = self.disk_dir()
+        max_files = int(check_config("PFSC_RENDER_CACHE_DISK_MAX_FILES") or 0)
+        if d is None or max_files <= 0:
+            return 0
+        return prune_lru_files(d, max_files)
+
+    def remember(self, key, html):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = html
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+_render_cache = None
+
+
+def get_render_cache():
+    global _render_cache
+    if _render_cache is None:
+        _render_cache = RenderCache(int(check_config("PFSC_RENDER_CACHE_SIZE") or 0))
+    return _render_cache
+
+
+def cached_render(key, render, persist=False):
+    """
+    Look up a key in the render cache, rendering and storing on a miss.
+
+    :param key: a key, as made by `make_render_key()`
+    :param render: function of no arguments, returning the HTML
+    :param persist: set True to write a new entry to disk as well (if so
+        configured)
+    :return: the HTML
+    """
+    cache = get_render_cache()
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.put(key, html, persist=persist)
+    return html
@@ -30,7 +30,7 @@ from pfsc.constants import (
     DISP_WIDGET_BEGIN_EDIT, DISP_WIDGET_END_EDIT,
     MAX_WIDGET_GROUP_NAME_LEN,
 )
-from pfsc.lang.freestrings import render_anno_markdown, Libpath
+from pfsc.lang.freestrings import render_markdown, Libpath
 from pfsc.build.lib.libpath import (
     expand_multipath,
     get_formal_moditempath,
@@ -38,6 +38,7 @@ from pfsc.build.lib.libpath import (
 from pfsc import libpath_is_trusted
 from pfsc.build.repo import get_repo_part, make_repo_versioned_libpath
 from pfsc.gdb import get_graph_reader
+from pfsc.gdb.origins import get_origin_resolver
 from pfsc.lang.objects import PfscObj
 from pfsc.lang.doc import doc_ref_factory
 from pfsc.util import topological_sort, unindent
@@ -190,22 +191,27 @@ class Widget(PfscObj):
         results in `self.checked_data`.
 
         :param types: the definition of the arg types to be checked. See docstring for
-                      the `check_input()` function.
+                      the `check_input()` function. May instead be a validator made
+                      by the `compile_types()` function (see `get_arg_validator()`).
 
         :param raw: optional dictionary to check instead of `self.raw_data`.
 
         :param reify_undefined: forwarded to the `check_input()` function.
+                      Ignored if `types` is a compiled validator.
 
         :return: nothing
         """
         if raw is None:
             raw = self.raw_data
         try:
-            checkinput.check_input(
-                raw, self.checked_data, types,
-                reify_undefined=reify_undefined,
-                err_on_unexpected=True
-            )
+            if callable(types):
+                types(raw, self.checked_data)
+            else:
+                checkinput.check_input(
+                    raw, self.checked_data, types,
+                    reify_undefined=reify_undefined,
+                    err_on_unexpected=True
+                )
         except PfscExcep as pe:
             field = pe.bad_field()
             field_detail = f'"{field}" field in ' if field else ''
@@ -227,6 +233,20 @@ class Widget(PfscObj):
         """
         raise NotImplementedError(f'Widget class `{cls.__class__}` needs to implement `generate_arg_spec()`')
 
+    @classmethod
+    def get_arg_validator(cls):
+        """
+        Get the compiled validator for our arg spec.
+
+        Since the arg spec depends only on the class, we compile it just once
+        per class, instead of interpreting it anew for every widget.
+        """
+        validator = cls.__dict__.get('_arg_validator')
+        if validator is None:
+            validator = checkinput.compile_types(cls.generate_arg_spec(), err_on_unexpected=True)
+            cls._arg_validator = validator
+        return validator
+
     def check_fields(self):
         """
         Subclasses must override.
@@ -628,8 +648,7 @@ class CtlWidget(Widget):
         return spec
 
     def check_fields(self):
-        spec, _ = self._generate_arg_spec_parts()
-        self.check(spec)
+        self.check(self.get_arg_validator())
 
     def data_translator(self, obj, datapath):
         is_default_field = datapath and datapath[-1] in self.supported_default_fields
@@ -868,8 +887,7 @@ class ChartWidget(NavWidget):
         return spec
 
     def check_fields(self):
-        spec = self.generate_arg_spec()
-        self.check(spec)
+        self.check(self.get_arg_validator())
 
     def enrich_data(self):
         super().enrich_data()
@@ -1027,8 +1045,7 @@ class DocWidget(NavWidget):
         return spec
 
     def check_fields(self):
-        spec = self.generate_arg_spec()
-        self.check(spec)
+        self.check(self.get_arg_validator())
 
     def enrich_data(self):
         super().enrich_data()
@@ -1181,8 +1198,7 @@ class LinkWidget(NavWidget):
         }
 
     def check_fields(self):
-        spec = self.generate_arg_spec()
-        self.check(spec)
+        self.check(self.get_arg_validator())
 
     def enrich_data(self):
         super().enrich_data()
@@ -1240,8 +1256,7 @@ class QnAWidget(Widget):
         }
 
     def check_fields(self):
-        spec = self.generate_arg_spec()
-        self.check(spec)
+        self.check(self.get_arg_validator())
         self.question = self.checked_data['question']
         self.answer = self.checked_data['answer']
 
@@ -1279,7 +1294,7 @@ class WrapperWidget(Widget):
     """
 
     def determine_tag_and_contents(self):
-        mdtest = render_anno_markdown(self.label, {}, trusted=self.parent.trusted)
+        mdtest = render_markdown(self.label, trusted=self.parent.trusted)
         M = heading_pattern.match(mdtest)
         if M:
             self.tag = 'h%s' % M.group(1)
@@ -1330,10 +1345,9 @@ class LabelWidget(WrapperWidget):
         return {}
 
     def check_fields(self):
-        spec = self.generate_arg_spec()
         # Even though we accept no fields, it's important to call `self.check()`,
         # as this will raise an exception if the user *did* define any fields.
-        self.check(spec)
+        self.check(self.get_arg_validator())
 
 
 class GoalWidget(WrapperWidget):
@@ -1378,8 +1392,7 @@ class GoalWidget(WrapperWidget):
         return spec
 
     def check_fields(self):
-        spec = self.generate_arg_spec()
-        self.check(spec)
+        self.check(self.get_arg_validator())
 
     def compute_origin(self, force=False):
         # If the origin was already given, don't bother to do anything (unless forcing).
@@ -1402,19 +1415,39 @@ class GoalWidget(WrapperWidget):
                     obj = self.objects_by_abspath[altpath]
                     label = obj.get_index_type()
                     major = obj.getMajorVersion()
+                    resolver = get_origin_resolver()
+                    if resolver is not None:
+                        # Defer the lookup, so it can be batched with others.
+                        # Until then, we have no origin.
+                        resolver.request(label, major, altpath, self.accept_alt_origin)
+                        self.origin = None
+                        return None
                     origins = get_graph_reader().get_origins({label: [altpath]}, major)
-                    if altpath not in origins:
-                        raise PfscExcep(
-                            (f'Could not find origin for goal path {altpath}.'
-                             ' Have you built that repo yet?'),
-                            PECode.MISSING_ORIGIN
-                        )
-                    origin = origins[altpath]
+                    origin = self.accept_alt_origin(origins.get(altpath))
             if origin is None:
                 origin = f'{libpath}@{self.getMajorVersion()}'
         self.origin = origin
         return origin
 
+    def accept_alt_origin(self, origin):
+        """
+        Accept the origin looked up for our `altpath`.
+
+        :param origin: the origin, or None if none was found
+        :return: the origin
+        """
+        if origin is None:
+            altpath = self.data.get('altpath')
+            raise PfscExcep(
+                (f'Could not find origin for goal path {altpath}.'
+                 ' Have you built that repo yet?'),
+                PECode.MISSING_ORIGIN
+            )
+        self.origin = origin
+        if 'origin' in self.data:
+            self.data['origin'] = origin
+        return origin
+
     def enrich_data(self):
         super().enrich_data()
         self.data['origin'] = self.compute_origin()
@@ -1628,8 +1661,7 @@ class ParamWidget(ExampWidget):
         return spec
 
     def check_fields(self):
-        spec = self.generate_arg_spec()
-        self.check(spec)
+        self.check(self.get_arg_validator())
 
     def make_generator(self):
         make_param = from_import('pfsc_examp', 'make_param')
@@ -1704,8 +1736,7 @@ class DispWidget(ExampWidget):
         return spec
 
     def check_fields(self):
-        spec = self.generate_arg_spec()
-        self.check(spec)
+        self.check(self.get_arg_validator())
 
     def make_generator(self):
         make_disp = from_import('pfsc_examp', 'make_disp')
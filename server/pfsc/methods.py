@@ -18,6 +18,7 @@
 Methods of handling requests.
 """
 
+from contextlib import nullcontext
 import sys
 import logging
 from io import BytesIO
@@ -30,27 +31,44 @@ import requests
 from requests.exceptions import ConnectionError
 
 from pfsc import get_app, check_config
-from pfsc.rq import get_rqueue
-from pfsc.constants import MAIN_TASK_QUEUE_NAME
+from pfsc.excep import PfscExcep
+from pfsc.rq import (
+    get_task_queue, is_worker_app,
+    check_pending_jobs_limit, note_pending_job,
+)
 from pfsc.handlers import emit_ise_event
-from pfsc.session import get_csrf_from_session
+from pfsc.session import get_csrf_from_session, get_requester_identity
 
 def enqueue_handler_job(handler_class, message, request_id):
     """
     Convenience method to be used by socketio event handlers. Enqueues an RQ job, and
     emits the original message, with added job_id field, under the `job_enqueued` event.
 
+    The job goes to the task queue for the handler class's `QUEUE_CLASS`. If the
+    requester already has as many jobs of that class pending as they are allowed,
+    we do not enqueue, and instead emit the handler's error response.
+
     :param handler_class: the class that's going to handle the job
     :param message: The original message received by the socketio event handler.
     :param request_id: the ID of the socketio client
 
-    :return: the job id
+    :return: the job id, or None if we did not enqueue
     """
-    pfsc_task_queue = get_rqueue(MAIN_TASK_QUEUE_NAME)
+    queue_class = handler_class.QUEUE_CLASS
+    pfsc_task_queue = get_task_queue(queue_class)
+    requester = get_requester_identity(room=request_id)
+    try:
+        check_pending_jobs_limit(pfsc_task_queue, queue_class, requester)
+    except PfscExcep as pe:
+        handler = handler_class(message.copy(), request_id)
+        handler.set_anticipated_pfsc_excep(pe)
+        handler.emit_standard_response()
+        return None
     job = pfsc_task_queue.enqueue(
         handler_job, handler_class, message, request_id, get_csrf_from_session()
     )
     job_id = job.get_id()
+    note_pending_job(pfsc_task_queue, queue_class, requester, job_id)
     message['job_id'] = job_id
     # Here setting the room equal to the sid is not strictly necessary, since we should be
     # inside of an event context anyway.
@@ -83,11 +101,12 @@ def handler_job(handler_class, message, request_id, csrf_from_session=None):
     That is why it begins by making an app and opening the app context.
     Otherwise the RQ worker will try to carry out the task without any app context,
     and then anything that requires configuration info (e.g. writing or building
-    a module) will fail.
+    a module) will fail. (A long-lived `PfscWorker` has an app context already,
+    which we reuse.)
     """
     #log_within_rq('START HANDLER...')
     app, _ = get_app()
-    with app.app_context():
+    with (nullcontext() if is_worker_app(app) else app.app_context()):
         request_info = message.copy()
         handler = handler_class(request_info, request_id, csrf_from_session=csrf_from_session)
         # ~~~~~~~~~~~~~~~~
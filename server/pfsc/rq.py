@@ -20,10 +20,25 @@ import dill
 from flask import current_app, g
 from redis import Redis
 import rq
+from rq.job import Job, JobStatus
+from rq.utils import utcnow
 
 from config import ConfigName
 from pfsc import check_config
-from pfsc.constants import RQ_QUEUE_NAMES
+from pfsc.constants import RQ_QUEUE_NAMES, TASK_QUEUE_NAME_BY_CLASS, QueueClass
+from pfsc.excep import PfscExcep, PECode
+
+# Key under which a `pfsc.rqworker.PfscWorker` registers itself in the
+# `extensions` of its app.
+WORKER_EXTENSION_NAME = 'pfsc_rq_worker'
+
+
+def is_worker_app(app):
+    """
+    Say whether an app is that of a long-lived `PfscWorker`.
+    """
+    return app.extensions.get(WORKER_EXTENSION_NAME) is not None
+
 
 def get_redis_connection():
     return Redis.from_url(current_app.config["REDIS_URI"])
@@ -46,6 +61,167 @@ def get_rqueue(queue_name):
         setattr(g, queue_name, q)
     return getattr(g, queue_name)
 
+def get_task_queue(queue_class):
+    """
+    :param queue_class: a value of the `QueueClass` enum class
+    :return: the RQ task queue for jobs of that class
+    """
+    return get_rqueue(TASK_QUEUE_NAME_BY_CLASS[queue_class])
+
+
+def get_queue_class(queue_name):
+    """
+    :return: the `QueueClass` served by the named queue, or None
+    """
+    for queue_class, name in TASK_QUEUE_NAME_BY_CLASS.items():
+        if name == queue_name:
+            return queue_class
+    return None
+
+
+def parse_class_pairs(pairs):
+    """
+    Parse a list of strings of the form `name:n`, as in the config vars
+    `RQ_WORKER_QUEUE_WEIGHTS` and `MAX_PENDING_JOBS_PER_USER`.
+
+    :return: dict mapping names to ints
+    """
+    d = {}
+    for pair in pairs:
+        name, _, n = pair.partition(':')
+        try:
+            d[name.strip()] = int(n)
+        except ValueError:
+            msg = f'Bad `name:number` pair: {pair}'
+            raise PfscExcep(msg, PECode.MALFORMED_CONFIG_VAR)
+    return d
+
+
+# ----------------------------------------------------------------------------
+# Per-user fairness
+
+# Lifetime in seconds of a user's record of pending jobs. Entries are pruned
+# whenever the record is checked, so this only cleans up after users who go
+# quiet.
+PENDING_JOBS_TTL = 24 * 60 * 60
+
+FINAL_JOB_STATUSES = {JobStatus.FINISHED, JobStatus.FAILED, JobStatus.STOPPED}
+
+
+def pending_jobs_key(queue_class, requester):
+    return f'pfsc:pending_jobs:{queue_class}:{requester}'
+
+
+def check_pending_jobs_limit(queue, queue_class, requester):
+    """
+    Check that a requester may enqueue another job of a given class.
+
+    :param queue: the queue for the class.
+    :param queue_class: a value of the `QueueClass` enum class.
+    :param requester: a requester identity, as made by
+        `pfsc.session.get_requester_identity()`.
+    :raises: PfscExcep if the requester already has as many jobs of this
+        class waiting or running as `MAX_PENDING_JOBS_PER_USER` allows.
+    """
+    limit = parse_class_pairs(check_config("MAX_PENDING_JOBS_PER_USER") or []).get(queue_class)
+    if not limit or not queue.is_async:
+        return
+    redis = queue.connection
+    key = pending_jobs_key(queue_class, requester)
+    job_ids = [j.decode() for j in redis.smembers(key)]
+    jobs = Job.fetch_many(job_ids, connection=redis, serializer=queue.serializer)
+    done = [
+        job_id for job_id, job in zip(job_ids, jobs)
+        if job is None or job.get_status() in FINAL_JOB_STATUSES
+    ]
+    if done:
+        redis.srem(key, *done)
+    if len(job_ids) - len(done) >= limit:
+        msg = (
+            f'You already have {limit} {queue_class} tasks waiting or running.'
+            ' Please wait for some of these to finish.'
+        )
+        raise PfscExcep(msg, PECode.ACTION_EXCEEDS_RATE_LIMIT)
+
+
+def note_pending_job(queue, queue_class, requester, job_id):
+    """
+    Record a newly enqueued job, for `check_pending_jobs_limit()`.
+    """
+    if not queue.is_async:
+        return
+    key = pending_jobs_key(queue_class, requester)
+    with queue.connection.pipeline() as pipe:
+        pipe.sadd(key, job_id)
+        pipe.expire(key, PENDING_JOBS_TTL)
+        pipe.execute()
+
+
+# ----------------------------------------------------------------------------
+# Queue wait metrics
+
+# Number of recent wait times we keep for each queue class.
+WAIT_SAMPLE_SIZE = 1000
+
+
+def queue_wait_key(queue_class):
+    return f'pfsc:queue_wait:{queue_class}'
+
+
+def queue_wait_samples_key(queue_class):
+    return f'pfsc:queue_wait_samples:{queue_class}'
+
+
+def record_queue_wait(job, queue_name):
+    """
+    Record how long a job waited in its queue. To be called as the job starts.
+
+    :param job: the RQ job.
+    :param queue_name: the name of the queue from which it was taken.
+    """
+    queue_class = get_queue_class(queue_name)
+    if queue_class is None or job.enqueued_at is None:
+        return
+    wait_ms = max(0, int((utcnow() - job.enqueued_at).total_seconds() * 1000))
+    key = queue_wait_key(queue_class)
+    samples_key = queue_wait_samples_key(queue_class)
+    with job.connection.pipeline() as pipe:
+        pipe.hincrby(key, 'count', 1)
+        pipe.hincrby(key, 'total_ms', wait_ms)
+        pipe.lpush(samples_key, wait_ms)
+        pipe.ltrim(samples_key, 0, WAIT_SAMPLE_SIZE - 1)
+        pipe.execute()
+
+
+def get_queue_wait_metrics(redis):
+    """
+    Report queue wait metrics for each queue class.
+
+    :param redis: Redis connection.
+    :return: dict mapping each queue class to a dict giving the number of
+        jobs now `queued`, and, over all jobs started so far, the `count` and
+        `mean_ms` wait, as well as the `p50_ms`, `p95_ms`, and `max_ms` wait
+        over recent jobs.
+    """
+    metrics = {}
+    for queue_class in QueueClass.all_classes:
+        queue_name = TASK_QUEUE_NAME_BY_CLASS[queue_class]
+        totals = redis.hgetall(queue_wait_key(queue_class))
+        count = int(totals.get(b'count', 0))
+        total_ms = int(totals.get(b'total_ms', 0))
+        samples = sorted(int(w) for w in redis.lrange(queue_wait_samples_key(queue_class), 0, -1))
+        n = len(samples)
+        metrics[queue_class] = {
+            'queued': rq.Queue(queue_name, connection=redis).count,
+            'count': count,
+            'mean_ms': total_ms / count if count else None,
+            'p50_ms': samples[n // 2] if n else None,
+            'p95_ms': samples[min(n - 1, (95 * n) // 100)] if n else None,
+            'max_ms': samples[-1] if n else None,
+        }
+    return metrics
+
+
 def close_rqueues(e=None):
     for name in RQ_QUEUE_NAMES:
         q = g.pop(name, None)
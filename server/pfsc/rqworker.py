@@ -0,0 +1,167 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+RQ workers, including one that can carry out all its jobs under one
+long-lived app context.
+
+By default we use the `PfscForkingWorker`, which, like a standard RQ worker,
+forks a new "work horse" process for each job. This isolates jobs from one
+another, but since the horse has no app context, our job functions form a new
+app for each job, paying every time for config loading, blueprint
+registration, and new connections to the graph database and Redis.
+
+If `RQ_WORKER_NO_FORK` is set, we instead use the `PfscWorker`, which makes
+one app per worker process, and performs jobs in its own process, under a
+single app context, pushed when it starts work. Connection objects, which we
+keep in Flask's `g`, thus stay warm from one job to the next. Everything else
+in `g` is per-job state, and is cleared after each job.
+
+Since jobs are then no longer isolated in their own processes, operators may
+want to have workers exit after a certain number of jobs
+(`RQ_WORKER_MAX_JOBS`), and be restarted by their supervisor.
+
+Workers of either kind (long-lived, or forking per job) serve the task queues
+of the various job classes (see `pfsc.constants.QueueClass`) with weighted
+priorities, and record how long each job waited in its queue.
+"""
+
+from flask import g
+from rq import SimpleWorker, Worker
+
+from pfsc.constants import RQ_QUEUE_NAMES, TASK_QUEUE_NAME_BY_CLASS
+from pfsc.gdb import (
+    GDB_OBJECT_NAME, GRAPH_READER_NAME, GRAPH_WRITER_NAME, GREMLIN_REMOTE_NAME,
+    REPLICA_GDB_OBJECT_NAME, REPLICA_GRAPH_READER_NAME, REPLICA_GREMLIN_REMOTE_NAME,
+)
+from pfsc.rq import WORKER_EXTENSION_NAME, parse_class_pairs, record_queue_wait
+
+
+# Names of the objects in `g` that are kept from one job to the next.
+PERSISTENT_G_NAMES = {
+    GDB_OBJECT_NAME, GRAPH_READER_NAME, GRAPH_WRITER_NAME, GREMLIN_REMOTE_NAME,
+    REPLICA_GDB_OBJECT_NAME, REPLICA_GRAPH_READER_NAME, REPLICA_GREMLIN_REMOTE_NAME,
+    *RQ_QUEUE_NAMES,
+}
+
+
+def reset_job_state():
+    """
+    Clear all per-job state from `g`.
+    """
+    for name in list(g):
+        if name not in PERSISTENT_G_NAMES:
+            g.pop(name)
+
+
+def resolve_worker_queues(specs):
+    """
+    Determine the queues a worker should listen on, and their weights.
+
+    :param specs: list of strings of the form `name` or `name:weight`, where
+        each name is either a queue class, or the name of a queue. Weights
+        default to 1.
+    :return: pair (queue_names, weights), where queue_names is a list, and
+        weights is a dict mapping queue names to weights.
+    """
+    queue_names = []
+    weights = {}
+    for spec in specs:
+        if ':' not in spec:
+            spec += ':1'
+        for name, weight in parse_class_pairs([spec]).items():
+            name = TASK_QUEUE_NAME_BY_CLASS.get(name, name)
+            queue_names.append(name)
+            weights[name] = weight
+    return queue_names, weights
+
+
+class WeightedQueuesMixin:
+    """
+    Instead of always trying its queues in the same order, a worker with this
+    mixin serves them in proportion to their weights, using a "smooth
+    weighted round-robin": every time a job is taken, each queue earns credit
+    equal to its weight, the queue that was served pays the total of all
+    weights, and the queues are then tried in order of credit. This way a
+    queue of lower weight still gets its share of service while others are
+    busy, but waits behind them in the meantime. A queue of weight zero is
+    tried only after all others.
+
+    Also records queue wait metrics (see `pfsc.rq.get_queue_wait_metrics()`).
+    """
+
+    def __init__(self, *args, queue_weights=None, **kwargs):
+        """
+        :param queue_weights: optional dict mapping queue names to weights.
+            Queues not named get weight 1.
+        """
+        super().__init__(*args, **kwargs)
+        queue_weights = queue_weights or {}
+        self.queue_weights = {q.name: queue_weights.get(q.name, 1) for q in self.queues}
+        self.queue_credits = dict(self.queue_weights)
+        self.order_queues_by_credit()
+
+    def order_queues_by_credit(self):
+        self._ordered_queues = sorted(self.queues, key=lambda q: (
+            self.queue_weights[q.name] == 0, -self.queue_credits[q.name]
+        ))
+
+    def reorder_queues(self, reference_queue):
+        total = sum(self.queue_weights.values())
+        if reference_queue is not None and reference_queue.name in self.queue_credits:
+            self.queue_credits[reference_queue.name] -= total
+        for name, weight in self.queue_weights.items():
+            # Bound the credit, so that a queue that has been empty for a long
+            # time does not then monopolize the worker.
+            self.queue_credits[name] = min(self.queue_credits[name] + weight, 2 * total)
+        self.order_queues_by_credit()
+
+    def perform_job(self, job, queue, *args, **kwargs):
+        record_queue_wait(job, queue.name)
+        return super().perform_job(job, queue, *args, **kwargs)
+
+
+class PfscForkingWorker(WeightedQueuesMixin, Worker):
+    """
+    A standard RQ worker, forking a work horse for each job, but serving
+    weighted queues. This is the default.
+    """
+    pass
+
+
+class PfscWorker(WeightedQueuesMixin, SimpleWorker):
+    """
+    A worker that performs all jobs in its own process, under one long-lived
+    app context. Used only if `RQ_WORKER_NO_FORK` is set.
+    """
+
+    def __init__(self, *args, app=None, **kwargs):
+        """
+        :param app: the Flask app under which all jobs are to be performed.
+        """
+        super().__init__(*args, **kwargs)
+        self.app = app
+        app.extensions[WORKER_EXTENSION_NAME] = self
+
+    def work(self, *args, **kwargs):
+        with self.app.app_context():
+            return super().work(*args, **kwargs)
+
+    def perform_job(self, *args, **kwargs):
+        try:
+            return super().perform_job(*args, **kwargs)
+        finally:
+            reset_job_state()
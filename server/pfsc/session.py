@@ -17,6 +17,7 @@
 import secrets
 
 from flask import session, has_app_context, has_request_context
+from flask_login import current_user
 
 import pfsc.constants
 from pfsc import check_config
@@ -55,3 +56,34 @@ def make_demo_user_path():
             demo_username = get_demo_username_from_session(supply_if_absent=True)
             return f'demo.{demo_username}'
     return None
+
+def get_requester_identity(session_dict=None, room=None):
+    """
+    Identify the requester for whom we are working. This is the one notion of
+    requester used throughout, for per-requester limits on pending jobs, for
+    coalescing of jobs, and for read-your-writes tokens.
+
+    A logged-in user is identified by their username. Otherwise a demo
+    username identifies a browser session, while in personal server mode
+    there is just one requester. Failing all of these, an anonymous requester
+    can only be identified by the socket room to which we report.
+
+    :param session_dict: optional dict of session vars in which to look for
+        a demo username, before looking in the Flask session.
+    :param room: optional socket room, to identify anonymous requesters.
+    :return: str, or None if the requester cannot be identified.
+    """
+    if has_request_context() and current_user.is_authenticated:
+        return f'user:{current_user.username}'
+    key = pfsc.constants.DEMO_USERNAME_SESSION_KEY
+    demo_username = (session_dict or {}).get(key)
+    if not demo_username and has_request_context():
+        demo_username = session.get(key)
+    if demo_username:
+        return f'demo:{demo_username}'
+    from pfsc.permissions import check_is_psm
+    if check_is_psm():
+        return 'psm'
+    if room is not None:
+        return f'room:{room}'
+    return None
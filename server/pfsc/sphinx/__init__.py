@@ -16,25 +16,28 @@
 
 from config import PISE_VERSION
 
-from pfsc.sphinx.pages import (
-    form_pfsc_module_for_rst_file,
-    setup_pfsc_env, purge_pfsc_env, merge_pfsc_env,
-    inject_page_data,
-)
-from pfsc.sphinx.widgets import (
-    pfsc_block_widget, pfsc_inline_widget,
-    visit_pfsc_widget_html, depart_pfsc_widget_html,
-    widget_types_and_classes,
-)
-from pfsc.sphinx.embed import PfscEmbedDirective
-from pfsc.sphinx.links import ExternalLinks
-from pfsc.sphinx.vertex import VerTeX2TeX
 
-# This import achieves a monkey patch:
-import pfsc.sphinx.errors
+def setup(app):
+    # We import these here, not at module level, so that importing other
+    # modules of this package (such as `pfsc.sphinx.pages`, which the builder
+    # needs in all builds) does not import Sphinx and docutils.
+    from pfsc.sphinx.pages import (
+        form_pfsc_module_for_rst_file,
+        setup_pfsc_env, purge_pfsc_env, merge_pfsc_env,
+        inject_page_data,
+    )
+    from pfsc.sphinx.widgets import (
+        pfsc_block_widget, pfsc_inline_widget,
+        visit_pfsc_widget_html, depart_pfsc_widget_html,
+        widget_types_and_classes,
+    )
+    from pfsc.sphinx.embed import PfscEmbedDirective
+    from pfsc.sphinx.links import ExternalLinks
+    from pfsc.sphinx.vertex import VerTeX2TeX
 
+    # This import achieves a monkey patch:
+    import pfsc.sphinx.errors
 
-def setup(app):
     app.add_config_value('pfsc_repopath', None, 'html')
     app.add_config_value('pfsc_repovers', None, 'html')
 
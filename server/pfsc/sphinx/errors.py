@@ -32,14 +32,18 @@ def should_elevate(record):
     Return a boolean saying whether the given warning record is one that should
     be elevated to a build-halting error.
     """
+    # Sphinx's own messages may be lazy translation proxies, not strings.
+    # (For example, the warning about extensions that are not parallel safe.)
+    msg = str(record.msg)
+
     # Our custom directives and roles will start their messages with the value
     # of the `PFSC_SPHINX_CRIT_ERR_MARKER` constant if they want to halt the build.
-    if record.msg.find(PFSC_SPHINX_CRIT_ERR_MARKER) >= 0:
+    if msg.find(PFSC_SPHINX_CRIT_ERR_MARKER) >= 0:
         return True
 
     # Below we catch special built-in Sphinx/docutils warnings that are serious enough
     # that the build should stop.
-    if INVALID_OPT_BLOCK_RE.search(record.msg):
+    if INVALID_OPT_BLOCK_RE.search(msg):
         return True
 
     return False
@@ -260,9 +260,20 @@ class SphinxPfscEnvironment:
         if modpath in self.pfsc_modules:
             del self.pfsc_modules[modpath]
 
-    def merge(self, other):
+    def merge(self, app, docnames, other):
+        """
+        Take the modules for the given docs from another environment.
+
+        In a parallel read, the other environment comes from a subprocess that
+        read just the given docs, but it also holds copies of all the modules
+        we already had. Taking only the ones we need saves both time and memory.
+        """
         other_pfsc_env = get_pfsc_env(other)
-        self.pfsc_modules.update(other_pfsc_env.pfsc_modules)
+        for docname in docnames:
+            modpath = build_libpath_for_rst(app.config, docname, within_page=False)
+            module = other_pfsc_env.get_module(modpath)
+            if module is not None:
+                self.pfsc_modules[modpath] = module
 
 
 def setup_pfsc_env(app):
@@ -295,4 +306,4 @@ def merge_pfsc_env(app, env, docnames, other):
     Handler for the Sphinx 'env-merge-info' event.
     Updates the `SphinxPfscEnvironment` accordingly.
     """
-    get_pfsc_env(env).merge(other)
+    get_pfsc_env(env).merge(app, docnames, other)
@@ -0,0 +1,323 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Lightweight span tracing.
+
+A span records the time taken by one step of some process, together with any
+attributes (such as a repopath, or a number of modules) that help to interpret
+it. Spans nest: a span begun while another is open in the same thread becomes
+its child, and shares its trace id.
+
+Spans are opened with the `span()` context manager, or the `traced()`
+decorator. For example, the phases of a build are traced like this:
+
+    with span('build.build_write_index', repopath=repopath) as s:
+        ...
+        s.set(modules=len(modules))
+
+When a span ends, it adds one to a count, named after the first segment of its
+name, in each of its ancestors. So e.g. the span for a whole build will record
+how many `gdb` calls, and `ix` indexing steps, took place within it.
+
+Finished spans are passed to the exporters named in the `TRACING_EXPORTERS`
+config var:
+
+    ring: keep the most recent `TRACING_RING_SIZE` spans in memory, where they
+          can be viewed by admins at the `getTraces` endpoint. Since these are
+          kept per-process, this shows only the spans of the process serving
+          the request.
+    file: append each span as a line of JSON to `TRACING_FILE`. This is the
+          way to see spans from RQ workers.
+
+When no exporters are configured, tracing is disabled, and `span()` returns a
+shared, inert object, so the cost of an instrumented step is just a function
+call.
+"""
+
+from collections import deque
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+
+from pfsc.excep import PfscExcep, PECode
+
+
+class Span:
+
+    def __init__(self, tracer, name, attrs, parent):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.counts = {}
+        self.parent = parent
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.start = None
+        self.duration = None
+        self.error = None
+        self._t0 = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def count(self, key, n=1):
+        self.counts[key] = self.counts.get(key, 0) + n
+        return self
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.tracer.push(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.perf_counter() - self._t0
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.tracer.pop(self)
+        kind = self.name.split('.', 1)[0]
+        ancestor = self.parent
+        while ancestor is not None:
+            ancestor.count(kind)
+            ancestor = ancestor.parent
+        self.tracer.export(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'start': self.start,
+            'duration': self.duration,
+            'attrs': self.attrs,
+            'counts': self.counts,
+            'error': self.error,
+        }
+
+
+class NoopSpan:
+    """
+    Stands in for a span when tracing is disabled.
+    """
+
+    def set(self, **attrs):
+        return self
+
+    def count(self, key, n=1):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class RingBufferExporter:
+
+    def __init__(self, size):
+        self.spans = deque(maxlen=size)
+
+    def export(self, span):
+        self.spans.append(span.to_dict())
+
+    def list_spans(self, name_prefix=None, limit=None):
+        """
+        :param name_prefix: optional string. If given, list only those spans
+            whose names begin with this.
+        :param limit: optional int. If given, list at most this many spans,
+            namely the most recent ones.
+        :return: list of span dicts, in order of completion
+        """
+        spans = list(self.spans)
+        if name_prefix:
+            spans = [s for s in spans if s['name'].startswith(name_prefix)]
+        if limit is not None:
+            spans = spans[-limit:] if limit > 0 else []
+        return spans
+
+
+class FileExporter:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=repr) + '\n'
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+
+
+class Tracer:
+
+    def __init__(self, exporters):
+        self.exporters = exporters
+        self.local = threading.local()
+
+    def stack(self):
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    def current_span(self):
+        stack = self.stack()
+        return stack[-1] if stack else None
+
+    def push(self, span):
+        self.stack().append(span)
+
+    def pop(self, span):
+        stack = self.stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+
+    def start_span(self, name, attrs):
+        return Span(self, name, attrs, self.current_span())
+
+    def export(self, span):
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    def get_exporter(self, cls):
+        for exporter in self.exporters:
+            if isinstance(exporter, cls):
+                return exporter
+        return None
+
+
+# The active Tracer, or None if tracing is disabled.
+_tracer = None
+
+
+def init_app(app):
+    """
+    Set up tracing according to the app's config.
+    """
+    names = app.config.get("TRACING_EXPORTERS") or []
+    exporters = []
+    for name in names:
+        if name == 'ring':
+            exporters.append(RingBufferExporter(app.config["TRACING_RING_SIZE"]))
+        elif name == 'file':
+            path = app.config.get("TRACING_FILE")
+            if not path:
+                msg = 'The `file` tracing exporter requires `TRACING_FILE` to be defined.'
+                raise PfscExcep(msg, PECode.ESSENTIAL_CONFIG_VAR_UNDEFINED)
+            exporters.append(FileExporter(path))
+        else:
+            msg = f'Unknown tracing exporter: {name}'
+            raise PfscExcep(msg, PECode.MALFORMED_CONFIG_VAR)
+    set_tracer(Tracer(exporters) if exporters else None)
+
+
+def set_tracer(tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, **attrs):
+    """
+    Open a span, for use as a context manager.
+
+    :param name: the name of the span. By convention, the first segment names
+        the kind of step, e.g. `build`, `ix`, `gdb`, or `handler`.
+    :param attrs: attributes to record with the span
+    """
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.start_span(name, attrs)
+
+
+def current_span():
+    """
+    :return: the innermost open span in this thread, or the inert span if
+        there is none, or tracing is disabled.
+    """
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.current_span() or NOOP_SPAN
+
+
+def traced(name=None):
+    """
+    Decorator, to trace every call to a function.
+
+    Note: since the wrapper does not have the signature of the function it
+    wraps, do not use this on `Handler` methods that are called "withfields".
+
+    :param name: the name for the spans. Defaults to the qualified name of
+        the function.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.start_span(span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls, prefix, predicate):
+    """
+    Trace calls to those methods of a class that are defined in the class
+    itself (not inherited), and satisfy a predicate.
+
+    :param cls: the class
+    :param prefix: spans are named `{prefix}.{method name}`
+    :param predicate: function of a method name, returning boolean
+    """
+    for attr_name, value in list(vars(cls).items()):
+        if inspect.isfunction(value) and predicate(attr_name):
+            setattr(cls, attr_name, traced(f'{prefix}.{attr_name}')(value))
+
+
+def trace_module_functions(namespace, prefix, predicate):
+    """
+    Trace calls to the functions defined in a module, which satisfy a
+    predicate. Call this at the bottom of the module, passing `globals()`.
+
+    :param namespace: the namespace of the module
+    :param prefix: spans are named `{prefix}.{function name}`
+    :param predicate: function of a function name, returning boolean
+    """
+    module_name = namespace['__name__']
+    for attr_name, value in list(namespace.items()):
+        if (inspect.isfunction(value) and value.__module__ == module_name
+                and predicate(attr_name)):
+            namespace[attr_name] = traced(f'{prefix}.{attr_name}')(value)
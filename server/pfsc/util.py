@@ -21,6 +21,8 @@ import random
 import datetime
 from collections import defaultdict
 import subprocess
+import sys
+import threading
 
 from mistletoe import HTMLRenderer
 
@@ -71,6 +73,68 @@ class NumberedName:
             L, M = len(A), len(B)
             return L < M
 
+class LazyLark:
+    """
+    Stands in for a Lark parser, which is constructed (from the given grammar
+    and options) only the first time it is used.
+
+    Constructing a parser means analyzing its grammar, which for some of our
+    grammars takes tens of milliseconds. Since our parsers are defined at module
+    level, constructing them eagerly would put this cost on every process that
+    imports the module, including those (like web servers that only serve built
+    products) that never parse anything.
+    """
+
+    def __init__(self, grammar, **options):
+        self.grammar = grammar
+        self.options = options
+        self._parser = None
+        self._lock = threading.Lock()
+
+    def get_parser(self):
+        if self._parser is None:
+            with self._lock:
+                if self._parser is None:
+                    from lark import Lark
+                    self._parser = Lark(self.grammar, **self.options)
+        return self._parser
+
+    def parse(self, text, *args, **kwargs):
+        return self.get_parser().parse(text, *args, **kwargs)
+
+
+class EmptyDict(dict):
+    """
+    A read-only, empty dict. Its one instance, `EMPTY_DICT`, is for objects of
+    which we make very many (like kNodes, or PfscObjs), and which usually have
+    nothing to put in some dict attribute. They can share this one, until they
+    need a dict of their own.
+    """
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('EMPTY_DICT is read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    setdefault = update = pop = popitem = clear = _read_only
+
+    def __reduce__(self):
+        # Pickling and copying preserve identity.
+        return 'EMPTY_DICT'
+
+
+EMPTY_DICT = EmptyDict()
+
+
+def intern_str(s):
+    """
+    Intern a string, so that equal strings, like libpaths that are computed
+    over and over in separate places, can share one object. Values that are
+    not strings (e.g. None) pass through unchanged.
+    """
+    return sys.intern(s) if type(s) is str else s
+
+
 def topological_sort(graph, reversed=False, secondary_key=None):
     """
     :param graph: a directed graph (see format below)
@@ -417,3 +481,52 @@ def conditionally_unlink_files(dir_path, condition, recursive=False, rmdirs=Fals
         dir_path.rmdir()
         count_total += 1
     return count_total
+
+
+def prune_lru_files(dir_path, max_files):
+    """
+    Bound a cache of files, kept in and under a given directory, by deleting
+    the least recently used ones, i.e. those with the oldest mtimes. (So it is
+    up to the cache to touch a file whenever it uses it.)
+
+    To avoid pruning again on the very next write, we delete down to 90% of the
+    given bound.
+
+    :param dir_path: pathlib.Path of the cache directory
+    :param max_files: max number of files to keep
+    :return: the number of files deleted
+    """
+    if not dir_path.exists():
+        return 0
+    entries = []
+    for path in dir_path.rglob('*'):
+        try:
+            st = path.stat()
+        except OSError:
+            # Another process may be pruning at the same time.
+            continue
+        if path.is_file():
+            entries.append((st.st_mtime, path))
+    excess = len(entries) - max_files
+    if excess <= 0:
+        return 0
+    entries.sort()
+    num_deleted = 0
+    for _, path in entries[:excess + max_files // 10]:
+        try:
+            path.unlink()
+            num_deleted += 1
+        except OSError:
+            pass
+    return num_deleted
+
+
+def touch_file(path):
+    """
+    Update a file's mtime, ignoring errors (like the file's having been pruned
+    just now by another process).
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
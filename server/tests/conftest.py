@@ -18,6 +18,8 @@ import os
 import re
 
 import pytest
+from redis import Redis
+from redis.exceptions import RedisError
 from werkzeug.test import Client as WzClient
 
 from pfsc.constants import WEBSOCKET_NAMESPACE, WIP_TAG, ISE_PREFIX
@@ -100,6 +102,24 @@ def repos_ready(app):
     return True
 
 
+@pytest.fixture
+def redis_ready(app):
+    """
+    Skip the test if Redis cannot be reached. (We try with a short timeout,
+    since connecting to an unreachable host may otherwise hang.)
+
+    :return: True
+    """
+    redis = Redis.from_url(
+        app.config["REDIS_URI"], socket_connect_timeout=1, socket_timeout=1
+    )
+    try:
+        redis.ping()
+    except RedisError:
+        pytest.skip('Redis is unreachable')
+    return True
+
+
 class ClientWrapper(WzClient):
     """
     Wrapper for the basic Werkzeug test client.
@@ -14,10 +14,12 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
+import json
+
 import pytest
 
 import pfsc.constants
-from pfsc.checkinput import check_input
+from pfsc.checkinput import check_input, compile_types, IType, UndefinedInput
 from pfsc.excep import PfscExcep, PECode
 
 
@@ -42,3 +44,121 @@ def test_check_libpath_exceps(pathtype, path, err_code):
             }
         })
     assert e.value.code() == err_code
+
+
+# ----------------------------------------------------------------------
+# Compiled validators must behave exactly like `check_input()`.
+
+types_1 = {
+    "REQ": {
+        'libpath': {'type': IType.LIBPATH},
+        'n': {'type': IType.INTEGER, 'min': 0, 'rename': 'num'},
+    },
+    "REQ_ORDER": ['n', 'libpath'],
+    "OPT": {
+        'flag': {'type': IType.BOOLEAN, 'default_cooked': False},
+        'vers': {'type': IType.FULL_VERS, 'default_raw': pfsc.constants.WIP_TAG},
+        'raw_s': {'type': IType.STR, 'keep_raw': True},
+        'color': {'type': IType.STR},
+        'group': {
+            'type': IType.DISJ,
+            'alts': [
+                {'type': IType.STR, 'max_len': 4},
+                {'type': IType.INTEGER, 'min': 0},
+            ],
+        },
+        'coords': {
+            'type': IType.LIST,
+            'spec': [{'type': IType.INTEGER}, {'type': IType.FLOAT, 'gt': 0}],
+        },
+        'names': {
+            'type': IType.LIST,
+            'itemtype': {'type': IType.CDLIST, 'itemtype': {'type': IType.STR}},
+            'max_num_items': 2,
+            'nonempty': True,
+            'flatten': True,
+        },
+        'words': {
+            'type': IType.DLIST,
+            'delimiter': ';',
+            'itemtype': {'type': IType.STR, 'values': ['a', 'b']},
+        },
+        'opts': {
+            'type': IType.DICT,
+            'spec': {
+                "OPT": {
+                    'on': {'type': IType.STRICT_BOOLEAN},
+                },
+            },
+            'reify_undefined': False,
+        },
+        'counts': {
+            'type': IType.DICT,
+            'keytype': {'type': IType.STR},
+            'valtype': {'type': IType.INTEGER},
+        },
+    },
+    "ALT_SETS": [
+        {
+            'email': {'type': IType.STR},
+            'username': {'type': IType.STR, 'rename': 'user'},
+        },
+    ],
+    "CONF": {
+        'email2': {'primary': 'email'},
+    },
+}
+
+good_1 = {'libpath': 'test.foo.bar', 'n': '3', 'email': 'a@b.c', 'email2': 'a@b.c'}
+
+
+@pytest.mark.parametrize(('raw', 'kwargs'), (
+    (good_1, {}),
+    (good_1, {'reify_undefined': False}),
+    ({**good_1, 'flag': 'true', 'raw_s': 'foo', 'group': 7, 'coords': '[1, 2.5]',
+      'names': ['a,b', 'c'], 'words': 'a;b;a', 'opts': '{"on": true}',
+      'counts': {'x': 1}}, {}),
+    ({**good_1, 'bogus': 1, 'other': 2}, {'err_on_unexpected': True}),
+    ({**good_1, 'bogus': 1}, {}),
+    ({**good_1, 'libpath': ''}, {}),
+    ({**good_1, 'libpath': 'a' * (pfsc.constants.MAX_LIBPATH_LEN + 1)}, {}),
+    ({k: v for k, v in good_1.items() if k != 'n'}, {}),
+    ({**good_1, 'n': -1}, {}),
+    ({**good_1, 'group': 'toolong'}, {}),
+    ({**good_1, 'coords': [1]}, {}),
+    ({**good_1, 'coords': [1, 0]}, {}),
+    ({**good_1, 'coords': '[1, '}, {}),
+    ({**good_1, 'names': []}, {}),
+    ({**good_1, 'names': ['a', 'b', 'c']}, {}),
+    ({**good_1, 'words': 'a;c'}, {}),
+    ({**good_1, 'opts': {'on': 'yes'}}, {}),
+    ({**good_1, 'opts': '[]'}, {}),
+    ({**good_1, 'counts': {'x': 'y'}}, {}),
+    ({**good_1, 'username': 'foo'}, {}),
+    ({**good_1, 'email2': 'x@y.z'}, {}),
+    ({k: v for k, v in good_1.items() if k != 'email2'}, {}),
+))
+def test_compiled_conformance(raw, kwargs):
+    """
+    Show that a compiled validator returns and stashes the same things, and
+    raises the same errors, as `check_input()`.
+    """
+    def run(check):
+        stash = {}
+        try:
+            expected_keys = check(stash)
+        except PfscExcep as pe:
+            return 'error', pe.code(), pe.bad_field(), pe.public_msg()
+        return 'ok', expected_keys, json.dumps(stash, sort_keys=True, default=describe)
+
+    def describe(obj):
+        if isinstance(obj, UndefinedInput):
+            return '<undefined>'
+        return repr(getattr(obj, '__dict__', obj))
+
+    interpreted = run(lambda stash: check_input(raw, stash, types_1, **kwargs))
+    validate = compile_types(types_1, **kwargs)
+    compiled = run(lambda stash: validate(raw, stash))
+    assert compiled == interpreted
+    # A validator can be used again.
+    assert run(lambda stash: validate(raw, stash)) == interpreted
@@ -0,0 +1,270 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Differential test for `compute_cut_add_sets()`, comparing it against a
+straightforward implementation of the same set algebra using Python sets,
+on the libpaths of the test repos, under randomized move mappings.
+"""
+
+import pathlib
+import random
+import re
+
+import pytest
+
+from pfsc.build.lib.bitset import UidUniverse
+from pfsc.build.mii import compute_cut_add_sets, compute_movemapping_closure
+from pfsc.constants import IndexType
+from pfsc.excep import PfscExcep, PECode
+from pfsc.gdb.k import kNode, kReln
+from pfsc.lang.modules import build_module_from_text
+
+REPO_SRC_DIR = pathlib.Path(__file__).parent / 'resources' / 'repo'
+
+
+def reference_cut_add_sets(repopath,
+                           existing_k_nodes, desired_k_nodes,
+                           existing_k_relns, desired_k_relns,
+                           move_mapping, mm_closure):
+    L = set(existing_k_nodes.keys())
+    M = set(desired_k_nodes.keys())
+    existing_k_reln_uids = set(existing_k_relns.keys())
+    desired_k_reln_uids = set(desired_k_relns.keys())
+
+    V_minus = L - M
+    V0 = L & M
+    V_plus = M - L
+
+    E_minus = existing_k_reln_uids - desired_k_reln_uids
+    E0 = existing_k_reln_uids & desired_k_reln_uids
+    E_plus = desired_k_reln_uids - existing_k_reln_uids
+
+    Dbar = set(mm_closure.keys())
+    Rbar = set(mm_closure.values()) - { None }
+    D = set(move_mapping.keys())
+
+    unnamed_widget_pattern = re.compile(r'_w\d+$')
+
+    def discard_unnamed_widgets(X):
+        return set(
+            x for x in X if not unnamed_widget_pattern.match(x.split('.')[-1])
+        )
+
+    if discard_unnamed_widgets(Rbar - M):
+        raise PfscExcep('', PECode.INVALID_MOVE_MAPPING)
+    if D - L:
+        raise PfscExcep('', PECode.INVALID_MOVE_MAPPING)
+    if discard_unnamed_widgets(V_minus - Dbar):
+        raise PfscExcep('', PECode.INVALID_MOVE_MAPPING)
+
+    I = set()
+    I.update(Dbar & M)
+    I.update(Rbar & M & L)
+    for uid in V0:
+        e = existing_k_nodes[uid]
+        d = desired_k_nodes[uid]
+        if d.node_type != e.node_type or d.modpath != e.modpath:
+            I.add(e.libpath)
+
+    if I - Dbar:
+        raise PfscExcep('', PECode.INVALID_MOVE_MAPPING)
+
+    V_cut = Dbar
+    V_add = V_plus | I
+
+    I_reln = set()
+    for uid in E0:
+        tlp, kind, hlp = uid.split(":")
+        if tlp in I or hlp in I:
+            I_reln.add(uid)
+    E_cut = E_minus | I_reln
+    E_add = E_plus | I_reln
+
+    for uid in E_add:
+        tlp, kind, hlp = uid.split(":")
+        if kind == IndexType.EXPANDS and tlp in L and not tlp in I:
+            raise PfscExcep('', PECode.MULTIPLE_EXPANSION_DEFINITION)
+
+    return M, Rbar, I, V_cut, V_add, E_cut, E_add
+
+
+def gather_libpaths(vers_dir, repopath):
+    """
+    Parse all the pfsc modules in a version dir of a test repo, and return a
+    dict mapping the libpaths of all the modules and their items, recursively,
+    to pairs (node_type, modpath).
+    """
+    found = {}
+
+    def visit(obj, modpath):
+        for item in obj.items.values():
+            if getattr(item, 'libpath', None) and item.libpath not in found:
+                found[item.libpath] = (type(item).__name__, modpath)
+                visit(item, modpath)
+
+    for path in sorted(vers_dir.glob('**/*.pfsc')):
+        rel = path.relative_to(vers_dir).with_suffix('')
+        parts = [p for p in rel.parts if p != '__']
+        modpath = '.'.join([repopath] + parts)
+        try:
+            module = build_module_from_text(path.read_text(), modpath)
+        except PfscExcep:
+            continue
+        found[modpath] = ('PfscModule', modpath)
+        visit(module, modpath)
+    return found
+
+
+def gather_universes():
+    universes = []
+    for user_dir in sorted(REPO_SRC_DIR.iterdir()):
+        if not user_dir.is_dir():
+            continue
+        for proj_dir in sorted(user_dir.iterdir()):
+            if not proj_dir.is_dir():
+                continue
+            repopath = f'test.{user_dir.name}.{proj_dir.name}'
+            for vers_dir in sorted(proj_dir.iterdir()):
+                if vers_dir.is_dir():
+                    found = gather_libpaths(vers_dir, repopath)
+                    if found:
+                        universes.append((repopath, found))
+    return universes
+
+
+def make_k_objects(repopath, libpaths_info, major, expands):
+    """
+    Make kNodes for the given libpaths, along with UNDER relns joining each to
+    its nearest present ancestor, and the given EXPANDS relns.
+    """
+    nodes = {
+        lp: kNode(node_type, lp, modpath, repopath, major, '00000', '00000')
+        for lp, (node_type, modpath) in libpaths_info.items()
+    }
+    relns = {}
+
+    def add(tail, reln_type, head):
+        k = kReln(
+            nodes[tail].node_type, tail, major, reln_type,
+            nodes[head].node_type, head, major,
+            nodes[tail].modpath, repopath, major, '00000', '00000'
+        )
+        relns[k.uid] = k
+
+    for lp in nodes:
+        parts = lp.split('.')
+        for i in range(len(parts) - 1, 3, -1):
+            parentpath = '.'.join(parts[:i])
+            if parentpath in nodes:
+                add(lp, IndexType.UNDER, parentpath)
+                break
+    for tail, head in expands:
+        if tail in nodes and head in nodes:
+            add(tail, IndexType.EXPANDS, head)
+    return nodes, relns
+
+
+def random_scenario(rng, repopath, existing):
+    """
+    Starting from a given set of existing libpaths, make a random move mapping,
+    and a new set of libpaths that is usually, but not always, consistent with it.
+    """
+    L = sorted(existing.keys())
+    mm = {}
+    for lp in rng.sample(L, min(len(L), rng.randint(0, 4))):
+        r = rng.random()
+        if r < 0.3:
+            mm[lp] = None
+        elif r < 0.6:
+            mm[lp] = lp + f'_moved{rng.randint(0, 9)}'
+        else:
+            mm[lp] = rng.choice(L)
+    mm_closure = compute_movemapping_closure(mm, set(L))
+
+    desired = {
+        lp: info for lp, info in existing.items() if lp not in mm_closure
+    }
+    for a, b in mm_closure.items():
+        if b is not None and rng.random() < 0.95:
+            desired[b] = existing.get(a, ('Node', repopath))
+    # Random noise, to exercise the error cases:
+    if rng.random() < 0.2 and desired:
+        del desired[rng.choice(sorted(desired.keys()))]
+    if rng.random() < 0.2 and desired:
+        lp = rng.choice(sorted(desired.keys()))
+        desired[lp] = ('Changed', desired[lp][1])
+    for i in range(rng.randint(0, 3)):
+        desired[f'{repopath}.New{i}'] = ('Node', repopath)
+    if rng.random() < 0.1:
+        desired[f'{repopath}.Foo_w{rng.randint(0, 9)}'] = ('Widget', repopath)
+
+    def random_expands(lps):
+        lps = sorted(lps)
+        return [
+            (rng.choice(lps), rng.choice(lps))
+            for _ in range(rng.randint(0, 3))
+        ] if lps else []
+
+    old_expands = random_expands(existing.keys())
+    new_expands = old_expands[:rng.randint(0, len(old_expands))] + random_expands(desired.keys())
+
+    existing_k_nodes, existing_k_relns = make_k_objects(repopath, existing, '00000', old_expands)
+    desired_k_nodes, desired_k_relns = make_k_objects(repopath, desired, '00001', new_expands)
+    return (
+        repopath,
+        existing_k_nodes, desired_k_nodes,
+        existing_k_relns, desired_k_relns,
+        mm, mm_closure
+    )
+
+
+def run(func, args):
+    try:
+        return func(*args)
+    except PfscExcep as e:
+        return e.code()
+
+
+def test_uid_universe():
+    U = UidUniverse()
+    A = U.bits(['a', 'b', 'c'])
+    B = U.bits(['c', 'd'])
+    assert U.uids_of(A & ~B) == {'a', 'b'}
+    assert U.uids_of(A & B) == {'c'}
+    assert U.uids_of(A | B) == {'a', 'b', 'c', 'd'}
+    assert U.uids_of(0) == set()
+    many = [f'x{i}' for i in range(1000)]
+    assert U.uids_of(U.bits(many[::3])) == set(many[::3])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_cut_add_differential(app, seed):
+    rng = random.Random(seed)
+    with app.app_context():
+        universes = gather_universes()
+    assert universes
+    outcomes = set()
+    for repopath, existing in universes:
+        for i in range(10):
+            args = random_scenario(rng, repopath, existing)
+            expected = run(reference_cut_add_sets, args)
+            computed = run(compute_cut_add_sets, args)
+            assert computed == expected, (repopath, args[5])
+            outcomes.add(expected if isinstance(expected, int) else 'ok')
+    # Make sure we exercised both the success and the failure cases.
+    assert 'ok' in outcomes
+    assert PECode.INVALID_MOVE_MAPPING in outcomes
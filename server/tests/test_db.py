@@ -59,6 +59,50 @@ def test_get_deduc_closure(app, repos_ready):
         #computed_closure2 = lp_get_deduc_closure(libpaths)
         #assert computed_closure2 == expected_closure
 
+def test_materialized_closures(app, repos_ready):
+    """
+    Check that the ancestry and deduction closures materialized at indexing
+    time agree with those computed by traversal, both in a module having ten
+    levels of nested expansions, and for expansions spanning several repos.
+    """
+    tower = 'test.moo.tower.levels'
+    with app.app_context():
+        gr = get_graph_reader()
+        for deducpath, major, ancestors in [
+            (f'{tower}.D10', 0, [f'{tower}.D{i}' for i in range(10)]),
+            ('test.casey.math.expand2.W7', 2, [
+                'test.alex.math.thm2.Thm2',
+                'test.alex.math.thm2.Pf2',
+                'test.brook.math.exp1.X3',
+            ]),
+        ]:
+            major0 = gr.adaptall(major)
+            # The ancestry was materialized, so the chain is not found by traversal.
+            assert gr._get_ancestry_internal(deducpath, major0)[1] is not None
+            chain = gr.get_ancestor_chain(deducpath, major)
+            assert [link[0] for link in chain] == ancestors
+            chain_t = gr._get_ancestor_chain_by_traversal(deducpath, major0)
+            assert chain == [link[:3] for link in chain_t]
+
+        for libpaths, major, closure in [
+            ([f'{tower}.D{i}.A{i}' for i in range(11)], 0, {
+                f'{tower}.D{i}' for i in range(11)
+            }),
+            ([
+                'test.alex.math.thm1.Pf.A2', 'test.alex.math.thm2.Thm2.C2',
+                'test.alex.math.thm2.Pf13.A3',
+            ], 3, {
+                'test.alex.math.thm1.Pf', 'test.alex.math.thm2.Thm2',
+                'test.alex.math.thm2.Pf13',
+            }),
+        ]:
+            major0 = gr.adaptall(major)
+            node2deduc = gr._get_materialized_deducs_internal(libpaths, major0)
+            assert set(node2deduc) == set(libpaths)
+            assert node2deduc == gr._get_deduction_closure_internal(libpaths, major0)
+            assert gr.get_deduction_closure({major: libpaths}) == closure
+
+
 def test_get_deductive_nbrs(app, repos_ready):
     print()
     with app.app_context():
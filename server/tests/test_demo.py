@@ -29,9 +29,13 @@ from pfsc.build.demo import (
     schedule_demo_repo_for_deletion,
     check_demo_repo_deletion_time,
     cancel_scheduled_demo_repo_deletion,
+    delete_demo_repo_with_app,
+    demo_repo_deletion_job_id,
+    get_demo_repo_deletion_registries,
 )
+from pfsc.rq import get_task_queue
 from pfsc.util import count_pfsc_modules
-from pfsc.constants import ISE_PREFIX, SYNC_JOB_RESPONSE_KEY
+from pfsc.constants import ISE_PREFIX, SYNC_JOB_RESPONSE_KEY, QueueClass
 
 
 # Is there a way to reference fixtures (like `app`) in a `skipif`?
@@ -84,6 +88,35 @@ def test_schedule_demo_repo_deletion(app):
         assert not os.path.exists(ri.abs_fs_path_to_dir)
 
 
+def test_legacy_demo_repo_deletion(app):
+    """
+    Deletions scheduled on the main task queue, before they moved to the
+    maintenance queue, can still be found, cancelled, and rescheduled.
+    """
+    with app.app_context():
+        repopath = 'demo.q123.workbook'
+        job_id = demo_repo_deletion_job_id(repopath)
+        current, legacy = get_demo_repo_deletion_registries()
+
+        def schedule_legacy_deletion():
+            get_task_queue(QueueClass.INTERACTIVE).enqueue_in(
+                timedelta(hours=1), delete_demo_repo_with_app, args=[repopath], job_id=job_id)
+
+        schedule_legacy_deletion()
+        assert check_demo_repo_deletion_time(repopath) is not None
+        assert cancel_scheduled_demo_repo_deletion(repopath) is True
+        assert check_demo_repo_deletion_time(repopath) is None
+        assert cancel_scheduled_demo_repo_deletion(repopath) is False
+
+        # Rescheduling moves the deletion to the maintenance queue.
+        schedule_legacy_deletion()
+        schedule_demo_repo_for_deletion(repopath, delta=timedelta(hours=2))
+        assert job_id not in legacy.get_job_ids()
+        assert job_id in current.get_job_ids()
+        assert cancel_scheduled_demo_repo_deletion(repopath) is True
+        assert check_demo_repo_deletion_time(repopath) is None
+
+
 @pytest.mark.parametrize('user, repo', [
     ['D935MN8', 'workbook'],
 ])
@@ -14,10 +14,20 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
+import json
+import os
+
 import pytest
+from flask import Flask
 
+import pfsc.exampeval as exampeval
 from pfsc.handlers.examp import ExampReevaluator
-from pfsc.excep import PECode
+from pfsc.excep import PfscExcep, PECode
+from pfsc.exampeval import (
+    evaluate_examp_widget, cpu_time_limit, EvaluationTimeout,
+    canonicalize_param_choices, make_memo_key, ExampEvalPool, ExampMemo,
+    InProcessEvaluator, evaluate_examp,
+)
 
 request_1 = {
     "libpath": "test.foo.bar.expansions.Notes4.eg1_disp2",
@@ -55,7 +65,6 @@ $$\begin{array}{rcl}
 """
 
 
-@pytest.mark.skip('For now the ExampReevaluator is a disabled part of the library.')
 @pytest.mark.psm
 @pytest.mark.req_csrf(False)
 def test_reeval_2(app):
@@ -63,8 +72,129 @@ def test_reeval_2(app):
     Successful reeval of examp widget.
     """
     with app.app_context():
+        app.config["SERVER_SIDE_EXAMP_EVAL"] = True
         er = ExampReevaluator(request_2, 0)
         er.process()
         resp = er.generate_response()
         html = resp['innerHtml']
         assert html == html_2
+
+
+param_info = {
+    'type': 'PARAM', 'widget_libpath': 'test.foo.Notes.p', 'uid': 'test-foo-Notes-p_v1-0-0',
+    'ptype': 'Prime', 'tex': 'p', 'default': 7, 'params': {}, 'dependencies': [],
+}
+
+disp_info = {
+    'type': 'DISP', 'widget_libpath': 'test.foo.Notes.d', 'uid': 'test-foo-Notes-d_v1-0-0',
+    'params': {'p': 'test.foo.Notes.p'}, 'imports': {},
+    'build': ['return "p = " + str(p)'],
+    'dependencies': [{
+        'libpath': 'test.foo.Notes.p', 'uid': 'test-foo-Notes-p_v1-0-0',
+        'type': 'PARAM', 'direct': True,
+    }],
+}
+
+
+def test_evaluate_examp_widget():
+    r = evaluate_examp_widget(disp_info, [param_info], {'test.foo.Notes.p': '11'}, 3)
+    assert r == {'err_lvl': 0, 'err_msg': '', 'html': '<div class="display">\np = 11\n</div>\n'}
+    r = evaluate_examp_widget(disp_info, [param_info], {'test.foo.Notes.p': '12'}, 3)
+    assert r['err_lvl'] == PECode.BAD_PARAMETER_RAW_VALUE_WITH_BLAME
+    assert r['blame_widget_uid'] == 'test-foo-Notes-p_v1-0-0'
+
+
+def test_cpu_time_limit():
+    with pytest.raises(EvaluationTimeout):
+        with cpu_time_limit(1):
+            while True:
+                pass
+    # The limit is lifted afterward.
+    with cpu_time_limit(-1):
+        pass
+
+
+def test_memo_key():
+    params = {'test.foo.Notes.p': ' 11', 'test.foo.Notes.unused': '3'}
+    choices = canonicalize_param_choices(disp_info, [param_info], params)
+    assert choices == [('test.foo.Notes.p', '11')]
+    with pytest.raises(PfscExcep) as ei:
+        canonicalize_param_choices(disp_info, [param_info], {})
+    assert ei.value.code() == PECode.MISSING_EXAMPLORE_PARAM
+
+    infos = [disp_info, param_info]
+    # Widget data is part of the key at every version, since a numbered
+    # version too can be rebuilt.
+    for version in ['v1.0.0', 'WIP']:
+        assert make_memo_key('test.foo.Notes.d', version, choices, infos) != \
+               make_memo_key('test.foo.Notes.d', version, choices, [])
+
+    memo = ExampMemo(1, 0)
+    memo.put('a', {'err_lvl': 0})
+    memo.put('b', {'err_lvl': 1})
+    assert memo.get('a') is None
+    assert memo.get('b') == {'err_lvl': 1}
+
+
+def test_evaluate_examp(monkeypatch):
+    """
+    Successful evaluations are memoized, until the widget is rebuilt.
+    """
+    calls = []
+
+    class CountingEvaluator:
+        def evaluate(self, target_info, dep_infos, params, cpu_seconds):
+            calls.append(params)
+            return evaluate_examp_widget(target_info, dep_infos, params, cpu_seconds)
+
+    monkeypatch.setattr(exampeval, '_pool', CountingEvaluator())
+    monkeypatch.setattr(exampeval, '_memo', ExampMemo(8, 0))
+    app = Flask('test')
+    app.config['MATH_CALCULATION_TIMEOUT'] = 3
+
+    def evaluate(info):
+        return evaluate_examp(
+            'test.foo.Notes.d', 'v1.0.0', info, [param_info], {'test.foo.Notes.p': '11'}
+        )
+
+    with app.app_context():
+        r = evaluate(disp_info)
+        assert r == {'err_lvl': 0, 'err_msg': '', 'html': '<div class="display">\np = 11\n</div>\n'}
+        assert evaluate(disp_info) == r
+        assert len(calls) == 1
+        # A rebuild of the same version is evaluated afresh.
+        rebuilt = dict(disp_info, build=['return "p is " + str(p)'])
+        assert evaluate(rebuilt)['html'] == '<div class="display">\np is 11\n</div>\n'
+        assert len(calls) == 2
+
+
+def test_examp_eval_pool():
+    pool = ExampEvalPool(1, 0, 0, {})
+    try:
+        r = pool.evaluate(disp_info, [param_info], {'test.foo.Notes.p': '13'}, 3)
+        assert r['html'] == '<div class="display">\np = 13\n</div>\n'
+    finally:
+        pool.terminate()
+
+
+def test_in_process_evaluator():
+    """
+    Evaluate in a forked child, as in an RQ work horse.
+    """
+    evaluator = InProcessEvaluator(0, {})
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            result = evaluator.evaluate(disp_info, [param_info], {'test.foo.Notes.p': '17'}, 3)
+            os.write(w, json.dumps(result).encode())
+        finally:
+            os._exit(0)
+    os.close(w)
+    with os.fdopen(r) as f:
+        result = json.loads(f.read())
+    os.waitpid(pid, 0)
+    assert result['html'] == '<div class="display">\np = 17\n</div>\n'
+    # Nothing was started in this process.
+    assert evaluator.pid is None
@@ -0,0 +1,418 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+from lark import Tree
+from lark.exceptions import LarkError
+
+import pfsc.gdb
+from pfsc.build import Builder, BuildMonitor
+from pfsc.build.mii import ModuleIndexInfo
+from pfsc.constants import IndexType
+from pfsc.gdb import get_graph_writer
+from pfsc.lang.modules import (
+    build_module_from_text, load_module, pfsc_parser, strip_comments,
+    BlockChunker, CachePolicy,
+)
+import pfsc.lang.parse_cache as pc
+from pfsc.lang.parse_cache import ParseCache, split_item_chunks
+
+
+MODULE_TEXT = """
+deduc A {
+    asrt C { sy="C" }
+    supp S { sy="S" }
+    supp T { sy="T" versus=S }
+    meson = "Suppose S. Then C."
+}
+
+deduc B {
+    clone A.C
+    asrt D { sy="D" }
+    meson = "C so D."
+}
+
+deduc E of A.C {
+    asrt F { sy="F" }
+    meson = "F so A.C."
+}
+
+anno N @@@
+Some notes on <chart:>[C]{"view": "E"}
+@@@
+"""
+
+
+def tree_to_tuple(tree):
+    """
+    Represent a parse tree with all its tokens and positions, for comparison.
+    """
+    if isinstance(tree, Tree):
+        m = tree.meta
+        pos = tuple(getattr(m, a, None) for a in [
+            'line', 'column', 'start_pos', 'end_line', 'end_column', 'end_pos'
+        ])
+        return tree.data, pos, tuple(tree_to_tuple(c) for c in tree.children)
+    return (tree.type, tree.value, tree.pos_in_stream, tree.line, tree.column,
+            tree.end_line, tree.end_column)
+
+
+def simplify(text):
+    return strip_comments(BlockChunker(text).get_modified_text())
+
+
+def test_split_item_chunks():
+    text = simplify(MODULE_TEXT)
+    chunks = split_item_chunks(text)
+    assert [c[:7] for _, c in chunks] == ['\n', 'deduc A', 'deduc B', 'deduc E', 'anno N ']
+    assert ''.join(c for _, c in chunks) == text
+    assert all(text[a:].startswith(c) for a, c in chunks)
+
+
+def test_parse_cache(monkeypatch):
+    # Count parses only against the in-memory cache.
+    monkeypatch.setattr(ParseCache, 'disk_dir', staticmethod(lambda: None))
+    cache = ParseCache(pfsc_parser, 16)
+    text = simplify(MODULE_TEXT)
+    assert tree_to_tuple(cache.parse(text)) == tree_to_tuple(pfsc_parser.parse(text))
+    assert cache.misses == 5
+    # Editing one deduction means parsing just that one again.
+    text = text.replace('sy="D"', 'sy="D2"')
+    assert tree_to_tuple(cache.parse(text)) == tree_to_tuple(pfsc_parser.parse(text))
+    assert cache.misses == 6
+    assert cache.hits == 4
+
+
+def test_parse_cache_fallback():
+    """
+    A chunk boundary inside a string makes a chunk that does not parse, and
+    then we have to parse the whole text at once.
+    """
+    cache = ParseCache(pfsc_parser, 16)
+    text = 'x = """\ndeduc A { asrt C {} meson = "C" }\n"""\n'
+    assert len(split_item_chunks(text)) == 2
+    assert tree_to_tuple(cache.parse(text)) == tree_to_tuple(pfsc_parser.parse(text))
+
+
+def test_parse_cache_error():
+    """
+    Parsing errors are reported just as they would be without the cache.
+    """
+    cache = ParseCache(pfsc_parser, 16)
+    text = simplify(MODULE_TEXT.replace('meson = "C so D."', 'meson = "C so D.'))
+    with pytest.raises(LarkError) as ei0:
+        pfsc_parser.parse(text)
+    with pytest.raises(LarkError) as ei1:
+        cache.parse(text)
+    assert str(ei1.value) == str(ei0.value)
+
+
+def test_parse_cache_disk_bound(tmp_path, monkeypatch):
+    """
+    The parse cache on disk is bounded, keeping the most recently used trees.
+    """
+    app = Flask('test')
+    app.config['PFSC_BUILD_ROOT'] = str(tmp_path)
+    app.config['PFSC_PARSE_CACHE_ON_DISK'] = True
+    app.config['PFSC_PARSE_CACHE_DISK_MAX_FILES'] = 10
+    monkeypatch.setattr(pc, 'PRUNE_INTERVAL', 20)
+    cache = ParseCache(pfsc_parser, 0)
+    with app.app_context():
+        chunks = [f'x{i} = {i}\n' for i in range(20)]
+        keys = [cache.make_key(chunk) for chunk in chunks]
+        for i, chunk in enumerate(chunks[:15]):
+            cache.get_tree(chunk)
+            os.utime(cache.disk_path(keys[i]), (i, i))
+        # Reading an old tree makes it recent.
+        cache.get_tree(chunks[0])
+        assert cache.hits == 1
+        for i, chunk in enumerate(chunks[15:], start=15):
+            cache.get_tree(chunk)
+            os.utime(cache.disk_path(keys[i]), (100 + i, 100 + i))
+        on_disk = [k for k in keys if cache.disk_path(k).exists()]
+        assert len(on_disk) <= 10
+        assert keys[0] in on_disk
+        assert keys[1] not in on_disk
+        assert keys[-1] in on_disk
+
+
+edits = [
+    # An edit inside A changes B (which clones a node of A), E (which expands
+    # A), and N (which has a chart showing E).
+    (('sy="S"', 'sy="S2"'), ['A', 'B', 'E', 'N']),
+    # An edit inside B changes only B.
+    (('sy="D"', 'sy="D2"'), ['B']),
+    # Spacing within E changes E and so N, but a comment after it does not.
+    (('asrt F { sy="F" }', 'asrt F {  sy="F" }'), ['E', 'N']),
+    (('A.C."\n}', 'A.C."\n}  # comment'), []),
+    # Moving items to different lines changes them, since line numbers are
+    # recorded in the build products.
+    (('deduc E', '\ndeduc E'), ['E', 'N']),
+    (('Some notes', 'Some other notes'), ['N']),
+    # An edit between items, outside of any of them, changes all of them.
+    (('deduc B {', 'x = "y"\ndeduc B {'), ['A', 'B', 'E', 'N']),
+]
+@pytest.mark.parametrize(['edit', 'expected'], edits)
+@pytest.mark.psm
+def test_item_fingerprints(app, edit, expected):
+    with app.app_context():
+        def get_fingerprints(text):
+            module = build_module_from_text(text, 'test.local.foo')
+            module.resolve()
+            return module.get_item_fingerprints()
+
+        fp0 = get_fingerprints(MODULE_TEXT)
+        fp1 = get_fingerprints(MODULE_TEXT.replace(*edit))
+        assert set(fp0) == set(fp1) == {'A', 'B', 'E', 'N'}
+        changed = sorted(k for k in fp1 if fp1[k] != fp0[k])
+        assert changed == expected
+
+
+LINK_CASE_TEXT = """
+deduc A {
+    asrt C { sy="C" }
+    asrt C2 { sy="C2" }
+    supp R versus S { sy="R" }
+    supp S { sy="S" }
+    subdeduc X {
+        supp U versus A.R { sy="U" }
+        asrt V { sy="V" }
+        meson = "Suppose U. Then V."
+    }
+    meson = "Suppose R. Then C. Suppose S. Then C2."
+}
+
+deduc B {
+    clone A.S
+    asrt D { sy="D" }
+    meson = "Suppose S. Then D."
+}
+
+deduc E of A.C {
+    supp F versus A.S { sy="F" }
+    meson = "Suppose F. Then A.C."
+}
+"""
+
+link_case_edits = [
+    # Inside a subdeduction, changing which cases are linked changes A's
+    # products, and so B, which clones one of A's cases, and E, which expands A.
+    (('supp U versus A.R {', 'supp U {'), ['A', 'B', 'E']),
+    # Inside a case that is cloned.
+    (('sy="S"', 'sy="S2"'), ['A', 'B', 'E']),
+    # A case in another deduction, linked to one of A's, does not change A.
+    (('supp F versus A.S {', 'supp F {'), ['E']),
+    (('sy="F"', 'sy="F2"'), ['E']),
+    # Between deductions.
+    (('deduc B {', '# comment\ndeduc B {'), ['B', 'E']),
+]
+@pytest.mark.parametrize(['edit', 'expected'], link_case_edits)
+@pytest.mark.psm
+def test_link_case_fingerprints(app, edit, expected):
+    """
+    Edits inside, between, and across deductions that link cases and clone
+    nodes. Whenever the built products of an item change, so must its
+    fingerprint.
+    """
+    with app.app_context():
+        def build(text):
+            module = build_module_from_text(text, 'test.local.foo')
+            module.resolve()
+            fingerprints = module.get_item_fingerprints()
+            dashgraphs = {
+                name: json.dumps(module[name].buildDashgraph(), sort_keys=True)
+                for name in fingerprints
+            }
+            return fingerprints, dashgraphs
+
+        fp0, dg0 = build(LINK_CASE_TEXT)
+        fp1, dg1 = build(LINK_CASE_TEXT.replace(*edit))
+        # Products are a function of the source.
+        assert build(LINK_CASE_TEXT)[1] == dg0
+        changed = sorted(k for k in fp1 if fp1[k] != fp0[k])
+        assert changed == expected
+        assert {k for k in dg1 if dg1[k] != dg0[k]} <= set(changed)
+
+
+
+CHAIN_TEXTS = {
+    'm0': """
+deduc U {
+    asrt A { sy="A" }
+    asrt C { sy="C" }
+    meson = "A so C."
+}
+""",
+    'm1': """
+from test.foo.chain.m0 import U
+
+deduc T of U.C {
+    asrt D { sy="D" }
+    meson = "D so U.C."
+}
+""",
+    'm2': """
+from test.foo.chain.m1 import T
+
+deduc B of T.D {
+    asrt E { sy="E" }
+    meson = "E so T.D."
+}
+""",
+}
+
+
+@pytest.mark.psm
+def test_cross_module_fingerprints(app, tmp_path, monkeypatch):
+    """
+    A change in one module changes the fingerprints of items in modules that
+    depend on it, even through a module in between.
+    """
+    monkeypatch.setitem(app.config, 'PFSC_LIB_ROOT', str(tmp_path))
+    repo_dir = tmp_path / 'test' / 'foo' / 'chain'
+    repo_dir.mkdir(parents=True)
+
+    def get_fingerprints(edit=None):
+        for name, text in CHAIN_TEXTS.items():
+            if name == 'm0' and edit:
+                text = text.replace(*edit)
+            (repo_dir / f'{name}.pfsc').write_text(text)
+        module = load_module('test.foo.chain.m2', caching=CachePolicy.NEVER)
+        module.resolve()
+        return module.get_item_fingerprints()
+
+    with app.app_context():
+        fp0 = get_fingerprints()
+        assert get_fingerprints() == fp0
+        assert get_fingerprints(('sy="C"', 'sy="C2"'))['B'] != fp0['B']
+
+
+REPO = 'test.foo.bar'
+
+
+@pytest.fixture
+def gdb_app(tmp_path):
+    app = Flask('test')
+    app.config['GRAPHDB_URI'] = f'sqlite://{tmp_path / "gdb.db"}'
+    pfsc.gdb.init_app(app)
+    return app
+
+
+def make_wip_mii(unchanged=()):
+    """
+    Index info for a WIP build of a module with deductions A and B, where B
+    cites A.
+    """
+    mii = ModuleIndexInfo(BuildMonitor(None), REPO, 'WIP', 'abc')
+    mii.add_root_module()
+    for deduc, node in [('A', 'C'), ('B', 'D')]:
+        mii.add_kNode(IndexType.DEDUC, f'{REPO}.{deduc}', REPO)
+        mii.add_under_reln(IndexType.DEDUC, f'{REPO}.{deduc}', IndexType.MODULE, REPO, REPO)
+        mii.add_kNode(IndexType.NODE, f'{REPO}.{deduc}.{node}', REPO)
+        mii.add_under_reln(IndexType.NODE, f'{REPO}.{deduc}.{node}', IndexType.DEDUC, f'{REPO}.{deduc}', REPO)
+    mii.add_kReln(IndexType.NODE, f'{REPO}.B.D', 'WIP', IndexType.IMPLIES,
+                  IndexType.NODE, f'{REPO}.A.C', 'WIP', REPO)
+    mii.set_unchanged_items({f'{REPO}.{name}' for name in unchanged})
+    return mii
+
+
+def index_wip(gw, mii):
+    mii.compute_mm_closure(gw.reader)
+    mii.do_post_scanning_steps(gw.reader)
+    gw.index_module(mii)
+    return mii
+
+
+def test_omit_unchanged_items(gdb_app):
+    A, AC = f'{REPO}.A', f'{REPO}.A.C'
+    with gdb_app.app_context():
+        gw = get_graph_writer()
+        gr = gw.reader
+        mii = index_wip(gw, make_wip_mii(['A']))
+        # Nothing is kept when there was nothing in the index.
+        assert mii.kept_libpaths == set()
+        assert len(mii.V_add) == 5
+        all_libpaths = gr.get_wip_libpaths_under_module(REPO)
+        num_edges = gr.num_edges_in_db()
+
+        # The j-nodes under A are kept, and so is the reln between them.
+        # The reln from A to the module, and that from B.D to A.C, are re-added,
+        # since the module and B.D are dropped.
+        mii = index_wip(gw, make_wip_mii(['A']))
+        assert mii.kept_libpaths == {A, AC}
+        assert mii.V_add.isdisjoint({A, AC})
+        assert f'{AC}:{IndexType.UNDER}:{A}' not in mii.E_add
+        assert f'{A}:{IndexType.UNDER}:{REPO}' in mii.E_add
+        assert f'{REPO}.B.D:{IndexType.IMPLIES}:{AC}' in mii.E_add
+        assert gr.get_wip_libpaths_under_module(REPO) == all_libpaths
+        assert gr.num_edges_in_db() == num_edges
+
+        # If the graph database has lost any of the j-nodes under unchanged
+        # items, everything in the module is added afresh.
+        tx = gw.new_transaction()
+        gw._drop_wip_nodes_under_module(REPO, tx, keep=[A])
+        gw.commit_transaction(tx)
+        assert gr.get_wip_libpaths_under_module(REPO) == {A}
+        mii = index_wip(gw, make_wip_mii(['A']))
+        assert mii.kept_libpaths == set()
+        assert len(mii.V_add) == 5
+        assert gr.get_wip_libpaths_under_module(REPO) == all_libpaths
+        assert gr.num_edges_in_db() == num_edges
+
+
+def test_drop_wip_nodes_keep(gdb_app):
+    A, AC = f'{REPO}.A', f'{REPO}.A.C'
+    with gdb_app.app_context():
+        gw = get_graph_writer()
+        gr = gw.reader
+        index_wip(gw, make_wip_mii())
+        tx = gw.new_transaction()
+        gw._drop_wip_nodes_under_module(REPO, tx, keep=[A, AC])
+        gw.commit_transaction(tx)
+        assert gr.get_wip_libpaths_under_module(REPO) == {A, AC}
+        # Only the reln between the kept nodes survives.
+        assert gr.num_edges_in_db() == 1
+        tx = gw.new_transaction()
+        gw._drop_wip_nodes_under_module(REPO, tx)
+        gw.commit_transaction(tx)
+        assert gr.get_wip_libpaths_under_module(REPO) == set()
+
+
+def test_reuse_products(tmp_path):
+    def path_getter(itempath, version):
+        return tmp_path, f'{itempath}.html', f'{itempath}.json'
+
+    builder = SimpleNamespace(unchanged_items={'test.foo.bar.A'}, version='WIP')
+    for name in ['A.html', 'B.html', 'B.json']:
+        p = tmp_path / f'test.foo.bar.{name}'
+        p.write_text('x')
+        os.utime(p, (0, 0))
+    # A changed item's products are never reused.
+    assert not Builder.reuse_products(builder, 'test.foo.bar.B', path_getter)
+    # Nor are an unchanged item's, if any are missing.
+    assert not Builder.reuse_products(builder, 'test.foo.bar.A', path_getter)
+    (tmp_path / 'test.foo.bar.A.json').write_text('x')
+    os.utime(tmp_path / 'test.foo.bar.A.json', (0, 0))
+    assert Builder.reuse_products(builder, 'test.foo.bar.A', path_getter)
+    # Those reused are touched.
+    assert (tmp_path / 'test.foo.bar.A.html').stat().st_mtime > 0
+    assert (tmp_path / 'test.foo.bar.A.json').stat().st_mtime > 0
+    assert (tmp_path / 'test.foo.bar.B.html').stat().st_mtime == 0
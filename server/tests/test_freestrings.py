@@ -14,8 +14,11 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
+import html
 import json, os
 
+import mistletoe
+from mistletoe.html_renderer import HTMLRenderer
 import pytest
 
 from pfsc.lang.freestrings import (
@@ -24,6 +27,9 @@ from pfsc.lang.freestrings import (
     PfscJsonTransformer,
     split_on_widgets,
     render_anno_markdown,
+    renderer_pool,
+    PfscRenderer,
+    MISTLETOE_CHARREF,
 )
 from pfsc.build.repo import RepoInfo
 from pfsc.lang.modules import load_module
@@ -478,3 +484,128 @@ def test_section_numbers_1(app, ctl_text, depth):
                     e = len(p[0].split('.'))
                     assert e == d - (depth - 1)
                     assert p[1].endswith(p[0])
+
+# ----------------------------------------------------------------------
+
+anno_text_render_cache_1 = """
+# Heading
+
+Some text, with a <qna:>[question]{
+    question: "What is $1 + 1$?",
+    answer: "%s",
+} widget.
+"""
+
+def test_render_cache_1(app, monkeypatch):
+    """
+    Test that annotation HTML is reused from the render cache, exactly when
+    the text and widget data are unchanged.
+    """
+    from pfsc.lang.render_cache import get_render_cache
+    # Use the in-memory cache only, so that entries on disk from previous
+    # test runs do not count as hits.
+    monkeypatch.setitem(app.config, 'PFSC_RENDER_CACHE_ON_DISK', False)
+    with app.app_context():
+        cache = get_render_cache()
+        cache.clear()
+
+        def render(answer):
+            anno = Annotation('foo', [], anno_text_render_cache_1 % answer, None)
+            anno.build()
+            anno.cascadeLibpaths()
+            anno.resolve()
+            return anno.get_escaped_html()
+
+        h1 = render('$2$')
+        assert (cache.hits, cache.misses) == (0, 1)
+        h2 = render('$2$')
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert h2 == h1
+        h3 = render('two')
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert h3 != h1
+
+        # Plain markdown, as in previews, goes through the same cache.
+        render_markdown(md_input_1)
+        assert render_markdown(md_input_1) == html_output_1
+        assert cache.hits == 2
+
+
+def test_render_cache_disk_bound(tmp_path, monkeypatch):
+    """
+    Test that the render cache on disk is bounded, keeping the most recently
+    used entries.
+    """
+    from flask import Flask
+    import pfsc.lang.render_cache as rc
+    app = Flask('test')
+    app.config['PFSC_BUILD_ROOT'] = str(tmp_path)
+    app.config['PFSC_RENDER_CACHE_ON_DISK'] = True
+    app.config['PFSC_RENDER_CACHE_DISK_MAX_FILES'] = 10
+    monkeypatch.setattr(rc, 'PRUNE_INTERVAL', 20)
+    cache = rc.RenderCache(0)
+    with app.app_context():
+        keys = [rc.make_render_key(i) for i in range(20)]
+        for i, key in enumerate(keys[:15]):
+            cache.put(key, f'<p>{i}</p>', persist=True)
+            os.utime(cache.disk_path(key), (i, i))
+        # Reading an old entry makes it recent.
+        assert cache.get(keys[0]) == '<p>0</p>'
+        for i, key in enumerate(keys[15:], start=15):
+            cache.put(key, f'<p>{i}</p>', persist=True)
+            os.utime(cache.disk_path(key), (100 + i, 100 + i))
+        on_disk = [k for k in keys if cache.disk_path(k).exists()]
+        assert len(on_disk) <= 10
+        assert keys[0] in on_disk
+        assert keys[1] not in on_disk
+        assert keys[-1] in on_disk
+
+
+def test_render_key_parts():
+    from pfsc.lang.render_cache import make_render_key
+    assert make_render_key('md', 'x', True, ['a.org']) == make_render_key('md', 'x', True, ['a.org'])
+    assert make_render_key('md', 'x', True, False) != make_render_key('md', 'x', False, True)
+    # Parts that are not JSON-serializable are an error, not silently keyed
+    # by their repr.
+    with pytest.raises(TypeError):
+        make_render_key('md', object())
+
+# ----------------------------------------------------------------------
+
+def test_renderer_pool_1():
+    """
+    Test that renderers are reused, and still render correctly when reused.
+    """
+    h1 = render_anno_markdown(anno_stub_text_1, mock_widgets_1)
+    h2 = render_anno_markdown(anno_stub_text_1, mock_widgets_1)
+    assert h1 == h2 == render_anno_output_1
+
+    key = ('test', False, ['http'])
+    with renderer_pool.take(key, lambda: PfscRenderer({})) as r1:
+        r1.bind(mock_widgets_1)
+        # Reentrant rendering gets a different instance.
+        with renderer_pool.take(key, lambda: PfscRenderer({})) as r2:
+            assert r2 is not r1
+    # Renderers are unbound when returned to the pool.
+    assert r1.widget_lookup == {}
+    with renderer_pool.take(key, lambda: PfscRenderer({})) as r3:
+        assert r3 in (r1, r2)
+
+
+def test_mistletoe_charref():
+    """
+    Test that we keep up with mistletoe's use of the `html._charref` global.
+    (See `reinstall_mistletoe_charref()`.)
+    """
+    stdlib_charref = html._charref
+    with HTMLRenderer():
+        assert html._charref.pattern == MISTLETOE_CHARREF.pattern
+    assert html._charref is stdlib_charref
+
+    # CommonMark wants no char ref without a semicolon, while the stdlib
+    # pattern accepts some. Reused renderers must still get this right.
+    for i in range(2):
+        with renderer_pool.take(('test_charref',), lambda: PfscRenderer({})) as r:
+            h = mistletoe.markdown('a &copy b &copy; c', r)
+        assert h == '<p>a &amp;copy b © c</p>\n'
+        assert html._charref is stdlib_charref
@@ -20,6 +20,7 @@ from pfsc.build.manifest import (
     build_manifest_from_dict,
     load_manifest,
     Manifest,
+    ManifestIndex,
     ManifestTreeNode,
 )
 
@@ -304,6 +305,27 @@ def test_merge_04():
     assert d == manifest_02_c_MOD
 
 
+def test_manifest_index(tmp_path):
+    """Check lookups in a manifest index."""
+    path = tmp_path / 'manifest.sqlite'
+    ManifestIndex.write(path, make(manifest_01_c1))
+    with ManifestIndex(path) as index:
+        assert index.get_root_libpath() == 'a'
+        assert index.get_build_info() == manifest_01_c1['build']
+        assert index.get('a.b1').data['type'] == 'BAR'
+        assert index.get('a.nope') is None
+        assert [n.id for n in index.get_children('a.b1')] == ['a.b1.c1']
+        assert [n.id for n in index.get_ancestors('a.b1.c1')] == ['a.b1', 'a']
+        assert index.get_ancestors('a') == []
+        assert [(n.id, p, d) for n, p, d in index.iter_subtree('a')] == [
+            ('a', None, 0), ('a.b1', 'a', 1), ('a.b1.c1', 'a.b1', 2),
+        ]
+        root = index.load_subtree('a', max_depth=1)
+        assert [c.id for c in root.children] == ['a.b1']
+        assert root.children[0].children == []
+        assert index.load_manifest().build_dict() == manifest_01_c1
+
+
 def test_is_terminal(repos_ready):
     """Check the `isTerminal` property."""
     manifest = load_manifest('test.alex.math', version='v3.0.0')
@@ -14,12 +14,19 @@
 #   limitations under the License.                                            #
 # --------------------------------------------------------------------------- #
 
+import pathlib
+import sys
+import time
+
 import pytest
 
 from pfsc.build.repo import checkout, get_repo_info
 from pfsc.excep import PfscExcep, PECode
-from pfsc.lang.meson import build_graph_from_meson, build_graph_from_arcs
-from pfsc.lang.modules import load_module
+from pfsc.lang.freestrings import PfscJsonTransformer
+from pfsc.lang.meson import build_graph_from_meson, build_graph_from_arcs, Graph
+from pfsc.lang.modules import load_module, parse_module_text
+
+from tests.util.synth import make_meson_chain
 
 
 success = [
@@ -442,6 +449,200 @@ def test_issue_14(app):
             assert ei.value.code() == PECode.MESON_BAD_GHOST_NODE
 
 
+######################################################################
+# Bridges and articulation points
+
+
+class DummyActualNode:
+    """
+    Stands in for the actual node that a node of a meson Graph represents.
+    A name `A.B` is taken to be contained in `A`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.parent_name = name.rsplit('.', 1)[0] if '.' in name else '<deduc>'
+
+    def getName(self):
+        return self.name
+
+    def getParent(self):
+        return DummyActualNode(self.parent_name) if '.' in self.name else DeducStandIn
+
+    def getLibpath(self):
+        return self.name
+
+    def isModal(self):
+        return False
+
+    def isGhostNode(self):
+        return False
+
+    def isSubDeduc(self):
+        return False
+
+
+class DeducStandIn:
+
+    @staticmethod
+    def getName():
+        return '<deduc>'
+
+
+def set_dummy_actual_nodes(graph):
+    for name, node in graph.getNodes().items():
+        node.setActualNode(DummyActualNode(name))
+
+
+def reference_bridges(graph):
+    """
+    The recursive bridge search that `Graph.findAndMarkBridges()` used to do.
+
+    :return: set of edge reprs
+    """
+    bridges = set()
+    all_nodes = graph.nodes
+    edge_lookup = graph.edgesByEndpts
+    unvisited_names = set(all_nodes.keys())
+    c_nbrs = graph.computeContainmentNbrs()
+    min_reach = {name: -1 for name in all_nodes}
+    first_enc = min_reach.copy()
+
+    def bridge_search(a, b, count):
+        count += 1
+        min_reach[b] = first_enc[b] = count
+        for c in all_nodes[b].nbrNames | c_nbrs[b]:
+            if first_enc[c] < 0:
+                unvisited_names.remove(c)
+                bridge_search(b, c, count)
+                min_reach[b] = min(min_reach[b], min_reach[c])
+                if min_reach[c] == first_enc[c]:
+                    e = edge_lookup[b].get(c)
+                    if e is not None:
+                        bridges.add(repr(e))
+            elif a != c:
+                min_reach[b] = min(min_reach[b], first_enc[c])
+
+    while unvisited_names:
+        a = unvisited_names.pop()
+        bridge_search(a, a, 0)
+    return bridges
+
+
+def reference_articulations(graph):
+    """
+    Brute force: delete each node in turn, and count components.
+    """
+    names, adj = graph.buildAdjacency()
+
+    def count_components(deleted):
+        seen = {deleted}
+        k = 0
+        for i in range(len(names)):
+            if i not in seen:
+                k += 1
+                seen.add(i)
+                stack = [i]
+                while stack:
+                    for j in adj[stack.pop()]:
+                        if j not in seen:
+                            seen.add(j)
+                            stack.append(j)
+        return k
+
+    base = count_components(-1)
+    return {names[i] for i in range(len(names)) if count_components(i) > base}
+
+
+def iter_resource_graphs():
+    """
+    Build a Graph from each meson script and arc listing in the test repos.
+    """
+    transformer = PfscJsonTransformer()
+    root = pathlib.Path(__file__).parent / 'resources' / 'repo'
+    for path in sorted(root.glob('**/*.pfsc')):
+        tree, _ = parse_module_text(path.read_text())
+        for asgn in tree.find_data('assignment'):
+            key = str(asgn.children[0])
+            if key in ['meson', 'arcs']:
+                script = transformer.transform(asgn.children[1]).unescape()
+                try:
+                    if key == 'meson':
+                        graph = build_graph_from_meson(script)
+                    else:
+                        graph = build_graph_from_arcs(script)
+                except PfscExcep:
+                    # Some test repos contain deliberately bad scripts.
+                    continue
+                set_dummy_actual_nodes(graph)
+                yield f'{path}: {script[:40]}', graph
+
+
+def test_bridge_parity():
+    """
+    Check that we find the same bridges as the old, recursive search, for
+    every graph in the test repos.
+    """
+    n = 0
+    for desc, graph in iter_resource_graphs():
+        found = {repr(e) for e in graph.findAndMarkBridges()}
+        assert found == reference_bridges(graph), desc
+        assert found == {repr(e) for e in graph.getEdges().values() if e.isBridge()}
+        assert graph.findArticulationNodes() == reference_articulations(graph), desc
+        n += 1
+    assert n > 100
+
+
+def test_articulations():
+    g = build_graph_from_arcs("A --> B --> C --> A --> D --> E")
+    set_dummy_actual_nodes(g)
+    assert {repr(e) for e in g.findAndMarkBridges()} == {'A --> D', 'D --> E'}
+    assert g.findArticulationNodes() == {'A', 'D'}
+
+
+def make_chain_graph(n):
+    """
+    Make the Graph that `make_meson_chain()` would make from n intermediate
+    nodes, without parsing. (The meson parser takes several seconds on
+    a script of this length.)
+    """
+    g = Graph()
+    names = [f'A{i}' for i in range(n)] + ['C']
+    for a, b in zip(names, names[1:]):
+        g.createEdge(a, b)
+    set_dummy_actual_nodes(g)
+    return g
+
+
+def test_bridges_long_chain():
+    """
+    Stress test on a 20k-node chain, deeper than Python's recursion limit.
+    """
+    n = 20000
+    assert n > sys.getrecursionlimit()
+    g = make_chain_graph(n)
+    t0 = time.perf_counter()
+    g.semanticCheck([DummyActualNode('C')])
+    bridges = g.findAndMarkBridges()
+    articulations = g.findArticulationNodes()
+    elapsed = time.perf_counter() - t0
+    assert len(bridges) == n
+    assert len(articulations) == n - 1
+    assert elapsed < 5
+
+
+def test_bridges_parsed_chain():
+    """
+    Same, but with a (shorter) parsed meson script.
+    """
+    n = 2 * sys.getrecursionlimit()
+    script = make_meson_chain([f'A{i}' for i in range(n)], 'C', [])
+    g = build_graph_from_meson(script)
+    set_dummy_actual_nodes(g)
+    g.semanticCheck([DummyActualNode('C')])
+    assert len(g.findAndMarkBridges()) == n
+
+
 ######################################################################
 # Manual testing
 
@@ -0,0 +1,103 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import pytest
+
+from pfsc.excep import PfscExcep, PECode
+from pfsc.lang.objects import PfscObj
+
+
+class Loader(PfscObj):
+    """
+    Lazy loads a "submodule" on any name beginning with `sub`.
+    """
+
+    def lazyLoadSubmodule(self, name):
+        if name.startswith('sub'):
+            sub = PfscObj()
+            sub['x'] = name
+            self[name] = sub
+            return sub
+        return None
+
+
+def make_tree():
+    root = Loader()
+    root.libpath = 'test.foo.bar'
+    a = PfscObj()
+    a.libpath = 'test.foo.bar.A'
+    root['A'] = a
+    a.setParent(root)
+    b = PfscObj()
+    b.libpath = 'test.foo.bar.A.B'
+    a['B'] = b
+    b.setParent(a)
+    b['sy'] = 'B'
+    root['x'] = None
+    return root, a, b
+
+
+def test_get():
+    root, a, b = make_tree()
+    assert root.get('A') is a
+    assert root.get('A.B') is b
+    assert root.get(['A', 'B', 'sy']) == 'B'
+    assert root.get('A.C', default=0) == 0
+    # Items equal to None are missing, and are not lazy loaded.
+    assert root.get('x', default=0) == 0
+    # Lazy loading can be declined for the lead segment only.
+    assert root.get('sub1', lazy_load=False) is None
+    assert root.get('sub1.x') == 'sub1'
+    assert root.get('sub1', lazy_load=False) is not None
+    with pytest.raises(PfscExcep) as ei:
+        root.get([])
+    assert ei.value.code() == PECode.MALFORMED_LIBPATH
+
+
+def test_get_from_ancestor():
+    root, a, b = make_tree()
+    assert b.getFromAncestor('sy') == ('B', 'test.foo.bar.A.B')
+    assert b.getFromAncestor('sy', proper=True) == (None, None)
+    assert b.getFromAncestor('A.B') == (b, 'test.foo.bar')
+    assert b.getFromAncestor('sub2.x') == ('sub2', 'test.foo.bar')
+    with pytest.raises(PfscExcep) as ei:
+        b.getFromAncestor('C', missing_obj_descrip='named in test')
+    assert ei.value.code() == PECode.MODULE_DOES_NOT_CONTAIN_OBJECT
+
+
+def test_get_from_non_pfsc_obj_ancestor():
+    class Host:
+        def getFromAncestor(self, path, proper=False, missing_obj_descrip=None):
+            return 'found', 'host'
+
+    obj = PfscObj()
+    obj.setParent(Host())
+    assert obj.getFromAncestor('foo') == ('found', 'host')
+
+
+def test_items():
+    obj = PfscObj()
+    other = PfscObj()
+    # Objects without items share one empty dict, which is read-only.
+    assert obj.items is other.items
+    with pytest.raises(TypeError):
+        obj.items['x'] = 1
+    # Setting a path through missing objects creates them.
+    obj['A.B'] = 'C'
+    assert obj.items is not other.items
+    assert other.items == {}
+    assert isinstance(obj['A'], PfscObj)
+    assert obj.get('A.B') == 'C'
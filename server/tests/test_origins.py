@@ -16,7 +16,17 @@
 
 import json
 
+from flask import Flask
+import pytest
+
+from pfsc.build import Builder
 from pfsc.build.products import load_dashgraph, load_annotation
+from pfsc.build.repo import get_repo_info
+from pfsc.excep import PfscExcep, PECode
+from pfsc.gdb.origins import (
+    OriginResolver, batched_origin_lookups, get_origin_resolver,
+)
+from pfsc.lang.widgets import GoalWidget
 
 
 def test_origins_1(app, repos_ready):
@@ -26,9 +36,147 @@ def test_origins_1(app, repos_ready):
         origin = dg["children"]["test.moo.bar.results.Pf.U"]["origin"]
         assert origin == "test.moo.bar.results.Pf.T@1"
 
+
 def test_origins_2(app, repos_ready):
     with app.app_context():
         html, j = load_annotation('test.moo.study.expansions.Notes3', version='v1.0.0')
         data = json.loads(j)
         origin = data["widgets"]["test-moo-study-expansions-Notes3-w1_v1-0-0"]["origin"]
         assert origin == "test.moo.study.expansions.Notes3.w2@1"
+
+
+class CountingReader:
+
+    def __init__(self, known):
+        self.known = known
+        self.calls = []
+
+    def get_origins(self, libpaths_by_label, major):
+        self.calls.append((libpaths_by_label, major))
+        return {
+            lp: self.known[lp]
+            for libpaths in libpaths_by_label.values()
+            for lp in libpaths if lp in self.known
+        }
+
+
+def test_origin_resolver():
+    reader = CountingReader({
+        'test.foo.bar.Pf.A1': 'test.foo.bar.Pf.A1@1',
+        'test.foo.bar.Pf.A2': 'test.foo.bar.Pf.A2@1',
+        'test.foo.bar.Pf': 'test.foo.bar.Pf@1',
+        'test.moo.bar.Pf.S': 'test.moo.bar.Pf.S@0',
+    })
+    resolver = OriginResolver(graph_reader=reader)
+    found = {}
+
+    def accept(key):
+        return lambda origin: found.__setitem__(key, origin)
+
+    for i, (label, major, libpath) in enumerate([
+        ('Node', 1, 'test.foo.bar.Pf.A1'),
+        ('Node', 1, 'test.foo.bar.Pf.A2'),
+        ('Node', 1, 'test.foo.bar.Pf.A1'),
+        ('Deduc', 1, 'test.foo.bar.Pf'),
+        ('Node', 0, 'test.moo.bar.Pf.S'),
+        ('Node', 0, 'test.moo.bar.Pf.T'),
+    ]):
+        resolver.request(label, major, libpath, accept(i))
+    assert reader.calls == []
+
+    resolver.resolve()
+    # One query per (label, major) pair, with no repeated libpaths.
+    assert resolver.num_queries == len(reader.calls) == 3
+    assert reader.calls[0] == ({'Node': ['test.foo.bar.Pf.A1', 'test.foo.bar.Pf.A2']}, 1)
+    assert found == {
+        0: 'test.foo.bar.Pf.A1@1',
+        1: 'test.foo.bar.Pf.A2@1',
+        2: 'test.foo.bar.Pf.A1@1',
+        3: 'test.foo.bar.Pf@1',
+        4: 'test.moo.bar.Pf.S@0',
+        5: None,
+    }
+
+
+class StandIn:
+
+    def __init__(self, label, major):
+        self.label = label
+        self.major = major
+
+    def get_index_type(self):
+        return self.label
+
+    def getMajorVersion(self):
+        return self.major
+
+
+def make_goal_widget(altpath):
+    gw = GoalWidget.__new__(GoalWidget)
+    gw.libpath = 'test.moo.comment.bar.NotesS.w1'
+    gw.data = {'altpath': altpath}
+    gw.objects_by_abspath = {altpath: StandIn('Node', 0)}
+    return gw
+
+
+def test_goal_widget_batched_origins():
+    reader = CountingReader({
+        'test.moo.bar.Pf.S': 'test.moo.bar.Pf.S@0',
+        'test.moo.bar.Pf.T': 'test.moo.bar.Pf.T@0',
+    })
+    widgets = [make_goal_widget(f'test.moo.bar.Pf.{n}') for n in 'STS']
+    with Flask(__name__).app_context():
+        with batched_origin_lookups(graph_reader=reader) as resolver:
+            assert get_origin_resolver() is resolver
+            for gw in widgets:
+                gw.data['origin'] = gw.compute_origin()
+                assert gw.origin is None
+        assert get_origin_resolver() is None
+    assert len(reader.calls) == 1
+    assert [gw.origin for gw in widgets] == [
+        'test.moo.bar.Pf.S@0', 'test.moo.bar.Pf.T@0', 'test.moo.bar.Pf.S@0'
+    ]
+    assert [gw.data['origin'] for gw in widgets] == [gw.origin for gw in widgets]
+
+
+def test_goal_widget_missing_batched_origin():
+    gw = make_goal_widget('test.moo.bar.Pf.U')
+    with Flask(__name__).app_context():
+        with pytest.raises(PfscExcep) as ei:
+            with batched_origin_lookups(graph_reader=CountingReader({})):
+                gw.compute_origin()
+    assert ei.value.code() == PECode.MISSING_ORIGIN
+
+
+@pytest.mark.psm
+def test_build_origin_queries(app, repos_ready):
+    """
+    Show that a build looks up the origins of the ghost nodes for a cited
+    proof in another repo all at once.
+    """
+    with app.app_context():
+        # `test.moo.comment` is among the repos that are built at WIP, from
+        # its `v0.2.0` tag, so we can rebuild it that way here without
+        # disturbing any numbered release.
+        ri = get_repo_info('test.moo.comment')
+        ri.checkout('v0.2.0')
+        b = Builder('test.moo.comment', make_clean=True)
+        reader = b.graph_writer.reader
+        calls = []
+        get_origins = reader.get_origins
+
+        def counting_get_origins(libpaths_by_label, major):
+            calls.append((libpaths_by_label, major))
+            return get_origins(libpaths_by_label, major)
+
+        reader.get_origins = counting_get_origins
+        try:
+            b.build()
+        finally:
+            del reader.get_origins
+            ri.clean()
+        assert b.origin_queries == len(calls)
+        # The ghost nodes all point into `test.moo.bar.results.Pf`, at a
+        # single version.
+        assert 0 < b.origin_queries <= 2
+        assert len(set(map(str, calls))) == len(calls)
@@ -0,0 +1,129 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import json
+import threading
+
+from flask import Flask
+
+import pfsc.build.reindex as reindex
+from pfsc.build import BuildMonitor
+from pfsc.build.mii import ModuleIndexInfo
+from pfsc.build.reindex import Reindexer, load_index_info, sort_versions
+from pfsc.constants import IndexType
+from pfsc.util import EMPTY_DICT
+
+
+def make_mii():
+    mii = ModuleIndexInfo(BuildMonitor(None), 'test.foo.bar', 'v1.2.0', 'abc', recursive=True)
+    mii.add_root_module()
+    mii.add_submodule('test.foo.bar.baz', 'test.foo.bar')
+    mii.add_kNode(IndexType.DEDUC, 'test.foo.bar.baz.Thm', 'test.foo.bar.baz', extra_props={'foo': 1})
+    mii.add_under_reln(IndexType.DEDUC, 'test.foo.bar.baz.Thm', IndexType.MODULE, 'test.foo.bar.baz', 'test.foo.bar.baz')
+    return mii
+
+
+def test_index_records_round_trip():
+    mii = make_mii()
+    records = json.loads(json.dumps(mii.get_index_records()))
+    assert set(records.keys()) == {'test.foo.bar', 'test.foo.bar.baz'}
+
+    mii2 = ModuleIndexInfo(BuildMonitor(None), 'test.foo.bar', 'v1.2.0', 'abc', recursive=True)
+    for modpath in ['test.foo.bar', 'test.foo.bar.baz']:
+        mii2.add_index_records(modpath, records[modpath])
+    assert mii2.added_modpaths == mii.added_modpaths
+    for lookup_name in ['node_lookup', 'reln_lookup']:
+        L1, L2 = getattr(mii, lookup_name), getattr(mii2, lookup_name)
+        assert L1.keys() == L2.keys()
+        for uid, k in L1.items():
+            assert k.get_attributes() == L2[uid].get_attributes()
+
+
+def test_sort_versions():
+    assert sort_versions(['WIP', 'v10.0.0', 'v2.1.0', 'v2.0.3']) == [
+        'v2.0.3', 'v2.1.0', 'v10.0.0', 'WIP'
+    ]
+
+
+class MockReindexer(Reindexer):
+
+    def __init__(self, failing, **kwargs):
+        super().__init__(**kwargs)
+        self.failing = failing
+        self.order = []
+        self.lock = threading.Lock()
+
+    def reindex_repo(self, repopath, versions):
+        with self.lock:
+            self.order.append(repopath)
+        if repopath in self.failing:
+            raise Exception('oops')
+
+
+def test_reindex_scheduling(monkeypatch):
+    built = {
+        'test.a.a': ['v1.0.0'],
+        'test.b.b': ['v1.0.0', 'WIP'],
+        'test.c.c': ['WIP'],
+        'test.d.d': ['WIP'],
+        'test.e.e': ['WIP'],
+    }
+    deps = {
+        'test.a.a': set(),
+        'test.b.b': {'test.a.a', 'test.x.x'},
+        'test.c.c': {'test.b.b'},
+        'test.d.d': {'test.a.a'},
+        'test.e.e': {'test.d.d'},
+    }
+    monkeypatch.setattr(reindex, 'building_in_gdb', lambda: False)
+    monkeypatch.setattr(reindex, 'find_built_versions', lambda repopaths: built)
+    monkeypatch.setattr(reindex, 'load_repo_dependencies', lambda r, vv: set(deps[r]))
+
+    app = Flask('test')
+    with app.app_context():
+        r = MockReindexer({'test.b.b'}, workers=3)
+        report = r.run()
+    assert r.order.index('test.a.a') < r.order.index('test.b.b')
+    assert r.order.index('test.d.d') < r.order.index('test.e.e')
+    assert 'test.c.c' not in r.order
+    assert list(report['failed'].keys()) == ['test.b.b']
+    assert report['blocked'] == ['test.c.c']
+
+
+def test_load_index_info(app, repos_ready):
+    with app.app_context():
+        mii, deps = load_index_info('test.moo.bar', 'v1.0.0')
+        assert mii.added_modpaths[0] == 'test.moo.bar'
+        assert len(mii.node_lookup) > 0
+        # Every version of a built repo is already indexed, except WIP, which
+        # is redone.
+        report = Reindexer(repopaths=['test.moo.bar']).run()
+        assert report['failed'] == {}
+        assert all(not s.endswith('@WIP') for s in report['skipped'])
+
+
+def test_kObj_extra_props():
+    mii = make_mii()
+    k = mii.get_kNode('test.foo.bar.baz')
+    assert k.extra_props is EMPTY_DICT
+    k.set_extra_prop('bar', 2)
+    assert k.extra_props == {'bar': 2}
+    assert mii.get_kNode('test.foo.bar').extra_props is EMPTY_DICT
+    # Equal libpaths are interned to a single string.
+    modpath = '.'.join(['test', 'foo', 'bar', 'baz'])
+    mii.add_under_reln(IndexType.DEDUC, 'test.foo.bar.baz.Pf', IndexType.MODULE, modpath, modpath)
+    r = mii.get_kReln('test.foo.bar.baz.Pf:UNDER:test.foo.bar.baz')
+    assert r.head_libpath is k.libpath
@@ -0,0 +1,296 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import inspect
+
+import pytest
+from flask import Flask, session
+from flask_login import LoginManager
+
+import pfsc.gdb
+import pfsc.gdb.replicas as replicas
+import pfsc.rq
+from pfsc.build import BuildMonitor
+from pfsc.build.mii import ModuleIndexInfo
+from pfsc.constants import UserProps, DEMO_USERNAME_SESSION_KEY
+from pfsc.gdb import get_graph_reader, get_graph_writer
+from pfsc.gdb.replicas import (
+    SESSION_WRITE_TIME_NAME, note_primary_write, set_job_requesters,
+    shared_write_time_key,
+)
+from pfsc.gdb.sqlite.writer import SQLiteGraphWriter
+from pfsc.gdb.user import UserNotes
+from pfsc.gdb.writer import is_writing_method
+from pfsc.handlers import job_app_context, perform_repo_task_job, RepoTaskHandler
+
+
+class MockGdb:
+    """In-memory stand-in for a GDB driver. """
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.closed = False
+
+    def session(self):
+        return self
+
+    def close(self):
+        self.closed = True
+
+
+class MockRedis:
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, ex=None):
+        self.data[key] = str(value).encode()
+
+    def get(self, key):
+        return self.data.get(key)
+
+
+@pytest.fixture
+def replica_app(monkeypatch):
+    monkeypatch.setattr(pfsc.gdb, 'make_gdb', lambda uri: (MockGdb(uri), None))
+    redis = MockRedis()
+    monkeypatch.setattr(pfsc.rq, 'get_redis_connection', lambda: redis)
+    app = Flask('test')
+    app.config['SECRET_KEY'] = 'test'
+    app.config['GRAPHDB_URI'] = 'redis://primary:6379'
+    app.config['GRAPHDB_REPLICA_URIS'] = ['redis://r1:6379', 'redis://r2:6379']
+    app.config['GRAPHDB_REPLICA_MAX_LAG'] = 10
+    LoginManager(app).user_loader(lambda user_id: None)
+    pfsc.gdb.init_app(app)
+    app.redis = redis
+    return app
+
+
+def test_no_replicas(monkeypatch):
+    monkeypatch.setattr(pfsc.gdb, 'make_gdb', lambda uri: (MockGdb(uri), None))
+    app = Flask('test')
+    app.config['GRAPHDB_URI'] = 'redis://primary:6379'
+    with app.app_context():
+        assert get_graph_reader() is get_graph_writer().reader
+        assert get_graph_reader().gdb.uri == 'redis://primary:6379'
+
+
+def test_replica_routing(replica_app):
+    uris = []
+    for i in range(4):
+        with replica_app.test_request_context():
+            reader = get_graph_reader()
+            uris.append(reader.gdb.uri)
+            # Repeat calls in the same app context get the same reader.
+            assert get_graph_reader() is reader
+            # Writers always use the primary.
+            assert get_graph_writer().reader.gdb.uri == 'redis://primary:6379'
+    assert sorted(uris) == ['redis://r1:6379'] * 2 + ['redis://r2:6379'] * 2
+
+
+def test_read_your_writes(replica_app, monkeypatch):
+    with replica_app.test_request_context():
+        assert get_graph_reader().gdb.uri != 'redis://primary:6379'
+        note_primary_write()
+        # The rest of this app context reads from the primary.
+        assert get_graph_reader().gdb.uri == 'redis://primary:6379'
+        t = session[SESSION_WRITE_TIME_NAME]
+
+    # So does the next request in the same session...
+    with replica_app.test_request_context():
+        session[SESSION_WRITE_TIME_NAME] = t
+        assert get_graph_reader().gdb.uri == 'redis://primary:6379'
+
+    # ...until the replicas have had time to catch up.
+    monkeypatch.setattr(replicas.time, 'time', lambda: t + 11)
+    with replica_app.test_request_context():
+        session[SESSION_WRITE_TIME_NAME] = t
+        assert get_graph_reader().gdb.uri != 'redis://primary:6379'
+
+
+def test_shared_write_token(replica_app):
+    # A write made outside of any request (as in an RQ worker) sends the
+    # sessions of the requesters for whom it was made to the primary.
+    with replica_app.app_context():
+        set_job_requesters(['demo:test.moo', None])
+        note_primary_write()
+    assert list(replica_app.redis.data) == [shared_write_time_key('demo:test.moo')]
+    with replica_app.test_request_context():
+        session[DEMO_USERNAME_SESSION_KEY] = 'test.moo'
+        assert get_graph_reader().gdb.uri == 'redis://primary:6379'
+    # Other users' reads still go to a replica.
+    with replica_app.test_request_context():
+        session[DEMO_USERNAME_SESSION_KEY] = 'test.foo'
+        assert get_graph_reader().gdb.uri != 'redis://primary:6379'
+    with replica_app.test_request_context():
+        assert get_graph_reader().gdb.uri != 'redis://primary:6379'
+    replica_app.redis.data.clear()
+    with replica_app.test_request_context():
+        session[DEMO_USERNAME_SESSION_KEY] = 'test.moo'
+        assert get_graph_reader().gdb.uri != 'redis://primary:6379'
+
+
+def test_write_for_no_requester(replica_app):
+    # A write made for no one in particular leaves no token.
+    with replica_app.app_context():
+        note_primary_write()
+        assert get_graph_reader().gdb.uri == 'redis://primary:6379'
+    assert replica_app.redis.data == {}
+    with replica_app.test_request_context():
+        assert get_graph_reader().gdb.uri != 'redis://primary:6379'
+
+
+USERNAME = 'test.moo'
+REPO = 'test.foo.bar'
+
+
+def index_wip(gw):
+    mii = ModuleIndexInfo(BuildMonitor(None), REPO, 'WIP', 'abc')
+    mii.add_root_module()
+    mii.compute_mm_closure(gw.reader)
+    mii.do_post_scanning_steps(gw.reader)
+    gw.index_module(mii)
+
+
+# One example of each kind of write.
+WRITES = {
+    'index_module': index_wip,
+    'commit_transaction': lambda gw: gw.commit_transaction(gw.new_transaction()),
+    'clear_test_indexing': lambda gw: gw.clear_test_indexing(),
+    'delete_everything_under_repo': lambda gw: gw.delete_everything_under_repo(REPO),
+    'delete_full_wip_build': lambda gw: gw.delete_full_wip_build(REPO),
+    'delete_full_build_at_version': lambda gw: gw.delete_full_build_at_version(REPO, 'v1.0.0'),
+    'add_user': lambda gw: gw.add_user('test.foo', UserProps.V_USERTYPE.USER, 'foo@example.org', []),
+    'merge_user': lambda gw: gw.merge_user(USERNAME, UserProps.V_USERTYPE.USER, 'moo@example.org', []),
+    'update_user': lambda gw: gw.update_user(gw.reader.load_user(USERNAME)),
+    'delete_user': lambda gw: gw.delete_user(USERNAME, definitely_want_to_delete_this_user=True),
+    'delete_all_notes_of_one_user': lambda gw: gw.delete_all_notes_of_one_user(
+        USERNAME, definitely_want_to_delete_all_notes=True),
+    'record_user_notes': lambda gw: gw.record_user_notes(
+        USERNAME, UserNotes(REPO, 'WIP', 'checked', '')),
+    'record_module_source': lambda gw: gw.record_module_source(REPO, 'WIP', 'anno N @@@ n @@@'),
+    'record_repo_manifest': lambda gw: gw.record_repo_manifest(REPO, 'WIP', '{}'),
+    'record_dashgraph': lambda gw: gw.record_dashgraph(f'{REPO}.Thm', 'WIP', '{}'),
+    'record_annobuild': lambda gw: gw.record_annobuild(f'{REPO}.N', 'WIP', '', '{}'),
+    'delete_builds_under_module': lambda gw: gw.delete_builds_under_module(REPO, 'WIP'),
+    'set_approval': lambda gw: gw.set_approval(f'{REPO}.N.w1', 'WIP', True),
+}
+
+
+@pytest.fixture
+def sqlite_replica_app(tmp_path, monkeypatch):
+    redis = MockRedis()
+    monkeypatch.setattr(pfsc.rq, 'get_redis_connection', lambda: redis)
+    app = Flask('test')
+    app.config['SECRET_KEY'] = 'test'
+    app.config['GRAPHDB_URI'] = f'sqlite://{tmp_path / "primary.db"}'
+    app.config['GRAPHDB_REPLICA_URIS'] = [f'sqlite://{tmp_path / "replica.db"}']
+    app.config['GRAPHDB_REPLICA_MAX_LAG'] = 10
+    LoginManager(app).user_loader(lambda user_id: None)
+    pfsc.gdb.init_app(app)
+    with app.app_context():
+        index_wip(get_graph_writer())
+        get_graph_writer().add_user(USERNAME, UserProps.V_USERTYPE.USER, 'moo@example.org', [])
+    # Forget the writes made in setting up.
+    redis.data.clear()
+    app.redis = redis
+    return app
+
+
+def test_every_write_is_covered():
+    writing_methods = {
+        name for name, _ in inspect.getmembers(SQLiteGraphWriter, inspect.isfunction)
+        if is_writing_method(name)
+    }
+    assert writing_methods == set(WRITES)
+
+
+@pytest.mark.parametrize('write', list(WRITES))
+def test_reads_go_to_primary_after_writes(sqlite_replica_app, write):
+    with sqlite_replica_app.test_request_context():
+        gw = get_graph_writer()
+        assert get_graph_reader().gdb is not gw.reader.gdb
+        WRITES[write](gw)
+        assert get_graph_reader().gdb is gw.reader.gdb
+        assert SESSION_WRITE_TIME_NAME in session
+
+
+def test_write_in_job_with_phony_session(sqlite_replica_app, monkeypatch):
+    """
+    An RQ job may carry session vars, and then gets a request context with a
+    throwaway session. Its writes must still send the requester's sessions to
+    the primary.
+    """
+    monkeypatch.setattr(replicas, 'get_current_job', lambda: object())
+    with sqlite_replica_app.app_context():
+        with job_app_context({DEMO_USERNAME_SESSION_KEY: 'test.moo'}):
+            assert session[DEMO_USERNAME_SESSION_KEY] == 'test.moo'
+            get_graph_writer().record_dashgraph(f'{REPO}.Thm', 'WIP', '{}')
+    assert shared_write_time_key('demo:test.moo') in sqlite_replica_app.redis.data
+    with sqlite_replica_app.test_request_context():
+        session[DEMO_USERNAME_SESSION_KEY] = 'test.moo'
+        assert get_graph_reader().gdb is get_graph_writer().reader.gdb
+    with sqlite_replica_app.test_request_context():
+        session[DEMO_USERNAME_SESSION_KEY] = 'test.foo'
+        assert get_graph_reader().gdb is not get_graph_writer().reader.gdb
+
+
+class DashgraphHandler(RepoTaskHandler):
+    """Records a dashgraph, as a stand-in for a build. """
+
+    def check_permissions(self):
+        pass
+
+    def compute_implicated_repopaths(self):
+        self.implicated_repopaths = {REPO}
+
+    def go_ahead(self):
+        get_graph_writer().record_dashgraph(f'{REPO}.Thm', 'WIP', '{}')
+
+
+@pytest.mark.parametrize('psm', [False, True])
+def test_write_through_job(sqlite_replica_app, monkeypatch, psm):
+    """
+    A write made in a job, outside of any request, is seen by the reads of
+    the requester who enqueued the job, as named in the job descriptor.
+    """
+    app = sqlite_replica_app
+    app.config['PERSONAL_SERVER_MODE'] = psm
+    monkeypatch.setattr(RepoTaskHandler, 'emit_standard_response', lambda self: None)
+
+    def start_request():
+        ctx = app.test_request_context()
+        ctx.push()
+        if not psm:
+            session[DEMO_USERNAME_SESSION_KEY] = 'test.moo'
+        return ctx
+
+    ctx = start_request()
+    handler = DashgraphHandler({}, 'room0')
+    handler.prepare()
+    assert handler.is_prepared
+    descriptor = handler.make_job_descriptor()
+    ctx.pop()
+    identity = 'psm' if psm else 'demo:test.moo'
+    assert descriptor['requester'] == identity
+
+    with app.app_context():
+        perform_repo_task_job(descriptor)
+    assert list(app.redis.data) == [shared_write_time_key(identity)]
+    ctx = start_request()
+    assert get_graph_reader().gdb is get_graph_writer().reader.gdb
+    ctx.pop()
+
@@ -0,0 +1,197 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import time
+
+from collections import Counter
+
+import dill
+from flask import Flask, current_app, g, session
+from flask_login import LoginManager
+import pytest
+from redis import Redis
+import rq
+
+import pfsc
+import pfsc.handlers
+from pfsc.constants import (
+    QueueClass, TASK_QUEUE_NAME_BY_CLASS, DEMO_USERNAME_SESSION_KEY,
+)
+from pfsc.excep import PfscExcep, PECode
+from pfsc.gdb import GRAPH_READER_NAME
+from pfsc.handlers import SocketHandler
+from pfsc.methods import handler_job
+from pfsc.rq import (
+    is_worker_app, get_redis_connection, check_pending_jobs_limit,
+    note_pending_job, record_queue_wait, get_queue_wait_metrics,
+)
+from pfsc.rqworker import (
+    PfscWorker, PfscForkingWorker, reset_job_state, resolve_worker_queues,
+)
+from pfsc.session import get_requester_identity
+
+
+def test_reset_job_state():
+    app = Flask('test')
+    worker = PfscWorker(['pfsc-tasks'], connection=Redis(), app=app)
+    assert is_worker_app(app)
+    with app.app_context():
+        setattr(g, GRAPH_READER_NAME, 'reader')
+        g.foo = 'bar'
+        reset_job_state()
+        assert getattr(g, GRAPH_READER_NAME) == 'reader'
+        assert 'foo' not in g
+
+
+class AppRecordingHandler(SocketHandler):
+    """Records the app under which each job is performed. """
+
+    apps = []
+
+    def __init__(self, *args, **kwargs):
+        SocketHandler.__init__(self, *args, **kwargs)
+        self.do_require_csrf = False
+
+    def check_permissions(self):
+        pass
+
+    def go_ahead(self):
+        self.apps.append(current_app._get_current_object())
+
+
+def test_worker_reuses_app(app, monkeypatch):
+    """
+    A job performed without an app context (as in a work horse forked by a
+    standard RQ worker) has to make a fresh app, whereas a `PfscWorker`
+    performs every job under its own long-lived app.
+    """
+    made = []
+    make_app = pfsc.make_app
+    monkeypatch.setattr(pfsc, 'make_app', lambda *args, **kwargs: made.append(1) or make_app(*args, **kwargs))
+    monkeypatch.setattr(pfsc.handlers, 'emit_ise_event', lambda *args, **kwargs: None)
+    monkeypatch.setattr(AppRecordingHandler, 'apps', [])
+    N = 3
+
+    for i in range(N):
+        handler_job(AppRecordingHandler, {}, 'room')
+    assert len(made) == N
+    assert len({id(a) for a in AppRecordingHandler.apps}) == N
+
+    made.clear()
+    AppRecordingHandler.apps.clear()
+    worker = PfscWorker(['pfsc-tasks'], connection=Redis.from_url(app.config["REDIS_URI"]), app=app)
+    try:
+        with app.app_context():
+            for i in range(N):
+                handler_job(AppRecordingHandler, {}, 'room')
+                reset_job_state()
+    finally:
+        del app.extensions['pfsc_rq_worker']
+    assert made == []
+    assert AppRecordingHandler.apps == [app] * N
+
+
+def test_resolve_worker_queues():
+    names, weights = resolve_worker_queues(['interactive:8', 'build:2', 'pfsc-math-calc'])
+    assert names == ['pfsc-tasks', 'pfsc-tasks-build', 'pfsc-math-calc']
+    assert weights == {'pfsc-tasks': 8, 'pfsc-tasks-build': 2, 'pfsc-math-calc': 1}
+    with pytest.raises(PfscExcep) as ei:
+        resolve_worker_queues(['build:two'])
+    assert ei.value.code() == PECode.MALFORMED_CONFIG_VAR
+
+
+def test_weighted_queue_order():
+    """
+    When all queues are busy, each is served in proportion to its weight, and
+    a queue of weight zero is never served.
+    """
+    names, weights = resolve_worker_queues([
+        'interactive:8', 'build:4', 'bulk-clone:2', 'maintenance:1', 'pfsc-math-calc:0'
+    ])
+    worker = PfscForkingWorker(names, connection=Redis(), queue_weights=weights)
+    # Before any job is taken, queues are tried in order of weight.
+    assert [q.name for q in worker._ordered_queues][:2] == ['pfsc-tasks', 'pfsc-tasks-build']
+    served = Counter()
+    for i in range(15 * 10):
+        q = worker._ordered_queues[0]
+        served[q.name] += 1
+        worker.reorder_queues(reference_queue=q)
+    assert served == {
+        'pfsc-tasks': 80, 'pfsc-tasks-build': 40,
+        'pfsc-tasks-bulk-clone': 20, 'pfsc-tasks-maintenance': 10,
+    }
+
+
+def test_pending_jobs_limit(app, redis_ready, monkeypatch):
+    monkeypatch.setitem(app.config, "MAX_PENDING_JOBS_PER_USER", ['build:2'])
+    with app.app_context():
+        redis = get_redis_connection()
+        queue = rq.Queue(TASK_QUEUE_NAME_BY_CLASS[QueueClass.BUILD],
+                         connection=redis, serializer=dill)
+        requester = 'room:test_pending_jobs_limit'
+        jobs = []
+        for i in range(2):
+            check_pending_jobs_limit(queue, QueueClass.BUILD, requester)
+            job = queue.enqueue(print, i)
+            note_pending_job(queue, QueueClass.BUILD, requester, job.id)
+            jobs.append(job)
+        with pytest.raises(PfscExcep) as ei:
+            check_pending_jobs_limit(queue, QueueClass.BUILD, requester)
+        assert ei.value.code() == PECode.ACTION_EXCEEDS_RATE_LIMIT
+        # Other classes, and other requesters, are unaffected.
+        check_pending_jobs_limit(queue, QueueClass.INTERACTIVE, requester)
+        check_pending_jobs_limit(queue, QueueClass.BUILD, 'room:someone_else')
+        # Once a job is gone, there is room for another.
+        jobs[0].delete()
+        check_pending_jobs_limit(queue, QueueClass.BUILD, requester)
+        jobs[1].delete()
+
+
+def test_requester_identity():
+    app = Flask('test')
+    app.config['SECRET_KEY'] = 'test'
+    LoginManager(app).user_loader(lambda user_id: None)
+    with app.test_request_context():
+        # An anonymous requester is known only by their socket room.
+        assert get_requester_identity(room='r1') == 'room:r1'
+        assert get_requester_identity() is None
+        # A demo user is the same requester, whichever room they use, so
+        # gets one quota of pending jobs.
+        session[DEMO_USERNAME_SESSION_KEY] = 'abc'
+        assert get_requester_identity(room='r1') == 'demo:abc'
+        assert get_requester_identity(room='r2') == 'demo:abc'
+    # A job's session vars may be given explicitly.
+    with app.app_context():
+        session_dict = {DEMO_USERNAME_SESSION_KEY: 'abc'}
+        assert get_requester_identity(session_dict=session_dict) == 'demo:abc'
+        # In personal server mode, there is just one requester.
+        app.config['PERSONAL_SERVER_MODE'] = True
+        assert get_requester_identity(room='r1') == 'psm'
+
+
+def test_queue_wait_metrics(app, redis_ready):
+    with app.app_context():
+        redis = get_redis_connection()
+        queue = rq.Queue(TASK_QUEUE_NAME_BY_CLASS[QueueClass.MAINTENANCE],
+                         connection=redis, serializer=dill)
+        before = get_queue_wait_metrics(redis)[QueueClass.MAINTENANCE]['count']
+        job = queue.enqueue(print, 'hello')
+        time.sleep(0.05)
+        record_queue_wait(job, queue.name)
+        metrics = get_queue_wait_metrics(redis)[QueueClass.MAINTENANCE]
+        assert metrics['count'] == before + 1
+        assert metrics['max_ms'] >= 50
+        job.delete()
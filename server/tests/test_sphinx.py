@@ -17,17 +17,23 @@
 """Tests of sphinx builds. """
 
 import json
+import pathlib
+from types import SimpleNamespace
 
 from bs4 import BeautifulSoup
 from flask import Flask
 import pytest
 
+from pfsc.build import build_repo
 from pfsc.build.repo import get_repo_info
 from pfsc.build.manifest import load_manifest
 from pfsc.build.products import load_annotation, load_dashgraph
-from pfsc.sphinx.pages import SCRIPT_INTRO, SCRIPT_ID
+from pfsc.constants import PFSC_SPHINX_CRIT_ERR_MARKER
+from pfsc.sphinx.errors import should_elevate
+from pfsc.sphinx.pages import SCRIPT_INTRO, SCRIPT_ID, SphinxPfscEnvironment
 from pfsc.sphinx.widgets.util import process_widget_subtext
 from pfsc.excep import PfscExcep
+from pfsc.gdb import get_graph_writer
 
 
 def get_chart_widget_anchors(soup):
@@ -137,6 +143,39 @@ def test_process_widget_subtext_exception(subtext):
         process_widget_subtext(subtext)
 
 
+def test_pfsc_env_merge():
+    """
+    After a parallel read, we should take from the other environment only
+    the modules for the docs that were read there.
+    """
+    app = SimpleNamespace(config=SimpleNamespace(pfsc_repopath='test.foo.bar'))
+    mine = SphinxPfscEnvironment(app)
+    mine.add_module('test.foo.bar.a', 'a0')
+    mine.add_module('test.foo.bar.b', 'b0')
+    theirs = SphinxPfscEnvironment(app)
+    theirs.add_module('test.foo.bar.a', 'a_stale')
+    theirs.add_module('test.foo.bar.b', 'b1')
+    theirs.add_module('test.foo.bar.c', 'c1')
+    other = SimpleNamespace(proofscape=theirs)
+    mine.merge(app, ['b', 'c'], other)
+    assert mine.get_modules() == {
+        'test.foo.bar.a': 'a0',
+        'test.foo.bar.b': 'b1',
+        'test.foo.bar.c': 'c1',
+    }
+
+
+def test_should_elevate_lazy_msg():
+    """
+    Sphinx may log warnings whose messages are lazy translation proxies.
+    """
+    from sphinx.locale import _TranslationProxy
+    record = SimpleNamespace(msg=_TranslationProxy('sphinx', 'general', 'doing serial read'))
+    assert should_elevate(record) is False
+    record = SimpleNamespace(msg=f'{PFSC_SPHINX_CRIT_ERR_MARKER}: bad widget')
+    assert should_elevate(record) is True
+
+
 expected_widget_data_spx_doc0 = json.loads("""
 {
     "libpath": "test.spx.doc0.index._page",
@@ -720,3 +759,36 @@ def test_lineno_offset(app):
         d_d = json.loads(j_d)
         #print(json.dumps(d_d, indent=4))
         assert d_d['textRange'][0] == 23
+
+
+@pytest.mark.psm
+def test_rewrite_affected_pages(app, repos_ready):
+    """
+    After an edit to one page, a rebuild rewrites that page, and the pages
+    that import from it, but no others.
+    """
+    repopath = 'test.spx.doc1'
+    docnames = ['index', 'pageA', 'pageB', 'foo/pageC', 'foo/pageD', 'foo/pageE']
+    with app.app_context():
+        ri = get_repo_info(repopath)
+        ri.checkout('v0.1.0')
+        build_dir = ri.get_build_dir(sphinx_dir=True)
+
+        def get_mtimes():
+            return {d: (build_dir / f'{d}.html').stat().st_mtime_ns for d in docnames}
+
+        try:
+            build_repo(repopath)
+            mtimes0 = get_mtimes()
+            # Page D imports from page C.
+            rst_path = pathlib.Path(ri.abs_fs_path_to_dir) / 'foo' / 'pageC.rst'
+            rst_path.write_text(rst_path.read_text() + '\nOne more paragraph.\n')
+            build_repo(repopath)
+            mtimes1 = get_mtimes()
+            rewritten = [d for d in docnames if mtimes1[d] != mtimes0[d]]
+            assert rewritten == ['foo/pageC', 'foo/pageD']
+        finally:
+            ri.clean()
+            ri.delete_all_build_output()
+            get_graph_writer().delete_full_wip_build(repopath)
+
@@ -0,0 +1,316 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Tests for the embedded SQLite graph database. Unlike most tests of the GDB,
+these do not need the test repos to be built, but make a small graph by hand.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+from pygit2 import init_repository
+
+import pfsc.gdb
+from pfsc.constants import IndexType, UserProps, WIP_TAG
+from pfsc.gdb import get_graph_reader, get_graph_writer, using_sqlite
+from pfsc.gdb.sqlite.util import insert_node, insert_edge
+from pfsc.gdb.user import UserNotes
+
+REPO = 'test.foo.bar'
+
+
+@pytest.fixture
+def gdb_app(tmp_path):
+    app = Flask('test')
+    app.config['GRAPHDB_URI'] = f'sqlite://{tmp_path / "gdb.db"}'
+    pfsc.gdb.init_app(app)
+    return app
+
+
+def make_graph(tx):
+    """
+    Version 1 has a theorem Thm, proved by Pf, which cites a lemma Lem. An
+    annotation has a goal widget w1, targeting the conclusion of Thm.
+
+    In version 2, Thm moves to Thm2, and Lem dies.
+    """
+    ids = {}
+
+    def node(label, name, major='000001', cut='INF', **extra):
+        libpath = f'{REPO}.{name}' if name else REPO
+        modpath = REPO if label != IndexType.MODULE else libpath
+        ids[name] = insert_node(tx, label, {
+            'libpath': libpath, 'modpath': modpath, 'repopath': REPO,
+            'major': major, 'minor': '000000', 'patch': '000000', 'cut': cut,
+            **extra
+        })
+
+    def edge(label, tail, head, major='000001', **extra):
+        insert_edge(tx, label, ids[tail], ids[head], {
+            'modpath': REPO, 'repopath': REPO,
+            'major': major, 'minor': '000000', 'patch': '000000', 'cut': 'INF',
+            **extra
+        })
+
+    node(IndexType.MODULE, '')
+    node(IndexType.DEDUC, 'Thm', cut='000002')
+    node(IndexType.NODE, 'Thm.C', cut='000002')
+    node(IndexType.DEDUC, 'Lem', cut='000002')
+    node(IndexType.DEDUC, 'Pf')
+    node(IndexType.NODE, 'Pf.A')
+    node(IndexType.GHOST, 'Pf.G')
+    node(IndexType.ANNO, 'Notes')
+    node(IndexType.WIDGET, 'Notes.w1', **{IndexType.EP_WTYPE: 'GOAL'})
+    node(IndexType.DEDUC, 'Thm2', major='000002')
+    node(IndexType.NODE, 'Thm2.C', major='000002')
+    ids['void'] = insert_node(tx, IndexType.VOID, {})
+    for name in ['Thm', 'Lem', 'Pf', 'Notes']:
+        edge(IndexType.UNDER, name, '', segment=name)
+    edge(IndexType.UNDER, 'Thm2', '', major='000002', segment='Thm2')
+    for name in ['Thm.C', 'Pf.A', 'Pf.G', 'Notes.w1', 'Thm2.C']:
+        parent, segment = name.split('.')
+        edge(IndexType.UNDER, name, parent, major=name.startswith('Thm2') and '000002' or '000001', segment=segment)
+    edge(IndexType.EXPANDS, 'Pf', 'Thm', **{IndexType.EP_TAKEN_AT: 'v1.0.0'})
+    edge(IndexType.GHOSTOF, 'Pf.G', 'Lem')
+    edge(IndexType.TARGETS, 'Notes.w1', 'Thm.C')
+    insert_edge(tx, IndexType.MOVE, ids['Thm'], ids['Thm2'], {})
+    insert_edge(tx, IndexType.MOVE, ids['Lem'], ids['void'], {})
+    return ids
+
+
+def test_select_backend(gdb_app):
+    with gdb_app.app_context():
+        assert using_sqlite()
+        gr = get_graph_reader()
+        assert get_graph_writer().reader is gr
+        assert gr.num_nodes_in_db() == 0
+
+
+def test_queries(gdb_app):
+    with gdb_app.app_context():
+        gw = get_graph_writer()
+        gr = gw.reader
+        tx = gw.new_transaction()
+        make_graph(tx)
+        gw.commit_transaction(tx)
+        assert gr.num_nodes_in_db() == 12
+        assert gr.num_edges_in_db() == 15
+
+        # Moves
+        mc = gr.find_move_conjugate(f'{REPO}.Thm.C', 1)
+        assert (mc.libpath, mc.major) == (f'{REPO}.Thm2.C', '000002')
+        assert gr.find_move_conjugate(f'{REPO}.Lem', 1) == IndexType.VOID
+        assert gr.find_move_conjugate(f'{REPO}.Pf.A', 1) is None
+        assert [mc.libpath for mc in gr.find_move_conjugate_chain(f'{REPO}.Thm', '000001')] == [f'{REPO}.Thm2']
+
+        # Closures
+        relns = gr._find_enrichments_internal(f'{REPO}.Thm', '000001')
+        assert [k.uid for k in relns] == [f'{REPO}.Notes.w1:{IndexType.TARGETS}:{REPO}.Thm.C']
+        assert gr._find_enrichments_internal(f'{REPO}.Thm', '000002') == []
+        assert gr.get_ancestor_chain(f'{REPO}.Pf', 1) == [[f'{REPO}.Thm', 'v1.0.0', '000002']]
+        assert gr.get_ancestry(f'{REPO}.Pf', 1) == ('000001', [[f'{REPO}.Thm', '000001', 'v1.0.0']])
+        assert gr._get_deduction_closure_internal([f'{REPO}.Pf.A', f'{REPO}.Pf.G'], '000001') == {
+            f'{REPO}.Pf.A': f'{REPO}.Pf', f'{REPO}.Pf.G': f'{REPO}.Pf',
+        }
+        assert gr.get_results_relied_upon_by(f'{REPO}.Thm', 1, realm='test.foo') == [f'{REPO}.Lem']
+        assert gr.get_results_relying_upon(f'{REPO}.Lem', 1, realm='test.foo') == [f'{REPO}.Thm']
+        # The realm is by default the repo, so must contain the modules.
+        assert gr.get_results_relied_upon_by(f'{REPO}.Thm', 1) == []
+        assert gr.get_modpath(f'{REPO}.Pf.A', 1) == REPO
+        assert gr.is_deduc(f'{REPO}.Thm', 1) and not gr.is_deduc(f'{REPO}.Thm', 2)
+
+        nodes, relns = gr.get_existing_objects(REPO, '000001', True)
+        assert len(nodes) == 9
+        assert len(relns) == 11
+
+
+def add_versions_and_citations(tx, ids):
+    """
+    Record versions 1, 2, and WIP as indexed, and add a proof PfL of Lem,
+    which cites an axiom Ax, so that theory graphs have more than one level.
+    """
+    for M, version in [('000001', 'v1.0.0'), ('000002', 'v2.0.0'), (WIP_TAG, WIP_TAG)]:
+        m = p = M if M == WIP_TAG else '000000'
+        insert_node(tx, IndexType.VERSION, {
+            'repopath': REPO, 'version': version, 'full': M + m + p,
+            'major': M, 'minor': m, 'patch': p, 'time': 1,
+        })
+
+    def node(label, name):
+        ids[name] = insert_node(tx, label, {
+            'libpath': f'{REPO}.{name}', 'modpath': REPO, 'repopath': REPO,
+            'major': '000001', 'minor': '000000', 'patch': '000000', 'cut': '000002',
+        })
+
+    def edge(label, tail, head, **extra):
+        insert_edge(tx, label, ids[tail], ids[head], {
+            'modpath': REPO, 'repopath': REPO,
+            'major': '000001', 'minor': '000000', 'patch': '000000', 'cut': '000002',
+            **extra
+        })
+
+    node(IndexType.DEDUC, 'Ax')
+    node(IndexType.DEDUC, 'PfL')
+    node(IndexType.GHOST, 'PfL.G')
+    edge(IndexType.UNDER, 'Ax', '', segment='Ax')
+    edge(IndexType.UNDER, 'PfL', '', segment='PfL')
+    edge(IndexType.UNDER, 'PfL.G', 'PfL', segment='G')
+    edge(IndexType.EXPANDS, 'PfL', 'Lem', **{IndexType.EP_TAKEN_AT: 'v1.0.0'})
+    edge(IndexType.GHOSTOF, 'PfL.G', 'Ax')
+
+
+def test_versions_and_enrichment(gdb_app, tmp_path):
+    """
+    Cover the reader methods used by `test_index_2` and `test_theory_graph`,
+    which need the test repos to be built.
+    """
+    # Enrichment consults the info of the repo, so it must be present.
+    gdb_app.config['PFSC_LIB_ROOT'] = str(tmp_path / 'lib')
+    init_repository(str(tmp_path / 'lib' / 'test' / 'foo' / 'bar'))
+    with gdb_app.app_context():
+        gw = get_graph_writer()
+        gr = gw.reader
+        tx = gw.new_transaction()
+        ids = make_graph(tx)
+        add_versions_and_citations(tx, ids)
+        gw.commit_transaction(tx)
+
+        # Versions
+        assert [v['version'] for v in gr.get_versions_indexed(REPO)] == ['v1.0.0', 'v2.0.0']
+        assert [v['version'] for v in gr.get_versions_indexed(REPO, include_wip=True)] == [
+            'v1.0.0', 'v2.0.0', WIP_TAG
+        ]
+        assert len(gr.get_all_versions_indexed()) == 2
+        assert len(gr.get_all_versions_indexed(include_wip=True)) == 3
+        assert gr.version_is_already_indexed(REPO, 'v2.0.0')
+        assert not gr.version_is_already_indexed(REPO, 'v3.0.0')
+        assert gr.get_modpath(f'{REPO}.Thm2.C', 2) == REPO
+        assert gr.get_modpath(f'{REPO}.Thm2.C', 1) is None
+
+        # Everything under the repo
+        # As with Cypher, this includes the Version nodes, but not the MOVE
+        # edges, which have no repopath.
+        graph = gr.everything_under_repo(REPO)
+        assert len(graph.nodes) == 17
+        assert len(graph.relns) == 18
+        assert [v['version'] for v in graph.index_info] == ['v1.0.0', 'v2.0.0', WIP_TAG]
+
+        # Enrichment, available at every numbered version from the one at
+        # which the goal widget was made.
+        E = gr.get_enrichment(f'{REPO}.Thm', 1, filter_by_repo_permission=False)
+        assert E == {
+            f'{REPO}.Thm.C': {
+                IndexType.WIDGET: [{
+                    'libpath': f'{REPO}.Notes.w1',
+                    'versions': ['v1.0.0', 'v2.0.0'],
+                }],
+            },
+        }
+        assert gr.get_enrichment(f'{REPO}.Thm', 2, filter_by_repo_permission=False) == {}
+
+        # Theory graphs
+        lower = gr.get_lower_theory_graph(f'{REPO}.Thm', 1, realm='test.foo')
+        assert [n.label for n in lower.nodes] == [f'{REPO}.{name}' for name in ['Thm', 'Lem', 'Ax']]
+        assert [(e.src.label, e.tgt.label) for e in lower.edges] == [
+            (f'{REPO}.Lem', f'{REPO}.Thm'), (f'{REPO}.Ax', f'{REPO}.Lem'),
+        ]
+        assert 'd1 --> d0\nd2 --> d1\n' in lower.write_modtext('_map')
+        upper = gr.get_upper_theory_graph(f'{REPO}.Ax', 1, realm='test.foo')
+        assert [n.label for n in upper.nodes] == [f'{REPO}.{name}' for name in ['Ax', 'Lem', 'Thm']]
+        assert [(e.src.label, e.tgt.label) for e in upper.edges] == [
+            (f'{REPO}.Ax', f'{REPO}.Lem'), (f'{REPO}.Lem', f'{REPO}.Thm'),
+        ]
+        # Ax is not cited at version 2.
+        assert len(gr.get_upper_theory_graph(f'{REPO}.Ax', 2, realm='test.foo').nodes) == 1
+
+
+def test_users_and_builds(gdb_app):
+    username = 'test.moo'
+    with gdb_app.app_context():
+        gw = get_graph_writer()
+        gr = gw.reader
+        tx = gw.new_transaction()
+        make_graph(tx)
+        gw.commit_transaction(tx)
+
+        gw.add_user(username, UserProps.V_USERTYPE.USER, 'moo@example.org', [])
+        assert gr.load_user(username).username == username
+        for goal in ['Pf.A', 'Notes.w1']:
+            gw.record_user_notes(username, UserNotes(f'{REPO}.{goal}', 1, 'checked', goal))
+        # Recording again updates the notes.
+        gw.record_user_notes(username, UserNotes(f'{REPO}.Pf.A', 1, 'unchecked', 'A'))
+        assert gr.load_user_notes_on_deduc(username, f'{REPO}.Pf', 1) == [
+            UserNotes(f'{REPO}.Pf.A', 1, 'unchecked', 'A')
+        ]
+        assert gr.load_user_notes_on_anno(username, f'{REPO}.Notes', 1) == [
+            UserNotes(f'{REPO}.Notes.w1', 1, 'checked', 'Notes.w1')
+        ]
+        assert len(gr.load_user_notes_on_module(username, REPO, 1)) == 2
+        gw.record_user_notes(username, UserNotes(f'{REPO}.Pf.A', 1, 'unchecked', ''))
+        assert len(gr.load_user_notes(username, None)) == 1
+
+        gw.record_dashgraph(f'{REPO}.Pf', 'v1.0.0', '{"pf": 1}')
+        assert gr.dashgraph_is_built(f'{REPO}.Pf', 'v1.0.0')
+        assert gr.load_dashgraph(f'{REPO}.Pf', 'v1.0.0') == '{"pf": 1}'
+        with pytest.raises(FileNotFoundError):
+            gr.load_dashgraph(f'{REPO}.Thm', 'v1.0.0')
+
+        # Deleting everything under the repo also deletes the build nodes,
+        # and all edges, including the user's notes.
+        gw._do_delete_all_under_repo(REPO)
+        assert gr.num_nodes_in_db() == 2
+        assert gr.num_edges_in_db() == 0
+        assert gw.delete_user(username, definitely_want_to_delete_this_user=True) == 1
+
+
+class RetargetingMii:
+    """Just what `ix0360()` needs of a `ModuleIndexInfo`. """
+
+    def __init__(self, existing_k_nodes, mm_closure, major):
+        self.existing_k_nodes = existing_k_nodes
+        self.mm_closure = mm_closure
+        self.major = major
+
+    def note_begin_indexing_phase(self, phase):
+        pass
+
+    def note_task_element_completed(self, code, n=1):
+        pass
+
+
+def test_retarget_existing_enrichments(gdb_app):
+    """
+    When indexing version 2, in which Thm.C moves to Thm2.C, the existing
+    goal widget on Thm.C should get a RETARGETS edge to Thm2.C.
+    """
+    with gdb_app.app_context():
+        gw = get_graph_writer()
+        tx = gw.new_transaction()
+        ids = make_graph(tx)
+        mii = RetargetingMii(
+            {f'{REPO}.Thm.C': SimpleNamespace(db_uid=ids['Thm.C'])},
+            {f'{REPO}.Thm.C': f'{REPO}.Thm2.C'},
+            '000002',
+        )
+        gw.ix0360(mii, tx, [])
+        rows = tx.execute(f"""
+        SELECT tail, head, major FROM edges WHERE label = '{IndexType.RETARGETS}'
+        """).fetchall()
+        # The edge carries the properties of the TARGETS edge it derives from.
+        assert [tuple(row) for row in rows] == [(ids['Notes.w1'], ids['Thm2.C'], '000001')]
+        gw.commit_transaction(tx)
@@ -0,0 +1,64 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import json
+
+from pfsc.util import LazyLark
+
+from tests.util.importtime import run
+
+# Generous, so as not to fail on slow machines, but well under what it took
+# when Sphinx, all the GDB drivers, and all the grammars were loaded eagerly.
+MAX_STARTUP_SECONDS = 2.5
+
+STARTUP_CODE = '''
+import json, sys, time
+t0 = time.perf_counter()
+from pfsc import make_app
+make_app()
+t1 = time.perf_counter()
+print(json.dumps({
+    'time': t1 - t0,
+    'modules': [m for m in %r if m in sys.modules],
+}))
+'''
+
+DEFERRED_MODULES = [
+    'sphinx', 'docutils', 'neo4j', 'gremlin_python', 'redisgraph',
+    'pfsc.gdb.cypher.reader', 'pfsc.gdb.gremlin.reader',
+]
+
+
+def test_make_app_startup():
+    r = run(STARTUP_CODE % DEFERRED_MODULES)
+    assert r.returncode == 0, r.stderr
+    d = json.loads(r.stdout.strip().split('\n')[-1])
+    assert d['modules'] == []
+    assert d['time'] < MAX_STARTUP_SECONDS
+
+
+def test_lazy_lark():
+    parser = LazyLark('''
+        start: WORD+
+        %import common.WORD
+        %import common.WS
+        %ignore WS
+    ''', parser='lalr')
+    assert parser._parser is None
+    assert len(parser.parse('foo bar').children) == 2
+    p = parser.get_parser()
+    parser.parse('spam')
+    assert parser.get_parser() is p
@@ -15,10 +15,12 @@
 # --------------------------------------------------------------------------- #
 
 import json
+import os
 
 import pytest
 
 from tests import handleAsJson, loginAsTestUser
+from pfsc.checkinput.version import CheckedVersion
 from pfsc.gdb import get_graph_writer
 from pfsc.constants import ISE_PREFIX
 from pfsc.handlers.study import (
@@ -26,7 +28,12 @@ from pfsc.handlers.study import (
     GoalOriginFinder,
     GoalDataLoadMethod,
     DEFAULT_GOAL_DATA_LOAD_METHOD,
+    AnnoInfo, DeducInfo, StudyPageWriter,
 )
+from pfsc.lang.freestrings import (
+    PfscJsonTransformer, json_parser, split_on_widgets,
+)
+from pfsc.lang.modules import build_module_from_text
 
 exp0 = """\
 <h1>Study Notes</h1>
@@ -209,6 +216,83 @@ def test_study_page_builder_2(app, repos_ready):
         print(json.dumps(data, indent=4))
         assert data["widgets"]["special-studypage-test-moo-bar-results-Pf-studyPage-_w4_v2-0-0"]["origin"] == "test.moo.bar.results.Pf.T@1"
 
+def make_sample_infos():
+    ai = AnnoInfo('Notes')
+    ai.add_goal_widget('w1', 'test.foo.bar.Notes.w1@0')
+    ai.add_goal_widget('w2', 'test.foo.bar.Notes.w2@3')
+    di = DeducInfo('Thm', 'test.foo.bar.Thm@1')
+    di.add_node('A1', 'test.foo.bar.Thm.A1@1')
+    di.add_node('A2', 'test.foo.bar.Thm.A2@2')
+    studyData = {
+        'test.foo.bar.Notes.w2@3': {'notes': 'Notes on *w2*, with $x^2$.'},
+        'test.foo.bar.Thm@1': {'notes': 'Notes on Thm.\nOn two lines.'},
+        'test.foo.bar.Thm.A1@1': {'notes': 'Notes on "A1".'},
+    }
+    return [ai, di], studyData
+
+
+def test_study_page_writer():
+    """
+    Check that the parts and widget data recorded by the `StudyPageWriter`
+    are exactly what we would get by parsing the pfsc text.
+    """
+    infos, studyData = make_sample_infos()
+    pfsc_text = StudyPageBuilder.write_pfsc(
+        'studyPage', 'test.foo.bar', infos, studyData)
+    anno_text = pfsc_text.split('@@@')[1]
+
+    writer = StudyPageBuilder.write_parts(infos, studyData)
+    assert writer.write_text() == anno_text
+
+    parts = split_on_widgets(anno_text)
+    assert writer.parts == parts
+
+    transformer = PfscJsonTransformer(scope=None)
+    for rwd, data in zip(parts[1::2], writer.widget_data, strict=True):
+        assert data == transformer.transform(json_parser.parse(rwd.data))
+
+
+@pytest.mark.parametrize('studypath', [
+    'test.moo.study.expansions.Notes3',
+    'test.moo.study.expansions',
+])
+def test_study_page_direct_build(app, repos_ready, studypath):
+    """
+    Check that building a study page directly yields the same html and data
+    as writing pfsc text and building a module from that.
+    """
+    studyData = {
+        'test.moo.study.expansions.Notes3.w2@1': {
+            'notes': 'Some notes on goal w2...',
+        },
+        'test.moo.study.expansions.X@1': {
+            'notes': 'Some notes on deduc X...',
+        },
+        'test.moo.study.expansions.X.A1@1': {
+            'notes': 'Some notes on node A1...',
+        },
+    }
+    pagename = 'studyPage'
+    modpath = f'special.studypage.{studypath}'
+    deps = {'test.moo.study': 'v1.0.0'}
+    with app.app_context():
+        h = StudyPageBuilder({})
+        loader = h.make_loader(studypath, CheckedVersion('v1.0.0', 'v1', False))
+        infos = loader.load_goal_data()
+
+        pfsc_text = h.write_pfsc(pagename, loader.modpath, infos, studyData)
+        m0 = build_module_from_text(pfsc_text, modpath, dependencies=deps)
+        m1 = h.build_page_module(
+            pagename, modpath, loader.modpath, infos, studyData, deps)
+
+        results = []
+        for module in [m0, m1]:
+            module.resolve()
+            anno = module[pagename]
+            results.append((anno.get_escaped_html(), anno.get_anno_data()))
+        assert results[1] == results[0]
+
+
 import cProfile, pstats, io
 """
 For timings with StudyPageBuilder, whichever method you employ first operates
@@ -290,3 +374,74 @@ def test_timings_1(app, repos_ready, handler, method):
         ps = pstats.Stats(pr, stream=s).sort_stats(sortby)
         ps.print_stats(10)
         print(s.getvalue())
+
+
+def test_build_generation(tmp_path, monkeypatch):
+    """
+    Check that the build generation changes when a numbered version is
+    rebuilt, both when building in the build dir, and in the GDB.
+    """
+    import pfsc.handlers.study as study
+    manifest = tmp_path / 'manifest.json'
+
+    class MockRepoInfo:
+        def get_manifest_json_path(self, version):
+            return manifest
+
+    class MockReader:
+        time = 1
+
+        def get_versions_indexed(self, repopath, include_wip=False):
+            return [{'version': 'v1.0.0', 'time': self.time}]
+
+    reader = MockReader()
+    monkeypatch.setattr(study, 'get_repo_info', lambda libpath: MockRepoInfo())
+    monkeypatch.setattr(study, 'get_graph_reader', lambda: reader)
+
+    monkeypatch.setattr(study, 'building_in_gdb', lambda: False)
+    assert study.get_build_generation('test.foo.bar', 'v1.0.0') is None
+    manifest.write_text('{}')
+    os.utime(manifest, ns=(1, 1))
+    g1 = study.get_build_generation('test.foo.bar', 'v1.0.0')
+    os.utime(manifest, ns=(2, 2))
+    g2 = study.get_build_generation('test.foo.bar', 'v1.0.0')
+    assert g1 is not None and g2 != g1
+
+    monkeypatch.setattr(study, 'building_in_gdb', lambda: True)
+    assert study.get_build_generation('test.foo.bar', 'v2.0.0') is None
+    g1 = study.get_build_generation('test.foo.bar', 'v1.0.0')
+    reader.time = 2
+    g2 = study.get_build_generation('test.foo.bar', 'v1.0.0')
+    assert g1 is not None and g2 != g1
+
+
+def test_study_page_cache(monkeypatch):
+    """
+    Check that built study pages are reused exactly when the build, the
+    notes, and the trust setting are the same.
+    """
+    import pfsc.handlers.study as study
+    builds = []
+
+    def build_page(modpath, vers, loader, infos, studyData):
+        builds.append(studyData)
+        return f'<p>{len(builds)}</p>', '{}'
+
+    monkeypatch.setattr(study, 'load_goal_data_with_cache', lambda *args: (None, []))
+    monkeypatch.setattr(StudyPageBuilder, 'build_page', staticmethod(build_page))
+    study.build_study_page_with_cache.cache_clear()
+
+    def load(generation, notes, trusted=False):
+        return study.build_study_page_with_cache(
+            'build_dir', 'special.studypage.test.foo.bar', 'test.foo.bar', 'v1.0.0',
+            generation, json.dumps(notes, sort_keys=True), trusted,
+        )[0]
+
+    assert load(1, {}) == '<p>1</p>'
+    assert load(1, {}) == '<p>1</p>'
+    assert load(1, {'a@0': {'notes': 'foo'}}) == '<p>2</p>'
+    assert builds[1] == {'a@0': {'notes': 'foo'}}
+    assert load(1, {}, trusted=True) == '<p>3</p>'
+    # A rebuild makes a new generation.
+    assert load(2, {}) == '<p>4</p>'
+    study.build_study_page_with_cache.cache_clear()
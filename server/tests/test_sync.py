@@ -0,0 +1,184 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import os
+
+import pytest
+from flask import Flask
+
+import pfsc.build.sync as sync
+from pfsc.excep import PfscExcep, PECode
+from pfsc.build.sync import (
+    BuildSyncChecker, load_checkpoint, get_sync_check_progress, PROGRESS_META_KEY,
+)
+
+
+def test_incremental_sync_check(app, repos_ready):
+    with app.app_context():
+        c1 = BuildSyncChecker(skip_cache=True)
+        problems = c1.run(use_checkpoint=False)
+        assert not problems
+        n = c1.progress['examined']
+        assert n > 0
+        assert c1.progress['verified'] == n
+
+        # A second run should find everything unchanged.
+        progress_reports = []
+        c2 = BuildSyncChecker(skip_cache=True)
+        c2.run(on_progress=lambda p: progress_reports.append(dict(p)), progress_every=1)
+        assert c2.progress['examined'] == n
+        assert c2.progress['unchanged'] == n
+        assert c2.progress['verified'] == 0
+        # Progress is reported once at the start, and then after each dir.
+        assert [p['examined'] for p in progress_reports] == list(range(n + 1))
+
+        report = load_checkpoint()['report']
+        assert report['unchanged'] == n
+        assert report['problems'] == {}
+
+
+class MockReader:
+
+    def __init__(self, indexed):
+        self.indexed = indexed
+        self.queried = []
+
+    def get_all_versions_indexed(self, include_wip=False):
+        self.queried.append(None)
+        return [{'repopath': r, 'version': v, 'time': 1} for r, v in self.indexed]
+
+
+class MockJob:
+
+    def __init__(self):
+        self.meta = {}
+        self.saved = []
+
+    def save_meta(self):
+        self.saved.append(dict(self.meta[PROGRESS_META_KEY]))
+
+
+def make_build_dirs(tmp_path, n):
+    build_dirs = []
+    for i in range(n):
+        d = tmp_path / 'gh' / 'foo' / f'r{i}' / 'v1.0.0'
+        d.mkdir(parents=True)
+        build_dirs.append((f'gh.foo.r{i}', 'v1.0.0', d))
+    return build_dirs
+
+
+def test_sync_check_progress(tmp_path, monkeypatch):
+    build_dirs = make_build_dirs(tmp_path, 5)
+    indexed = [(r, v) for r, v, d in build_dirs[:4]]
+    job = MockJob()
+    monkeypatch.setattr(BuildSyncChecker, 'iter_version_dirs', lambda self: iter(build_dirs))
+    monkeypatch.setattr(sync, 'get_graph_reader', lambda: MockReader(indexed))
+    monkeypatch.setattr(sync, 'get_current_job', lambda: job)
+    app = Flask('test')
+    app.config['PFSC_BUILD_ROOT'] = str(tmp_path)
+
+    seen = []
+
+    def on_progress(p):
+        # Progress is on disk, where another process could poll it.
+        seen.append(get_sync_check_progress())
+
+    with app.app_context():
+        assert get_sync_check_progress() is None
+        with pytest.raises(PfscExcep) as ei:
+            BuildSyncChecker().run(on_progress=on_progress, progress_every=2)
+        assert ei.value.code() == PECode.BUILD_DIR_AND_GRAPH_DB_OUT_OF_SYNC
+        assert [p['examined'] for p in seen] == [0, 2, 4]
+        assert all(p['finished'] is None for p in seen)
+        # Verifications are saved along the way.
+        assert len(load_checkpoint()['verified']) == 4
+        final = get_sync_check_progress()
+        assert final['finished'] is not None
+        assert final['examined'] == 5 and final['discrepancies'] == 1
+
+    # The RQ job's meta was updated at each step, and at the end.
+    assert [p['examined'] for p in job.saved] == [0, 2, 4, 5]
+    assert job.meta[PROGRESS_META_KEY] == final
+
+
+def test_sync_check_unchanged(tmp_path, monkeypatch):
+    build_dirs = make_build_dirs(tmp_path, 5)
+    reader = MockReader([(r, v) for r, v, d in build_dirs])
+    monkeypatch.setattr(BuildSyncChecker, 'iter_version_dirs', lambda self: iter(build_dirs))
+    monkeypatch.setattr(sync, 'get_graph_reader', lambda: reader)
+    monkeypatch.setattr(sync, 'get_current_job', lambda: None)
+    app = Flask('test')
+    app.config['PFSC_BUILD_ROOT'] = str(tmp_path)
+
+    with app.app_context():
+        BuildSyncChecker().run(progress_every=1)
+        # The graph DB is asked once for all indexed versions.
+        assert reader.queried == [None]
+        checkpoint_path = sync.get_checkpoint_path()
+        mtime = checkpoint_path.stat().st_mtime_ns
+
+        # Verified dirs are found unchanged, and the checkpoint is not
+        # rewritten.
+        reader.queried = []
+        c = BuildSyncChecker()
+        c.run(progress_every=1)
+        assert c.progress['unchanged'] == 5
+        assert reader.queried == [None]
+        assert checkpoint_path.stat().st_mtime_ns == mtime
+
+        # A new build dir is verified.
+        reader.queried = []
+        build_dirs += make_build_dirs(tmp_path / 'more', 1)
+        c = BuildSyncChecker()
+        c.run()
+        assert c.progress['unchanged'] == 5 and c.progress['verified'] == 1
+        assert reader.queried == [None]
+        assert len(load_checkpoint()['verified']) == 6
+
+
+def test_sync_check_reverifies(tmp_path, monkeypatch):
+    build_dirs = make_build_dirs(tmp_path, 3)
+    reader = MockReader([(r, v) for r, v, d in build_dirs])
+    monkeypatch.setattr(BuildSyncChecker, 'iter_version_dirs', lambda self: iter(build_dirs))
+    monkeypatch.setattr(sync, 'get_graph_reader', lambda: reader)
+    monkeypatch.setattr(sync, 'get_current_job', lambda: None)
+    app = Flask('test')
+    app.config['PFSC_BUILD_ROOT'] = str(tmp_path)
+    manifest_path = tmp_path / 'html' / 'gh' / 'foo' / 'r1' / 'v1.0.0' / 'manifest.json'
+    manifest_path.parent.mkdir(parents=True)
+    manifest_path.write_text('{}')
+
+    with app.app_context():
+        BuildSyncChecker().run()
+        assert load_checkpoint()['verified']['gh/foo/r1/v1.0.0']['mtime'] is not None
+
+        # A rewritten manifest means its version is verified again.
+        st = manifest_path.stat()
+        os.utime(manifest_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        c = BuildSyncChecker()
+        c.run()
+        assert c.progress['unchanged'] == 2 and c.progress['verified'] == 1
+
+        # A version since removed from the graph DB is found out, even though
+        # it was verified before.
+        reader.indexed = reader.indexed[1:]
+        c = BuildSyncChecker()
+        with pytest.raises(PfscExcep) as ei:
+            c.run()
+        assert ei.value.code() == PECode.BUILD_DIR_AND_GRAPH_DB_OUT_OF_SYNC
+        assert c.progress['unchanged'] == 2 and c.progress['discrepancies'] == 1
+        assert load_checkpoint()['report']['problems'] == {'gh.foo.r0': ['v1.0.0']}
+        assert 'gh/foo/r0/v1.0.0' not in load_checkpoint()['verified']
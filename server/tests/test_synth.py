@@ -0,0 +1,58 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+from collections import Counter
+
+from pfsc.lang.meson import build_graph_from_meson
+from pfsc.lang.modules import parse_module_text
+
+from tests.util.synth import SynthRepoSpec, make_meson_chain
+
+
+def test_synth_deterministic():
+    spec = SynthRepoSpec(num_modules=12, num_versions=3)
+    texts = [spec.generate_module_texts(k) for k in range(3)]
+    assert texts == [SynthRepoSpec(num_modules=12, num_versions=3).generate_module_texts(k) for k in range(3)]
+    assert len(texts[0]) == 12
+    # Each later version edits some modules, and leaves the rest alone.
+    for prev, curr in zip(texts, texts[1:]):
+        changed = [p for p in curr if curr[p] != prev[p]]
+        assert 0 < len(changed) < 12
+    # A different seed makes a different repo.
+    assert SynthRepoSpec(num_modules=12, seed=1).generate_module_texts() != texts[0]
+
+
+def test_synth_modules_parse():
+    spec = SynthRepoSpec(num_modules=6, widgets_per_anno=5, expansion_depth=3)
+    for text in spec.generate_module_texts().values():
+        parse_module_text(text)
+
+
+def test_synth_imports():
+    spec = SynthRepoSpec(num_modules=30, fan_out=3, max_fan_in=2)
+    imports = spec.choose_imports()
+    fan_in = Counter(m for imps in imports for m, _ in imps)
+    assert max(fan_in.values()) <= 2
+    for i, imps in enumerate(imports):
+        assert all(m < i for m, _ in imps)
+        assert len(imps) <= 3
+
+
+def test_make_meson_chain():
+    meson = make_meson_chain(['A1', 'A2', 'A3'], 'Thm.C', ['M0Thm0.C'])
+    graph = build_graph_from_meson(meson)
+    assert set(graph.getNodes()) == {'A1', 'A2', 'A3', 'Thm.C', 'M0Thm0.C'}
+    assert len(graph.getEdges()) == 4
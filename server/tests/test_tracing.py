@@ -0,0 +1,114 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+import json
+
+import pytest
+
+from pfsc.gdb.reader import GraphReader
+from pfsc.gdb.writer import GraphWriter
+from pfsc.tracing import (
+    NOOP_SPAN, FileExporter, RingBufferExporter, Tracer,
+    current_span, set_tracer, span, traced,
+)
+
+
+@pytest.fixture
+def ring():
+    exporter = RingBufferExporter(100)
+    set_tracer(Tracer([exporter]))
+    yield exporter
+    set_tracer(None)
+
+
+def test_tracing_disabled():
+    set_tracer(None)
+    with span('build.foo', repopath='test.foo.bar') as s:
+        s.set(modules=3).count('gdb')
+    assert s is NOOP_SPAN
+    assert current_span() is NOOP_SPAN
+
+
+def test_nested_spans(ring):
+    @traced('gdb.bar')
+    def bar():
+        return 7
+
+    with span('build.outer', repopath='test.foo.bar') as outer:
+        with span('build.inner') as inner:
+            assert current_span() is inner
+            assert bar() == 7
+            assert bar() == 7
+        outer.set(modules=2)
+    assert current_span() is NOOP_SPAN
+
+    spans = ring.list_spans()
+    assert [s['name'] for s in spans] == ['gdb.bar', 'gdb.bar', 'build.inner', 'build.outer']
+    o = spans[-1]
+    assert o['parent_id'] is None
+    assert o['attrs'] == {'repopath': 'test.foo.bar', 'modules': 2}
+    assert o['counts'] == {'gdb': 2, 'build': 1}
+    assert spans[2]['counts'] == {'gdb': 2}
+    assert spans[2]['parent_id'] == o['span_id']
+    assert len({s['trace_id'] for s in spans}) == 1
+
+    assert len(ring.list_spans(name_prefix='gdb.')) == 2
+    assert [s['name'] for s in ring.list_spans(limit=1)] == ['build.outer']
+
+
+def test_span_error(ring):
+    with pytest.raises(ValueError):
+        with span('handler.go_ahead'):
+            raise ValueError
+    assert ring.list_spans()[0]['error'] == 'ValueError'
+
+
+def test_reader_and_writer_methods_traced(ring):
+    class Reader(GraphReader):
+        def get_modpath(self, libpath, major):
+            return libpath
+
+        def _internal(self):
+            return 0
+
+    class Writer(GraphWriter):
+        def ix0200(self, mii, tx):
+            return []
+
+        def record_dashgraph(self, *args):
+            pass
+
+    r = Reader(None)
+    w = Writer(r)
+    assert r.get_modpath('foo.bar', 1) == 'foo.bar'
+    r._internal()
+    w.ix0200(None, None)
+    w.record_dashgraph()
+    assert [s['name'] for s in ring.list_spans()] == ['gdb.get_modpath', 'ix.ix0200']
+
+
+def test_file_exporter(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    set_tracer(Tracer([FileExporter(str(path))]))
+    try:
+        with span('build.foo'):
+            with span('ix.bar', n=1):
+                pass
+    finally:
+        set_tracer(None)
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [d['name'] for d in lines] == ['ix.bar', 'build.foo']
+    assert lines[0]['attrs'] == {'n': 1}
@@ -372,6 +372,26 @@ def test_unexpected_field_error(app):
         assert ei.value.code() == PECode.UNEXPECTED_INPUT
 
 
+def test_arg_validators():
+    """
+    Show that each widget class compiles its own arg spec, just once.
+    """
+    from pfsc.lang.widgets import WIDGET_TYPE_TO_CLASS
+    validators = {}
+    for widget_class in WIDGET_TYPE_TO_CLASS.values():
+        v = widget_class.get_arg_validator()
+        assert widget_class.get_arg_validator() is v
+        validators[widget_class] = v
+    assert len(set(validators.values())) == len(validators)
+
+    stash = {}
+    validators[WIDGET_TYPE_TO_CLASS['QNA']]({'question': 'Q', 'answer': 'A'}, stash)
+    assert stash == {'question': 'Q', 'answer': 'A'}
+    with pytest.raises(PfscExcep) as ei:
+        validators[WIDGET_TYPE_TO_CLASS['CHART']]({'foobar': 1}, {})
+    assert ei.value.code() == PECode.UNEXPECTED_INPUT
+
+
 @pytest.mark.psm
 def test_err_in_ctl_default_value(app):
     """
@@ -16,10 +16,15 @@
 
 import json
 
+import dill
+from flask import g
 import pytest
 
 from pfsc.build.repo import get_repo_info
+from pfsc.constants import DEMO_USERNAME_SESSION_KEY
+from pfsc.excep import PfscExcep, PECode
 from pfsc.lang.modules import PathInfo
+from pfsc.handlers import RepoTaskHandler, JOB_DESCRIPTOR_VERSION
 from pfsc.handlers.write import WriteHandler
 
 
@@ -90,3 +95,177 @@ def test_autowrite_1(app):
         assert i0 == 355
         # Clean up.
         ri.clean()
+
+
+@pytest.mark.psm
+@pytest.mark.req_csrf(False)
+def test_job_descriptor(app):
+    """
+    Check that the payload we enqueue for a write job is a compact job
+    descriptor, whose size is bounded by that of the raw request info, and
+    from which an equivalent handler can be rehydrated.
+    """
+    with app.test_request_context():
+        modpath = 'test.foo.bar.results'
+        text = PathInfo(modpath).read_module()
+        args = {
+            'writepaths': [modpath],
+            'writetexts': [text * 100],
+            'buildpaths': [modpath],
+            'makecleans': [False],
+        }
+        request_info = {'info': json.dumps(args)}
+        wh = WriteHandler(request_info, 0)
+        wh.prepare()
+        assert wh.is_prepared
+
+        descriptor = wh.make_job_descriptor()
+        payload = dill.dumps(descriptor)
+        handler_payload = dill.dumps(wh)
+        raw_size = len(json.dumps(request_info))
+        assert len(payload) < raw_size + 1024
+        assert len(payload) < len(handler_payload)
+
+        wh2 = RepoTaskHandler.from_job_descriptor(dill.loads(payload))
+        assert isinstance(wh2, WriteHandler)
+        wh2.rehydrate(descriptor)
+        assert wh2.is_prepared
+        assert wh2.anticipated_pfsc_excep is None
+        assert [p.value for p in wh2.fields['writepaths']] == [modpath]
+        assert wh2.writerepos == {'test.foo.bar'}
+        assert wh2.get_implicated_repopaths() == wh.get_implicated_repopaths()
+        assert wh2.autowriters == []
+
+
+def test_bad_job_descriptor():
+    descriptor = {'v': JOB_DESCRIPTOR_VERSION + 1}
+    with pytest.raises(PfscExcep) as ei:
+        RepoTaskHandler.from_job_descriptor(descriptor)
+    assert ei.value.code() == PECode.BAD_JOB_DESCRIPTOR
+    descriptor = {'v': JOB_DESCRIPTOR_VERSION, 'handler': 'pfsc.build.repo.RepoInfo'}
+    with pytest.raises(PfscExcep) as ei:
+        RepoTaskHandler.from_job_descriptor(descriptor)
+    assert ei.value.code() == PECode.BAD_JOB_DESCRIPTOR
+
+
+def make_write_descriptor(room, writes, builds, state):
+    return {
+        'v': JOB_DESCRIPTOR_VERSION,
+        'handler': 'pfsc.handlers.write.WriteHandler',
+        'request_info': {
+            'info': json.dumps({
+                'writepaths': [w[0] for w in writes],
+                'writetexts': [w[1] for w in writes],
+                'buildpaths': [b[0] for b in builds],
+                'makecleans': [b[1] for b in builds],
+            }),
+            'cookie': {'room': room},
+        },
+        'room': room,
+        'recipSID': None,
+        'namespace': '/',
+        'repopaths': ['test.foo.bar'],
+        'session': {},
+        'response': {},
+        'state': state,
+    }
+
+
+def test_coalesce_job_descriptors():
+    a, b, c = 'test.foo.bar.a', 'test.foo.bar.b', 'test.foo.bar.c'
+    state = {'writerepos': {'test.foo.bar'}, 'buildrepos': {'test.foo.bar'}, 'cacherepos': set()}
+    descriptors = [
+        make_write_descriptor(0, [(a, 'a1'), (b, 'b1')], [(a, True)], state),
+        make_write_descriptor(1, [(a, 'a2')], [(a, False), (b, False)], state),
+        make_write_descriptor(2, [(c, 'c3'), (b, 'b3')], [(c, False)], state),
+    ]
+    combined = WriteHandler.coalesce_job_descriptors(descriptors)
+    info = json.loads(combined['request_info']['info'])
+    assert dict(zip(info['writepaths'], info['writetexts'])) == {a: 'a2', b: 'b3', c: 'c3'}
+    assert dict(zip(info['buildpaths'], info['makecleans'])) == {a: True, b: False, c: False}
+    assert info['autowrites'] == []
+    assert combined['state'] == state
+    assert combined['room'] == 2
+    assert combined['request_info']['cookie'] == {'room': 2}
+
+
+@pytest.mark.psm(False)
+def test_coalescing_signature(app):
+    def signature(room, demo_username=None, autowrites=()):
+        wh = WriteHandler({'info': '{}'}, room)
+        wh.fields = {'shadowonly': False, 'autowrites': list(autowrites)}
+        wh.implicated_repopaths = {'test.foo.bar'}
+        wh.required_phony_session_dict = {DEMO_USERNAME_SESSION_KEY: demo_username}
+        return wh.get_coalescing_signature()
+
+    with app.test_request_context():
+        # Requests from different sessions are never coalesced.
+        assert signature('room0', 'test.moo') == signature('room1', 'test.moo')
+        assert signature('room0', 'test.moo') != signature('room0', 'test.goo')
+        assert signature('room0') != signature('room1')
+        # Nor are requests with autowrites.
+        assert signature('room0', 'test.moo', [{'type': 'WIDGET_DATA'}]) is None
+    app.config["PERSONAL_SERVER_MODE"] = True
+    with app.test_request_context():
+        # In personal server mode, there is just one requester.
+        assert signature('room0') == signature('room1')
+
+
+@pytest.mark.psm
+@pytest.mark.req_csrf(False)
+@pytest.mark.parametrize('is_async', [False, True])
+def test_write_burst(app, redis_ready, monkeypatch, is_async):
+    """
+    A burst of 50 writes to one module, each from its own requester. In sync
+    mode each is carried out in turn; in async mode, they are coalesced into a
+    single job. Either way the last write wins, and every requester hears the
+    outcome.
+    """
+    import rq
+    import pfsc.handlers
+    from pfsc.constants import MAIN_TASK_QUEUE_NAME
+    from pfsc.rq import get_redis_connection
+
+    emitted = []
+    def record_emit(room, event_type, recipSID, event_message, namespace=None):
+        emitted.append((room, event_type, dict(event_message)))
+    monkeypatch.setattr(pfsc.handlers, 'emit_ise_event', record_emit)
+
+    N = 50
+    with app.test_request_context():
+        ri = get_repo_info('test.foo.bar')
+        ri.checkout('v0')
+        modpath = 'test.foo.bar.results'
+        text = PathInfo(modpath).read_module()
+
+        queue = rq.Queue(
+            MAIN_TASK_QUEUE_NAME, is_async=is_async,
+            connection=get_redis_connection(), serializer=dill,
+        )
+        setattr(g, MAIN_TASK_QUEUE_NAME, queue)
+
+        job_ids = set()
+        for i in range(N):
+            args = {
+                'writepaths': [modpath],
+                'writetexts': [text + f'\n# {i}\n'],
+            }
+            wh = WriteHandler({'info': json.dumps(args), 'cookie': {'n': i}}, f'room{i}')
+            wh.process()
+            assert wh.success
+            job_ids.add(wh.job_id)
+
+        if is_async:
+            assert len(job_ids) == 1
+            worker = rq.SimpleWorker([queue], connection=queue.connection, serializer=dill)
+            worker.work(burst=True)
+        else:
+            assert len(job_ids) == N
+
+        assert PathInfo(modpath).read_module() == text + f'\n# {N - 1}\n'
+        delayed = [(room, msg) for room, event_type, msg in emitted if event_type == 'delayed']
+        assert sorted(room for room, msg in delayed) == sorted(f'room{i}' for i in range(N))
+        for room, msg in delayed:
+            assert msg['err_lvl'] == 0
+            assert msg['cookie'] == {'n': int(room[4:])}
+        ri.clean()
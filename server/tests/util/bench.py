@@ -0,0 +1,350 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Benchmark building, indexing, and loading, on a synthetic repo.
+
+Example:
+
+    $ python -m tests.util.bench --modules 200 --gdb redis://localhost:6379 \
+        --gdb bolt://localhost:7687 --gdb sqlite:///tmp/pfsc-gdb.db -o bench.json
+
+makes the repo `test.synth.big` (see `tests.util.synth`), and then, against
+each graph database named by a `--gdb` URI (by default just the one in the
+LOCALDEV config), times:
+
+    clean:     a clean build @WIP
+    warm:      a build @WIP with nothing changed
+    edit:      a build @WIP after editing one module
+    releases:  a build of each tagged version, in order
+    loaders:   loading dashgraphs, annotations, source, and enrichment @WIP
+    queries:   graph reader queries @WIP, timed call by call
+    memory:    a clean build @WIP, under tracemalloc
+
+Builds are timed phase by phase (build, index, write). The memory benchmark is
+not timed, since tracing slows everything down; it reports the peak memory
+during each phase, and the memory still held after it. All existing indexing
+and build output for the synthetic repo is deleted before each GDB is tried.
+
+Results are written as JSON, together with the spec of the synthetic repo and
+the git commit of this project, so that they can be compared across commits.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pfsc.constants
+from pfsc import make_app
+from pfsc.build import Builder
+from pfsc.build.products import (
+    load_annotation_with_cache, load_dashgraph_with_cache,
+)
+from pfsc.build.repo import get_repo_info
+from pfsc.excep import PfscExcep
+from pfsc.gdb import get_graph_reader, get_graph_writer
+from pfsc.handlers.load import (
+    AnnotationLoader, DashgraphLoader, EnrichmentLoader, SourceLoader,
+)
+from pfsc.lang.render_cache import get_render_cache
+from config import ConfigName
+
+from tests.util.synth import (
+    SynthRepoSpec, make_synth_repo, edit_one_module, revert_edits,
+)
+
+
+def timed_build(repopath, version, make_clean):
+    """
+    Do what `Builder.build_write_index()` does, timing each phase.
+
+    :return: dict of timings, in seconds
+    """
+    times = {}
+    t0 = time.perf_counter()
+    b = Builder(repopath, version=version, make_clean=make_clean, quiet=True)
+    times['init'] = time.perf_counter() - t0
+    try:
+        for name, phase in [
+            ('build', b.build),
+            ('index', b.update_index),
+            ('write', b.write_all),
+        ]:
+            t0 = time.perf_counter()
+            phase()
+            times[name] = time.perf_counter() - t0
+        b.monitor.declare_complete()
+    except PfscExcep:
+        b.repo_info.delete_all_build_output(version, clear_cache=False)
+        b.graph_writer.delete_full_build_at_version(repopath, version=version)
+        raise
+    times['total'] = sum(times.values())
+    return times
+
+
+def traced_build(repopath, version):
+    """
+    Do a clean build, like `timed_build()`, but trace memory allocation
+    instead of timing.
+
+    :return: dict giving, for each phase, in MiB, the peak memory during the
+        phase, and the memory still held after it (while the Builder is
+        still alive)
+    """
+    mib = 1024 * 1024
+    mem = {}
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        b = Builder(repopath, version=version, make_clean=True, quiet=True)
+        for name, phase in [
+            ('build', b.build),
+            ('index', b.update_index),
+            ('write', b.write_all),
+        ]:
+            tracemalloc.reset_peak()
+            phase()
+            held, peak = tracemalloc.get_traced_memory()
+            mem[name] = {'peak': (peak - base) / mib, 'held': (held - base) / mib}
+        b.monitor.declare_complete()
+    finally:
+        tracemalloc.stop()
+    mem['peak'] = max(m['peak'] for m in mem.values())
+    return mem
+
+
+def clear_in_process_caches():
+    get_render_cache().clear()
+    load_dashgraph_with_cache.cache_clear()
+    load_annotation_with_cache.cache_clear()
+
+
+def clear_synth_repo(spec):
+    """
+    Delete all indexing and build output for a synthetic repo.
+    """
+    gw = get_graph_writer()
+    ri = get_repo_info(spec.repopath)
+    for version in [pfsc.constants.WIP_TAG] + spec.tag_names:
+        gw.delete_full_build_at_version(spec.repopath, version=version)
+        ri.delete_all_build_output(version, clear_cache=True)
+    clear_in_process_caches()
+
+
+def summarize(samples):
+    return {
+        'n': len(samples),
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'max': max(samples),
+    }
+
+
+def time_loader(app, handler_class, request_infos):
+    """
+    Time a loader on each of a list of requests, as served over HTTP (i.e.
+    in a request context), but without going through the routing.
+    """
+    samples = []
+    for info in request_infos:
+        with app.test_request_context():
+            t0 = time.perf_counter()
+            h = handler_class(info)
+            h.process(raise_anticipated=True)
+            h.generate_response()
+            samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def bench_loaders(app, spec, num_samples, reps):
+    wip = pfsc.constants.WIP_TAG
+    modpaths = [spec.modpath(i) for i in range(min(num_samples, spec.num_modules))]
+    deducs = [f'{m}.Pf0' for m in modpaths]
+    annos = [f'{m}.Notes0' for m in modpaths] if spec.annos_per_module else []
+    results = {}
+    for handler_class, infos in [
+        (DashgraphLoader, [{'libpath': lp, 'vers': wip} for lp in deducs]),
+        (AnnotationLoader, [{'libpath': lp, 'vers': wip} for lp in annos]),
+        (SourceLoader, [{'libpaths': m, 'versions': wip} for m in modpaths]),
+        (EnrichmentLoader, [{'libpath': lp, 'vers': wip} for lp in deducs]),
+    ]:
+        if infos:
+            results[handler_class.__name__] = time_loader(app, handler_class, infos * reps)
+    return results
+
+
+def time_queries(app, method_name, args_list):
+    """
+    Time a GraphReader method on each of a list of argument tuples. All calls
+    are made in one app context, so that we time just the queries, and not
+    the connection to the GDB.
+    """
+    samples = []
+    with app.app_context():
+        method = getattr(get_graph_reader(), method_name)
+        for args in args_list:
+            t0 = time.perf_counter()
+            method(*args)
+            samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def bench_queries(app, spec, num_samples, reps):
+    wip = pfsc.constants.WIP_TAG
+    modpaths = [spec.modpath(i) for i in range(min(num_samples, spec.num_modules))]
+    deducs = [f'{m}.Pf0' for m in modpaths]
+    nodes = [f'{d}.A1' for d in deducs]
+    results = {}
+    for method_name, args_list in [
+        ('get_existing_objects', [(m, wip, False) for m in modpaths]),
+        ('get_enrichment', [(d, wip) for d in deducs]),
+        ('get_ancestor_chain', [(d, wip) for d in deducs]),
+        ('get_deductive_nbrs', [({wip: [n]},) for n in nodes]),
+        ('get_deduction_closure', [({wip: [n]},) for n in nodes]),
+        ('find_move_conjugate', [(n, wip) for n in nodes]),
+        ('get_lower_theory_graph', [(d, wip) for d in deducs]),
+        ('get_upper_theory_graph', [(d, wip) for d in deducs]),
+    ]:
+        results[method_name] = time_queries(app, method_name, args_list * reps)
+    return results
+
+
+def bench_gdb(spec, gdb_uri, args):
+    """
+    Run all benchmarks against one graph database.
+    """
+    app = make_app(ConfigName.LOCALDEV)
+    app.config["PERSONAL_SERVER_MODE"] = True
+    app.config["REQUIRE_CSRF_TOKEN"] = False
+    if gdb_uri:
+        app.config["GRAPHDB_URI"] = gdb_uri
+    wip = pfsc.constants.WIP_TAG
+    results = {'gdb_uri': app.config["GRAPHDB_URI"]}
+
+    def report(name, times):
+        if args.verbose:
+            print(f'    {name}: {times["total"]:.3f}s')
+        return times
+
+    with app.app_context():
+        clear_synth_repo(spec)
+        results['clean'] = report('clean', timed_build(spec.repopath, wip, True))
+        results['warm'] = report('warm', timed_build(spec.repopath, wip, False))
+        edited = edit_one_module(spec, i=args.edit_module)
+        try:
+            results['edit'] = report('edit', timed_build(spec.repopath, wip, False))
+            results['edit']['modpath'] = edited
+        finally:
+            revert_edits(spec)
+        results['loaders'] = bench_loaders(app, spec, args.loader_samples, args.loader_reps)
+        results['queries'] = bench_queries(app, spec, args.loader_samples, args.loader_reps)
+        if not args.skip_memory:
+            get_graph_writer().delete_full_build_at_version(spec.repopath, version=wip)
+            clear_in_process_caches()
+            results['memory'] = traced_build(spec.repopath, wip)
+            if args.verbose:
+                print(f'    memory: {results["memory"]["peak"]:.1f}MiB peak')
+        results['releases'] = {}
+        for tag in spec.tag_names:
+            clear_in_process_caches()
+            results['releases'][tag] = report(tag, timed_build(spec.repopath, tag, True))
+        if not args.keep:
+            clear_synth_repo(spec)
+    return results
+
+
+def get_project_commit():
+    try:
+        r = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except OSError:
+        return None
+    return r.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--name', default='big', help='name of the synthetic repo')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--modules', type=int, default=20, help='number of modules')
+    parser.add_argument('--modules-per-dir', type=int, default=10)
+    parser.add_argument('--deducs', type=int, default=2, help='theorem/proof pairs per module')
+    parser.add_argument('--nodes', type=int, default=8, help='nodes per proof')
+    parser.add_argument('--annos', type=int, default=1, help='annotations per module')
+    parser.add_argument('--widgets', type=int, default=4, help='widgets per annotation')
+    parser.add_argument('--fan-out', type=int, default=2, help='imports per module')
+    parser.add_argument('--max-fan-in', type=int, default=0, help='max importers per module (0 for no limit)')
+    parser.add_argument('--depth', type=int, default=2, help='expansion depth')
+    parser.add_argument('--versions', type=int, default=2, help='number of tagged versions')
+    parser.add_argument('--edit-fraction', type=float, default=0.2, help='fraction of modules edited per version')
+    parser.add_argument('--edit-module', type=int, help='index of the module to edit for the "edit" build')
+    parser.add_argument('--gdb', action='append', help='graph database URI (may be repeated)')
+    parser.add_argument('--loader-samples', type=int, default=10, help='number of modules to load from (or query)')
+    parser.add_argument('--loader-reps', type=int, default=3, help='repetitions of each load (or query)')
+    parser.add_argument('--skip-memory', action='store_true', help='skip the memory benchmark')
+    parser.add_argument('--skip-make', action='store_true', help='use the existing synthetic repo')
+    parser.add_argument('--keep', action='store_true', help='keep the build output and indexing afterward')
+    parser.add_argument('-o', '--out', help='file to which to write the JSON results (default stdout)')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    spec = SynthRepoSpec(
+        name=args.name, seed=args.seed,
+        num_modules=args.modules, modules_per_dir=args.modules_per_dir,
+        deducs_per_module=args.deducs, nodes_per_deduc=args.nodes,
+        annos_per_module=args.annos, widgets_per_anno=args.widgets,
+        fan_out=args.fan_out, max_fan_in=args.max_fan_in,
+        expansion_depth=args.depth,
+        num_versions=args.versions, edit_fraction=args.edit_fraction,
+    )
+    if not args.skip_make:
+        make_synth_repo(spec, verbose=args.verbose)
+
+    output = {
+        'spec': spec.to_dict(),
+        'commit': get_project_commit(),
+        'python': platform.python_version(),
+        'started': time.time(),
+        'results': [],
+    }
+    for gdb_uri in args.gdb or [None]:
+        if args.verbose:
+            print(f'GDB: {gdb_uri or "(default)"}')
+        output['results'].append(bench_gdb(spec, gdb_uri, args))
+
+    j = json.dumps(output, indent=4)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(j)
+    else:
+        print(j)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except PfscExcep as e:
+        print(e)
+        sys.exit(1)
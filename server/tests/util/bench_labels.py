@@ -0,0 +1,111 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Micro-benchmark for rendering node labels.
+
+Example:
+
+    $ python -m tests.util.bench_labels --nodes 2000 --distinct 50
+
+makes a module (in memory; no repo is needed) with one deduction of the given
+number of nodes, whose labels are drawn in rotation from the given number of
+distinct label texts, and times `buildDashgraph()` on it:
+
+    uncached:  with the render cache disabled, so that every label is rendered
+    cold:      with an empty render cache
+    warm:      with the render cache as left by the cold run
+
+Note: Loading the module (which is not part of the benchmark) takes a while,
+since parsing the long Meson script is slow.
+"""
+
+import argparse
+import json
+import time
+
+import pfsc.build
+from pfsc import make_app
+from pfsc.lang.modules import load_module, CachePolicy
+from pfsc.lang.render_cache import get_render_cache
+from config import ConfigName
+
+from tests.util.synth import write_deduc, make_meson_chain
+
+MODPATH = 'test.synth.labels.bench'
+
+
+def make_module_text(num_nodes, num_distinct):
+    names = [f'A{i}' for i in range(num_nodes)]
+    text = write_deduc('Thm', None, ['C'], 'The theorem', 'C.')
+    pf = 'deduc Pf of Thm.C {\n\n'
+    for i, name in enumerate(names):
+        k = i % num_distinct
+        pf += f'    asrt {name} {{\n        en = "Step {k}: *so* $x_{{{k}}} \\\\in S$."\n    }}\n\n'
+    pf += f'    meson = "{make_meson_chain(names, "Thm.C")}"\n\n}}\n'
+    return text + pf
+
+
+def time_dashgraph(deduc, reps):
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        deduc.buildDashgraph()
+        samples.append(time.perf_counter() - t0)
+    return min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=2000, help='number of nodes in the deduction')
+    parser.add_argument('--distinct', type=int, default=50, help='number of distinct labels')
+    parser.add_argument('--reps', type=int, default=3, help='repetitions of each timing (we report the min)')
+    args = parser.parse_args()
+
+    app = make_app(ConfigName.LOCALDEV)
+    app.config["PERSONAL_SERVER_MODE"] = True
+    with app.app_context():
+        t0 = time.perf_counter()
+        module = load_module(
+            MODPATH, text=make_module_text(args.nodes, args.distinct),
+            caching=CachePolicy.NEVER
+        )
+        module.resolve()
+        load_time = time.perf_counter() - t0
+        deduc = module['Pf']
+
+        cache = get_render_cache()
+        max_size = cache.max_size
+        cache.clear()
+        cache.max_size = 0
+        uncached = time_dashgraph(deduc, args.reps)
+        cache.max_size = max(max_size, args.distinct + 10)
+        cold = time_dashgraph(deduc, 1)
+        warm = time_dashgraph(deduc, args.reps)
+        cache.max_size = max_size
+
+    print(json.dumps({
+        'nodes': args.nodes,
+        'distinct': args.distinct,
+        'load': load_time,
+        'uncached': uncached,
+        'cold': cold,
+        'warm': warm,
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
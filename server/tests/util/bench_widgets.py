@@ -0,0 +1,95 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Micro-benchmark for checking widget fields.
+
+Example:
+
+    $ python -m tests.util.bench_widgets --widgets 5000
+
+makes a module (in memory; no repo is needed) with one annotation containing
+the given number of widgets (see `tests.util.synth`), and times:
+
+    build:        building the module from its text
+    interpreted:  checking the fields of all the widgets with `check_input()`,
+                  generating the arg spec for each widget, as widgets once did
+    compiled:     checking the fields of all the widgets with the compiled
+                  validators, as widgets do now
+"""
+
+import argparse
+import json
+import time
+
+import pfsc.build
+from pfsc import make_app
+from pfsc.checkinput import check_input
+from pfsc.lang.modules import build_module_from_text, CachePolicy
+from config import ConfigName
+
+from tests.util.synth import SynthRepoSpec
+
+MODPATH = 'test.synth.widgets.bench'
+
+
+def time_checks(widgets, check, reps):
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        for w in widgets:
+            check(w)
+        samples.append(time.perf_counter() - t0)
+    return min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--widgets', type=int, default=5000, help='number of widgets in the annotation')
+    parser.add_argument('--reps', type=int, default=3, help='repetitions of each timing (we report the min)')
+    args = parser.parse_args()
+
+    spec = SynthRepoSpec(
+        num_modules=1, deducs_per_module=1, annos_per_module=1,
+        widgets_per_anno=args.widgets, expansion_depth=0,
+    )
+    text = list(spec.generate_module_texts().values())[0]
+
+    app = make_app(ConfigName.LOCALDEV)
+    app.config["PERSONAL_SERVER_MODE"] = True
+    with app.app_context():
+        t0 = time.perf_counter()
+        module = build_module_from_text(text, MODPATH, caching=CachePolicy.NEVER)
+        build_time = time.perf_counter() - t0
+        widgets = module['Notes0'].get_proper_widgets()
+
+        interpreted = time_checks(widgets, lambda w: check_input(
+            w.raw_data, {}, w.generate_arg_spec(), err_on_unexpected=True
+        ), args.reps)
+        compiled = time_checks(widgets, lambda w: w.get_arg_validator()(
+            w.raw_data, {}
+        ), args.reps)
+
+    print(json.dumps({
+        'widgets': len(widgets),
+        'build': build_time,
+        'interpreted': interpreted,
+        'compiled': compiled,
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Profile the imports made in starting up the app.
+
+Example:
+
+    $ python -m tests.util.importtime -n 30
+
+runs `make_app()` in a fresh process under `python -X importtime`, and lists
+the 30 imports with the greatest cumulative time, plus the total time taken
+by `make_app()`. Use `--code` to profile something else, e.g.
+
+    $ python -m tests.util.importtime --code "import pfsc.rqworker"
+
+Heavy libraries that should _not_ show up here include Sphinx, docutils, and
+the graph database drivers other than the one named by `GRAPHDB_URI`. These
+are imported only when needed.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_CODE = '''
+import time
+t0 = time.perf_counter()
+from pfsc import make_app
+make_app()
+print(f'{time.perf_counter() - t0:.3f}s')
+'''
+
+
+def startup_env():
+    """
+    The environment in which to run the app. Any of the config vars that the
+    app requires but which are not already defined get dummy values, since
+    merely making the app does not connect to any of the services they name.
+    """
+    env = dict(os.environ)
+    env.setdefault('FLASK_CONFIG', 'localdev')
+    for var, value in [
+        ('SECRET_KEY', 'startup'),
+        ('REDIS_URI', 'redis://localhost:6379'),
+        ('GRAPHDB_URI', 'redis://localhost:6379'),
+        ('PFSC_LIB_ROOT', '/tmp/proofscape/lib'),
+        ('PFSC_BUILD_ROOT', '/tmp/proofscape/build'),
+    ]:
+        env.setdefault(var, value)
+    return env
+
+
+def run(code, importtime=False):
+    """
+    Run code in a fresh Python process, from the `server` directory.
+
+    :return: the `subprocess.CompletedProcess`
+    """
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += ['-c', code]
+    return subprocess.run(
+        cmd, capture_output=True, text=True, env=startup_env(),
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+
+
+def parse_importtime(stderr):
+    """
+    :return: list of triples (self_us, cumulative_us, module name), one for
+        each line of `-X importtime` output
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        try:
+            self_us, cumul_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # The header line
+            continue
+        rows.append((self_us, cumul_us, parts[2].strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', type=int, default=25, help='number of imports to list')
+    parser.add_argument('--self', action='store_true', help='sort by self time, instead of cumulative')
+    parser.add_argument('--code', default=DEFAULT_CODE, help='code to profile')
+    args = parser.parse_args()
+
+    r = run(args.code, importtime=True)
+    if r.returncode != 0:
+        print(r.stderr)
+        sys.exit(r.returncode)
+    rows = parse_importtime(r.stderr)
+    rows.sort(key=lambda row: row[0 if args.self else 1], reverse=True)
+    print(f'{"self (ms)":>10} {"cumul (ms)":>11}  module')
+    for self_us, cumul_us, name in rows[:args.n]:
+        print(f'{self_us / 1000:10.1f} {cumul_us / 1000:11.1f}  {name}')
+    if r.stdout.strip():
+        print(f'\nTotal: {r.stdout.strip()}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# --------------------------------------------------------------------------- #
+#   Copyright (c) 2011-2024 Proofscape Contributors                           #
+#                                                                             #
+#   Licensed under the Apache License, Version 2.0 (the "License");           #
+#   you may not use this file except in compliance with the License.          #
+#   You may obtain a copy of the License at                                   #
+#                                                                             #
+#       http://www.apache.org/licenses/LICENSE-2.0                            #
+#                                                                             #
+#   Unless required by applicable law or agreed to in writing, software       #
+#   distributed under the License is distributed on an "AS IS" BASIS,         #
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.  #
+#   See the License for the specific language governing permissions and       #
+#   limitations under the License.                                            #
+# --------------------------------------------------------------------------- #
+
+"""
+Generate synthetic test repos, of any size, for benchmarking.
+
+A synthetic repo is determined entirely by a `SynthRepoSpec`: generating twice
+from equal specs produces identical text, so that benchmark results from
+different commits can be compared.
+
+Each module in a synthetic repo defines a number of theorem/proof pairs, a
+chain of expansions, and a number of annotations containing widgets. Modules
+import deductions from earlier modules (so there are no import cycles), with
+the number of imports per module, and the number of importers of any one
+module, under control. Proofs cite the imported theorems, and the first
+expansion in each chain expands on a node of an imported proof.
+
+Each version after the first edits the node texts in a fraction of the modules.
+Versions are tagged v0.1.0, v0.2.0, ..., so that no change log is needed.
+"""
+
+import os
+import random
+import shutil
+
+from config import LocalDevConfig
+
+SYNTH_USER = 'synth'
+
+
+class SynthRepoSpec:
+
+    def __init__(
+            self, name='big', seed=0,
+            num_modules=20, modules_per_dir=10,
+            deducs_per_module=2, nodes_per_deduc=8,
+            annos_per_module=1, widgets_per_anno=4,
+            fan_out=2, max_fan_in=0,
+            expansion_depth=2,
+            num_versions=2, edit_fraction=0.2,
+    ):
+        """
+        :param name: the repo will be `test.synth.{name}`
+        :param seed: seed for the random choices (of imports, and of edits)
+        :param num_modules: number of modules
+        :param modules_per_dir: modules are grouped into directories of at
+            most this many
+        :param deducs_per_module: number of theorem/proof pairs per module
+        :param nodes_per_deduc: number of nodes in each proof
+        :param annos_per_module: number of annotations per module
+        :param widgets_per_anno: number of widgets per annotation
+        :param fan_out: number of deductions each module imports (fewer for
+            the first few modules, which have fewer modules before them)
+        :param max_fan_in: maximum number of modules that may import from any
+            one module. Zero means no limit.
+        :param expansion_depth: length of the chain of expansions in each
+            module, in which each expansion expands on a node of the last
+        :param num_versions: number of tagged versions
+        :param edit_fraction: fraction of modules edited in each version
+            after the first
+        """
+        self.name = name
+        self.seed = seed
+        self.num_modules = num_modules
+        self.modules_per_dir = modules_per_dir
+        self.deducs_per_module = deducs_per_module
+        self.nodes_per_deduc = nodes_per_deduc
+        self.annos_per_module = annos_per_module
+        self.widgets_per_anno = widgets_per_anno
+        self.fan_out = fan_out
+        self.max_fan_in = max_fan_in
+        self.expansion_depth = expansion_depth
+        self.num_versions = num_versions
+        self.edit_fraction = edit_fraction
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @property
+    def repopath(self):
+        return f'test.{SYNTH_USER}.{self.name}'
+
+    @property
+    def tag_names(self):
+        return [f'v0.{k}.0' for k in range(1, self.num_versions + 1)]
+
+    def module_name(self, i):
+        return f'mod{i:04d}'
+
+    def dir_name(self, i):
+        return f'part{i // self.modules_per_dir:02d}'
+
+    def module_relpath(self, i):
+        """
+        :return: the path of the i'th module's file, relative to the repo root
+        """
+        return f'{self.dir_name(i)}/{self.module_name(i)}.pfsc'
+
+    def modpath(self, i):
+        return f'{self.repopath}.{self.dir_name(i)}.{self.module_name(i)}'
+
+    def choose_imports(self):
+        """
+        Decide which modules import from which.
+
+        :return: list, in which the i'th entry is the list of pairs (m, j)
+            meaning that module i imports Thm{j} and Pf{j} from module m < i.
+        """
+        rng = random.Random(self.seed)
+        fan_in = [0] * self.num_modules
+        imports = []
+        for i in range(self.num_modules):
+            candidates = [
+                m for m in range(i)
+                if self.max_fan_in <= 0 or fan_in[m] < self.max_fan_in
+            ]
+            chosen = rng.sample(candidates, min(self.fan_out, len(candidates)))
+            for m in chosen:
+                fan_in[m] += 1
+            imports.append([
+                (m, rng.randrange(self.deducs_per_module)) for m in sorted(chosen)
+            ])
+        return imports
+
+    def choose_edits(self, version_index):
+        """
+        :return: the set of indices of the modules that are edited in the
+            version of the given index.
+        """
+        if version_index == 0:
+            return set()
+        rng = random.Random(f'{self.seed}:{version_index}')
+        k = max(1, round(self.edit_fraction * self.num_modules))
+        return set(rng.sample(range(self.num_modules), min(k, self.num_modules)))
+
+    def generate_module_texts(self, version_index=0):
+        """
+        :param version_index: index of the version (among `tag_names`)
+        :return: dict mapping module relpaths to module texts
+        """
+        imports = self.choose_imports()
+        # For each module, the index of the last version in which it was edited.
+        last_edit = [0] * self.num_modules
+        for k in range(1, version_index + 1):
+            for i in self.choose_edits(k):
+                last_edit[i] = k
+        return {
+            self.module_relpath(i): self.write_module(i, imports[i], last_edit[i])
+            for i in range(self.num_modules)
+        }
+
+    def write_module(self, i, imports, edition):
+        """
+        Write the text of one module.
+
+        :param i: the index of the module
+        :param imports: list of pairs (m, j), as in `choose_imports()`
+        :param edition: the version index at which this module was last edited
+        :return: str
+        """
+        text = ''
+        cited = []
+        for m, j in imports:
+            alias = f'M{m:04d}'
+            text += f'from ...{self.dir_name(m)}.{self.module_name(m)} import Thm{j} as {alias}Thm{j}\n'
+            text += f'from ...{self.dir_name(m)}.{self.module_name(m)} import Pf{j} as {alias}Pf{j}\n'
+            cited.append((f'{alias}Thm{j}', f'{alias}Pf{j}'))
+        if imports:
+            text += '\n'
+
+        tag = f'(module {i}, edition {edition})'
+        n = self.nodes_per_deduc
+        for j in range(self.deducs_per_module):
+            text += write_deduc(f'Thm{j}', None, ['C'], f'Theorem {j} {tag}', 'C.')
+            names = [f'A{k}' for k in range(1, n + 1)]
+            premises = [f'{thm}.C' for thm, _ in cited[j::self.deducs_per_module]]
+            text += write_deduc(
+                f'Pf{j}', f'Thm{j}.C', names, f'Step of proof {j} {tag}',
+                make_meson_chain(names, f'Thm{j}.C', premises)
+            )
+
+        # The first expansion expands on a node of an imported proof, if
+        # there is one, else on a node of a local one.
+        target = f'{cited[0][1]}.A1' if cited else 'Pf0.A1'
+        for d in range(self.expansion_depth):
+            names = [f'B{k}' for k in range(1, max(2, n // 2) + 1)]
+            text += write_deduc(
+                f'X{d}', target, names, f'Expansion {d} {tag}',
+                make_meson_chain(names, target)
+            )
+            target = f'X{d}.B1'
+
+        views = [f'Pf{j}' for j in range(self.deducs_per_module)]
+        views += [pf for _, pf in cited]
+        views += [f'X{d}' for d in range(self.expansion_depth)]
+        w = 0
+        for a in range(self.annos_per_module):
+            text += f'anno Notes{a} @@@\n# Notes {a} {tag}\n\n'
+            for _ in range(self.widgets_per_anno):
+                if w % 2 == 0:
+                    view = views[(w // 2) % len(views)]
+                    text += f'Let us look at <chart:w{w}>[the deduction]{{view: {view}}}.\n\n'
+                else:
+                    text += f'* <goal:w{w}>[]{{}} Understand the previous chart.\n\n'
+                w += 1
+            text += '@@@\n\n'
+
+        return text
+
+    def write_version(self, dir_path, version_index):
+        """
+        Write the modules of a version into a directory, replacing all
+        existing modules.
+        """
+        for name in os.listdir(dir_path):
+            if name.startswith('part'):
+                shutil.rmtree(os.path.join(dir_path, name))
+        for relpath, text in self.generate_module_texts(version_index).items():
+            path = os.path.join(dir_path, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(text)
+
+
+def write_deduc(name, target, node_names, node_text, meson):
+    """
+    Write a deduction in which every node is an assertion.
+    """
+    text = f'deduc {name}' + (f' of {target}' if target else '') + ' {\n\n'
+    for node_name in node_names:
+        text += f'    asrt {node_name} {{\n        en = "{node_text}, node {node_name}."\n    }}\n\n'
+    text += f'    meson = "{meson}"\n\n}}\n\n'
+    return text
+
+
+def make_meson_chain(names, conclusion, premises=None):
+    """
+    Write a Meson script in which each node follows from the last, and the
+    conclusion from the final node, by any premises.
+    """
+    meson = ', so '.join(names + [conclusion])
+    if premises:
+        meson += ' by ' + ' and '.join(premises)
+    return meson + '.'
+
+
+def get_synth_repo_dir(spec, config=LocalDevConfig):
+    return os.path.join(config.PFSC_LIB_ROOT, 'test', SYNTH_USER, spec.name)
+
+
+def make_synth_repo(spec, config=LocalDevConfig, verbose=True):
+    """
+    Make a synthetic repo as a git repository under LIB_ROOT/test/synth,
+    replacing any existing repo of the same name. Each version is committed,
+    and tagged, in order, and the repo is left with its last version checked
+    out.
+
+    :param spec: a SynthRepoSpec
+    :param config: a Config subclass. This is needed for the PFSC_LIB_ROOT.
+    :param verbose: control verbosity
+    :return: the filesystem path of the repo
+    """
+    repo_dir = get_synth_repo_dir(spec, config=config)
+    if os.path.exists(repo_dir):
+        if verbose: print(f'Removing existing {repo_dir}')
+        shutil.rmtree(repo_dir)
+    os.makedirs(repo_dir)
+    if verbose: print(f'Making {spec.repopath}...')
+    os.system(f'cd {repo_dir}; git init > /dev/null 2>&1')
+    for k, tag_name in enumerate(spec.tag_names):
+        if verbose: print(f'    Make version {tag_name}...')
+        spec.write_version(repo_dir, k)
+        os.system(f'cd {repo_dir}; git add -A > /dev/null 2>&1')
+        os.system(f'cd {repo_dir}; git commit -m "{tag_name}" > /dev/null 2>&1')
+        os.system(f'cd {repo_dir}; git tag {tag_name} > /dev/null 2>&1')
+    return repo_dir
+
+
+def edit_one_module(spec, i=None, config=LocalDevConfig):
+    """
+    Edit one module in the working tree of a synthetic repo, as a user would,
+    by changing the text of one node.
+
+    :param spec: a SynthRepoSpec
+    :param i: index of the module to edit. Defaults to the middle module.
+    :param config: a Config subclass. This is needed for the PFSC_LIB_ROOT.
+    :return: the modpath of the module that was edited
+    """
+    if i is None:
+        i = spec.num_modules // 2
+    path = os.path.join(get_synth_repo_dir(spec, config=config), spec.module_relpath(i))
+    with open(path) as f:
+        text = f.read()
+    with open(path, 'w') as f:
+        f.write(text.replace('en = "', 'en = "Edited. ', 1))
+    return spec.modpath(i)
+
+
+def revert_edits(spec, config=LocalDevConfig):
+    """
+    Discard any edits in the working tree of a synthetic repo.
+    """
+    repo_dir = get_synth_repo_dir(spec, config=config)
+    os.system(f'cd {repo_dir}; git checkout -- . > /dev/null 2>&1')
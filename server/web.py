@@ -26,6 +26,9 @@ from pfsc import socketio, make_app
 
 def start_web_server(app):
     is_dev = app.config.get("IS_DEV", False)
+    if app.config.get("BACKGROUND_SYNC_CHECK"):
+        from pfsc.build.sync import run_background_sync_check
+        socketio.start_background_task(run_background_sync_check, app)
     socketio.run(app, host='0.0.0.0', port=7372, debug=is_dev, use_reloader=is_dev)
 
 
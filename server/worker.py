@@ -29,10 +29,11 @@ import os
 
 import dill
 from redis import Redis
-from rq import Connection, Worker
+from rq import Connection
 
 from pfsc import make_app
 from pfsc.email import send_error_report_mail
+from pfsc.rqworker import PfscWorker, PfscForkingWorker, resolve_worker_queues
 
 # Set a signal that this is an RQ worker.
 # This is checked by the `pfsc.permissions.check_is_psm()` function, to
@@ -57,16 +58,33 @@ def email_exc_handler(job, *exc_info):
 # definite impact, improving performance of the worker by loading libraries
 # once now, instead of repeatedly on each job.
 from pfsc.blueprints.ise import *
-# However, the following lines are deliberately commented out now, since we
-# are not currently supporting server-side math eval.
-#from pfsc_examp.parameters.types import *
-#from pfsc_examp.parse.display import *
+# The examp libraries are needed only for server-side math eval, and are
+# loaded below, if that is enabled.
 
 with Connection(connection=Redis.from_url(app.config.get("REDIS_URI"))):
-    qs = sys.argv[1:] or ['pfsc-tasks']
-    worker = Worker(
-        qs, log_job_description=False,
+    # Queues may be given on the command line, as queue classes or queue
+    # names, each optionally with a weight, e.g. `interactive:8 build:2`.
+    qs, weights = resolve_worker_queues(
+        sys.argv[1:] or app.config.get("RQ_WORKER_QUEUE_WEIGHTS")
+    )
+    kwargs = dict(
+        log_job_description=False,
         exception_handlers=[email_exc_handler],
         serializer=dill,
+        queue_weights=weights,
+    )
+    fork_per_job = not app.config.get("RQ_WORKER_NO_FORK")
+    if app.config.get("SERVER_SIDE_EXAMP_EVAL"):
+        # Start the examp eval pool, or, if forking, preload the examp
+        # libraries for the work horses. See `pfsc.exampeval`.
+        from pfsc.exampeval import prepare_rq_worker
+        with app.app_context():
+            prepare_rq_worker(fork_per_job)
+    if fork_per_job:
+        worker = PfscForkingWorker(qs, **kwargs)
+    else:
+        worker = PfscWorker(qs, app=app, **kwargs)
+    worker.work(
+        with_scheduler=need_scheduler(), logging_level="INFO",
+        max_jobs=app.config.get("RQ_WORKER_MAX_JOBS") or None,
     )
-    worker.work(with_scheduler=need_scheduler(), logging_level="INFO")